@@ -32,6 +32,10 @@ USER_EMAIL = cfl.USER_EMAIL
 MAX_ALLOWED_FILES = 2000
 CPUS = 5
 
+# Genome download engine
+DWL_WORKERS = 8  # concurrent file downloads
+DWL_GENOME_WORKERS = 4  # genomes whose accessions are resolved concurrently
+
 # LSF GROUP constraints
 LSF_GROUPS_CMD = cfl.LSF_GROUPS_CMD
 LSF_GEN_GROUP = cfl.LSF_GEN_GROUP
@@ -44,6 +48,7 @@ GCA_REG_LBL = "Regions"  # GCA ASSEMPLY REGIONS FILE XML LABEL
 
 # Genome Search variables
 SPLIT_SIZE = 5427083
+CHUNK_OVERLAP = 10000  # overlap of genome windows, longer than the longest Rfam hit
 SRCH_MEM = 36000
 SCAN_MEM = 36000
 RFAMSEQ_SIZE = 451031.997884  # size of rfamseq13 in Mb
@@ -104,6 +109,15 @@ ENA_FTP_WGS_SUP = cfl.ENA_FTP_WGS_SUP
 # path to ena assembly sequence report files
 ENA_GCA_SEQ_REPORT = cfl.ENA_GCA_SEQ_REPORT
 
+# ---------------------------------HTTP CACHE----------------------------------
+
+# persistent cache of xml responses (see utils/http_client.py). Disabled
+# for local configs that predate these settings
+HTTP_CACHE = getattr(cfl, "HTTP_CACHE", '')
+HTTP_CACHE_TTL = getattr(cfl, "HTTP_CACHE_TTL", 604800)
+HTTP_CACHE_MAX_SIZE = getattr(cfl, "HTTP_CACHE_MAX_SIZE", 2147483648)
+HTTP_CACHE_OFFLINE = getattr(cfl, "HTTP_CACHE_OFFLINE", False)
+
 # -----------------------------------MODELS------------------------------------
 
 GENOME_MODEL = "RfamLive.Genome"  # table names RfamLive.Genome
@@ -60,6 +60,9 @@ RFAM_NCBI_IDS = cfl.RFAM_NCBI_IDS
 VALID_NCBI_IDS = cfl.VALID_NCBI_IDS
 NCBI_RANKS = cfl.NCBI_RANKS
 
+# optional, rfam_svn_file_export checks families out with rfco if not set
+SVN_FAMILY_URL = getattr(cfl, "SVN_FAMILY_URL", '')
+
 # -------------------------------LSF GROUPS------------------------------------
 # rfamprod privileges required
 FA_EXPORT_GROUP = cfl.FA_EXPORT_GROUP
@@ -110,6 +110,18 @@ RFAM_NCBI_IDS = ''
 VALID_NCBI_IDS = ''
 NCBI_RANKS = ''
 
+# ------------------------------HTTP CACHE-------------------------------------
+# SQLite file caching Uniprot/ENA/NCBI xml responses. Empty to disable
+HTTP_CACHE = ''
+HTTP_CACHE_TTL = 604800  # seconds before cached responses are revalidated
+HTTP_CACHE_MAX_SIZE = 2147483648  # bytes
+# serve xml lookups from the cache only, with no network access
+HTTP_CACHE_OFFLINE = False
+
+# ---------------------------------SVN-----------------------------------------
+# url of the SVN directory with all family directories. Empty to use rfco
+SVN_FAMILY_URL = ''
+
 # -------------------------------LSF GROUPS------------------------------------
 # rfamprod privileges required
 FA_EXPORT_GROUP = '/rfam_fa'
@@ -38,6 +38,9 @@ FAMILY = 'F'
 GENOME = 'G'
 MATCH = 'R'
 
+# Manifest of the entries of an export, kept in the output directory
+XML_MANIFEST = "xml4db_manifest.json"
+
 
 # 9606 - human
 # 10090 - mouse
@@ -148,6 +151,47 @@ FULL_REGION_SEEDS = """
     AND gs.version='14.0'
 """
 
+# All significant full and seed regions of all genomes in a single pass,
+# ordered by genome, with the full regions of a genome before its seeds
+# (same rows as FULL_REGION_FIELDS followed by FULL_REGION_SEEDS per upid)
+FULL_REGION_ALL = """
+    SELECT
+    gs.upid, fr.rfamseq_acc, fr.seq_start, fr.seq_end, fr.cm_start, fr.cm_end,
+    fr.evalue_score, fr.bit_score, fr.type as alignment_type, fr.truncated, fr.rfam_acc,
+    f.rfam_id, f.type as rna_type, rs.description as rfamseq_acc_description,
+    rs.ncbi_id as ncbi_id, tx.species as scientific_name, tx.tax_string
+    FROM full_region fr, family f, genseq gs, rfamseq rs, taxonomy tx
+    WHERE fr.rfamseq_acc=gs.rfamseq_acc
+    AND gs.rfamseq_acc=rs.rfamseq_acc
+    AND rs.ncbi_id=tx.ncbi_id
+    AND fr.rfam_acc=f.rfam_acc
+    AND fr.is_significant=1
+    AND fr.type IN ('full', 'seed')
+    AND gs.version = '14.0'
+    ORDER BY gs.upid, fr.type
+"""
+
+# RNAcentral ids of all significant genome regions
+RNACENTRAL_MAPPING_ALL = """
+    SELECT rm.rfamseq_acc, rm.seq_start, rm.seq_end, rm.rnacentral_id
+    FROM genseq gs, full_region fr, rnacentral_matches rm
+    WHERE
+    gs.rfamseq_acc = fr.rfamseq_acc
+    AND fr.rfamseq_acc = rm.rfamseq_acc
+    AND fr.seq_start = rm.seq_start
+    AND fr.seq_end = rm.seq_end
+    AND fr.is_significant = 1
+    AND rm.rnacentral_id IS NOT NULL
+    AND gs.version='14.0'
+"""
+
+# All RNAcentral mappings, for the RNAcentral mapping index of a release
+RNACENTRAL_MATCHES_ALL = """
+    SELECT rfamseq_acc, seq_start, seq_end, rnacentral_id
+    FROM rnacentral_matches
+    WHERE rnacentral_id IS NOT NULL
+"""
+
 # -----------------------------CROSS REFERENCES---------------------------
 
 # FAMILIES
@@ -13,17 +13,18 @@ limitations under the License.
 
 """
 Pipeline to search each genome individually. This pipeline also parallelises the step
-of splitting and indexing the genome files in smaller chunks
+of splitting and indexing the genome files in smaller chunks. Chunk searches
+run on LSF by default, or locally with --SearchConfig-executor local
 """
 
 # ---------------------------------IMPORTS-------------------------------------
 
 import os
+import json
 import luigi
-import subprocess
 
-from config import gen_config as gc
-from utils import genome_search_utils as gsu
+from pipelines import genome_search_utils as gsu
+from utils import project_index as pi
 
 # add parent directory to path
 if __name__ == '__main__' and __package__ is None:
@@ -33,54 +34,40 @@ if __name__ == '__main__' and __package__ is None:
 # ----------------------------------TASKS--------------------------------------
 
 
-class ScanGenome(luigi.Task):
-    """
-    Add comment here
-    """
-    updir = luigi.Parameter()
-    upid = luigi.Parameter()
-    tool = luigi.Parameter()
-    lsf = luigi.Parameter()
-
-    def run(self):
-        """
-        Add comment here
-        """
-        if self.lsf is True:
-            gsu.single_genome_scan_from_download_directory(self.updir,
-                                                       self.upid, tool=self.tool)
-
-# -----------------------------------------------------------------------------
-
-
-class GenomeSearchEngine(luigi.Task):
+class GenomeSearchEngine(luigi.WrapperTask):
     """
     Launches genome search directly from the download directory which should
-    have the following structure project_dir/xxx/UPYYYYYYxxx
+    have the following structure project_dir/xxx/UPYYYYYYxxx. Every genome
+    goes through merge, clean, split, per chunk search, tbl merge and
+    full_region conversion, skipping the stages whose outputs exist. Run
+    with --workers N to keep N tasks of any genomes in flight at once
     """
     project_dir = luigi.Parameter(description="Genome download project directory")
     genome_list = luigi.Parameter(default=None,
-                                  description="A list of upids to search for ncRNAs")
-    tool = luigi.Parameter(default=None,
-                                  description="Infernal search tool (cmsearch/cmscan)")
-    lsf = luigi.BoolParameter(default=False,
-                              description="Run pipeline on lsf, otherwise run locally")
+                                  description="A list of upids to search for ncRNAs. "
+                                              "All genomes in upid_gca_dict.json if omitted")
+    tool = luigi.Parameter(default="cmsearch",
+                           description="Infernal search tool (cmsearch/cmscan)")
 
-    def run(self):
+    def requires(self):
         """
-        Add comment here
+        The full_region file of every genome in the list
         """
-        # load upids
-        upid_fp = open(self.genome_list, 'r')
-        upids = [x.strip() for x in upid_fp]
-        upid_fp.close()
+        # load upids, falling back to all genomes of the project
+        if self.genome_list is None:
+            upid_gca_fp = open(os.path.join(self.project_dir, "upid_gca_dict.json"), 'r')
+            upids = sorted(json.load(upid_gca_fp).keys())
+            upid_gca_fp.close()
+
+        else:
+            upid_fp = open(self.genome_list, 'r')
+            upids = [x.strip() for x in upid_fp if x.strip() != '']
+            upid_fp.close()
 
         for upid in upids:
-            # get updir location
-            subdir = os.path.join(self.project_dir, upid[-3:])
-            updir = os.path.join(subdir, upid)
+            updir = pi.get_genome_dir(self.project_dir, upid)
 
-            yield ScanGenome(updir, upid, self.tool.lower(), self.lsf)
+            yield gsu.ConvertToFullRegion(updir=updir, upid=upid, tool=self.tool.lower())
 
 # -----------------------------------------------------------------------------
 
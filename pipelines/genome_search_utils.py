@@ -21,16 +21,139 @@ from config import rfam_local as conf
 from config import gen_config as gc
 from support import merge_fasta as mf
 
+from utils import genome_chunker as gch
 from utils import genome_search_utils as gsu
+from utils import infernal_utils as iu
+from utils import project_index as pi
+from utils import search_executor as se
 
 # add parent directory to path
 if __name__ == '__main__' and __package__ is None:
     os.sys.path.append(
         os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# -----------------------------------------------------------------------------
+
+SEARCH_CHUNKS_DIR = "search_chunks"
+SEARCH_OUTPUT_DIR = "search_output"
+
+# ----------------------------------TARGETS------------------------------------
+
+
+class ChunkSearchTarget(luigi.Target):
+    """
+    Target of a chunk search, which exists once the search has completed
+    with an empty .err file and a .tbl file
+    """
+
+    def __init__(self, search_output_dir, chunk):
+        """
+        search_output_dir: The search_output directory of a genome
+        chunk: The filename of the sequence chunk
+        """
+        self.search_output_dir = search_output_dir
+        self.chunk = chunk
+
+    def exists(self):
+        """
+        Checks the search status of the chunk from its output files
+        """
+        search_files = {}
+        for extension in (".err", ".tbl"):
+            output_file = os.path.join(self.search_output_dir, self.chunk + extension)
+            if os.path.exists(output_file):
+                search_files[self.chunk + extension] = os.path.getsize(output_file)
+
+        return pi.get_chunk_search_status(self.chunk, search_files) == pi.DONE
+
+# ----------------------------------CONFIG-------------------------------------
+
+
+class SearchConfig(luigi.Config):
+    """
+    Settings of the chunk searches, set in the [SearchConfig] section of
+    luigi.cfg or on the command line (e.g. --SearchConfig-executor local).
+    Every local search holds one unit of the local_search resource, so that
+    local_search in the [resources] section of luigi.cfg caps how many run
+    at once (one unless set)
+    """
+    executor = luigi.Parameter(default="lsf")
+    cpus = luigi.IntParameter(default=gc.CPU_NO)
+    memory = luigi.IntParameter(default=gc.SRCH_MEM)
+    scratch_dir = luigi.Parameter(default=None)
+
+# -----------------------------------------------------------------------------
+
+
+class SplitConfig(luigi.Config):
+    """
+    Genome chunking settings. The sequence mode splits genomes at sequence
+    boundaries with esl-ssplit, while the window mode cuts long sequences
+    into overlapping windows and packs short ones together, which balances
+    the searches of large eukaryotic genomes
+    """
+    mode = luigi.Parameter(default="sequence")
+    window_size = luigi.IntParameter(default=gc.SPLIT_SIZE)
+    overlap = luigi.IntParameter(default=gc.CHUNK_OVERLAP)
+
 # ----------------------------------TASKS--------------------------------------
 
 
+class MergeGenomeFasta(luigi.Task):
+    """
+    Task to merge genome fasta files
+    """
+    updir = luigi.Parameter()
+
+    def run(self):
+        """
+        Merge all fasta files in updir
+        """
+        mf.merge_genome_files(self.updir)
+
+    def output(self):
+        """
+        Check genome fasta file has been generated
+        """
+        upid = os.path.split(self.updir)[1]
+        genome_fasta = os.path.join(self.updir, upid + '.fa')
+
+        return luigi.LocalTarget(genome_fasta)
+
+# -----------------------------------------------------------------------------
+
+
+class RewriteCleanFasta(luigi.Task):
+    """
+    Task to remove lines with illegal characters from the merged genome fasta
+    """
+    updir = luigi.Parameter()
+    upid = luigi.Parameter()
+
+    def requires(self):
+        """
+        The merged genome fasta file
+        """
+        return MergeGenomeFasta(updir=self.updir)
+
+    def run(self):
+        """
+        Rewrite the merged fasta file without illegal lines
+        """
+        gsu.cleanup_illegal_lines_from_fasta(self.input().path, dest_dir=self.updir)
+
+    def output(self):
+        """
+        Check that a clean fasta file has been generated
+        """
+        upid = os.path.split(self.updir)[1]
+        clean_fasta = os.path.join(self.updir, upid + '_cleaned.fa')
+
+        return luigi.LocalTarget(clean_fasta)
+
+# -----------------------------------------------------------------------------
+
+
 class SplitGenomeFasta(luigi.Task):
     """
     Luigi task to split genome files in smaller chunks for efficient searching
@@ -38,95 +161,176 @@ class SplitGenomeFasta(luigi.Task):
     updir = luigi.Parameter()
     upid = luigi.Parameter()
 
+    def requires(self):
+        """
+        The clean genome fasta file
+        """
+        return RewriteCleanFasta(updir=self.updir, upid=self.upid)
+
     def run(self):
         """
         Main function that organises genome search directories based on
-        genome size
+        genome size. Chunks are written to a temporary directory renamed
+        once complete, and listed in the chunk manifest of the genome
         """
-        # get updir location
-        upid_fasta = os.path.join(self.updir, self.upid + '.fa')
-        seq_chunks_dir = os.path.join(self.updir, "search_chunks")
+        clean_fasta = self.input().path
+        seq_chunks_dir = os.path.join(self.updir, SEARCH_CHUNKS_DIR)
+        # windows and their offsets, kept for reruns on the same chunks
+        windows_file = os.path.join(self.updir, self.upid + '.windows')
 
+        # directories split by earlier runs are kept as they are
         if not os.path.exists(seq_chunks_dir):
-            os.mkdir(seq_chunks_dir)
-            os.chmod(seq_chunks_dir, 0777)
+            tmp_chunks_dir = seq_chunks_dir + ".tmp"
+            if os.path.exists(tmp_chunks_dir):
+                shutil.rmtree(tmp_chunks_dir)
+            os.mkdir(tmp_chunks_dir)
+
+            config = SplitConfig()
+            manifest = None
+
+            if config.mode == "window":
+                manifest = gch.split_genome_windows(clean_fasta, tmp_chunks_dir, self.upid,
+                                                    config.window_size, overlap=config.overlap)
 
             # check if we need to split the seq_file
-            if gsu.count_nucleotides_in_fasta(upid_fasta) >= gc.SPLIT_SIZE:
+            elif pi.count_residues(clean_fasta) >= gc.SPLIT_SIZE:
                 # split sequence file into smalled chunks
-                gsu.split_seq_file(upid_fasta, gc.SPLIT_SIZE, dest_dir=seq_chunks_dir)
-
-                # now index the fasta files
-                seq_files = os.listdir(seq_chunks_dir)
-                for seq_file in seq_files:
-                    seq_file_loc = os.path.join(seq_chunks_dir, seq_file)
-                    cmd = "%s --index %s" % (conf.ESL_SFETCH, seq_file_loc)
-                    subprocess.call(cmd, shell=True)
+                gsu.split_seq_file(clean_fasta, gc.SPLIT_SIZE, dest_dir=tmp_chunks_dir)
 
             # for input consistency if the sequence file is small, copy it in the
             # search_chunks directory
             else:
-                # copy file
-                shutil.copyfile(upid_fasta, os.path.join(seq_chunks_dir,
-                                                         self.upid + '.fa'))
-                # index file
-                cmd = "%s --index %s" % (conf.ESL_SFETCH, os.path.join(seq_chunks_dir,
-                                                                       self.upid + '.fa'))
+                shutil.copyfile(clean_fasta, os.path.join(tmp_chunks_dir, self.upid + '.fa'))
+
+            # now index the fasta files
+            for seq_file in os.listdir(tmp_chunks_dir):
+                seq_file_loc = os.path.join(tmp_chunks_dir, seq_file)
+                cmd = "%s --index %s" % (conf.ESL_SFETCH, seq_file_loc)
                 subprocess.call(cmd, shell=True)
 
+            os.chmod(tmp_chunks_dir, 0777)
+
+            if manifest is not None:
+                gch.write_chunk_manifest(manifest, windows_file)
+            elif os.path.exists(windows_file):
+                os.remove(windows_file)
+
+            os.rename(tmp_chunks_dir, seq_chunks_dir)
+
+        if os.path.exists(windows_file):
+            windows_fp = open(windows_file, 'r')
+            chunks_fp = self.output().open('w')
+            shutil.copyfileobj(windows_fp, chunks_fp)
+            chunks_fp.close()
+            windows_fp.close()
+            return
+
+        chunks = [x for x in os.listdir(seq_chunks_dir) if not x.endswith('.ssi')]
+
+        chunks_fp = self.output().open('w')
+        for chunk in sorted(chunks):
+            chunks_fp.write(chunk + '\n')
+        chunks_fp.close()
+
+    def output(self):
+        """
+        The chunk manifest of the genome, listing one chunk per line, with
+        the window offsets of windowed chunks (see utils/genome_chunker.py)
+        """
+        return luigi.LocalTarget(os.path.join(self.updir, self.upid + '.chunks'))
+
 # -----------------------------------------------------------------------------
 
 
-class MergeGenomeFasta(luigi.Task):
+class SearchChunk(luigi.Task):
     """
-    Task to merge genome fasta files
+    Searches a single sequence chunk of a genome with the executor set in
+    SearchConfig. LSF jobs are submitted with bsub -K, so that the task
+    completes with its job
     """
     updir = luigi.Parameter()
+    upid = luigi.Parameter()
+    chunk = luigi.Parameter()
+    tool = luigi.Parameter(default="cmsearch")
+
+    @property
+    def resources(self):
+        """
+        Local searches hold a slot of the machine running them
+        """
+        if SearchConfig().executor == "local":
+            return {"local_search": 1}
+
+        return {}
 
     def run(self):
         """
-        Merge all fasta files in updir
+        Runs the search of the chunk and checks its outcome
         """
-        mf.merge_genome_files(self.updir)
+        config = SearchConfig()
+
+        if self.tool == "cmscan":
+            search_method = conf.CMSCAN
+        else:
+            search_method = conf.CMSEARCH
+
+        job = {"name": self.chunk, "binary": search_method, "cm_file": conf.CMFILE,
+               "seq_file": os.path.join(self.updir, SEARCH_CHUNKS_DIR, self.chunk),
+               "dest_dir": os.path.join(self.updir, SEARCH_OUTPUT_DIR),
+               "dbsize": gc.RFAMSEQ_SIZE, "cpus": config.cpus, "memory": config.memory}
+
+        if config.executor == "local":
+            executor = se.LocalExecutor(cpus=config.cpus, memory=config.memory,
+                                        scratch_dir=config.scratch_dir)
+        else:
+            executor = se.LSFExecutor(group=gc.SRCH_GROUP, wait=True)
+
+        executor.run([job])
+
+        if not self.output().exists():
+            raise RuntimeError("Search of chunk %s of %s failed" % (self.chunk, self.upid))
 
     def output(self):
         """
-        Check genome fasta file has been generated
+        Check the chunk search has completed without errors
         """
-        upid = os.path.split(self.updir)[1]
-        genome_fasta = os.path.join(self.updir, upid + '.fa')
-
-        return luigi.LocalTarget(genome_fasta)
+        return ChunkSearchTarget(os.path.join(self.updir, SEARCH_OUTPUT_DIR), self.chunk)
 
 # -----------------------------------------------------------------------------
 
 
 class MergeGenomeTBLOUT(luigi.Task):
     """
-    Task to merge genome fasta files
+    Task to merge the tbl files of all chunks of a genome
     """
     updir = luigi.Parameter()
     upid = luigi.Parameter()
+    tool = luigi.Parameter(default="cmsearch")
 
-    def run(self):
+    def requires(self):
         """
-        Merge all tbl files in updir
+        The chunk manifest of the genome
         """
+        return SplitGenomeFasta(updir=self.updir, upid=self.upid)
 
-        upid = os.path.basename(self.updir)
-        results_dir = os.path.join(self.updir, "search_output")
-        res_files = [x for x in os.listdir(results_dir) if x.endswith('.tbl')]
-
-        up_tbl = open(os.path.join(self.updir, self.upid +'.tbl'), 'w')
+    def run(self):
+        """
+        Searches all chunks of the genome in parallel and merges their tbl
+        files, sorted by sequence and position, once every search has
+        completed
+        """
+        chunks, offsets = gch.read_chunk_manifest(self.input().path)
 
-        for res_file in res_files:
-            fp_in = open(os.path.join(results_dir, res_file), 'r')
-            for line in fp_in:
-                up_tbl.write(line)
+        # fan out the chunk searches, skipping those already done
+        yield [SearchChunk(updir=self.updir, upid=self.upid, chunk=x, tool=self.tool)
+               for x in chunks]
 
-            fp_in.close()
+        results_dir = os.path.join(self.updir, SEARCH_OUTPUT_DIR)
+        tbl_files = [os.path.join(results_dir, x + '.tbl') for x in chunks]
 
-        up_tbl.close()
+        # hits on windows are lifted to sequence coordinates and reconciled
+        iu.merge_tblout_files(tbl_files, self.output().path, tool=self.tool,
+                              offsets=offsets, resolve_overlaps=len(offsets) > 0)
 
     def output(self):
         """
@@ -139,28 +343,39 @@ class MergeGenomeTBLOUT(luigi.Task):
 # -----------------------------------------------------------------------------
 
 
-class RewriteCleanFasta(luigi.Task):
+class ConvertToFullRegion(luigi.Task):
     """
-    Task to merge genome fasta files
+    Task to convert the merged tbl file of a genome to full_region format
     """
     updir = luigi.Parameter()
     upid = luigi.Parameter()
+    tool = luigi.Parameter(default="cmsearch")
+
+    def requires(self):
+        """
+        The merged genome tbl file
+        """
+        return MergeGenomeTBLOUT(updir=self.updir, upid=self.upid, tool=self.tool)
 
     def run(self):
         """
-        Merge all fasta files in updir
+        Converts the tbl file in a temporary directory and moves the result
+        in place, so that an interrupted run never leaves a partial file
         """
-        up_fasta = os.path.join(self.updir, self.upid)
-        gsu.cleanup_illegal_lines_from_fasta(up_fasta, dest_dir=self.updir)
+        tmp_dir = os.path.join(self.updir, "full_region.tmp")
+        if not os.path.exists(tmp_dir):
+            os.mkdir(tmp_dir)
+
+        iu.tblout_to_full_region(self.input().path, dest_dir=tmp_dir)
+
+        os.rename(os.path.join(tmp_dir, self.upid + '.txt'), self.output().path)
+        shutil.rmtree(tmp_dir)
 
     def output(self):
         """
-        Check that a clean fasta file has been generated
+        Check the full_region file of the genome has been generated
         """
-        upid = os.path.split(self.updir)[1]
-        clean_fasta = os.path.join(self.updir, upid + '_cleaned.fa')
-
-        return luigi.LocalTarget(clean_fasta)
+        return luigi.LocalTarget(os.path.join(self.updir, self.upid + '.txt'))
 
 # -----------------------------------------------------------------------------
 
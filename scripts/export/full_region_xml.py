@@ -0,0 +1,328 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Writes full_region (MATCH) entries in EB-eye's XML4dbDUMP format as plain
+strings. Everything that is constant for a genome (dates, taxonomy fields,
+NCBI and Uniprot cross references), a sequence (chromosome fields, ENA
+cross reference) or a family (rna types, RFAM cross reference) is rendered
+once by FullRegionFormatter, and each region is filled into the ENTRY
+template. The output is laid out as rfam_xml_dumper's ElementTree/minidom
+export
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import datetime
+
+from config import rfam_search as rs
+
+# -----------------------------------------------------------------------------
+
+XML_ESCAPES = (('&', "&amp;"), ('<', "&lt;"), ('"', "&quot;"), ('>', "&gt;"))
+
+DB_HEADER = ("<?xml version=\"1.0\" ?>\n<database>\n"
+             "\t<name>%s</name>\n\t<description>%s</description>\n"
+             "\t<release>%s</release>\n\t<release_date>%s</release_date>\n"
+             "\t<entries>\n")
+
+DB_FOOTER = "\t</entries>\n\t<entry_count>%d</entry_count>\n</database>\n"
+
+FIELD = "\t\t\t\t<field name=\"%s\">%s</field>\n"
+EMPTY_FIELD = "\t\t\t\t<field name=\"%s\"/>\n"
+REF = "\t\t\t\t<ref dbkey=\"%s\" dbname=\"%s\"/>\n"
+
+# numeric and enum columns of a region, rendered without escaping
+REGION_COLUMNS = ("seq_start", "seq_end", "cm_start", "cm_end", "evalue_score",
+                  "bit_score", "alignment_type", "truncated")
+
+# an entry with slots for the per-row values and the pre-rendered fragments
+ENTRY = ("\t\t<entry id=\"%s_%s_%s\">\n"
+         "\t\t\t<name>%s/%s:%s</name>\n"
+         "\t\t\t<description>%s %s</description>\n"
+         "%s"
+         "\t\t\t<additional_fields>\n" +
+         FIELD % ("entry_type", "Sequence") +
+         "%s%s" +
+         ''.join([FIELD % (x, "%s") for x in REGION_COLUMNS]) +
+         "%s%s%s%s%s"
+         "\t\t\t</additional_fields>\n"
+         "\t\t\t<cross_references>\n"
+         "%s%s%s%s%s"
+         "\t\t\t</cross_references>\n"
+         "\t\t</entry>\n")
+
+# -----------------------------------------------------------------------------
+
+
+def escape(value):
+    """
+    Converts a value to a UTF-8 string escaped for XML text and attributes
+
+    value: A string, unicode or any value str() accepts
+
+    return: An escaped string
+    """
+
+    if isinstance(value, unicode):
+        value = value.encode("utf-8")
+    else:
+        value = str(value)
+
+    for char, entity in XML_ESCAPES:
+        if char in value:
+            value = value.replace(char, entity)
+
+    return value
+
+# -----------------------------------------------------------------------------
+
+
+def render_field(name, value):
+    """
+    Renders an additional_fields field line
+
+    name: The field name
+    value: The field value. Empty values render an empty element
+
+    return: A string
+    """
+
+    value = escape(value)
+    if value == '':
+        return EMPTY_FIELD % name
+
+    return FIELD % (name, value)
+
+# -----------------------------------------------------------------------------
+
+
+class FullRegionFormatter(object):
+    """
+    Formats the full_region entries of a genome as XML4dbDUMP entry strings
+    """
+
+    def __init__(self, genome, chromosomes, rnacentral_ids, timestamp=None):
+        """
+        genome: The Genome object of the regions, or None for sequences not
+        in a proteome, in which case taxonomy fields are read from the rows
+        chromosomes: A dictionary of rfamseq_acc to (chromosome_name,
+        chromosome_type) tuples as returned by get_chromosome_metadata
+        rnacentral_ids: A dictionary of region names (acc/start:end) to
+        RNAcentral ids, or an RNAcentralIndex
+        timestamp: The created and updated date. Defaults to today
+        """
+
+        if timestamp is None:
+            timestamp = datetime.datetime.now().strftime("%d %b %Y")
+
+        self.chromosomes = chromosomes
+        self.rnacentral_ids = rnacentral_ids
+
+        self.dates = ("\t\t\t<dates>\n"
+                      "\t\t\t\t<date type=\"created\" value=\"%s\"/>\n"
+                      "\t\t\t\t<date type=\"updated\" value=\"%s\"/>\n"
+                      "\t\t\t</dates>\n") % (escape(timestamp), escape(timestamp))
+
+        self.genome_fragments = None
+        if genome is not None:
+            self.genome_fragments = self.render_genome_fragments(
+                genome.ncbi.tax_string, genome.ncbi_id, genome.common_name,
+                genome.scientific_name, genome.upid)
+
+        # fragments of sequences without a genome, by species
+        self.species_fragments = {}
+        self.sequence_fragments = {}
+        self.family_fragments = {}
+
+    def render_genome_fragments(self, tax_string, ncbi_id, common_name,
+                                scientific_name, upid=None):
+        """
+        Renders the fields and cross references shared by all regions of a
+        species
+
+        return: A dictionary with the rendered tax_string, popular_species,
+        names (common and scientific name), taxonomy and uniprot cross
+        reference fragments, the escaped scientific name and the NCBI
+        taxonomy id
+        """
+
+        ncbi_id = str(ncbi_id)
+
+        popular_species = ''
+        if ncbi_id in rs.POPULAR_SPECIES:
+            popular_species = render_field("popular_species", ncbi_id)
+
+        names = ''
+        if common_name:
+            names += render_field("common_name", common_name)
+        names += render_field("scientific_name", scientific_name)
+
+        uniprot = ''
+        if upid is not None:
+            uniprot = REF % (escape(upid), "Uniprot")
+
+        return {"tax_string": render_field("tax_string", tax_string),
+                "popular_species": popular_species, "names": names,
+                "taxonomy": REF % (escape(ncbi_id), "ncbi_taxonomy_id"),
+                "uniprot": uniprot, "scientific_name": escape(scientific_name),
+                "ncbi_id": ncbi_id}
+
+    def get_fragments(self, region):
+        """
+        Returns the genome or species fragments of a region
+        """
+
+        if self.genome_fragments is not None:
+            return self.genome_fragments
+
+        key = (region["ncbi_id"], region["scientific_name"], region["tax_string"])
+        if key not in self.species_fragments:
+            self.species_fragments[key] = self.render_genome_fragments(
+                region["tax_string"], region["ncbi_id"], None, region["scientific_name"])
+
+        return self.species_fragments[key]
+
+    def get_sequence_fragments(self, rfamseq_acc):
+        """
+        Renders the accession, chromosome fields and ENA cross reference of a
+        sequence, once per sequence
+
+        return: A tuple (escaped accession, rfamseq_acc field, chromosome
+        fields, ENA cross reference)
+        """
+
+        if rfamseq_acc not in self.sequence_fragments:
+            acc = escape(rfamseq_acc)
+
+            chromosome_fields = ''
+            if rfamseq_acc in self.chromosomes:
+                chromosome_name, chromosome_type = self.chromosomes[rfamseq_acc]
+                chromosome_fields = render_field("chromosome_name", chromosome_name) + \
+                    render_field("chromosome_type", chromosome_type)
+
+            ena_ref = ''
+            if rfamseq_acc.find('.') != -1:
+                ena_ref = REF % (escape(rfamseq_acc.partition('.')[0]), "ENA")
+            elif rfamseq_acc[0:3] != "URS":
+                ena_ref = REF % (acc, "ENA")
+
+            self.sequence_fragments[rfamseq_acc] = (acc, render_field("rfamseq_acc", rfamseq_acc),
+                                                    chromosome_fields, ena_ref)
+
+        return self.sequence_fragments[rfamseq_acc]
+
+    def get_family_fragments(self, region):
+        """
+        Renders the id, rna_type fields and RFAM cross reference of the
+        family of a region, once per family
+
+        return: A tuple (escaped rfam_id, rna_type fields, RFAM cross
+        reference)
+        """
+
+        rfam_acc = region["rfam_acc"]
+
+        if rfam_acc not in self.family_fragments:
+            rna_type = region["rna_type"]
+            rna_types = [x.strip() for x in rna_type.strip().split(rs.RNA_TYPE_DEL) if x != '']
+
+            self.family_fragments[rfam_acc] = (escape(region["rfam_id"]),
+                                               ''.join([render_field("rna_type", x)
+                                                        for x in rna_types]),
+                                               REF % (escape(rfam_acc), "RFAM"))
+
+        return self.family_fragments[rfam_acc]
+
+    def format(self, region):
+        """
+        Formats a full_region row
+
+        region: A dictionary with the fields of rs.FULL_REGION_FIELDS
+
+        return: The entry as a string
+        """
+
+        fragments = self.get_fragments(region)
+
+        rfamseq_acc = str(region["rfamseq_acc"])
+        acc, acc_field, chromosome_fields, ena_ref = self.get_sequence_fragments(rfamseq_acc)
+        rfam_id, rna_type_fields, rfam_ref = self.get_family_fragments(region)
+
+        seq_start = str(region["seq_start"])
+        seq_end = str(region["seq_end"])
+
+        rnacentral_id = self.rnacentral_ids.get(rfamseq_acc + '/' + seq_start + ':' + seq_end)
+        if rnacentral_id is not None:
+            rnacentral_ref = REF % (escape(rnacentral_id) + '_' + fragments["ncbi_id"],
+                                    "RNACENTRAL")
+        else:
+            rnacentral_ref = REF % (acc, "RNACENTRAL")
+
+        return ENTRY % (acc, seq_start, seq_end,
+                        acc, seq_start, seq_end,
+                        fragments["scientific_name"], rfam_id,
+                        self.dates,
+                        acc_field,
+                        render_field("rfamseq_acc_description", region["rfamseq_acc_description"]),
+                        seq_start, seq_end, region["cm_start"], region["cm_end"],
+                        region["evalue_score"], region["bit_score"], region["alignment_type"],
+                        region["truncated"],
+                        fragments["tax_string"], chromosome_fields, fragments["popular_species"],
+                        rna_type_fields, fragments["names"],
+                        fragments["taxonomy"], rfam_ref, ena_ref, fragments["uniprot"],
+                        rnacentral_ref)
+
+# -----------------------------------------------------------------------------
+
+
+def write_full_region_file(filename, regions, formatter):
+    """
+    Streams full_region entries to an XML4dbDUMP file, without holding the
+    entries in memory. The file is written to filename.tmp and renamed once
+    complete, and removed if there are no entries
+
+    filename: The path to the XML file
+    regions: An iterable of full_region rows
+    formatter: A FullRegionFormatter for the genome of the regions
+
+    return: The number of entries written
+    """
+
+    tmp_filename = filename + ".tmp"
+    fp_out = open(tmp_filename, 'w')
+
+    fp_out.write(DB_HEADER % (escape(rs.DB_NAME), escape(rs.DB_DESC), escape(rs.DB_RELEASE),
+                              datetime.date.today().strftime("%d/%m/%Y")))
+
+    entry_count = 0
+    for region in regions:
+        fp_out.write(formatter.format(region))
+        entry_count += 1
+
+    fp_out.write(DB_FOOTER % entry_count)
+    fp_out.close()
+
+    if entry_count == 0:
+        os.remove(tmp_filename)
+    else:
+        os.rename(tmp_filename, filename)
+
+    return entry_count
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
@@ -0,0 +1,220 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Profiles the per-row cost of the full_region XML export on synthetic rows,
+comparing the ElementTree/minidom formatter (rfam_xml_dumper's
+format_full_region) with the string builder of full_region_xml, and checks
+that both produce the same entries
+
+Usage: python scripts/export/full_region_xml_benchmark.py --rows 100000
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import shutil
+import timeit
+import argparse
+import tempfile
+import cProfile
+import pstats
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+
+from scripts.export import rfam_xml_dumper as rxd
+from scripts.export import full_region_xml as frx
+
+# -----------------------------------------------------------------------------
+
+
+class BenchmarkTaxonomy(object):
+    """
+    Stands in for the RfamLive taxonomy object of a genome
+    """
+
+    def __init__(self, tax_string):
+        self.tax_string = tax_string
+
+
+class BenchmarkGenome(object):
+    """
+    Stands in for the RfamLive Genome object of the regions
+    """
+
+    def __init__(self):
+        self.upid = "UP000005640"
+        self.ncbi_id = "9606"
+        self.common_name = "Human"
+        self.scientific_name = "Homo sapiens (Human)"
+        self.ncbi = BenchmarkTaxonomy("Eukaryota; Metazoa; Chordata; Craniata; Vertebrata; "
+                                      "Euteleostomi; Mammalia; Eutheria; Euarchontoglires; "
+                                      "Primates; Haplorrhini; Catarrhini; Hominidae; Homo.")
+
+# -----------------------------------------------------------------------------
+
+
+def make_regions(row_count, sequence_count=25):
+    """
+    Generates full_region rows as returned by rs.FULL_REGION_FIELDS
+
+    row_count: Number of rows
+    sequence_count: Number of distinct sequences the rows are spread over
+
+    return: A tuple (list of rows, chromosomes dictionary, RNAcentral ids)
+    """
+
+    regions = []
+    chromosomes = {}
+    rnacentral_ids = {}
+
+    for idx in range(row_count):
+        rfamseq_acc = "CM%06d.2" % (idx % sequence_count)
+        seq_start = 1000 + idx * 150
+        seq_end = seq_start + 71
+
+        regions.append({"rfamseq_acc": rfamseq_acc, "seq_start": seq_start, "seq_end": seq_end,
+                        "cm_start": 1, "cm_end": 71, "evalue_score": "2.3e-14",
+                        "bit_score": 61.2, "alignment_type": "full", "truncated": "0",
+                        "rfam_acc": "RF%05d" % (idx % 3000), "rfam_id": "tRNA",
+                        "rna_type": "Gene; tRNA;",
+                        "rfamseq_acc_description": "Homo sapiens chromosome %d, GRCh38 "
+                                                   "reference primary assembly" % (idx % sequence_count),
+                        "ncbi_id": 9606, "scientific_name": "Homo sapiens",
+                        "tax_string": "Eukaryota; Metazoa; Chordata."})
+
+        chromosomes[rfamseq_acc] = (str(idx % sequence_count), "chromosome")
+
+        # half of the regions are in RNAcentral
+        if idx % 2 == 0:
+            rnacentral_ids["%s/%s:%s" % (rfamseq_acc, seq_start, seq_end)] = "URS%010X" % idx
+
+    return regions, chromosomes, rnacentral_ids
+
+# -----------------------------------------------------------------------------
+
+
+def export_elementtree(regions, genome, chromosomes, rnacentral_ids, filename):
+    """
+    Exports regions with format_full_region and the ElementTree/minidom
+    serialisation of xml4db_dumper
+    """
+
+    db_xml, entries = rxd.create_xml4db_tree()
+
+    for region in regions:
+        rxd.format_full_region(entries, region, genome, chromosomes, rnacentral_ids)
+
+    ET.SubElement(db_xml, "entry_count").text = str(len(regions))
+
+    fp_out = open(filename, 'w')
+    fp_out.write(minidom.parseString(ET.tostring(db_xml, "utf-8")).toprettyxml(indent='\t'))
+    fp_out.close()
+
+# -----------------------------------------------------------------------------
+
+
+def export_string_builder(regions, genome, chromosomes, rnacentral_ids, filename):
+    """
+    Exports regions with full_region_xml's FullRegionFormatter
+    """
+
+    formatter = frx.FullRegionFormatter(genome, chromosomes, rnacentral_ids)
+    frx.write_full_region_file(filename, regions, formatter)
+
+# -----------------------------------------------------------------------------
+
+
+def read_entries(filename):
+    """
+    Reads the entries of an XML4dbDUMP file in a comparable form
+
+    return: A dictionary of entry ids to sorted lists of (tag, attributes,
+    text) tuples of the entry's nodes
+    """
+
+    entries = {}
+    for entry in ET.parse(filename).getroot().find("entries"):
+        entries[entry.get("id")] = sorted([(x.tag, sorted(x.items()), (x.text or '').strip())
+                                           for x in entry.iter()])
+
+    return entries
+
+# -----------------------------------------------------------------------------
+
+
+def run_benchmark(row_count, repeat=3, profile=False):
+    """
+    Times both exporters on the same rows and prints the per-row cost
+
+    row_count: Number of synthetic rows
+    repeat: Number of timed runs of each exporter, the best one is reported
+    profile: If True, print the top functions of a profiled run of each
+    exporter
+    """
+
+    regions, chromosomes, rnacentral_ids = make_regions(row_count)
+    genome = BenchmarkGenome()
+    dest_dir = tempfile.mkdtemp()
+
+    exporters = (("ElementTree", export_elementtree), ("string builder", export_string_builder))
+    times = {}
+
+    for name, exporter in exporters:
+        filename = os.path.join(dest_dir, name.replace(' ', '_') + ".xml")
+        args = (regions, genome, chromosomes, rnacentral_ids, filename)
+
+        times[name] = min(timeit.repeat(lambda: exporter(*args), number=1, repeat=repeat))
+        print "%-15s %8.2f us/row  (%.2fs for %d rows)" % (name, times[name] * 1000000.0 / row_count,
+                                                           times[name], row_count)
+
+        if profile is True:
+            profiler = cProfile.Profile()
+            profiler.runcall(exporter, *args)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(10)
+
+    print "speed-up: %.1fx" % (times["ElementTree"] / times["string builder"])
+
+    if read_entries(os.path.join(dest_dir, "ElementTree.xml")) == \
+            read_entries(os.path.join(dest_dir, "string_builder.xml")):
+        print "entries match"
+    else:
+        print "WARNING: entries differ"
+
+    shutil.rmtree(dest_dir)
+
+# -----------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the full_region XML export")
+
+    parser.add_argument("--rows", help="number of synthetic rows", type=int, default=50000)
+    parser.add_argument("--repeat", help="timed runs per exporter", type=int, default=3)
+    parser.add_argument("--profile", help="print the profile of each exporter",
+                        action="store_true")
+
+    return parser
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = usage()
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, repeat=args.repeat, profile=args.profile)
@@ -16,7 +16,9 @@ limitations under the License.
 import os
 import sys
 import json
+from config import gen_config as gc
 from scripts.export.genomes import fetch_gen_metadata as fgm
+from utils import http_client
 
 # -------------------------------------------------------------------------
 
@@ -192,6 +194,11 @@ def get_gca_genome_entry(upid, assembly_acc, domain):
 
 if __name__ == '__main__':
 
+    # serve repeated xml lookups from the persistent response cache
+    http_client.configure_cache(gc.HTTP_CACHE, ttl=gc.HTTP_CACHE_TTL,
+                                max_size=gc.HTTP_CACHE_MAX_SIZE,
+                                offline=gc.HTTP_CACHE_OFFLINE)
+
     # a upid_gca file generated from Uniprot
     upid_gca_file = sys.argv[1]
 
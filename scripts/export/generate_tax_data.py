@@ -17,7 +17,9 @@ import os
 import sys
 import httplib
 import xml.etree.ElementTree as ET
-import requests
+
+from config import gen_config as gc
+from utils import http_client
 
 # -----------------------------------------------------------------------------
 
@@ -57,9 +59,11 @@ def get_taxonomy_entries_from_ncbi(tax_ids):
     else:
         sys.exit("Wrong input. Please provide a list of tax ids or a file.")
 
-    for tax_id in tax_id_list:
+    # fetch all taxonomy xml files concurrently, within NCBI's rate limits
+    responses = http_client.map_concurrent(http_client.cached_get,
+                                           [ncbi_tax_url % str(x) for x in tax_id_list])
 
-        response = requests.get(ncbi_tax_url % str(tax_id))
+    for tax_id, response in zip(tax_id_list, responses):
 
         if response.status_code == httplib.OK:
 
@@ -130,6 +134,11 @@ def get_taxonomy_entries_from_ncbi(tax_ids):
 
 if __name__ == '__main__':
 
+    # serve repeated xml lookups from the persistent response cache
+    http_client.configure_cache(gc.HTTP_CACHE, ttl=gc.HTTP_CACHE_TTL,
+                                max_size=gc.HTTP_CACHE_MAX_SIZE,
+                                offline=gc.HTTP_CACHE_OFFLINE)
+
     taxon_ids = sys.argv[1]
     get_taxonomy_entries_from_ncbi(taxon_ids)
 
@@ -1,8 +1,11 @@
 import os
-import sys
+import errno
+import argparse
 
 from config import gen_config as gc
 from scripts.export.genomes import genome_fetch as gflib
+from utils import download_queue as dq
+from utils import http_client
 
 # ------------------------------------------------------------------------
 
@@ -11,9 +14,14 @@ def setup_genome_directory(upid_dir):
     Setup proteome directory.
     """
 
-    # finally, create the directory if it does not exist
+    # finally, create the directory if it does not exist. Genomes sharing a
+    # parent directory may be set up concurrently
     if not os.path.exists(upid_dir):
-        os.mkdir(upid_dir)
+        try:
+            os.makedirs(upid_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
         os.chmod(upid_dir, 0777)
 
     # create a sequence directory where all fasta files will be downloaded
@@ -26,15 +34,46 @@ def setup_genome_directory(upid_dir):
 # ------------------------------------------------------------------------
 
 
-def download_genome(project_dir, upid):
+def get_accession_subdirectory(accession, subdir_ranges):
     """
+    Finds the sequence subdirectory an accession is stored in when a genome
+    is split across multiple directories
 
-    project_dir:
-    upid:
+    accession: A sequence accession
+    subdir_ranges: The list of ranges returned by
+    get_genome_subdirectory_ranges
 
-    return:
+    return: The subdirectory index
+    """
+
+    max_combinations = 999
+
+    acc_index = accession[-3:]
+    i = 0
+
+    # find directory index
+    while i < len(subdir_ranges) and subdir_ranges[i] < acc_index:
+        i += 1
+
+    if i < len(subdir_ranges):
+        return subdir_ranges[i]
+
+    return max_combinations
+
+# ------------------------------------------------------------------------
+
+
+def queue_genome_downloads(project_dir, upid, store):
+    """
+    Sets up the genome directory, copies any WGS set from the FTP and queues
+    the fasta files of all other accessions in the download state store
+
+    project_dir: The path to the project directory
+    upid: A valid Uniprot proteome accession
+    store: A download_queue.DownloadStateStore object
+
+    return: The path to the genome directory
     """
-    missing_accessions = []
 
     sub_dir_index = upid[8:]
 
@@ -46,13 +85,15 @@ def download_genome(project_dir, upid):
     setup_genome_directory(upid_dir)
     sequence_dir = os.path.join(upid_dir, 'sequences')
 
-    max_combinations = 999
+    # failures of an earlier run are recorded again if they persist
+    store.clear_genome_errors(upid)
 
     # Fetch proteome accessions, this will also copy GCA file if available
     genome_accessions = gflib.get_genome_unique_accessions(upid, to_file=True,
                                                            output_dir=upid_dir)
     # fetch all other accessions other than WGS and GCA
     wgs_set = None
+    wgs_set_to_copy = None
     other_accessions = genome_accessions["OTHER"]
 
     # 1. check for assembly report file
@@ -65,25 +106,28 @@ def download_genome(project_dir, upid):
             if genome_accessions["GCA_NA"] == 1:
                 wgs_set = genome_accessions["WGS"]
 
-            gflib.copy_wgs_set_from_ftp(wgs_set, sequence_dir)
+            wgs_set_to_copy = wgs_set
 
     elif genome_accessions["WGS"] != -1 and genome_accessions["GCA"] == -1:
         # First copy WGS set in upid dir
-        gflib.copy_wgs_set_from_ftp(genome_accessions["WGS"], sequence_dir)
+        wgs_set_to_copy = genome_accessions["WGS"]
+
+    # record a missing WGS set and carry on with the other accessions
+    if wgs_set_to_copy is not None:
+        try:
+            gflib.copy_wgs_set_from_ftp(wgs_set_to_copy, sequence_dir)
+        except IOError as e:
+            store.mark_genome_failed(upid, wgs_set_to_copy, str(e))
 
     # this should be done in all cases
-    # download genome accessions in proteome directory
+    # queue genome accessions for download in proteome directory
+    entries = []
+
     if len(other_accessions) > 0:
-        if len(other_accessions) < gc.MAX_ALLOWED_FILES:
-            for acc in other_accessions:
-                status = gflib.fetch_ena_file(acc, "fasta", sequence_dir, compressed=False)
-                # add accession to list if file not downloaded
-                if status is False:
-                    missing_accessions.append(acc)
+        subdir_ranges = None
 
         # split fasta files in multiple directories
-        else:
-            # get ranges for
+        if len(other_accessions) >= gc.MAX_ALLOWED_FILES:
             subdir_ranges = gflib.get_genome_subdirectory_ranges(other_accessions)
 
             # generate subdirs
@@ -91,41 +135,120 @@ def download_genome(project_dir, upid):
                 if not os.path.exists(os.path.join(sequence_dir, str(subdir_index))):
                     os.mkdir(os.path.join(sequence_dir, str(subdir_index)))
 
-            for accession in other_accessions:
-                idx = 0
-                acc_index = accession[-3:]
-                i = 0
+        for accession in other_accessions:
+            dest_dir = sequence_dir
+            if subdir_ranges is not None:
+                dest_dir = os.path.join(sequence_dir,
+                                        str(get_accession_subdirectory(accession,
+                                                                       subdir_ranges)))
 
-                # find directory index
-                while i < len(subdir_ranges) and subdir_ranges[i] < acc_index:
-                    i += 1
+            seq_url, file_path = gflib.get_ena_file_location(accession, "fasta", dest_dir,
+                                                             compressed=False)
+            entries.append((upid, accession, seq_url, file_path))
 
-                if i < len(subdir_ranges):
-                    idx = subdir_ranges[i]
-                else:
-                    idx = max_combinations
+    store.add_many(entries)
 
-                subdir = os.path.join(sequence_dir, str(idx))
+    return upid_dir
+
+# ------------------------------------------------------------------------
 
-                status = gflib.fetch_ena_file(accession, "fasta", subdir, compressed=False)
 
-                if status is False:
-                    missing_accessions.append(accession)
+def report_missing_accessions(upid_dir, upid, store):
+    """
+    Lists the accessions that could not be downloaded in the file
+    unavailable_accessions.txt of the genome directory
+
+    upid_dir: The path to the genome directory
+    upid: A valid Uniprot proteome accession
+    store: A download_queue.DownloadStateStore object
+
+    return: The list of missing accessions
+    """
+
+    missing_accessions = [x[1] for x in store.genome_errors(upid=upid)]
+    missing_accessions.extend(store.failed_accessions(upid=upid))
+    missing_file = os.path.join(upid_dir, "unavailable_accessions.txt")
 
     # report any missing accessions
     if len(missing_accessions) > 0:
-        fp = open(os.path.join(upid_dir, "unavailable_accessions.txt"), 'w')
+        fp = open(missing_file, 'w')
 
         for accession in missing_accessions:
             fp.write(accession+'\n')
 
         fp.close()
 
+    # remove the report of a previous run that has since been completed
+    elif os.path.exists(missing_file):
+        os.remove(missing_file)
+
+    return missing_accessions
+
+# ------------------------------------------------------------------------
+
+
+def download_genome(project_dir, upid, state_file=None, workers=gc.DWL_WORKERS):
+    """
+    Downloads all sequence files of a genome. Files are fetched
+    concurrently and their state is kept in state_file, so a rerun after a
+    crash only downloads the files that are still missing
+
+    project_dir: The path to the project directory
+    upid: A valid Uniprot proteome accession
+    state_file: The path to the download state file. Defaults to
+    download_state.db in the genome directory
+    workers: Number of concurrent downloads
+
+    return: The list of accessions that could not be downloaded
+    """
+
+    upid_dir = os.path.join(os.path.join(project_dir, upid[8:]), upid)
+
+    if state_file is None:
+        setup_genome_directory(upid_dir)
+        state_file = os.path.join(upid_dir, "download_state.db")
+
+    store = dq.DownloadStateStore(state_file)
+
+    queue_genome_downloads(project_dir, upid, store)
+    dq.run_downloads(store, upid=upid, workers=workers)
+
+    missing_accessions = report_missing_accessions(upid_dir, upid, store)
+
+    store.close()
+
+    return missing_accessions
+
+# ------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Download a genome's sequence files")
+
+    parser.add_argument("project_dir", help="path to the project directory", type=str)
+    parser.add_argument("upid", help="a valid Uniprot proteome accession", type=str)
+    parser.add_argument("--state", help="download state file to resume from",
+                        type=str, default=None)
+    parser.add_argument("--workers", help="number of concurrent downloads",
+                        type=int, default=gc.DWL_WORKERS)
+
+    return parser
+
 # ------------------------------------------------------------------------
 
 if __name__ == "__main__":
 
-    project_dir = sys.argv[1]
-    upid = sys.argv[2]
+    parser = usage()
+    args = parser.parse_args()
+
+    # serve repeated xml lookups from the persistent response cache
+    http_client.configure_cache(gc.HTTP_CACHE, ttl=gc.HTTP_CACHE_TTL,
+                                max_size=gc.HTTP_CACHE_MAX_SIZE,
+                                offline=gc.HTTP_CACHE_OFFLINE)
 
-    download_genome(project_dir, upid)
\ No newline at end of file
+    download_genome(args.project_dir, args.upid, state_file=args.state,
+                    workers=args.workers)
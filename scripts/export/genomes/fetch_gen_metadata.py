@@ -22,10 +22,10 @@ import httplib
 import copy
 import xml.etree.ElementTree as ET
 
-import requests
 # Config Files
 import genome_fetch as gf
 from config import gen_config as gc
+from utils import http_client
 
 
 # -----------------------------------------------------------------------------
@@ -45,7 +45,7 @@ def fetch_gca_data(upid, assembly_acc, kingdom):
     tmp_acc = assembly_acc
 
     # check status
-    response = requests.get(gc.ENA_XML_URL % tmp_acc)
+    response = http_client.cached_get(gc.ENA_XML_URL % tmp_acc)
 
     # need to do this repeatedly
     if response.status_code == httplib.OK:
@@ -183,13 +183,19 @@ def fetch_assembly_accessions(upid, gca_acc, acc_ftp_link, reg_ftp_link=None):
         regions = region_loader(reg_ftp_link)
 
     http_link = acc_ftp_link.replace("ftp://", "http://")
-    response = requests.get(http_link).content
+    response = http_client.get(http_link).content
 
     acc_lines = response.strip().split('\n')
 
     # remove header line
     acc_lines.pop(0)
 
+    # fetch all accession metadata concurrently
+    meta_accs = [x[0] for x in [y.strip().split('\t') for y in acc_lines]
+                 if len(x) == 7 and x[0].find('.') != -1]
+    acc_metadata = dict(zip(meta_accs, http_client.map_concurrent(fetch_gca_acc_metadata,
+                                                                  meta_accs)))
+
     acc_attributes = ''
     for acc_line in acc_lines:
         acc_attributes = acc_line.strip().split('\t')
@@ -199,7 +205,7 @@ def fetch_assembly_accessions(upid, gca_acc, acc_ftp_link, reg_ftp_link=None):
             entry["pk"] = str(acc_attributes[0])  # seq_acc
 
             if len(acc_attributes) == 7:
-                acc_meta = fetch_gca_acc_metadata(acc_attributes[0])
+                acc_meta = acc_metadata[acc_attributes[0]]
 
                 # skip if accession was unavailable (e.g. obsolete)
                 if len(acc_meta.keys()) == 0:
@@ -271,7 +277,7 @@ def region_loader(reg_ftp_link):
     region_dict = {}
 
     http_link = reg_ftp_link.replace("ftp://", "http://")
-    response = requests.get(http_link).content
+    response = http_client.get(http_link).content
 
     regions = response.strip().split('\n')
 
@@ -302,7 +308,7 @@ def fetch_wgs_metadata(upid, assembly_acc, domain):
     wgs_entry = {}
     fields = {}
 
-    response = requests.get(gc.ENA_XML_URL % assembly_acc)
+    response = http_client.cached_get(gc.ENA_XML_URL % assembly_acc)
 
     if response.status_code == httplib.OK:
         assembly_xml = ET.fromstring(response.content)  # root
@@ -387,8 +393,10 @@ def fetch_wgs_accs_metadata(upid, assembly_acc, wgs_range):
 
     wgs_accs = gf.fetch_wgs_range_accs(wgs_range)
 
-    for acc in wgs_accs:
-        fields = fetch_wgs_acc_metadata(acc)
+    # fetch all accession metadata concurrently
+    wgs_accs_fields = http_client.map_concurrent(fetch_wgs_acc_metadata, wgs_accs)
+
+    for acc, fields in zip(wgs_accs, wgs_accs_fields):
         # skip if fields dict is empty. This could be due to obsolete accessions
         if fields.keys() == 0:
             continue
@@ -415,7 +423,7 @@ def fetch_wgs_acc_metadata(wgs_acc):
     """
 
     fields = {}
-    response = requests.get(gf.ENA_XML_URL % wgs_acc)
+    response = http_client.cached_get(gf.ENA_XML_URL % wgs_acc)
 
     if response.status_code == httplib.OK:
         acc_xml = ET.fromstring(response.content)
@@ -522,7 +530,7 @@ def fetch_gca_acc_metadata(accession):
 
     metadata = {}
 
-    response = requests.get(gc.ENA_XML_URL % accession)
+    response = http_client.cached_get(gc.ENA_XML_URL % accession)
 
     if response.status_code == httplib.OK:
         xml_str = response.content
@@ -561,7 +569,7 @@ def fetch_assembly_links(gca_acc):
 
     gca_ftp_links = {}
 
-    response = requests.get(gc.ENA_XML_URL % gca_acc)
+    response = http_client.cached_get(gc.ENA_XML_URL % gca_acc)
 
     if response.status_code == httplib.OK:
 
@@ -588,6 +596,25 @@ def fetch_assembly_links(gca_acc):
     return gca_ftp_links
 
 
+# -----------------------------------------------------------------------------
+
+def fetch_accession_metadata(accession):
+    """
+    Fetches the metadata of a WGS or any other ENA sequence accession
+
+    accession: A valid ENA sequence accession
+
+    return: A fields dictionary, empty if the accession is unavailable
+    """
+
+    # wgs acc
+    if len(accession) == 12:
+        return fetch_wgs_acc_metadata(accession)
+
+    # some other accession from Uniprot...
+    return fetch_gca_acc_metadata(accession)
+
+
 # -----------------------------------------------------------------------------
 def get_general_accession_metadata(upid, accession_list):
     """
@@ -606,13 +633,10 @@ def get_general_accession_metadata(upid, accession_list):
     entry = {}
     fields = {}
 
-    for acc in accession_list:
-        # wgs acc
-        if len(acc) == 12:
-            fields = fetch_wgs_acc_metadata(acc)
-        # some other accession from Uniprot...
-        else:
-            fields = fetch_gca_acc_metadata(acc)
+    # fetch all accession metadata concurrently
+    accs_fields = http_client.map_concurrent(fetch_accession_metadata, accession_list)
+
+    for acc, fields in zip(accession_list, accs_fields):
         # skip accession if unavailable
         if len(fields.keys()) == 0:
             continue
@@ -646,7 +670,7 @@ def extract_uniprot_genome_metadata(upid):
     # namespace prefix # or register a namespace in the ET
     prefix = "{http://uniprot.org/uniprot}%s"
 
-    response = requests.get(gc.PROTEOME_XML_URL % upid)
+    response = http_client.cached_get(gc.PROTEOME_XML_URL % upid)
 
     # check if we got an OK http reponse
     if response.status_code == httplib.OK:
@@ -828,5 +852,10 @@ def import_chromosome_names():
 
 if __name__ == '__main__':
 
+    # serve repeated xml lookups from the persistent response cache
+    http_client.configure_cache(gc.HTTP_CACHE, ttl=gc.HTTP_CACHE_TTL,
+                                max_size=gc.HTTP_CACHE_MAX_SIZE,
+                                offline=gc.HTTP_CACHE_OFFLINE)
+
     #pass
     import_chromosome_names()
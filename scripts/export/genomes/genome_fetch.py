@@ -19,18 +19,16 @@ limitations under the License.
 import httplib
 import json
 import os
-import sys
 import string
-import urllib
-import urllib2
 import shutil
+import zlib
 import copy
 import xml.etree.ElementTree as ET
 
-import requests
 from rdflib import Graph
 
 from config import gen_config as gc
+from utils import http_client
 
 # ----------------------------------GLOBALS------------------------------------
 
@@ -74,9 +72,9 @@ def fetch_ref_proteomes():
     """
 
     ref_prot_list = []
-    response = urllib2.urlopen(REF_PROT_LIST_URL)
+    response = http_client.get(REF_PROT_LIST_URL)
 
-    for ref_prot in response:
+    for ref_prot in response.content.strip().split('\n'):
         ref_prot_list.append(ref_prot.strip())
 
     return ref_prot_list
@@ -120,10 +118,10 @@ def extract_genome_acc(prot_rdf):
     """
     g = Graph()
 
-    response = requests.get(prot_rdf).status_code
+    response = http_client.get(prot_rdf)
 
-    if response == httplib.OK:
-        g.load(prot_rdf)
+    if response.status_code == httplib.OK:
+        g.parse(data=response.content, format="xml")
 
         for s, p, o in g:
             if string.find(o, "GCA") != -1:
@@ -152,8 +150,10 @@ def proteome_rdf_scanner(proteome):
     wgs_flag = False
     g = Graph()
 
-    if requests.get(prot_rdf).status_code == httplib.OK:
-        g.load(prot_rdf)
+    response = http_client.get(prot_rdf)
+
+    if response.status_code == httplib.OK:
+        g.parse(data=response.content, format="xml")
 
         # scan for accessions
         for s, p, o in g:
@@ -193,8 +193,10 @@ def proteome_xml_scanner(proteome):
 
     accessions = {"GCA": -1, "WGS": -1}
 
-    if requests.get(prot_xml).status_code == httplib.OK:
-        xml_root = ET.fromstring(requests.get(prot_xml).content)
+    response = http_client.cached_get(prot_xml)
+
+    if response.status_code == httplib.OK:
+        xml_root = ET.fromstring(response.content)
         proteome = xml_root.find(prefix % "proteome")
 
         # look for a GCA accession
@@ -248,21 +250,17 @@ def fetch_genome_acc(prot):
     else:
         proteome = string.strip(prot)
         rdf_url = gc.PROTEOME_URL % (proteome)
-        res_handle = urllib.urlopen(rdf_url)
-        if res_handle.getcode() == httplib.OK:
-            gen_acc = extract_genome_acc(rdf_url)
+        gen_acc = extract_genome_acc(rdf_url)
         gens[proteome] = gen_acc
 
         return gens
 
-    # do this for files and lists
-    for proteome in ref_prot_list:
-        proteome = string.strip(proteome)
-        rdf_url = gc.PROTEOME_URL % (proteome)
-        res_handle = urllib.urlopen(rdf_url)
-        if res_handle.getcode() == httplib.OK:
-            gen_acc = extract_genome_acc(rdf_url)
+    # do this for files and lists, fetching the rdf files concurrently
+    proteomes = [string.strip(x) for x in ref_prot_list]
+    gen_accs = http_client.map_concurrent(extract_genome_acc,
+                                          [gc.PROTEOME_URL % x for x in proteomes])
 
+    for proteome, gen_acc in zip(proteomes, gen_accs):
         gens[proteome] = gen_acc
 
     return gens
@@ -270,36 +268,50 @@ def fetch_genome_acc(prot):
 
 # -----------------------------------------------------------------------------
 
-def fetch_ena_file(acc, file_format, dest_dir, compressed=True):
+def get_ena_file_location(acc, file_format, dest_dir, compressed=True):
     """
-    Retrieves a file given a valid ENA accession and stores it in the
-    indicated destination in the selected format
+    Builds the download url and local path of an ENA file
 
     acc: A valid ENA entry accession
-    format: A valid ENA file format (xml, fasta, txt)
-    dest_dit: A valid path to destination directory
-    """
+    file_format: A valid ENA file format (xml, fasta, txt)
+    dest_dir: A valid path to destination directory
+    compressed: If True, fetch a gzipped file
 
-    seq_url = None
-    file_path = None
+    return: A tuple (url, file_path)
+    """
 
     if file_format.find("xml") != -1:
         seq_url = ENA_XML_URL % acc
         file_path = os.path.join(dest_dir, acc + FORMATS[file_format])
 
     # fetching compressed file
+    elif compressed is True:
+        seq_url = ENA_DATA_URL_GZIP % (acc, file_format)
+        file_path = os.path.join(dest_dir, acc + FORMATS[file_format] + ".gz")
+
     else:
-        if compressed is True:
-            seq_url = ENA_DATA_URL_GZIP % (acc, file_format)
-            file_path = os.path.join(dest_dir, acc + FORMATS[file_format] + ".gz")
-        else:
-            seq_url = ENA_DATA_URL % (acc, file_format)
-            file_path = os.path.join(dest_dir, acc + FORMATS[file_format])
+        seq_url = ENA_DATA_URL % (acc, file_format)
+        file_path = os.path.join(dest_dir, acc + FORMATS[file_format])
 
-    # check url is available
-    response = requests.get(seq_url)
-    if response.status_code == 200:
-        urllib.urlretrieve(seq_url, file_path)
+    return seq_url, file_path
+
+# -----------------------------------------------------------------------------
+
+def fetch_ena_file(acc, file_format, dest_dir, compressed=True):
+    """
+    Retrieves a file given a valid ENA accession and stores it in the
+    indicated destination in the selected format
+
+    acc: A valid ENA entry accession
+    format: A valid ENA file format (xml, fasta, txt)
+    dest_dit: A valid path to destination directory
+    """
+
+    seq_url, file_path = get_ena_file_location(acc, file_format, dest_dir,
+                                               compressed=compressed)
+
+    # stream the file in a single request
+    http_client.download(seq_url, file_path)
 
     if os.path.exists(file_path):
         return True
@@ -322,7 +334,7 @@ def extract_assembly_accs(accession):
     assembly_link = None
     assembly = None
 
-    assembly_xml = requests.get(ENA_XML_URL % accession).content
+    assembly_xml = http_client.cached_get(ENA_XML_URL % accession).content
 
     if os.path.isfile(assembly_xml):
         # parse xml tree and return root node
@@ -477,11 +489,11 @@ def rdf_accession_search(ref_prot_acc, sub_str):
     rdf_graph = Graph()
     rdf_url = PROTEOME_URL % ref_prot_acc
 
-    response = requests.get(rdf_url).status_code
+    response = http_client.get(rdf_url)
 
-    if response == httplib.OK:
+    if response.status_code == httplib.OK:
 
-        rdf_graph.load(rdf_url)
+        rdf_graph.parse(data=response.content, format="xml")
 
         for s, p, o in rdf_graph:
             if string.find(o, sub_str) != -1:
@@ -515,7 +527,7 @@ def assembly_report_parser(assembly_report, url=True):
     if url is True:
         report_url = assembly_report.replace("ftp://", "http://")
         # fetch assembly report file contents and store in a list, omitting header
-        ass_rep_file = requests.get(report_url).content.split('\n')[1:]
+        ass_rep_file = http_client.get(report_url).content.split('\n')[1:]
 
         # if empty line, remove it
         if ass_rep_file[len(ass_rep_file) - 1] == '':
@@ -566,7 +578,7 @@ def get_wgs_range(wgs_acc):
 
     wgs_range = None
 
-    response = requests.get(ENA_XML_URL % wgs_acc)
+    response = http_client.cached_get(ENA_XML_URL % wgs_acc)
 
     if response.status_code == httplib.OK:
         wgs_xml_str = response.content
@@ -725,7 +737,7 @@ def load_upid_gca_pairs():
     """
 
     id_pairs = {}
-    response = requests.get(gc.REF_PROT_REST_URL)
+    response = http_client.get(gc.REF_PROT_REST_URL)
 
     if response.status_code == 200:
         content = response.content
@@ -790,6 +802,28 @@ def fetch_genome_accessions(upid, gca_acc):
     return gen_accs
 
 
+# -----------------------------------------------------------------------------
+
+def parse_wgs_accession(wgs_acc):
+    """
+    Splits a WGS contig accession into its set prefix (letters and 2-digit
+    version) and its contig number
+
+    wgs_acc: A WGS contig accession (e.g. AYNF01000001)
+
+    return: A tuple (prefix, contig number, number of digits)
+    """
+
+    idx = 0
+    while idx < len(wgs_acc) and wgs_acc[idx].isalpha():
+        idx += 1
+
+    # the 2-digit build version is part of the prefix
+    idx += 2
+
+    return wgs_acc[0:idx], int(wgs_acc[idx:]), len(wgs_acc) - idx
+
+
 # -----------------------------------------------------------------------------
 
 def fetch_wgs_range_accs(wgs_range):
@@ -799,26 +833,51 @@ def fetch_wgs_range_accs(wgs_range):
     wgs_range: A valid ENA-WGS set range
     """
 
-    wgs_accs = []
+    wgs_end_points = wgs_range.strip().split('-')
+
+    wgs_prefix, wgs_start, width = parse_wgs_accession(wgs_end_points[0])
+    wgs_end = parse_wgs_accession(wgs_end_points[1])[1]
+
+    # keep the zero padding of the contig numbers
+    return ["%s%0*d" % (wgs_prefix, width, x) for x in xrange(wgs_start, wgs_end + 1)]
+
+
+# -----------------------------------------------------------------------------
+
+def get_wgs_range_batches(wgs_range, batch_size=MAX_SEQS):
+    """
+    Splits a WGS range into contiguous sub-ranges of balanced size, with no
+    more than batch_size contigs each, without expanding the full list of
+    accessions
+
+    wgs_range: A WGS assembly sequence accession range from ENA
+    (e.g. CBTL0100000001-CBTL0111673940)
+    batch_size: The maximum number of contigs per sub-range
+
+    return: A list of (first accession, last accession, number of contigs)
+    tuples
+    """
 
     wgs_end_points = wgs_range.strip().split('-')
-    wgs_prefix = wgs_end_points[0][0:5]
 
-    wgs_start = int(wgs_end_points[0][5:])
-    wgs_end = int(wgs_end_points[1][5:])
+    wgs_prefix, wgs_start, width = parse_wgs_accession(wgs_end_points[0])
+    wgs_end = parse_wgs_accession(wgs_end_points[1])[1]
 
-    wgs_acc = ''
+    total = wgs_end - wgs_start + 1
+    batch_no = (total + batch_size - 1) / batch_size
 
-    while wgs_start < wgs_end:
-        wgs_acc = wgs_prefix + str(wgs_start)
-        wgs_accs.append(wgs_acc)
-        wgs_start += 1
-        wgs_acc = ''
+    batches = []
+    first = wgs_start
+    for idx in range(batch_no):
+        # spread the remainder over the first batches
+        size = total / batch_no + (1 if idx < total % batch_no else 0)
+        last = first + size - 1
 
-    # include the last accession
-    wgs_accs.append(wgs_end_points[1])
+        batches.append(("%s%0*d" % (wgs_prefix, width, first),
+                        "%s%0*d" % (wgs_prefix, width, last), size))
+        first = last + 1
 
-    return wgs_accs
+    return batches
 
 
 # -----------------------------------------------------------------------------
@@ -893,7 +952,7 @@ def download_fasta_from_ncbi(accession, dest_dir):
     seq_url = NCBI_SEQ_URL % (accession)
     file_path = os.path.join(dest_dir, accession + '.fa')
 
-    urllib.urlretrieve(seq_url, file_path)
+    http_client.download(seq_url, file_path)
 
     if os.path.exists(file_path):
         return True
@@ -940,7 +999,7 @@ def download_sequence_report_files(project_dir, upid_gca_file):
 
             filename = "%s_sequence_report.txt" % acc_pairs[upid]["GCA"]
 
-            urllib.urlretrieve(seq_rep_url, os.path.join(updir, filename))
+            http_client.download(seq_rep_url, os.path.join(updir, filename))
 
             # check file exists or if it is empty
             if not os.path.exists(filename):
@@ -998,46 +1057,115 @@ def sequence_report_to_json(seq_report_file, dest_dir=None):
 # -----------------------------------------------------------------------------
 
 
-def split_and_download(wgs_range, dest_dir):
+def download_wgs_range_batch(batch, dest_dir, chunk_size=1024 * 1024):
     """
-    Function to split and download smaller segments of large genome assemblies
+    Downloads a contiguous range of WGS contigs as a gzipped fasta file and
+    decompresses it on the fly into dest_dir/<first>-<last>.fa. The number
+    of sequences received is checked against the size of the range, and
+    incomplete files are discarded. Ranges that have already been
+    downloaded are skipped
 
-    wgs_range: A WGS assembly sequence accession range from ENA
-    (e.g. CBTL0100000001-CBTL0111673940)
+    batch: A (first accession, last accession, number of contigs) tuple as
+    returned by get_wgs_range_batches
     dest_dir: The path to the destination directory
+    chunk_size: Number of bytes read per chunk
+
+    return: True if all contigs of the range were downloaded, False otherwise
+    """
+
+    first_acc, last_acc, contig_no = batch
+
+    accession = first_acc + '-' + last_acc
+    file_path = os.path.join(dest_dir, accession + '.fa')
+
+    if os.path.exists(file_path):
+        return True
+
+    response = http_client.get(ENA_DATA_URL_GZIP % (accession, "fasta"), stream=True)
+
+    if response.status_code != httplib.OK:
+        response.close()
+        return False
+
+    part_file = file_path + ".part"
+    fp_out = open(part_file, 'wb')
+
+    decompressor = None
+    seq_count = 0
+    complete = False
+
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
 
-    returns:  void
+            # the transport may already have decoded the gzip stream
+            if decompressor is None:
+                if chunk[0:2] == '\x1f\x8b':
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                else:
+                    decompressor = False
+
+            if decompressor is not False:
+                chunk = decompressor.decompress(chunk)
+
+            seq_count += chunk.count('>')
+            fp_out.write(chunk)
+
+        if decompressor:
+            chunk = decompressor.flush()
+            seq_count += chunk.count('>')
+            fp_out.write(chunk)
+
+        complete = seq_count == contig_no
+
+    finally:
+        fp_out.close()
+        response.close()
+
+        # incomplete or interrupted downloads leave no partial file behind
+        if not complete:
+            os.remove(part_file)
+
+    if not complete:
+        return False
+
+    os.rename(part_file, file_path)
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+
+def split_and_download(wgs_range, dest_dir, batch_size=MAX_SEQS,
+                       workers=http_client.WORKERS):
     """
+    Function to split and download smaller segments of large genome assemblies.
+    Sub-ranges of balanced size are downloaded concurrently and streamed
+    to disk, so memory use does not depend on the size of the assembly
 
-    # split the range into separate accessions
-    accessions = fetch_wgs_range_accs(wgs_range)
+    wgs_range: A WGS assembly sequence accession range from ENA
+    (e.g. CBTL0100000001-CBTL0111673940)
+    dest_dir: The path to the destination directory
+    batch_size: The maximum number of contigs per file
+    workers: Number of concurrent downloads
 
-    file_no = len(accessions) / MAX_SEQS
-    remainder = len(accessions) % MAX_SEQS
+    returns: A list of the sub-ranges that failed to download or were
+    incomplete
+    """
 
-    count = 0
-    # indexes
-    idx1 = 0
-    idx2 = MAX_SEQS
-    while count < file_no:
-        accession = accessions[idx1] + '-' + accessions[idx2]
-        urllib.urlretrieve(ENA_DATA_URL % accession,
-                           os.path.join(dest_dir, accession + '.fa'))
-        idx1 = idx2 + 1
-        idx2 = idx2 + MAX_SEQS
+    batches = get_wgs_range_batches(wgs_range, batch_size=batch_size)
 
-        count += 1
+    def download_batch(batch):
+        # a failed range must not abort the download of the others
+        try:
+            return download_wgs_range_batch(batch, dest_dir)
+        except Exception:
+            return False
 
-    # check if sequences are not split evenly, and do and extra step for the
-    # remaining seqs
+    status = http_client.map_concurrent(download_batch, batches, workers=workers)
 
-    if remainder != 0:
-        idx1 = idx1 = idx2 + 1
-        # get the last accession
-        idx2 = accessions[-1]
-        accession = accessions[idx1] + '-' + accessions[idx2]
-        urllib.urlretrieve(ENA_DATA_URL % accession,
-                           os.path.join(dest_dir, accession + '.fa'))
+    return [x[0] + '-' + x[1] for x, done in zip(batches, status) if done is False]
 
 
 # -----------------------------------------------------------------------------
@@ -1056,7 +1184,7 @@ def fetch_accessions_from_proteome_xml(proteome):
     # namespace prefix # or register a namespace in the ET
     prefix = "{http://uniprot.org/uniprot}%s"
 
-    response = requests.get(gc.PROTEOME_XML_URL % proteome)
+    response = http_client.cached_get(gc.PROTEOME_XML_URL % proteome)
 
     if response.status_code == 200:
         # convert from string to xml format
@@ -1090,7 +1218,7 @@ def check_accession_availability(accession):
     """
 
     # we can expand this by adding a db option (e.g. ena, uniprot, ncbi)
-    response = requests.get(ENA_XML_URL % accession)
+    response = http_client.cached_get(ENA_XML_URL % accession)
 
     if response.status_code == httplib.OK:
         xml_root = ET.fromstring(response.content)
@@ -1109,12 +1237,14 @@ def check_accession_availability(accession):
 
 def copy_wgs_set_from_ftp(wgs_acc, dest_dir):
     """
-    Copy wgs set sequences from physical location on cluster
+    Copy wgs set sequences from physical location on cluster. Sets missing
+    from the cluster are downloaded from ENA in contig ranges
 
     wsg_acc: A valid WGS set accession (e.g. AAVU01000000)
     dest_dir: Destination directory where the sequences will be copied to
 
-    return: void
+    return: void. Raises IOError if the set does not exist or any of its
+    ranges fails to download
     """
 
     # build path
@@ -1133,8 +1263,18 @@ def copy_wgs_set_from_ftp(wgs_acc, dest_dir):
             shutil.copyfile(os.path.join(wgs_subdir, wgs_filename),
                             os.path.join(dest_dir, wgs_filename))
 
+        # fall back to fetching the contigs from ENA
         else:
-            sys.exit("WGS set %s requested does not exist." % wgs_acc)
+            wgs_range = get_wgs_range(wgs_acc)
+
+            if wgs_range is None:
+                raise IOError("WGS set %s requested does not exist." % wgs_acc)
+
+            failed_ranges = split_and_download(wgs_range, dest_dir)
+
+            if len(failed_ranges) > 0:
+                raise IOError("WGS set %s ranges failed to download: %s" % (wgs_acc,
+                                                                          ', '.join(failed_ranges)))
 
 # -----------------------------------------------------------------------------
 
@@ -1155,7 +1295,7 @@ def proteome_xml_accessions_to_dict(upid):
     # namespace prefix # or register a namespace in the ET
     prefix = "{http://uniprot.org/uniprot}%s"
 
-    response = requests.get(gc.PROTEOME_XML_URL % upid)
+    response = http_client.cached_get(gc.PROTEOME_XML_URL % upid)
 
     if response.status_code == 200:
         # convert from string to xml format
@@ -1313,7 +1453,7 @@ def extract_wgs_acc_from_gca_xml(gca_accession):
 
     xml_root = None
     wgs_acc = None
-    assembly_xml = requests.get(ENA_XML_URL % gca_accession).content
+    assembly_xml = http_client.cached_get(ENA_XML_URL % gca_accession).content
 
     if os.path.isfile(assembly_xml):
         # parse xml tree and return root node
@@ -1350,7 +1490,7 @@ def download_gca_report_file_from_url(gca_accession, dest_dir):
     assembly = None
     url_links = []
 
-    assembly_xml = requests.get(ENA_XML_URL % gca_accession).content
+    assembly_xml = http_client.cached_get(ENA_XML_URL % gca_accession).content
 
     if os.path.isfile(assembly_xml):
         # parse xml tree and return root node
@@ -1376,7 +1516,7 @@ def download_gca_report_file_from_url(gca_accession, dest_dir):
 
             for url in url_links:
                 filename = url.split('/')[-1]
-                urllib.urlretrieve(url, os.path.join(dest_dir, filename))
+                http_client.download(url, os.path.join(dest_dir, filename))
 
             return True
 
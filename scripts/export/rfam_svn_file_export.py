@@ -11,135 +11,364 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 """
-Description: Export script fetching family specific files from the SVN 
+Description: Export script fetching family specific files from the SVN
              (e.g. "SEED", "CM")
+
+             Families are exported by a pool of workers, each in its own
+             temporary directory. With an SVN url files are read with
+             svn cat at the family's last changed revision, with no
+             checkout, and families whose revision has not changed since
+             the last export are skipped. Without one, every family is
+             checked out with rfco.
 """
 # ---------------------------------IMPORTS-------------------------------------
 
 import os
-import sys
-import subprocess
+import json
 import shutil
-import string
+import argparse
+import tempfile
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+from config import rfam_config as rc
 from utils import RfamDB
 
 # -----------------------------------------------------------------------------
 
 FILE_TYPES = ["CM", "SEED"]
 SVN_CHECKOUT = "rfco %s"
+SVN_LIST = ["svn", "list", "--verbose"]
+SVN_CAT = ["svn", "cat"]
+
+EXPORT_MANIFEST = "svn_export_manifest.json"
+
+WORKERS = 8
+MANIFEST_INTERVAL = 100  # families exported between manifest saves
+
+# -----------------------------------------------------------------------------
+
+
+def get_family_accessions():
+    """
+    Fetches all Rfam family accessions from rfam_live
+
+    return: A list of Rfam family accessions
+    """
+
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=True)
+
+    cursor.execute("SELECT rfam_acc FROM family")
+    rfam_accs = [str(x[0]) for x in cursor]
+
+    cursor.close()
+    RfamDB.disconnect(cnx)
+
+    return rfam_accs
+
+# -----------------------------------------------------------------------------
+
+
+def get_family_revisions(svn_url):
+    """
+    Lists the family directories of the SVN repository with a single
+    svn list call
+
+    svn_url: The url of the SVN directory with all family directories
+
+    return: A dictionary of Rfam family accessions to the revision each
+    family was last changed in
+    """
+
+    revisions = {}
+
+    output = subprocess.check_output(SVN_LIST + [svn_url])
+
+    # e.g. "  25641 rfamprod              Oct 01  2016 RF00001/"
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 2 or not fields[0].isdigit() or not fields[-1].endswith('/'):
+            continue
+
+        rfam_acc = fields[-1].rstrip('/')
+        if rfam_acc != '.':
+            revisions[rfam_acc] = int(fields[0])
+
+    return revisions
+
+# -----------------------------------------------------------------------------
+
+
+def load_export_manifest(out_dir):
+    """
+    Loads the family revisions recorded by the last export to out_dir
+
+    return: A dictionary of Rfam family accessions to revisions
+    """
+
+    manifest_file = os.path.join(out_dir, EXPORT_MANIFEST)
+
+    if not os.path.exists(manifest_file):
+        return {}
+
+    fp = open(manifest_file, 'r')
+    manifest = json.load(fp)
+    fp.close()
+
+    return dict([(str(x), y) for x, y in manifest.iteritems()])
+
+# -----------------------------------------------------------------------------
+
+
+def save_export_manifest(out_dir, manifest):
+    """
+    Writes the family revisions of an export to out_dir, replacing any
+    previous manifest only once written
+    """
+
+    manifest_file = os.path.join(out_dir, EXPORT_MANIFEST)
 
+    fp = open(manifest_file + ".tmp", 'w')
+    json.dump(manifest, fp, indent=0, sort_keys=True)
+    fp.close()
+
+    os.rename(manifest_file + ".tmp", manifest_file)
+
+# -----------------------------------------------------------------------------
+
+
+def get_export_path(out_dir, f_type, rfam_acc):
+    """
+    Returns the path to a family file in the export (e.g.
+    out_dir/SEED/RF00001.seed)
+    """
+
+    return os.path.join(out_dir, f_type, rfam_acc + '.' + f_type.lower())
 
 # -----------------------------------------------------------------------------
 
 
-def export_rfam_family_files(f_types, out_dir):
+def svn_cat_family_files(rfam_acc, f_types, out_dir, svn_url, revision, work_dir):
+    """
+    Reads the files of a family from the SVN with svn cat, without
+    checking the family out
+
+    rfam_acc: A valid Rfam family accession
+    f_types: A list of file type keywords (e.g. ["SEED", "CM"])
+    out_dir: The path to the output directory
+    svn_url: The url of the SVN directory with all family directories
+    revision: The revision to read the files at, or None for HEAD
+    work_dir: A temporary directory private to this family
     """
-    Fetches all Rfam family accessions from rfam_live, checks out each
-    family and copies the files in f_types in their corresponding
-    directories
+
+    for f_type in f_types:
+        file_url = "%s/%s/%s" % (svn_url.rstrip('/'), rfam_acc, f_type)
+        if revision is not None:
+            file_url = "%s@%d" % (file_url, revision)
+
+        tmp_file = os.path.join(work_dir, f_type)
+        fp = open(tmp_file, 'w')
+        status = subprocess.call(SVN_CAT + [file_url], stdout=fp)
+        fp.close()
+
+        if status != 0:
+            raise IOError("svn cat of %s failed" % file_url)
+
+        shutil.move(tmp_file, get_export_path(out_dir, f_type, rfam_acc))
+
+# -----------------------------------------------------------------------------
+
+
+def checkout_family_files(rfam_acc, f_types, out_dir, work_dir):
+    """
+    Checks a family out with rfco in work_dir and copies the files in
+    f_types to their directories
+
+    rfam_acc: A valid Rfam family accession
+    f_types: A list of file type keywords (e.g. ["SEED", "CM"])
+    out_dir: The path to the output directory
+    work_dir: A temporary directory private to this family
+    """
+
+    status = subprocess.call(SVN_CHECKOUT % rfam_acc, shell=True, cwd=work_dir)
+
+    fam_dir = os.path.join(work_dir, rfam_acc)
+    if status != 0 or not os.path.isdir(fam_dir):
+        raise IOError("rfco of %s failed" % rfam_acc)
+
+    for f_type in f_types:
+        shutil.move(os.path.join(fam_dir, f_type), get_export_path(out_dir, f_type, rfam_acc))
+
+# -----------------------------------------------------------------------------
+
+
+def export_family(rfam_acc, f_types, out_dir, svn_url=None, revision=None):
+    """
+    Exports the files of a single family in a temporary directory of its
+    own, which is deleted when done
+
+    rfam_acc: A valid Rfam family accession
+    f_types: A list of file type keywords (e.g. ["SEED", "CM"])
+    out_dir: The path to the output directory
+    svn_url: The url of the SVN directory with all family directories. If
+    None the family is checked out with rfco
+    revision: The revision to export the family at (svn_url only)
+
+    return: None on success, otherwise an error message
+    """
+
+    work_dir = tempfile.mkdtemp(prefix=rfam_acc + '_', dir=out_dir)
+
+    try:
+        if svn_url is not None:
+            svn_cat_family_files(rfam_acc, f_types, out_dir, svn_url, revision, work_dir)
+        else:
+            checkout_family_files(rfam_acc, f_types, out_dir, work_dir)
+
+    except (IOError, OSError), e:
+        return str(e)
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return None
+
+# -----------------------------------------------------------------------------
+
+
+def export_rfam_family_files(f_types, out_dir, svn_url=None, workers=WORKERS, rfam_accs=None,
+                             force=False):
+    """
+    Fetches all Rfam family accessions from rfam_live and exports the files
+    in f_types of each family to their corresponding directories, using a
+    pool of workers
 
     f_types: A list of file type keywords we need to
              export (e.g. ["SEED", "CM"])
     out_dir: The path to the output directory. If it does not exist it will
              be created
+    svn_url: The url of the SVN directory with all family directories. If
+    None families are checked out with rfco and always exported
+    workers: The number of families to export concurrently
+    rfam_accs: A list of Rfam family accessions to export instead of all
+    families in the database
+    force: If True, export families even if their revision has not changed
+
+    return: A dictionary of the Rfam family accessions that failed to
+    export to error messages
     """
 
+    out_dir = os.path.abspath(out_dir)
+
     # Create the output directory if it does not exist
-    if (not os.path.exists(out_dir)):
+    if not os.path.exists(out_dir):
         os.mkdir(out_dir)
 
-    # if current working directory isn't out_dir, change directory
-    if (string.find(os.getcwd(), out_dir) == -1):
-        os.chdir(out_dir)
-
     # generate specific output directories for each file type
-    file_path = ''
     for f_type in f_types:
         file_path = os.path.join(out_dir, f_type)
-        if (not os.path.exists(file_path)):
+        if not os.path.exists(file_path):
             os.mkdir(file_path)
-        file_path = ''
 
-    # get DB connection handle
-    cnx = RfamDB.connect()
+    if rfam_accs is None:
+        rfam_accs = get_family_accessions()
 
-    # get mysql cursor
-    cursor = cnx.cursor(buffered=True)
+    revisions = {}
+    manifest = {}
+    if svn_url is not None:
+        revisions = get_family_revisions(svn_url)
+        manifest = load_export_manifest(out_dir)
 
-    # execute query
-    cursor.execute("SELECT rfam_acc FROM family")
+    failed = {}
+    pending = []
+
+    for rfam_acc in rfam_accs:
+        revision = revisions.get(rfam_acc)
 
-    cmd = ''
+        if svn_url is not None and revision is None:
+            failed[rfam_acc] = "%s not found in %s" % (rfam_acc, svn_url)
+            continue
 
-    # fetch files for all Rfam family accessions
-    for rfam_acc in cursor:
+        # skip families unchanged since the last export
+        if (not force and revision is not None and manifest.get(rfam_acc) == revision and
+                all([os.path.exists(get_export_path(out_dir, x, rfam_acc)) for x in f_types])):
+            continue
 
-        rfam_acc = str(rfam_acc[0])
-        cmd = SVN_CHECKOUT % rfam_acc
+        pending.append((rfam_acc, revision))
 
-        # Check out family in out_dir using rfco on lsf
-        subprocess.call(cmd, shell=True)
+    print "%d families to export, %d unchanged" % (len(pending),
+                                                   len(rfam_accs) - len(pending) - len(failed))
 
-        # path to
-        fam_dir = os.path.join(out_dir, rfam_acc)
+    def export_pending(family):
+        return family, export_family(family[0], f_types, out_dir, svn_url=svn_url,
+                                     revision=family[1])
 
-        # copy files and rename
-        for f_type in f_types:
-            filename = rfam_acc + '.' + f_type.lower()
-            """
-            if (f_type == "SEED"):
-                # 1. open out file handler
-                seed_out_fp = open(
-                    os.path.join(os.path.join(out_dir, f_type), filename), 'w')
-                # 2. open desc handler
-                desc_fp = open(os.path.join(fam_dir, "DESC"), 'r')
-                # 3. write desc to outfile
-                seed_out_fp.writelines(desc_fp.readlines())
-                seed_out_fp.write('\n')
-                desc_fp.close()
-                # 4. open seed and write in outfile
+    pool = ThreadPool(processes=max(1, min(workers, len(pending))))
+    exported = 0
 
+    try:
+        for (rfam_acc, revision), error in pool.imap_unordered(export_pending, pending):
+            if error is not None:
+                failed[rfam_acc] = error
+                manifest.pop(rfam_acc, None)
                 continue
-            """
-            shutil.copyfile(os.path.join(fam_dir, f_type),
-                            os.path.join(os.path.join(out_dir, f_type), filename))
 
-        # delete family dir
-        shutil.rmtree(fam_dir)
+            exported += 1
+            if revision is not None:
+                manifest[rfam_acc] = revision
 
-        filename = ''
-        fam_dir = ''
-        cmd = ''
+                if exported % MANIFEST_INTERVAL == 0:
+                    save_export_manifest(out_dir, manifest)
+    finally:
+        pool.close()
+        pool.join()
 
-    # close DB connection
-    cursor.close()
-    RfamDB.disconnect(cnx)
+        if svn_url is not None:
+            save_export_manifest(out_dir, manifest)
 
+    return failed
 
 # -----------------------------------------------------------------------------
 
 
 def usage():
     """
-    Displays information on how to run rfam_svn_file_export
+    Parses arguments and displays usage information on screen
     """
 
-    print "\nUsage:\n------"
+    parser = argparse.ArgumentParser(description="Export family SEED and CM files from the SVN")
 
-    print "\npython rfam_svn_file_export.py out_dir"
-    print "\nout_dir: Path to an output directory"
-    print "\n-h option for usage\n"
+    parser.add_argument("out_dir", help="path to an output directory", type=str)
+    parser.add_argument("--svn-url", help="url of the SVN Families directory. Defaults to "
+                                          "SVN_FAMILY_URL, rfco checkouts if empty",
+                        type=str, default=None)
+    parser.add_argument("--workers", help="number of families to export concurrently",
+                        type=int, default=WORKERS)
+    parser.add_argument("--acc", help="export a single family", type=str, default=None)
+    parser.add_argument("--force", help="export unchanged families too", action="store_true",
+                        default=False)
 
+    return parser
 
 # -----------------------------------------------------------------------------
 
 if __name__ == '__main__':
 
-    out_dir = sys.argv[1]
+    parser = usage()
+    args = parser.parse_args()
+
+    svn_url = args.svn_url
+    if svn_url is None and rc.SVN_FAMILY_URL != '':
+        svn_url = rc.SVN_FAMILY_URL
+
+    rfam_accs = None
+    if args.acc is not None:
+        rfam_accs = [args.acc]
 
-    # minor input checks
-    if os.path.isdir(out_dir):
-        export_rfam_family_files(FILE_TYPES, out_dir)
+    failed = export_rfam_family_files(FILE_TYPES, args.out_dir, svn_url=svn_url,
+                                      workers=args.workers, rfam_accs=rfam_accs,
+                                      force=args.force)
 
-    else:
-        usage()
+    for rfam_acc in sorted(failed.keys()):
+        print "%s: %s" % (rfam_acc, failed[rfam_acc])
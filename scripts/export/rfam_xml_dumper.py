@@ -23,7 +23,11 @@ TO DO:
 
 import argparse
 import datetime
+import hashlib
+import itertools
+import json
 import logging
+import shutil
 import subprocess
 import timeit
 import traceback
@@ -37,6 +41,8 @@ from config import rfam_config as rfc
 from config import rfam_search as rs
 from utils import RfamDB
 from utils.parse_taxbrowser import *
+from utils.rnacentral_index import RNAcentralIndex
+from scripts.export import full_region_xml as frx
 
 django.setup()
 #settings.configure()
@@ -46,7 +52,8 @@ from rfam_schemas.RfamLive.models import Genseq, Genome
 
 # ----------------------------------------------------------------------------
 
-def xml4db_dumper(name_dict, name_object, entry_type, entry_acc, hfields, outdir):
+def xml4db_dumper(name_dict, name_object, entry_type, entry_acc, hfields, outdir,
+                  rnac_index=None):
     """
     Exports query results into EB-eye's XML4dbDUMP format
 
@@ -56,10 +63,45 @@ def xml4db_dumper(name_dict, name_object, entry_type, entry_acc, hfields, outdir
                 ('M': Motif, 'F': Family, 'C': Clan, 'G': Genome)
     entry_acc:  An Rfam related accession (Clan, Motif, Family)
     outdir: Destination directory
+    rnac_index: An RNAcentralIndex to look full region mappings up in,
+                instead of querying rnacentral_matches (optional)
     """
 
     entry_type = entry_type[0].capitalize()
 
+    db_xml, entries = create_xml4db_tree()
+
+    # call family xml builder to add a new family to the xml tree
+    if entry_type == rs.FAMILY:
+        family_xml_builder(
+            name_dict, name_object, entries, rfam_acc=entry_acc, hfields=hfields)
+
+    elif entry_type == rs.CLAN:
+        clan_xml_builder(entries, clan_acc=entry_acc)
+
+    elif entry_type == rs.MOTIF:
+        motif_xml_builder(entries, motif_acc=entry_acc)
+
+    elif entry_type == rs.GENOME:
+        genome_xml_builder(entries, gen_acc=entry_acc)
+
+    elif entry_type == rs.MATCH:
+        # full region entries are streamed to the file as strings
+        full_region_xml_builder(entry_acc, outdir, rnac_index=rnac_index)
+        return
+
+    write_xml4db_file(db_xml, entries, entry_acc, outdir)
+
+
+# ----------------------------------------------------------------------------
+
+def create_xml4db_tree():
+    """
+    Creates an EB-eye XML4dbDUMP tree with the fixed database tags
+
+    return: A tuple (database node, entries node)
+    """
+
     # EB_eye_search fixed tags
     db_xml = ET.Element("database")
     ET.SubElement(db_xml, "name").text = rs.DB_NAME
@@ -75,22 +117,21 @@ def xml4db_dumper(name_dict, name_object, entry_type, entry_acc, hfields, outdir
 
     entries = ET.SubElement(db_xml, "entries")
 
-    # call family xml builder to add a new family to the xml tree
-    if entry_type == rs.FAMILY:
-        family_xml_builder(
-            name_dict, name_object, entries, rfam_acc=entry_acc, hfields=hfields)
+    return db_xml, entries
 
-    elif entry_type == rs.CLAN:
-        clan_xml_builder(entries, clan_acc=entry_acc)
 
-    elif entry_type == rs.MOTIF:
-        motif_xml_builder(entries, motif_acc=entry_acc)
+# ----------------------------------------------------------------------------
 
-    elif entry_type == rs.GENOME:
-        genome_xml_builder(entries, gen_acc=entry_acc)
+def write_xml4db_file(db_xml, entries, entry_acc, outdir):
+    """
+    Adds the entry count to an XML4dbDUMP tree and writes it to
+    outdir/entry_acc.xml. Nothing is written for trees without entries
 
-    elif entry_type == rs.MATCH:
-        full_region_xml_builder(entries, entry_acc)
+    db_xml: The database node of the tree
+    entries: The entries node of the tree
+    entry_acc: The accession the file is named after
+    outdir: Destination directory
+    """
 
     # adding entry_count
     entry_count = len(entries.findall("entry"))
@@ -414,6 +455,10 @@ def result_iterator(cursor, arraysize=1000):
 def format_full_region(entries, region, genome, chromosome, rnacentral_ids):
     """
     Format full regions for a genome. Genome metadata is retrieved only once.
+
+    The export writes entries with full_region_xml.FullRegionFormatter. This
+    ElementTree version is the reference full_region_xml_benchmark compares
+    against.
     """
     timestamp = datetime.datetime.now().strftime("%d %b %Y")
     name = '%s/%s:%s' % (region["rfamseq_acc"], region["seq_start"], region["seq_end"])   
@@ -476,13 +521,22 @@ def format_full_region(entries, region, genome, chromosome, rnacentral_ids):
 
 # ----------------------------------------------------------------------------
 
-def get_chromosome_metadata():
+def get_chromosome_metadata(upid=None):
     """
-    Get chromosome metadata as a dictionary.
+    Get the chromosome metadata of the sequences of a genome as a dictionary
+    of rfamseq_acc to (chromosome_name, chromosome_type) tuples. Only the
+    genseq rows of the genome are fetched, rather than the whole table.
+
+    upid: Genome identifier. If None, the metadata of all genomes is loaded
     """
+    genseqs = Genseq.objects.exclude(chromosome_name__isnull=True)
+    if upid is not None:
+        genseqs = genseqs.filter(upid=upid)
+
     chromosomes = {}
-    for genseq in Genseq.objects.exclude(chromosome_name__isnull=True).values():
-        chromosomes[genseq['rfamseq_acc']] = genseq
+    for rfamseq_acc, chromosome_name, chromosome_type in genseqs.values_list(
+            'rfamseq_acc', 'chromosome_name', 'chromosome_type').iterator():
+        chromosomes[rfamseq_acc] = (chromosome_name, chromosome_type)
     return chromosomes
 
 
@@ -520,55 +574,124 @@ def get_rnacentral_mapping(upid):
 
 # ----------------------------------------------------------------------------
 
-def full_region_xml_builder(entries, upid):
+def full_region_xml_builder(upid, outdir, rnac_index=None):
     """
-    Export full region entries for a genome.
+    Export full region entries for a genome to outdir/upid.xml. Full regions
+    are written first, followed by the seed regions.
 
-    entries:    Entries node on xml tree
     upid:  Genome identifier.
+    outdir: Destination directory
+    rnac_index: An RNAcentralIndex. If None, the mappings of the genome are
+                fetched from rnacentral_matches
+
+    return: The number of entries written
     """
 
-    tax_id_duplicates = {'562': 1, '1280': 1, '7209': 1, '10679': 1, '10717': 1,
-                         '11021': 1, '11036': 1, '11072': 1, '11082': 1, '11228': 1,
-                         '11636': 1, '11963': 1, '31649': 1, '84589': 1, '90370': 1,
-                         '93838': 1, '186617': 1, '229533': 1, '351048': 1,
-                         '456327': 1, '766192': 1, '1891747': 1}
     genome = None
-    chromosomes = []
+    chromosomes = {}
     if upid[0:2] == 'UP':
         genome = Genome.objects.select_related('ncbi').get(upid=upid)
-        chromosomes = get_chromosome_metadata()
+        chromosomes = get_chromosome_metadata(upid)
+
+    rnacentral_ids = rnac_index
+    if rnac_index is None:
+        rnacentral_ids = get_rnacentral_mapping(upid=upid)
+    formatter = frx.FullRegionFormatter(genome, chromosomes, rnacentral_ids)
 
-    rnacentral_ids = get_rnacentral_mapping(upid=upid)
     cnx = RfamDB.connect()
     cursor = cnx.cursor(dictionary=True, buffered=True)
 
-    # work on 'full' refions
-    cursor.execute(rs.FULL_REGION_FIELDS % upid)
-    for row in result_iterator(cursor):
-        format_full_region(entries, row, genome, chromosomes, rnacentral_ids)
+    def iterate_regions():
+        # work on 'full' regions, then on 'seed' regions
+        for query in (rs.FULL_REGION_FIELDS, rs.FULL_REGION_SEEDS):
+            cursor.execute(query % upid)
+            for row in result_iterator(cursor):
+                yield row
+
+    entry_count = frx.write_full_region_file(os.path.join(outdir, upid + ".xml"),
+                                             iterate_regions(), formatter)
+
+    cursor.close()
+    cnx.disconnect()
+
+    if entry_count == 0:
+        print "No full region entries found for %s" % upid
 
-    # work on 'seed' regions if not already exported
-    # cursor.execute(rs.FULL_REGION_SEEDS % upid)
+    return entry_count
+
+
+# ----------------------------------------------------------------------------
 
+def get_all_rnacentral_mappings():
     """
-    # if one of the cases of duplicates, work with the flags
-    if genome.ncbi_id in tax_id_duplicates:
-        if tax_id_duplicates[genome.ncbi_id] == 1:
-            for row in result_iterator(cursor):
-                format_full_region(entries, row, genome, chromosomes, rnacentral_ids)
-            # set flag to 0 to disable export
-            tax_id_duplicates[genome.ncbi_id] = 0
+    Get RNAcentral mappings for all significant regions of all genomes,
+    loaded once for a bulk export.
     """
-    # capture the rest of the cases
-    # else:
-    cursor.execute(rs.FULL_REGION_SEEDS % upid)
-    for row in result_iterator(cursor):
-        format_full_region(entries, row, genome, chromosomes, rnacentral_ids)
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=False)
+    cursor.execute(rs.RNACENTRAL_MAPPING_ALL)
+    rnacentral_ids = {}
+    for rfamseq_acc, seq_start, seq_end, rnacentral_id in result_iterator(cursor):
+        name = '%s/%s:%s' % (rfamseq_acc, seq_start, seq_end)
+        rnacentral_ids[name] = str(rnacentral_id)
+    cursor.close()
+    cnx.disconnect()
+    return rnacentral_ids
+
+
+# ----------------------------------------------------------------------------
+
+def bulk_full_region_export(outdir, rnac_index=None):
+    """
+    Exports the full region entries of all genomes in a single ordered pass
+    over full_region, writing an XML file per genome as soon as all of its
+    regions have been read. RNAcentral mappings, chromosome metadata and
+    genomes are loaded once up front, instead of four queries per genome.
+
+    outdir: Destination directory
+    rnac_index: An RNAcentralIndex. If None, the mappings of all genomes are
+                loaded from rnacentral_matches
+
+    return: The number of genome files written
+    """
+
+    upids = Set(fetch_value_list(None, rs.GENOME_ACC))
+
+    rnacentral_ids = rnac_index
+    if rnac_index is None:
+        rnacentral_ids = get_all_rnacentral_mappings()
+    chromosomes = get_chromosome_metadata()
+    genomes = {}
+    for genome in Genome.objects.select_related('ncbi').filter(upid__startswith='UP').iterator():
+        genomes[genome.upid] = genome
+
+    timestamp = datetime.datetime.now().strftime("%d %b %Y")
+
+    cnx = RfamDB.connect()
+    # unbuffered, so that rows are streamed rather than loaded at once
+    cursor = cnx.cursor(dictionary=True, buffered=False)
+    cursor.execute(rs.FULL_REGION_ALL)
+
+    genome_count = 0
+    for upid, regions in itertools.groupby(result_iterator(cursor), key=lambda x: x["upid"]):
+        if upid not in upids:
+            continue
+
+        t0 = timeit.default_timer()
+
+        genome = genomes.get(upid) if upid[0:2] == 'UP' else None
+        formatter = frx.FullRegionFormatter(genome, chromosomes, rnacentral_ids,
+                                            timestamp=timestamp)
+
+        frx.write_full_region_file(os.path.join(outdir, upid + ".xml"), regions, formatter)
+        genome_count += 1
+        print "%s execution time: %.1fs" % (upid, timeit.default_timer() - t0)
 
     cursor.close()
     cnx.disconnect()
 
+    return genome_count
+
 
 # ----------------------------------------------------------------------------
 
@@ -782,6 +905,9 @@ def build_full_region_additional_fields(entry, fields, genome, chromosomes):
 
     entry:  This is the xml.etree.ElementTree at the point of entry
     fields: A list of additional fields to expand the entry with
+    genome: The Genome object of the region, or None
+    chromosomes: A dictionary of rfamseq_acc to (chromosome_name,
+                 chromosome_type) tuples as returned by get_chromosome_metadata
 
     return: void
     """
@@ -822,10 +948,9 @@ def build_full_region_additional_fields(entry, fields, genome, chromosomes):
     ET.SubElement(add_fields, "field", name="tax_string").text = tax_string
 
     if fields["rfamseq_acc"] in chromosomes:
-        ET.SubElement(add_fields, "field", name="chromosome_name").text = chromosomes[fields["rfamseq_acc"]][
-            "chromosome_name"]
-        ET.SubElement(add_fields, "field", name="chromosome_type").text = chromosomes[fields["rfamseq_acc"]][
-            "chromosome_type"]
+        chromosome_name, chromosome_type = chromosomes[fields["rfamseq_acc"]]
+        ET.SubElement(add_fields, "field", name="chromosome_name").text = chromosome_name
+        ET.SubElement(add_fields, "field", name="chromosome_type").text = chromosome_type
 
     # add popular species if any
     # species = genome.ncbi_id
@@ -981,7 +1106,242 @@ def fetch_value(query, accession):
 
 # ----------------------------------------------------------------------------
 
-def main(entry_type, rfam_acc, outdir, hfields=False):
+def fetch_full_region_checksum(upid):
+    """
+    Summarises the full and seed region rows a full region file of a genome
+    is built from (see full_region_xml_builder)
+
+    upid: Genome identifier
+
+    return: A tuple (number of rows, md5 hex digest of the rows)
+    """
+
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(dictionary=True, buffered=False)
+
+    rows = []
+    for query in (rs.FULL_REGION_FIELDS, rs.FULL_REGION_SEEDS):
+        cursor.execute(query % upid)
+        for row in result_iterator(cursor):
+            rows.append(json.dumps(row, sort_keys=True, default=str))
+
+    cursor.close()
+    cnx.disconnect()
+
+    # the queries are unordered
+    rows.sort()
+
+    return len(rows), hashlib.md5('\n'.join(rows)).hexdigest()
+
+
+# ----------------------------------------------------------------------------
+
+def get_rnacentral_signature(upid, rnac_index=None):
+    """
+    Identifies the RNAcentral mappings the full regions of a genome are
+    exported with
+
+    upid: Genome identifier
+    rnac_index: An RNAcentralIndex. If None, the mappings of the genome in
+                rnacentral_matches are summarised instead
+
+    return: A list identifying the index file (path, size, modification
+            time), or the md5 hex digest of the genome's mappings
+    """
+
+    if rnac_index is not None:
+        index_stat = os.stat(rnac_index.index_file)
+        return [os.path.abspath(rnac_index.index_file), index_stat.st_size,
+                int(index_stat.st_mtime)]
+
+    mappings = get_rnacentral_mapping(upid=upid)
+
+    return hashlib.md5(json.dumps(mappings, sort_keys=True, default=str)).hexdigest()
+
+
+# ----------------------------------------------------------------------------
+
+def get_entry_signature(entry_type, entry_acc, hfields=False, rnac_index=None):
+    """
+    Computes a signature of an entry from the fields fetch_entry_fields
+    returns, which include the updated timestamp of the entry, the release
+    and the export options. Full region (MATCH) entries are signed with the
+    fields of their genome, the number and checksum of their region rows and
+    the RNAcentral mappings they are exported with, as the full_region table
+    has no timestamp of its own
+
+    entry_type: Single char signifying the type of the entry accession
+    entry_acc:  An Rfam related accession
+    hfields: A flag (True/False) indicating whether hierarchical fields are
+             exported
+    rnac_index: The RNAcentralIndex full region entries are exported with
+
+    return: A hex digest, or None if the fields could not be fetched
+    """
+
+    fields_type = entry_type
+    if entry_type == rs.MATCH:
+        fields_type = rs.GENOME
+
+    fields = fetch_entry_fields(entry_acc, fields_type)
+    if fields is None:
+        return None
+
+    signed = [rs.DB_RELEASE, entry_type, hfields, fields]
+
+    if entry_type == rs.MATCH:
+        signed.append(fetch_full_region_checksum(entry_acc))
+        signed.append(get_rnacentral_signature(entry_acc, rnac_index=rnac_index))
+
+    content = json.dumps(signed, sort_keys=True, default=str)
+
+    return hashlib.sha1(content).hexdigest()
+
+
+# ----------------------------------------------------------------------------
+
+def load_export_manifest(export_dir):
+    """
+    Loads the manifest of an export directory
+
+    export_dir: An XML export directory
+
+    return: A dictionary of entry types to dictionaries of accessions to
+            {"signature": ..., "file": ...} entries
+    """
+
+    manifest_file = os.path.join(export_dir, rs.XML_MANIFEST)
+
+    if not os.path.exists(manifest_file):
+        return {}
+
+    fp = open(manifest_file, 'r')
+    manifest = json.load(fp)
+    fp.close()
+
+    return manifest
+
+
+# ----------------------------------------------------------------------------
+
+def save_export_manifest(manifest, export_dir):
+    """
+    Writes the manifest of an export directory, replacing the previous one
+    only once complete
+
+    manifest: A manifest dictionary as returned by load_export_manifest
+    export_dir: An XML export directory
+    """
+
+    manifest_file = os.path.join(export_dir, rs.XML_MANIFEST)
+
+    fp = open(manifest_file + ".tmp", 'w')
+    json.dump(manifest, fp, indent=1, sort_keys=True)
+    fp.close()
+
+    os.rename(manifest_file + ".tmp", manifest_file)
+
+
+# ----------------------------------------------------------------------------
+
+def export_entries(entry_type, entry_accs, outdir, export_entry, hfields=False,
+                   delta=False, previous_dir=None, rnac_index=None):
+    """
+    Exports a list of entries. In delta mode, an entry is only exported if
+    its signature differs from the one in the manifest of the previous run,
+    otherwise its XML file is kept, or copied over from previous_dir. XML
+    files of entries no longer in entry_accs are removed
+
+    entry_type: Single char signifying the type of the entry accession
+    entry_accs: A list of accessions to export
+    outdir: Destination directory
+    export_entry: A function exporting a single entry, given its accession
+    hfields: A flag (True/False) indicating whether hierarchical fields are
+             exported
+    delta: If True, only export entries changed since the previous run
+    previous_dir: The directory of the previous run. Defaults to outdir
+    rnac_index: The RNAcentralIndex full region entries are exported with
+
+    return: A tuple (number of entries exported, number of entries reused)
+    """
+
+    exported = 0
+    reused = 0
+
+    if delta is False:
+        for entry_acc in entry_accs:
+            print entry_acc
+            t0 = timeit.default_timer()
+            export_entry(entry_acc)
+            print "Execution time: %.1fs" % (timeit.default_timer() - t0)
+            exported += 1
+
+        return exported, reused
+
+    if previous_dir is None:
+        previous_dir = outdir
+
+    previous_entries = load_export_manifest(previous_dir).get(entry_type, {})
+
+    manifest = load_export_manifest(outdir)
+    manifest[entry_type] = {}
+
+    try:
+        for entry_acc in entry_accs:
+            signature = get_entry_signature(entry_type, entry_acc, hfields=hfields,
+                                            rnac_index=rnac_index)
+            previous = previous_entries.get(entry_acc)
+            xml_file = os.path.join(outdir, entry_acc + ".xml")
+
+            if signature is not None and previous is not None and \
+                    previous["signature"] == signature:
+                # entries without regions have no file
+                if previous["file"] is None:
+                    manifest[entry_type][entry_acc] = previous
+                    reused += 1
+                    continue
+
+                previous_file = os.path.join(previous_dir, previous["file"])
+                if os.path.exists(xml_file) or os.path.exists(previous_file):
+                    if not os.path.exists(xml_file):
+                        shutil.copyfile(previous_file, xml_file)
+                    manifest[entry_type][entry_acc] = previous
+                    reused += 1
+                    continue
+
+            print entry_acc
+            t0 = timeit.default_timer()
+            export_entry(entry_acc)
+            print "Execution time: %.1fs" % (timeit.default_timer() - t0)
+            exported += 1
+
+            filename = None
+            if os.path.exists(xml_file):
+                filename = os.path.basename(xml_file)
+
+            # unsigned entries are exported again on the next run
+            if signature is not None:
+                manifest[entry_type][entry_acc] = {"signature": signature, "file": filename}
+
+        # remove the files of entries that are no longer exported
+        for entry_acc in Set(previous_entries.keys()) - Set(entry_accs):
+            stale_file = os.path.join(outdir, entry_acc + ".xml")
+            if os.path.exists(stale_file):
+                os.remove(stale_file)
+
+    finally:
+        # also save partial runs, so that the next run picks up from here
+        save_export_manifest(manifest, outdir)
+
+    print "%d entries exported, %d unchanged" % (exported, reused)
+
+    return exported, reused
+
+
+# ----------------------------------------------------------------------------
+
+def main(entry_type, rfam_acc, outdir, hfields=False, bulk=False, delta=False,
+         previous_dir=None, rnac_index_file=None):
     """
     This function puts everything together
 
@@ -992,11 +1352,24 @@ def main(entry_type, rfam_acc, outdir, hfields=False):
     hfields: A flag (True/False) indicating whether to add hierarchical
              fields on not. True by default
     outdir: Destination directory
+    bulk: Export the full regions of all genomes in a single pass (see
+          bulk_full_region_export)
+    delta: Only export entries changed since the previous run (see
+           export_entries)
+    previous_dir: The output directory of the previous run, for delta
+                  exports to a new directory
+    rnac_index_file: The path to the RNAcentral mapping index of the release
+                     (see utils/rnacentral_index.py), used by full region
+                     exports instead of querying rnacentral_matches
     """
 
     rfam_accs = None
     entry = ""
 
+    rnac_index = None
+    if rnac_index_file is not None:
+        rnac_index = RNAcentralIndex(rnac_index_file)
+
     name_object = {}
     name_dict = {}
 
@@ -1026,6 +1399,10 @@ def main(entry_type, rfam_acc, outdir, hfields=False):
             elif entry_type == rs.MATCH:
                 rfam_accs = fetch_value_list(None, rs.GENOME_ACC)
 
+                if bulk is True:
+                    bulk_full_region_export(outdir, rnac_index=rnac_index)
+                    return
+
             # Family accessions
             elif entry_type == rs.FAMILY:
                 if hfields:
@@ -1037,19 +1414,18 @@ def main(entry_type, rfam_acc, outdir, hfields=False):
 
                 rfam_accs = fetch_value_list(None, rs.FAM_ACC)
 
-                for entry in rfam_accs:
-                    t0 = timeit.default_timer()
-                    xml4db_dumper(name_dict, name_object, entry_type, entry, hfields, outdir)
-                    print "Execution time: %.1fs" % (timeit.default_timer() - t0)
+                export_entries(entry_type, rfam_accs, outdir,
+                               lambda x: xml4db_dumper(name_dict, name_object, entry_type,
+                                                       x, hfields, outdir),
+                               hfields=hfields, delta=delta, previous_dir=previous_dir)
 
                 return
 
             # Don't build hierarchical references for Clans and Motifs
-            for entry in rfam_accs:
-                print entry
-                t0 = timeit.default_timer()
-                xml4db_dumper(None, None, entry_type, entry, False, outdir)
-                print "Execution time: %.1fs" % (timeit.default_timer() - t0)
+            export_entries(entry_type, rfam_accs, outdir,
+                           lambda x: xml4db_dumper(None, None, entry_type, x, False, outdir,
+                                                   rnac_index=rnac_index),
+                           delta=delta, previous_dir=previous_dir, rnac_index=rnac_index)
 
         # export single entry
         else:
@@ -1067,7 +1443,8 @@ def main(entry_type, rfam_acc, outdir, hfields=False):
                         name_dict, rfc.TAX_NODES_DUMP)
 
                 xml4db_dumper(
-                    name_dict, name_object, entry_type, rfam_acc, hfields, outdir)
+                    name_dict, name_object, entry_type, rfam_acc, hfields, outdir,
+                    rnac_index=rnac_index)
 
     except:
         traceback.print_exc()
@@ -1173,6 +1550,22 @@ def usage():
     parser.add_argument(
         "--hfields", help="include hierarchical fields", action="store_true")
 
+    parser.add_argument(
+        "--bulk", help="export the regions of all genomes in a single pass (R only)",
+        action="store_true")
+
+    parser.add_argument(
+        "--delta", help="only export entries changed since the previous run",
+        action="store_true")
+
+    parser.add_argument(
+        "--previous", help="output directory of the previous run (with --delta)",
+        type=str, default=None)
+
+    parser.add_argument(
+        "--rnac-index", help="RNAcentral mapping index of the release (R only)",
+        type=str, default=None)
+
     req_args.add_argument(
         "--out", help="path to output directory", type=str, required=True)
 
@@ -1210,4 +1603,25 @@ if __name__ == '__main__':
         parser.print_help()
         sys.exit()
 
-    main(args.type, args.acc, args.out, hfields=args.hfields)
+    if args.bulk is True and (args.type != 'R' or args.acc is not None):
+        print "\n--bulk exports all regions and requires --type R without --acc.\n"
+        parser.print_help()
+        sys.exit()
+
+    if args.delta is True and (args.bulk is True or args.acc is not None):
+        print "\n--delta exports all entries of a type and can't be used with --acc or --bulk.\n"
+        parser.print_help()
+        sys.exit()
+
+    if args.previous is not None and (args.delta is False or os.path.isdir(args.previous) is False):
+        print "\n--previous requires --delta and a valid directory.\n"
+        parser.print_help()
+        sys.exit()
+
+    if args.rnac_index is not None and os.path.exists(args.rnac_index) is False:
+        print "\nPlease provide a valid RNAcentral index.\n"
+        parser.print_help()
+        sys.exit()
+
+    main(args.type, args.acc, args.out, hfields=args.hfields, bulk=args.bulk,
+         delta=args.delta, previous_dir=args.previous, rnac_index_file=args.rnac_index)
@@ -17,19 +17,155 @@ limitations under the License.
 Description: Support code designed to ease Rfam jiffies' execution.
 
 Notes: 1. Call this script as rfamprod
+       2. Jiffies run concurrently, each family in a temporary working
+          directory of its own. The files a jiffy generates are moved to
+          outdir once it exits successfully, and its output is kept in
+          outdir/logs otherwise
 """
 
 # ---------------------------------IMPORTS-------------------------------------
 
 import os
-import sys
+import time
+import shutil
+import argparse
+import tempfile
+import traceback
 import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
+# -----------------------------------------------------------------------------
+
+JIFFY_LOG = "jiffy.log"
+LOG_DIR = "logs"
+SUMMARY_FILE = "jiffy_summary.tsv"
+
+RETRIES = 1
 
 # -----------------------------------------------------------------------------
 
 
-def call_jiffy(jiffy, fam_file, outdir=None):
+def load_family_accessions(fam_file=None):
+    """
+    Loads the Rfam family accessions to run a jiffy on
+
+    fam_file: A file with one Rfam family accession per line. If None, all
+    family accessions are fetched from the database
+
+    return: A list of Rfam family accessions
+    """
+
+    if fam_file is not None:
+        fp = open(os.path.abspath(fam_file), 'r')
+        rfam_accs = [x.strip() for x in fp if x.strip() != '']
+        fp.close()
+
+        return rfam_accs
+
+    # only needed when loading the accessions from the database
+    from utils import RfamDB
+
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=True)
+
+    cursor.execute("SELECT rfam_acc FROM family ORDER BY rfam_acc")
+    rfam_accs = [str(x[0]) for x in cursor]
+
+    cursor.close()
+    RfamDB.disconnect(cnx)
+
+    return rfam_accs
+
+# -----------------------------------------------------------------------------
+
+
+def run_jiffy(jiffy, rfam_acc, outdir):
+    """
+    Runs a jiffy on a single family in a temporary working directory,
+    which is deleted when done. Errors running the jiffy or moving its
+    files are written to the family's log with exit status -1
+
+    jiffy:  The path to the perl script to call
+    rfam_acc: A valid Rfam family accession
+    outdir: Destination directory where the files will be generated
+
+    return: A tuple (rfam_acc, exit status, elapsed time in seconds)
+    """
+
+    work_dir = None
+    log_file = None
+    status = -1
+
+    start = time.time()
+
+    try:
+        work_dir = tempfile.mkdtemp(prefix=rfam_acc + '_', dir=outdir)
+        log_file = os.path.join(work_dir, JIFFY_LOG)
+
+        log_fp = open(log_file, 'w')
+        status = subprocess.call("%s %s" % (jiffy, rfam_acc), shell=True, cwd=work_dir,
+                                 stdout=log_fp, stderr=subprocess.STDOUT)
+        log_fp.close()
+
+        if status == 0:
+            for filename in os.listdir(work_dir):
+                if filename != JIFFY_LOG:
+                    shutil.move(os.path.join(work_dir, filename),
+                                os.path.join(outdir, filename))
+
+            # drop the log of a failed earlier attempt
+            if os.path.exists(os.path.join(outdir, LOG_DIR, rfam_acc + ".log")):
+                os.remove(os.path.join(outdir, LOG_DIR, rfam_acc + ".log"))
+        else:
+            shutil.move(log_file, os.path.join(outdir, LOG_DIR, rfam_acc + ".log"))
+
+    except Exception:
+        status = -1
+
+        fp = open(os.path.join(outdir, LOG_DIR, rfam_acc + ".log"), 'w')
+
+        # keep the output of the jiffy, if any
+        if log_file is not None and os.path.exists(log_file):
+            jiffy_fp = open(log_file, 'r')
+            shutil.copyfileobj(jiffy_fp, fp)
+            jiffy_fp.close()
+
+        traceback.print_exc(file=fp)
+        fp.close()
+
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return rfam_acc, status, time.time() - start
+
+# -----------------------------------------------------------------------------
+
+
+def write_summary(summary_file, results):
+    """
+    Writes the exit status and timing of every family to a tab delimited
+    file
+
+    summary_file: The path to the summary file
+    results: A dictionary of Rfam family accessions to (exit status,
+    elapsed time, attempts) tuples
+    """
+
+    fp = open(summary_file, 'w')
+    fp.write("rfam_acc\tstatus\tseconds\tattempts\n")
+
+    for rfam_acc in sorted(results.keys()):
+        status, elapsed, attempts = results[rfam_acc]
+        fp.write("%s\t%d\t%.2f\t%d\n" % (rfam_acc, status, elapsed, attempts))
+
+    fp.close()
+
+# -----------------------------------------------------------------------------
+
+
+def call_jiffy(jiffy, fam_file=None, outdir=None, workers=None, retries=RETRIES):
     """
     This function was designed to call the perl script defined by the jiffy
     parameter. Used in Rfam 12.1 with jiffies writeAnnotatedCM.pl,
@@ -37,39 +173,97 @@ def call_jiffy(jiffy, fam_file, outdir=None):
     and seed_Tree files for the FTP server
 
     jiffy:  The path to the perl script to call
-    fam_file:   A list of all rfam_accessions
-    outdir: Destination directory where the files will be generated
+    fam_file:   A list of all rfam_accessions. If None, all families in
+    the database are processed
+    outdir: Destination directory where the files will be generated.
+    Defaults to the current working directory
+    workers: The number of jiffies to run concurrently. Defaults to the
+    number of cpus
+    retries: The number of times a failing family is rerun
+
+    return: A list of the Rfam family accessions the jiffy failed on
     """
 
-    # TO DO
-    # convert this to load family accessions from the database
+    if outdir is None:
+        outdir = os.getcwd()
+    outdir = os.path.abspath(outdir)
 
-    if outdir is not None:
-        os.chdir(os.path.abspath(outdir))
+    if workers is None:
+        workers = multiprocessing.cpu_count()
 
-    fp = open(os.path.abspath(fam_file), 'r')
+    log_dir = os.path.join(outdir, LOG_DIR)
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
 
-    for rfam_acc in fp:
-        cmd = "%s %s" % (jiffy, rfam_acc)
-        subprocess.call(cmd, shell=True)
+    pending = load_family_accessions(fam_file)
+    results = {}
+    attempt = 0
 
-    fp.close()
+    while len(pending) > 0 and attempt <= retries:
+        attempt += 1
+
+        pool = ThreadPool(processes=max(1, min(workers, len(pending))))
+        try:
+            for rfam_acc, status, elapsed in pool.imap_unordered(
+                    lambda x: run_jiffy(jiffy, x, outdir), pending):
+                results[rfam_acc] = (status, elapsed, attempt)
+        finally:
+            pool.close()
+            pool.join()
+
+        pending = sorted([x for x in results if results[x][0] != 0])
+
+    write_summary(os.path.join(outdir, SUMMARY_FILE), results)
 
+    return pending
 
 # -----------------------------------------------------------------------------
 
 
 def usage():
-    # TO DO
-    pass
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Run an Rfam jiffy on many families at once")
+
+    parser.add_argument("jiffy", help="path to the jiffy to call (e.g. writeAnnotatedCM.pl)",
+                        type=str)
+    # the positionals of earlier versions, --fam-file and --outdir win
+    parser.add_argument("fam_file_arg", metavar="fam_file", help="same as --fam-file",
+                        type=str, nargs='?', default=None)
+    parser.add_argument("outdir_arg", metavar="outdir", help="same as --outdir",
+                        type=str, nargs='?', default=None)
+    parser.add_argument("--fam-file", help="a file of Rfam family accessions. All families in "
+                                           "the database if omitted",
+                        type=str, default=None)
+    parser.add_argument("--outdir", help="destination directory. Defaults to the current "
+                                         "working directory",
+                        type=str, default=None)
+    parser.add_argument("--workers", help="number of jiffies to run concurrently",
+                        type=int, default=None)
+    parser.add_argument("--retries", help="number of times to rerun failing families",
+                        type=int, default=RETRIES)
 
+    return parser
 
 # -----------------------------------------------------------------------------
 
 if __name__ == '__main__':
-    # need to check the number of parameters provided
-    jiffy = sys.argv[1]
-    fam_file = sys.argv[2]
-    outdir = sys.argv[3]
 
-    call_jiffy(jiffy, fam_file, outdir)
+    parser = usage()
+    args = parser.parse_args()
+
+    fam_file = args.fam_file
+    if fam_file is None:
+        fam_file = args.fam_file_arg
+
+    outdir = args.outdir
+    if outdir is None:
+        outdir = args.outdir_arg
+
+    failed = call_jiffy(args.jiffy, fam_file=fam_file, outdir=outdir,
+                        workers=args.workers, retries=args.retries)
+
+    if len(failed) > 0:
+        print "%s failed on %d families: %s" % (args.jiffy, len(failed), ', '.join(failed))
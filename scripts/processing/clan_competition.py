@@ -267,12 +267,15 @@ def compete_seq_regions(regions, log):
 # -----------------------------------------------------------------------------
 
 
-def complete_clan_seqs(sorted_clan, clan_comp_type='FULL'):
+def complete_clan_seqs(sorted_clan, clan_comp_type='FULL', changes_file=None):
     """
     Parses a sorted clan file and generates a list of regions per rfam_acc,
     which are then competed by compete_seq_regions
 
     sorted_clan: A valid path to a sorted clan file
+    changes_file: Path to a json change file where the families and genomes
+    affected by the competition are recorded for incremental statistics
+    updates (see db_utils.refresh_changed_statistics)
     """
 
     fp = open(sorted_clan, 'r')
@@ -319,11 +322,140 @@ def complete_clan_seqs(sorted_clan, clan_comp_type='FULL'):
     fp.close()
 
     # at this point update full_region table
-    if len(non_sig_regs) != 0:
-        if clan_comp_type == 'FULL':
-            db_utils.set_is_singificant_to_zero_multi(non_sig_regs)
-        else:
-            db_utils.set_pdb_is_significant_to_zero(non_sig_regs)
+    update_non_significant_regions(non_sig_regs, clan_comp_type=clan_comp_type,
+                                   changes_file=changes_file)
+
+    return non_sig_regs
+
+# -----------------------------------------------------------------------------
+
+
+def update_non_significant_regions(non_sig_regs, clan_comp_type='FULL', changes_file=None):
+    """
+    Sets the is_significant field of the regions that lost the competition
+    to zero
+
+    non_sig_regs: A list of (rfam_acc, rfamseq_acc, seq_start) tuples
+    clan_comp_type: FULL to update full_region, PDB for pdb_full_region
+    changes_file: Path to a json change file where the families and genomes
+    affected by the competition are recorded (FULL only)
+    """
+
+    if len(non_sig_regs) == 0:
+        return
+
+    if clan_comp_type == 'FULL':
+        db_utils.set_is_singificant_to_zero_multi(non_sig_regs)
+
+        if changes_file is not None:
+            rfam_accs = set([x[RFAM_ACC] for x in non_sig_regs])
+            rfamseq_accs = set([x[SEQ_ACC] for x in non_sig_regs])
+            db_utils.record_statistics_changes(
+                changes_file, rfam_accs=rfam_accs,
+                upids=db_utils.fetch_upids_by_rfamseq_accs(rfamseq_accs))
+    else:
+        db_utils.set_pdb_is_significant_to_zero(non_sig_regs)
+
+# -----------------------------------------------------------------------------
+
+
+def compete_clan_regions(clan_regions, log):
+    """
+    Competes the regions of a columnar ClanRegions store, with the rules of
+    compete_seq_regions: of two regions on the same strand of a sequence
+    overlapping by at least OVERLAP, the one with the higher E-value, or
+    the lower bit score for equal E-values, is not significant. Of two
+    regions with equal E-values and bit scores, the one that came later in
+    the input rows loses, as the later line of a clan file does in
+    compete_seq_regions. Regions of a sequence are sorted by their lowest
+    coordinate, so each region is only compared with the regions that start
+    before it ends
+
+    clan_regions: A ClanRegions object (see utils/clan_regions.py)
+    log: log file pointer for tracking regions we haven't captured
+
+    return: A list of (rfam_acc, rfamseq_acc, seq_start) tuples of the non
+    significant regions
+    """
+
+    families = clan_regions.families
+    family_ids = clan_regions.family_ids
+    starts = clan_regions.starts
+    ends = clan_regions.ends
+    evalues = clan_regions.evalues
+    bit_scores = clan_regions.bit_scores
+    row_ids = clan_regions.row_ids
+
+    non_sig_regs = []
+    non_sig_idxs = set()
+
+    for rfamseq_acc, first, last in clan_regions.iterate_sequences():
+        for idx1 in xrange(first, last - 1):
+            s1 = starts[idx1]
+            e1 = ends[idx1]
+            strand1 = get_strand(s1, e1)
+            max1 = max(s1, e1)
+
+            for idx2 in xrange(idx1 + 1, last):
+                s2 = starts[idx2]
+                e2 = ends[idx2]
+
+                # the remaining regions start after this one ends
+                if min(s2, e2) > max1:
+                    break
+
+                if get_strand(s2, e2) != strand1:
+                    continue
+
+                overlap = calc_seq_overlap(s1, e1, s2, e2)
+
+                if overlap is None:
+                    log.debug("reg1: %s" % '\t'.join(map(str, clan_regions.region(idx1))))
+                    log.debug("reg2: %s" % '\t'.join(map(str, clan_regions.region(idx2))))
+                    continue
+
+                if overlap < OVERLAP:
+                    continue
+
+                if evalues[idx1] != evalues[idx2]:
+                    loser = idx2 if evalues[idx1] < evalues[idx2] else idx1
+                elif bit_scores[idx1] != bit_scores[idx2]:
+                    loser = idx2 if bit_scores[idx1] > bit_scores[idx2] else idx1
+                # exact ties go against the later input row, not coordinate
+                else:
+                    loser = idx2 if row_ids[idx1] < row_ids[idx2] else idx1
+
+                if loser not in non_sig_idxs:
+                    non_sig_idxs.add(loser)
+                    non_sig_regs.append((families[family_ids[loser]], rfamseq_acc,
+                                         starts[loser]))
+
+    return non_sig_regs
+
+# -----------------------------------------------------------------------------
+
+
+def compete_clan_from_db(clan_acc, changes_file=None):
+    """
+    Loads the full_region hits of a clan from the database in columnar form
+    (db_utils.load_clan_regions_from_db), competes them and updates the
+    full_region table, without a sorted clan file
+
+    clan_acc: Clan accession as in Rfam
+    changes_file: Path to a json change file where the families and genomes
+    affected by the competition are recorded
+
+    return: A list of the non significant regions
+    """
+
+    logging.basicConfig(
+        filename="missed_overlaps.log", filemode='w', level=logging.DEBUG)
+
+    clan_regions = db_utils.load_clan_regions_from_db(clan_acc)
+    non_sig_regs = compete_clan_regions(clan_regions, logging)
+
+    update_non_significant_regions(non_sig_regs, clan_comp_type='FULL',
+                                   changes_file=changes_file)
 
     return non_sig_regs
 
@@ -337,13 +469,15 @@ def usage():
 
     print "\nUsage:\n------"
 
-    print "\nclan_competition.py [clan_file|clan_dir] [-r] [PDB|FULL]"
+    print "\nclan_competition.py [clan_file|clan_dir|clan_acc] [-r] [PDB|FULL] [-c changes_file]"
 
     print "\nclan_dir: A directory of sorted clan region files"
     print "clan_file: The path to a sorted clan region file"
+    print "clan_acc: A clan accession to compete full regions loaded from the database"
     print "\n-r option to reset is_significant field"
     print "\nPDB option for pdb clan competition"
     print "\nFULL option for full region clan competition"
+    print "\n-c option to record affected families and genomes in a json file"
 
 
 # -----------------------------------------------------------------------------
@@ -356,11 +490,23 @@ if __name__ == '__main__':
     clan_source = sys.argv[1]
     #clan_competition_type = sys.argv[2]
 
+    # record touched rfam_accs/upids for incremental statistics updates
+    changes_file = None
+    if sys.argv.count("-c") == 1:
+        changes_file = sys.argv[sys.argv.index("-c") + 1]
+
+    # clan accessions are competed from the database
+    from_db = clan_source[0:2] == "CL" and not os.path.exists(clan_source)
+
     # minor input checks
-    if not os.path.isdir(clan_source) and not os.path.isfile(clan_source):
+    if not from_db and not os.path.isdir(clan_source) and not os.path.isfile(clan_source):
         usage()
         sys.exit()
 
+    if from_db and (sys.argv.count("pdb") == 1 or sys.argv.count("PDB") == 1):
+        print "\nOnly full regions can be competed from the database.\n"
+        sys.exit()
+
     # with -r option reset all is_significant fields back to 1
     if sys.argv.count("-r") == 1:
         print "\nReseting is_significant fields ..."
@@ -373,8 +519,17 @@ if __name__ == '__main__':
 
     print "\nCompeting Clans ...\n"
 
+    # compete a clan loaded from the database
+    if from_db is True:
+        non_sig_seqs = compete_clan_from_db(clan_source, changes_file=changes_file)
+
+        print "%s : %s" % (clan_source, len(non_sig_seqs))
+
+        elapsed_time = timeit.default_timer() - t_start
+        print "elapsed time: ", elapsed_time
+
     # compete multiple clans
-    if os.path.isdir(clan_source):
+    elif os.path.isdir(clan_source):
         clan_files = [x for x in os.listdir(clan_source) if x.endswith(".txt")]
 
         non_sig_seqs = None
@@ -388,7 +543,8 @@ if __name__ == '__main__':
 
             # compete full_region
             else:
-                non_sig_seqs = complete_clan_seqs(clan_file, clan_comp_type='FULL')
+                non_sig_seqs = complete_clan_seqs(clan_file, clan_comp_type='FULL',
+                                                  changes_file=changes_file)
 
             print "%s : %s" % (str(clan[0:8]), len(non_sig_seqs))
             non_sig_seqs = None
@@ -405,7 +561,8 @@ if __name__ == '__main__':
             non_sig_seqs = complete_clan_seqs(clan_file, clan_comp_type='PDB')
         # compete full_region
         else:
-            non_sig_seqs = complete_clan_seqs(clan_file, clan_comp_type='FULL')
+            non_sig_seqs = complete_clan_seqs(clan_file, clan_comp_type='FULL',
+                                              changes_file=changes_file)
 
         print "%s : %s" % (os.path.basename(clan_source).partition(".")[0],
                            len(non_sig_seqs))
@@ -15,6 +15,8 @@ limitations under the License.
 # ---------------------------------IMPORTS-------------------------------------
 
 import os
+import json
+import math
 import shutil
 import subprocess
 import sys
@@ -22,6 +24,10 @@ import sys
 from config import rfam_local as conf
 from scripts.validation import genome_search_validator as gsv
 from utils import genome_search_utils as gsu
+from utils import lsf_stats
+from utils import project_index as pi
+from utils import search_planner as sp
+from utils import search_executor as se
 
 # -----------------------------------------------------------------------------
 
@@ -42,14 +48,7 @@ MAX_JOBS = 50
 
 CREATE_SUBGROUP = "bgadd -L %s %s"
 
-SEARCH_MPI = ("bsub -q mpi-rh7 -M %s -R \"rusage[mem=%s,tmp=2000]\" -o %s -e %s -n %s -g %s -R \"span[hosts=1]\" "
-              "-f \"%s < %s\" "
-              "-f \"%s < %s\" "
-              "-f \"%s < %s\" "
-              "-f \"%s < %s\" "
-              "-Ep \"rm /tmp/%s.*\" "
-              "-a openmpi mpiexec -mca btl ^openib -np %s "
-              "%s -o %s --tblout %s --acc --cut_ga --rfam --notextw --nohmmonly -Z %s --mpi %s %s")
+SEARCH_MPI = se.SEARCH_MPI
 
 GROUP_AND_SRCH_MPI = ("bsub -q mpi-rh7 -M %s -R \"rusage[mem=%s]\" -o %s -e %s -n %s -g %s -R \"span[hosts=1]\" "
                       "-f %s < /tmp/%J.out "
@@ -59,6 +58,16 @@ GROUP_AND_SRCH_MPI = ("bsub -q mpi-rh7 -M %s -R \"rusage[mem=%s]\" -o %s -e %s -
                       "-a openmpi mpiexec -mca btl ^openib -np %s "
                       "%s -o %s --tblout %s --acc --cut_ga --rfam --notextw --nohmmonly -Z %s --mpi %s %s")
 
+# a bin-packed job of several chunks, searched one after the other by a job script
+PLANNED_SEARCH_JOB = ("bsub -M %s -R \"rusage[mem=%s]\" -n %s -R \"span[hosts=1]\" -W %s "
+                      "-o %s -e %s -g %s \"bash %s\"")
+
+PLANNED_SEARCH_CMD = ("%s --cpu %s -o %s --tblout %s --acc --cut_ga --rfam --notextw --nohmmonly "
+                      "-Z %s %s %s 2> %s")
+
+WALL_TIME_FACTOR = 2.0  # margin on estimated job wall time
+SEARCH_JOBS_DIR = "search_jobs"
+
 """
 # unfiltered
 CMD_TEMPLATE_MPI = ("bsub -q mpi-rh7 -M %s -R \"rusage[mem=%s]\" -o %s -e %s -n %s -g %s -R \"span[hosts=1]\" "
@@ -69,15 +78,21 @@ CMD_TEMPLATE_MPI = ("bsub -q mpi-rh7 -M %s -R \"rusage[mem=%s]\" -o %s -e %s -n
 
 # -------------------------------------------------------------------------
 
-def calculate_required_memory():
+def calculate_required_memory(seq_file, model_file=None):
     """
+    Estimates the memory required to search a sequence file using the
+    search cost model
 
-    :return:
+    seq_file: The path to a fasta file
+    model_file: A cost model file as generated by fit_search_cost_model.
+    The default model is used if None
+
+    return: The required memory in MB
     """
 
-    memory = 0
+    model = sp.load_cost_model(model_file)
 
-    return memory
+    return sp.estimate_memory(model, pi.count_residues(seq_file))
 
 # -------------------------------------------------------------------------
 
@@ -211,10 +226,11 @@ def genome_scan_from_download_directory(project_dir, upid_file, tool="cmsearch")
     upids = [x.strip() for x in upid_fp]
     upid_fp.close()
 
+    index = pi.ProjectIndex(project_dir)
+
     for upid in upids:
         # get updir location
-        subdir = os.path.join(project_dir, upid[-3:])
-        updir = os.path.join(subdir, upid)
+        updir = pi.get_genome_dir(project_dir, upid)
 
         # generate chunks - do this bit withing the search job in order to parallelize it.
         # if sequence chunk directory exists then don't generate it again and use that to
@@ -250,16 +266,17 @@ def genome_scan_from_download_directory(project_dir, upid_file, tool="cmsearch")
             os.mkdir(search_output_dir)
             os.chmod(search_output_dir, 0777)
 
-        # List all smaller files. Using list comprehension to filter out other contents
-        genome_chunks = [x for x in os.listdir(seq_chunks_dir) if not x.endswith('.ssi')]
+        # List all smaller files from the project index, which only lists
+        # the genome directory again if it has changed
+        index.refresh(upids=[upid])
+        genome_chunks = index.chunks(upid)
 
-        for seq_file in genome_chunks:
+        for seq_file_loc in genome_chunks:
             cmd = ''
             # index all sequence files
-            seq_file_loc = os.path.join(seq_chunks_dir, seq_file)
             gsu.index_sequence_file(seq_file_loc)
 
-            chunk_name = seq_file
+            chunk_name = os.path.basename(seq_file_loc)
             lsf_out_file = os.path.join(search_output_dir, chunk_name + ".out")
             lsf_err_file = os.path.join(search_output_dir, chunk_name + ".err")
             inf_tbl_file = os.path.join(search_output_dir, chunk_name + ".tbl")
@@ -280,25 +297,23 @@ def genome_scan_from_download_directory(project_dir, upid_file, tool="cmsearch")
 
             subprocess.call(cmd, shell=True)
 
+    index.close()
+
 # ------------------------------------------------------------------------------------------------
 
 
-def single_genome_scan_from_download_directory(updir, upid, tool="cmsearch"):
+def prepare_genome_chunks(updir, upid):
     """
-    Search all genomes from within their
-    updir: The path to a genome directory generated by genome_downloader. The
-    download directory should be in the
+    Splits the sequence file of a genome into indexed chunks under
+    updir/search_chunks, unless this has already been done. Small genomes
+    are copied as a single chunk, for all inputs to be consistent
+
+    updir: The path to a genome directory generated by genome_downloader
     upid: A valid upid of the genome to be searched
-    tool: Infernal's search method used for genome annotation (cmsearch, cmscan). Defaults to
-    cmsearch
 
-    return: void
+    return: The path to the chunks directory
     """
 
-    # generate chunks - do this bit withing the search job in order to parallelize it.
-    # if sequence chunk directory exists then don't generate it again and use that to
-    # re-launch the searches
-
     upid_fasta = os.path.join(updir, upid + '.fa')
     seq_chunks_dir = os.path.join(updir, "search_chunks")
 
@@ -319,8 +334,6 @@ def single_genome_scan_from_download_directory(updir, upid, tool="cmsearch"):
                 cmd = "%s --index %s" % (conf.ESL_SFETCH, seq_file_loc)
                 subprocess.call(cmd, shell=True)
 
-        # For all inputs to be consistent, if the sequence file is small,
-        # copy it in the search_chunks directory
         else:
             # copy file
             shutil.copyfile(upid_fasta, os.path.join(seq_chunks_dir, upid + '.fa'))
@@ -328,6 +341,27 @@ def single_genome_scan_from_download_directory(updir, upid, tool="cmsearch"):
             cmd = "%s --index %s" % (conf.ESL_SFETCH, os.path.join(seq_chunks_dir, upid + '.fa'))
             subprocess.call(cmd, shell=True)
 
+    return seq_chunks_dir
+
+# ------------------------------------------------------------------------------------------------
+
+
+def build_genome_search_jobs(updir, upid, tool="cmsearch", cpus=CPU_NO, memory=SRCH_MEM):
+    """
+    Builds a search job for every sequence chunk of a genome, writing the
+    outputs in updir/search_output
+
+    updir: The path to a genome directory generated by genome_downloader
+    upid: A valid upid of the genome to be searched
+    tool: Infernal's search method used for genome annotation (cmsearch, cmscan)
+    cpus: Number of CPUs of every job
+    memory: Memory of every job in MB
+
+    return: A list of search job dictionaries (see utils/search_executor.py)
+    """
+
+    seq_chunks_dir = prepare_genome_chunks(updir, upid)
+
     # Create a search directory
     search_output_dir = os.path.join(updir, "search_output")
 
@@ -339,40 +373,48 @@ def single_genome_scan_from_download_directory(updir, upid, tool="cmsearch"):
     genome_chunks = [x for x in os.listdir(seq_chunks_dir) if not x.endswith('.ssi')]
 
     # check and set search method selected
-
     search_method = None
     if tool == 'cmsearch':
         search_method = conf.CMSEARCH
     else:
         search_method = conf.CMSCAN
 
+    jobs = []
     for seq_file in genome_chunks:
-        cmd = ''
-        # index all sequence files
-        seq_file_loc = os.path.join(seq_chunks_dir, seq_file)
-
-        chunk_name = seq_file
-        lsf_out_file = os.path.join(search_output_dir, chunk_name + ".out")
-        lsf_err_file = os.path.join(search_output_dir, chunk_name + ".err")
-        inf_tbl_file = os.path.join(search_output_dir, chunk_name + ".tbl")
-        inf_out_file = os.path.join(search_output_dir, chunk_name + ".inf")
-
-        tmp_out_file = os.path.join("/tmp", chunk_name + ".out")
-        tmp_err_file = os.path.join("/tmp", chunk_name + ".err")
-        tmp_tbl_file = os.path.join("/tmp", chunk_name + ".tbl")
-        tmp_inf_file = os.path.join("/tmp", chunk_name + ".inf")
-
-        cmd = SEARCH_MPI % (SRCH_MEM, SRCH_MEM, tmp_out_file, tmp_err_file,
-                            CPU_NO, RFAM_SRCH_GROUP,
-                            lsf_out_file, tmp_out_file,
-                            lsf_err_file, tmp_err_file,
-                            inf_tbl_file, tmp_tbl_file,
-                            inf_out_file, tmp_inf_file, chunk_name,
-                            CPU_NO, search_method, tmp_inf_file,
-                            tmp_tbl_file, RFAMSEQ_SIZE,
-                            conf.CMFILE, seq_file_loc)
-
-        subprocess.call(cmd, shell=True)
+        jobs.append({"name": seq_file, "binary": search_method, "cm_file": conf.CMFILE,
+                     "seq_file": os.path.join(seq_chunks_dir, seq_file),
+                     "dest_dir": search_output_dir, "dbsize": RFAMSEQ_SIZE,
+                     "cpus": cpus, "memory": memory})
+
+    return jobs
+
+# ------------------------------------------------------------------------------------------------
+
+
+def single_genome_scan_from_download_directory(updir, upid, tool="cmsearch", executor=None):
+    """
+    Search all genomes from within their
+    updir: The path to a genome directory generated by genome_downloader. The
+    download directory should be in the
+    upid: A valid upid of the genome to be searched
+    tool: Infernal's search method used for genome annotation (cmsearch, cmscan). Defaults to
+    cmsearch
+    executor: An executor from utils/search_executor.py running the chunk
+    searches. Defaults to submitting every chunk to LSF
+
+    return: The results of the executor
+    """
+
+    # generate chunks - do this bit withing the search job in order to parallelize it.
+    # if sequence chunk directory exists then don't generate it again and use that to
+    # re-launch the searches
+
+    if executor is None:
+        executor = se.LSFExecutor(group=RFAM_SRCH_GROUP)
+
+    jobs = build_genome_search_jobs(updir, upid, tool=tool)
+
+    return executor.run(jobs)
 
 # ------------------------------------------------------------------------------------------------
 
@@ -473,79 +515,259 @@ def restore_jobs_with_multi_cms(cm_dir, input_dir, output_dir):
 # -------------------------------------------------------------------------
 
 
-def multi_cm_sequence_scan(cm_dir, sequence_dir, tool="cmsearch", seqdb_size=None, dest_dir=None):
+def build_multi_cm_search_jobs(cm_dir, sequence_dir, tool="cmsearch", seqdb_size=None,
+                               dest_dir=None, cpus=CPU_NO, memory=SRCH_MEM):
     """
-    This function treats each covariance model individually and launches
-    a job for each sequence file found in sequence_dir.
+    Builds a search job for every covariance model and sequence file pair.
+    If cm_dir has a CM group manifest written by support/group_cms.py, the
+    CM files it lists are used, otherwise all .cm/.CM files in cm_dir
 
     cm_dir: A directory with all CM models to scan
     sequence_dir: A directory with fasta sequence files to scan
-    dest_dir: The path to the destination directory
-
-    return: void
+    tool: Infernal's search method (cmsearch, cmscan)
+    seqdb_size: The database size in Mb. Defaults to the size of Rfamseq
+    dest_dir: The path to the destination directory. Every model gets a
+    result directory of its own
+    cpus: Number of CPUs of every job
+    memory: Memory of every job in MB
+
+    return: A list of search job dictionaries
     """
 
-    # list all covariance models and sequence files
-    cms = [x for x in os.listdir(cm_dir)
-           if x.endswith('.CM') or x.endswith('.cm')]
+    manifest_file = os.path.join(cm_dir, sp.CM_GROUP_MANIFEST)
+    if os.path.exists(manifest_file):
+        cms = [str(x["cm_file"]) for x in sp.load_cm_groups(manifest_file)]
+    else:
+        cms = [x for x in os.listdir(cm_dir)
+               if x.endswith('.CM') or x.endswith('.cm')]
+
     seq_files = [x for x in os.listdir(sequence_dir)
                  if not x.endswith('.ssi')]
 
-    # create the destination directory if necessary
-    if dest_dir is not None:
-        if not os.path.exists(dest_dir):
-            os.mkdir(dest_dir)
-
     # sequence db size is None set to Rfamseq size
     if seqdb_size is None:
         seqdb_size = RFAMSEQ_SIZE
 
-    search_method = ''
-    if tool == 'cmsearch':
-        search_method = conf.CMSEARCH
-    else:
+    search_method = conf.CMSEARCH
+    if tool != 'cmsearch':
         search_method = conf.CMSCAN
 
-    # now launch the searches
+    jobs = []
     for cm in cms:
-        # create an individual result directory per model
-        rfam_acc = cm.partition('.')[0]
-        family_dir = os.path.join(dest_dir, rfam_acc)
+        # an individual result directory per model
+        family_dir = os.path.join(dest_dir, cm.partition('.')[0])
+
+        for seq_file in seq_files:
+            jobs.append({"name": seq_file.partition('.')[0], "binary": search_method,
+                         "cm_file": os.path.join(cm_dir, cm),
+                         "seq_file": os.path.join(sequence_dir, seq_file),
+                         "dest_dir": family_dir, "dbsize": seqdb_size,
+                         "cpus": cpus, "memory": memory})
+
+    return jobs
+
+# -------------------------------------------------------------------------
 
-        cm_path = os.path.join(cm_dir, cm)
 
+def multi_cm_sequence_scan(cm_dir, sequence_dir, tool="cmsearch", seqdb_size=None, dest_dir=None,
+                           executor=None):
+    """
+    This function treats each covariance model individually and launches
+    a job for each sequence file found in sequence_dir. By default the jobs
+    of every model are submitted to LSF as a single job array rather than
+    one bsub per job, and every job stages its outputs in a scratch
+    directory of its own
+
+    cm_dir: A directory with all CM models to scan
+    sequence_dir: A directory with fasta sequence files to scan
+    dest_dir: The path to the destination directory
+    executor: An executor from utils/search_executor.py running the searches.
+    Defaults to LSF job arrays with task files in dest_dir/search_tasks
+
+    return: The results of the executor
+    """
+
+    # create the destination directory if necessary
+    if not os.path.exists(dest_dir):
+        os.mkdir(dest_dir)
+
+    if executor is None:
+        executor = se.LSFArrayExecutor(os.path.join(dest_dir, "search_tasks"),
+                                       group=RFAM_SRCH_GROUP)
+
+    jobs = build_multi_cm_search_jobs(cm_dir, sequence_dir, tool=tool, seqdb_size=seqdb_size,
+                                      dest_dir=dest_dir)
+
+    # create the result directory of every model before any job runs
+    for family_dir in set([x["dest_dir"] for x in jobs]):
         if not os.path.exists(family_dir):
             os.mkdir(family_dir)
 
-        for seq_file in seq_files:
-            seq_file_path = os.path.join(sequence_dir, seq_file)
-
-            filename = ''
-            if seq_file.find(".") != -1:
-                filename = seq_file.partition('.')[0]
-
-            lsf_out_file = os.path.join(family_dir, filename + ".out")
-            lsf_err_file = os.path.join(family_dir, filename + ".err")
-            inf_tbl_file = os.path.join(family_dir, filename + ".tbl")
-            inf_out_file = os.path.join(family_dir, filename + ".inf")
-
-            tmp_out_file = os.path.join("/tmp", filename + ".out")
-            tmp_err_file = os.path.join("/tmp", filename + ".err")
-            tmp_tbl_file = os.path.join("/tmp", filename + ".tbl")
-            tmp_inf_file = os.path.join("/tmp", filename + ".inf")
-
-            cmd = SEARCH_MPI % (SRCH_MEM, SRCH_MEM, tmp_out_file, tmp_err_file,
-                                CPU_NO, RFAM_SRCH_GROUP,
-                                lsf_out_file, tmp_out_file,
-                                lsf_err_file, tmp_err_file,
-                                inf_tbl_file, tmp_tbl_file,
-                                inf_out_file, tmp_inf_file, filename,
-                                CPU_NO, search_method, tmp_inf_file,
-                                tmp_tbl_file, seqdb_size,
-                                cm_path, seq_file_path)
+    return executor.run(jobs)
+
+
+# -------------------------------------------------------------------------
+
+
+def fit_search_cost_model(project_dir, model_file, cm_file=None, perf_db_file=None,
+                          tool="cmsearch"):
+    """
+    Fits the search cost model on the LSF statistics of past searches of a
+    genome download project, both single chunk jobs (search_output/<chunk>.out)
+    and planned jobs listed in search_jobs/plan.json, along with any jobs
+    harvested into a performance database by utils/lsf_stats.py. Residues are
+    single strand counts throughout
+
+    project_dir: The path to a project directory as generated by genome_downloader
+    model_file: The path to the json file to write the model to
+    cm_file: The CM file the searches were run with. Defaults to conf.CMFILE
+    perf_db_file: The path to a performance database of past runs. Jobs of
+    the project already in the database are only counted once
+    tool: The search tool whose jobs are used from the performance database
+
+    return: The cost model dictionary
+    """
+
+    if cm_file is None:
+        cm_file = conf.CMFILE
+
+    total_clen = sp.get_cm_stats(cm_file)[1]
+    samples = []
+
+    # one LSF job per chunk
+    index = pi.load_project_index(project_dir)
+    for upid in index.upids(search_status=pi.DONE):
+        search_output_dir = os.path.join(index.genome_dir(upid), "search_output")
+
+        for chunk_file in index.chunks(upid):
+            lsf_out_file = os.path.join(search_output_dir,
+                                        os.path.basename(chunk_file) + ".out")
+            if not os.path.exists(lsf_out_file):
+                continue
+
+            stats = gsu.extract_job_stats(lsf_out_file).values()[0]
+            stats["path"] = lsf_out_file
+            stats["residues"] = pi.count_residues(chunk_file)
+            stats["total_clen"] = total_clen
+            samples.append(stats)
+    index.close()
+
+    # bin-packed jobs
+    plan_file = os.path.join(project_dir, SEARCH_JOBS_DIR, "plan.json")
+    if os.path.exists(plan_file):
+        fp = open(plan_file, 'r')
+        plan = json.load(fp)
+        fp.close()
+
+        for job in plan["jobs"]:
+            if not os.path.exists(job["lsf_out_file"]):
+                continue
+
+            stats = gsu.extract_job_stats(job["lsf_out_file"]).values()[0]
+            stats["path"] = job["lsf_out_file"]
+            stats["residues"] = job["residues"]
+            stats["total_clen"] = plan["total_clen"]
+            samples.append(stats)
+
+    if perf_db_file is not None:
+        project_reports = set([os.path.abspath(x["path"]) for x in samples])
+
+        perf_db = lsf_stats.PerformanceDB(perf_db_file)
+        samples.extend([x for x in perf_db.samples(tool=tool)
+                        if x["path"] not in project_reports])
+        perf_db.close()
+
+    model = sp.fit_cost_model(samples)
+    sp.save_cost_model(model, model_file)
+
+    return model
 
+# -------------------------------------------------------------------------
+
+
+def planned_scan_from_download_directory(project_dir, upids, tool="cmsearch", model_file=None,
+                                         cpus=CPU_NO, job_hours=None, dry_run=False):
+    """
+    Searches the sequence chunks of a list of genomes with jobs of even
+    estimated run time, rather than one job per chunk with fixed resources.
+    Chunk residues and the CM file size are used to estimate the cost of
+    each chunk with the search cost model, and chunks are bin-packed into
+    jobs whose memory and wall time limits are set from the estimates.
+    Chunks must already exist in each genome's search_chunks directory
+    (see support/split_genomes.py), and the outputs are written to
+    search_output as with genome_scan_from_download_directory
+
+    project_dir: The path to a project directory as generated by genome_downloader
+    upids: A list of upids to search
+    tool: Infernal's search method used for genome annotation (cmsearch, cmscan)
+    model_file: A cost model file as generated by fit_search_cost_model
+    cpus: Number of CPUs per job
+    job_hours: Target wall time per job in hours
+    dry_run: If True, write the job scripts and plan without submitting
+
+    return: The list of planned jobs
+    """
+
+    search_method = conf.CMSEARCH
+    if tool != 'cmsearch':
+        search_method = conf.CMSCAN
+
+    model = sp.load_cost_model(model_file)
+    total_clen = sp.get_cm_stats(conf.CMFILE)[1]
+
+    index = pi.load_project_index(project_dir, upids=upids)
+
+    chunks = []
+    for upid in upids:
+        search_output_dir = os.path.join(index.genome_dir(upid), "search_output")
+        if not os.path.exists(search_output_dir):
+            os.mkdir(search_output_dir)
+            os.chmod(search_output_dir, 0777)
+
+        for chunk_file in index.chunks(upid):
+            chunks.append((chunk_file, pi.count_residues(chunk_file)))
+    index.close()
+
+    jobs = sp.plan_search_jobs(chunks, model, total_clen, cpus=cpus, job_hours=job_hours)
+
+    jobs_dir = os.path.join(project_dir, SEARCH_JOBS_DIR)
+    if not os.path.exists(jobs_dir):
+        os.mkdir(jobs_dir)
+        os.chmod(jobs_dir, 0777)
+
+    for job_idx, job in enumerate(jobs):
+        job_name = "job_%05d" % job_idx
+        job_script = os.path.join(jobs_dir, job_name + ".sh")
+        job["lsf_out_file"] = os.path.join(jobs_dir, job_name + ".out")
+        job["lsf_err_file"] = os.path.join(jobs_dir, job_name + ".err")
+
+        fp = open(job_script, 'w')
+        fp.write("#!/bin/bash\n")
+        for chunk_file in job["chunks"]:
+            chunk_name = os.path.basename(chunk_file)
+            search_output_dir = os.path.join(os.path.dirname(os.path.dirname(chunk_file)),
+                                             "search_output")
+            out_prefix = os.path.join(search_output_dir, chunk_name)
+
+            fp.write(PLANNED_SEARCH_CMD % (search_method, cpus, out_prefix + ".inf",
+                                           out_prefix + ".tbl", RFAMSEQ_SIZE,
+                                           conf.CMFILE, chunk_file, out_prefix + ".err") + '\n')
+        fp.close()
+
+        wall_minutes = max(60, int(math.ceil(job["wall_time"] * WALL_TIME_FACTOR / 60.0)))
+
+        cmd = PLANNED_SEARCH_JOB % (job["memory"], job["memory"], cpus, wall_minutes,
+                                    job["lsf_out_file"], job["lsf_err_file"],
+                                    RFAM_SRCH_GROUP, job_script)
+
+        if dry_run is False:
             subprocess.call(cmd, shell=True)
 
+    fp = open(os.path.join(jobs_dir, "plan.json"), 'w')
+    json.dump({"total_clen": total_clen, "model": model, "jobs": jobs}, fp, indent=2)
+    fp.close()
+
+    return jobs
 
 # -------------------------------------------------------------------------
 
@@ -571,8 +793,38 @@ if __name__ == '__main__':
         sequence_dir = sys.argv[2]
         dest_dir = sys.argv[3]
 
+        # run the searches on this machine instead of LSF
+        executor = None
+        if '--local' in sys.argv:
+            executor = se.LocalExecutor()
+
         multi_cm_sequence_scan(cm_dir, sequence_dir, tool="cmsearch",
-                             seqdb_size=None, dest_dir=dest_dir)
+                               seqdb_size=None, dest_dir=dest_dir, executor=executor)
+
+    elif '--plan' in sys.argv:
+        project_dir = sys.argv[1]
+        upid_fp = open(sys.argv[2], 'r')
+        upids = [x.strip() for x in upid_fp if x.strip() != '']
+        upid_fp.close()
+
+        # a cost model file fitted on a previous run with --fit
+        model_file = None
+        if len(sys.argv) > 4:
+            model_file = sys.argv[3]
+
+        planned_scan_from_download_directory(project_dir, upids, tool="cmsearch",
+                                             model_file=model_file)
+
+    elif '--fit' in sys.argv:
+        project_dir = sys.argv[1]
+        model_file = sys.argv[2]
+
+        # a performance database harvested with utils/lsf_stats.py
+        perf_db_file = None
+        if len(sys.argv) > 4:
+            perf_db_file = sys.argv[3]
+
+        fit_search_cost_model(project_dir, model_file, perf_db_file=perf_db_file)
 
     elif '--project' in sys.argv:
         project_dir = sys.argv[1]
@@ -586,15 +838,13 @@ if __name__ == '__main__':
             upid_fp.close()
 
             for upid in upids:
-                suffix = upid[-3:]
-                updir = os.path.join(os.path.join(project_dir, suffix), upid)
+                updir = pi.get_genome_dir(project_dir, upid)
                 single_genome_scan_from_download_directory(updir, upid, tool="cmsearch")
 
         # single upid
         else:
             upid = upid_input
-            suffix = upid_input[-3:]
-            updir = os.path.join(os.path.join(project_dir, suffix), upid)
+            updir = pi.get_genome_dir(project_dir, upid)
             single_genome_scan_from_download_directory(updir, upid, tool="cmsearch")
 
     else:
@@ -2,6 +2,8 @@ import os
 import sys
 import subprocess
 
+from utils import db_utils
+
 # -----------------------------------------------------------------
 
 MEMORY = 6000
@@ -42,7 +44,59 @@ def get_threshold_from_DESC(desc_file):
 
 # -----------------------------------------------------------------
 
-def main(family_dir, multi=False):
+def get_accession_from_DESC(desc_file):
+
+    """
+    Parses a family DESC file and returns the family accession
+
+    desc_file: The path to a valid Rfam family DESC file
+
+    return: The family accession (RFXXXXX) or None if the family
+    has not been assigned one yet
+    """
+
+    rfam_acc = None
+    desc_fp = open(desc_file, 'r')
+
+    for line in desc_fp:
+        if line[0:2] == 'AC':
+            rfam_acc = line.strip().split(' ')[-1]
+            break
+
+    desc_fp.close()
+
+    return rfam_acc
+
+# -----------------------------------------------------------------
+
+def record_family_changes(desc_files, changes_file):
+    """
+    Records the families being re-thresholded, along with the genomes
+    currently hit by them, in a json change file so that only their
+    statistics need refreshing once the new thresholds are loaded
+    (see db_utils.refresh_changed_statistics)
+
+    desc_files: A list of family DESC file paths
+    changes_file: Path to a json change file
+
+    return: None
+    """
+
+    rfam_accs = []
+    for desc_file in desc_files:
+        rfam_acc = get_accession_from_DESC(desc_file)
+        if rfam_acc is not None:
+            rfam_accs.append(rfam_acc)
+
+    # snapshot genomes hit before the load, as some may lose all their hits
+    upids = db_utils.fetch_upids_by_rfam_accs(rfam_accs)
+
+    db_utils.record_statistics_changes(changes_file, rfam_accs=rfam_accs,
+                                       upids=upids)
+
+# -----------------------------------------------------------------
+
+def main(family_dir, multi=False, changes_file=None):
     """
     Launches LSF jobs to re-threshold Rfam families
 
@@ -51,6 +105,9 @@ def main(family_dir, multi=False):
 
     multi: A boolean variable specifying a single on multi-launch
 
+    changes_file: Path to a json file where the re-thresholded families
+    are recorded for incremental statistics updates
+
     return: None
     """
 
@@ -58,6 +115,9 @@ def main(family_dir, multi=False):
         desc_loc = os.path.join(family_dir, "DESC")
         threshold = get_threshold_from_DESC(desc_loc)
 
+        if changes_file is not None:
+            record_family_changes([desc_loc], changes_file)
+
         cmd = CMD % (MEMORY, GROUP, family_dir, threshold, os.path.basename(family_dir))
 
         os.chdir(family_dir)
@@ -66,6 +126,10 @@ def main(family_dir, multi=False):
     else:
         family_sub_dirs = os.listdir(family_dir)
 
+        if changes_file is not None:
+            record_family_changes([os.path.join(family_dir, x, "DESC")
+                                   for x in family_sub_dirs], changes_file)
+
         for subdir in family_sub_dirs:
             subdir_loc = os.path.join(family_dir, subdir)
             desc_loc = os.path.join(subdir_loc, "DESC")
@@ -84,10 +148,16 @@ if __name__ == '__main__':
 
     family_dir = sys.argv[1]
 
+    # optional json file to record touched families for statistics updates
+    changes_file = None
+    if '-c' in sys.argv:
+        changes_file = sys.argv[sys.argv.index('-c') + 1]
+        sys.argv = sys.argv[:sys.argv.index('-c')] + sys.argv[sys.argv.index('-c') + 2:]
+
     if len(sys.argv) == 3:
         if '-m' in sys.argv:
-            main(family_dir, multi=True)
+            main(family_dir, multi=True, changes_file=changes_file)
         else:
             print "\nSecond parameter is wrong!\n"
     else:
-        main(family_dir, multi=False)
+        main(family_dir, multi=False, changes_file=changes_file)
@@ -5,6 +5,7 @@ import subprocess
 import json
 
 from config import rfam_config as rc
+from utils import project_index as pi
 
 # --------------------------------------------------------------------------------------------
 
@@ -304,20 +305,25 @@ def generate_new_genome_browser_hub_directories(genome_id_file, release_version,
     # generate hub_description.html file
     generate_hub_description_html_file(release_version, new_gbh_dir)
 
+    # tbl files are looked up in the project index
+    index = pi.load_project_index(genome_project_dir, upids=accession_mapings.keys())
+
     # change to bed_files dir
     os.chdir(bed_files_dir)
     # now generate genome directories, bigbed and trackDB files
     for genome in accession_mapings.keys():
+        tbl_file_path = index.find_file(genome, genome + '.tbl', kind="genome")
+
+        if tbl_file_path is None:
+            print "%s\tMissing tbl file" % genome
+            continue
+
         # replace spaces in species name with underscores
         # to be used as the genome directory name. If very long replace with common name
         genome_name = accession_mapings[genome]["species_name"].replace(' ', '_')
         genome_dir = os.path.join(new_gbh_dir, genome_name)
         os.mkdir(genome_dir)
 
-        tbl_file_path = os.path.join(os.path.join(os.path.join(genome_project_dir,
-                                                               genome[-3:]), genome),
-                                     genome+'.tbl')
-
         genome_bed_dir = os.path.join(bed_files_dir, genome)
         os.mkdir(genome_bed_dir)
 
@@ -332,6 +338,8 @@ def generate_new_genome_browser_hub_directories(genome_id_file, release_version,
 
         generate_trackdb_file(genome_name, release_version, genome_dir)
 
+    index.close()
+
     print "Done!"
 
 # --------------------------------------------------------------------------------------------
@@ -1,19 +1,38 @@
 import os
-import sys
+import argparse
 import subprocess
 
 from config import gen_config as gc
 from config import rfam_local as rl
+from scripts.export.genomes import download_genome as dg
+from utils import download_queue as dq
+from utils import http_client
 
 # ----------------------------------------------------------------------
 
 
-def launch_genome_download(project_dir, upid_list):
+def load_upid_list(upid_list):
+    """
+    Loads a list of Uniprot proteome accessions, one per line
+
+    upid_list: The path to a file of upids
+
+    return: A list of upids
+    """
 
     fp = open(upid_list, 'r')
-    upids = [x.strip() for x in fp]
+    upids = [x.strip() for x in fp if x.strip() != '']
     fp.close()
 
+    return upids
+
+# ----------------------------------------------------------------------
+
+
+def launch_genome_download(project_dir, upid_list):
+
+    upids = load_upid_list(upid_list)
+
     if not os.path.exists(project_dir):
         os.mkdir(project_dir)
         os.chmod(project_dir, 0777)
@@ -52,9 +71,101 @@ def launch_genome_download(project_dir, upid_list):
 
 # ----------------------------------------------------------------------
 
+
+def download_genomes_locally(project_dir, upid_list, workers=gc.DWL_WORKERS,
+                             genome_workers=gc.DWL_GENOME_WORKERS):
+    """
+    Downloads a list of genomes from a single process. Accessions of
+    several genomes are resolved concurrently and their files are queued
+    in a project wide state store (download_state.db), which is then worked
+    through by a single pool of download threads. Rerunning the same
+    command after a crash resumes where the previous run stopped
+
+    project_dir: The path to the project directory
+    upid_list: The path to a file of upids, one per line
+    workers: Number of concurrent file downloads across all genomes
+    genome_workers: Number of genomes whose accessions are resolved at once
+
+    return: A dictionary of upids to lists of missing accessions
+    """
+
+    upids = load_upid_list(upid_list)
+
+    if not os.path.exists(project_dir):
+        os.mkdir(project_dir)
+        os.chmod(project_dir, 0777)
+
+    store = dq.DownloadStateStore(os.path.join(project_dir, "download_state.db"))
+
+    def queue_genome(upid):
+        # a genome that cannot be queued is recorded rather than stopping
+        # every other genome of the run
+        try:
+            return dg.queue_genome_downloads(project_dir, upid, store)
+        except Exception as e:
+            store.mark_genome_failed(upid, upid, "%s: %s" % (e.__class__.__name__, str(e)))
+
+            upid_dir = os.path.join(project_dir, upid[8:], upid)
+            dg.setup_genome_directory(upid_dir)
+
+            return upid_dir
+
+    upid_dirs = http_client.map_concurrent(queue_genome, upids, workers=genome_workers)
+
+    counts = dq.run_downloads(store, workers=workers)
+
+    missing = {}
+    for upid, upid_dir in zip(upids, upid_dirs):
+        missing[upid] = dg.report_missing_accessions(upid_dir, upid, store)
+
+    genome_errors = store.genome_errors()
+    store.close()
+
+    print "Download status: %s" % ', '.join(["%s: %d" % (x, counts[x])
+                                              for x in sorted(counts.keys())])
+
+    for upid, accession, error in genome_errors:
+        print "%s: failed to fetch %s (%s)" % (upid, accession, error)
+
+    return missing
+
+# ----------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Download a list of genomes")
+
+    parser.add_argument("project_dir", help="path to the project directory", type=str)
+    parser.add_argument("upid_list", help="file listing one upid per line", type=str)
+    parser.add_argument("--local", help="download all genomes from this process "
+                                        "rather than submitting one LSF job per genome",
+                        action="store_true")
+    parser.add_argument("--workers", help="number of concurrent downloads (--local)",
+                        type=int, default=gc.DWL_WORKERS)
+    parser.add_argument("--genome-workers", help="number of genomes resolved at once (--local)",
+                        type=int, default=gc.DWL_GENOME_WORKERS)
+
+    return parser
+
+# ----------------------------------------------------------------------
+
 if __name__ == '__main__':
 
-    project_dir = sys.argv[1]
-    upid_list = sys.argv[2]
+    parser = usage()
+    args = parser.parse_args()
+
+    # serve repeated xml lookups from the persistent response cache
+    http_client.configure_cache(gc.HTTP_CACHE, ttl=gc.HTTP_CACHE_TTL,
+                                max_size=gc.HTTP_CACHE_MAX_SIZE,
+                                offline=gc.HTTP_CACHE_OFFLINE)
 
-    launch_genome_download(project_dir, upid_list)
\ No newline at end of file
+    if args.local is True:
+        download_genomes_locally(args.project_dir, args.upid_list,
+                                 workers=args.workers,
+                                 genome_workers=args.genome_workers)
+    else:
+        launch_genome_download(args.project_dir, args.upid_list)
@@ -15,12 +15,12 @@ limitations under the License.
 
 import json
 import os
-import subprocess
 import sys
 
 from config import gen_config as gc
-from config import rfam_config as rc
 from scripts.export.genomes import genome_fetch as gf
+from utils import fasta_validator as fv
+from utils import http_client
 
 # -----------------------------------------------------------------------------
 
@@ -244,51 +244,27 @@ def check_all_genome_files_exist(project_dir, upid_gca_file=None):
 
 def check_file_format(seq_file):
     """
-    Performs some sanity checks on the sequence file. Checks if file is
-    compressed and if not validates the format using esl-seqstat. It will also
-    check if the sequence file provided is empty or not
+    Performs some sanity checks on the sequence file. Plain and gzipped
+    fasta files are streamed and validated natively, which also catches
+    empty files and truncated archives. Other compressed files are checked
+    for their magic bytes and any other file for being non-empty
 
     seq_file: The path to a valid sequence file
     returns: True if file passed validation checks, False otherwise
     """
 
-    status = True
-
-    # compressed file
-    if seq_file.endswith(".gz"):
-        if not os.path.exists(seq_file):
-            return False
-        else:
-            return check_compressed_file(seq_file)
-
-    # uncompressed fasta format
-    elif seq_file.endswith(".fa"):
-
-        # check that file exists
+    if not fv.is_sequence_file(seq_file):
         if not os.path.exists(seq_file):
             return False
 
-        # check content
-        else:
-            cmd_args = [rc.ESL_SEQSTAT, '--informat', "fasta", "--dna", seq_file]
-            channel = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
-
-            # fetch esl-seqstat result
-            proc_output = channel.communicate()
-
-            # process the response
-            esl_seqstat_out = proc_output[0].split('\n')
-            # check only first line of response
-            if esl_seqstat_out[0].find("Parse failed") != -1 \
-                or esl_seqstat_out[0].find("Format") == -1:
-                return False
-
-    # check the size of the file
-    if os.path.getsize(seq_file) == 0:
-        return False
+        # other compressed formats can only be checked for their magic bytes
+        elif seq_file.endswith(".gz"):
+            return check_compressed_file(seq_file)
 
-    return status
+        # files in any other format are only checked for content
+        return os.path.getsize(seq_file) > 0
 
+    return fv.validate_sequence_file(seq_file)["status"]
 
 # -----------------------------------------------------------------------------
 
@@ -392,6 +368,11 @@ def check_luigi_worker_status(err_file):
 
 if __name__ == '__main__':
 
+    # serve repeated xml lookups from the persistent response cache
+    http_client.configure_cache(gc.HTTP_CACHE, ttl=gc.HTTP_CACHE_TTL,
+                                max_size=gc.HTTP_CACHE_MAX_SIZE,
+                                offline=gc.HTTP_CACHE_OFFLINE)
+
     project_dir = sys.argv[1]
 
     if len(sys.argv) == 2:
@@ -20,6 +20,8 @@ Genome search validation modules
 import os
 import sys
 
+from utils import project_index as pi
+
 # -----------------------------------------------------------------------------
 
 def check_genome_search_success(error_file):
@@ -44,10 +46,12 @@ def get_search_recovery_list(input_dir, recovery_file=True):
     Loops over all genome search lsf error files and outputs and list all
     genomes that crashed, so that we can restore those searches only.
     If destination directory is None then the function will return a list of
-    Uniprot's UPID accessions
+    Uniprot's UPID accessions. Genome download projects are answered by the
+    project index rather than by walking every genome directory
 
     input_dir (string): A string representing the path to a domain directory where
-    all genome search output files are located (e.g. eukaryota/UPXXXXXXXXX).
+    all genome search output files are located (e.g. eukaryota/UPXXXXXXXXX),
+    or to a project directory as generated by genome_downloader
     recovery_file (boolean): If True the function will generate a recovery file in
     input directory, otherwise it will return a list of accessions
     """
@@ -56,18 +60,26 @@ def get_search_recovery_list(input_dir, recovery_file=True):
 
     # list directory contents
     if os.path.exists(input_dir):
-        genome_dirs = [x for x in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, x))]
+        if pi.is_project_dir(input_dir):
+            index = pi.load_project_index(input_dir)
+            recovery_list = index.upids(search_status=pi.FAILED)
+            index.close()
+
+        else:
+            genome_dirs = [x for x in os.listdir(input_dir)
+                           if os.path.isdir(os.path.join(input_dir, x))]
 
-        # loop over all genome/proteome directories
-        for genome in genome_dirs:
-            genome_dir = os.path.join(input_dir, genome)
+            # loop over all genome/proteome directories
+            for genome in genome_dirs:
+                genome_dir = os.path.join(input_dir, genome)
 
-            # get lsf job status
-            exec_status = check_genome_search_success(os.path.join(genome_dir, genome+".err"))
+                # get lsf job status
+                exec_status = check_genome_search_success(os.path.join(genome_dir,
+                                                                       genome+".err"))
 
-            # if the job was unsuccessful list the upid for recovery
-            if exec_status == 0:
-                recovery_list.append(genome)
+                # if the job was unsuccessful list the upid for recovery
+                if exec_status == 0:
+                    recovery_list.append(genome)
 
         if recovery_file is True:
             fp_out = open(os.path.join(input_dir, "recovery_list.txt"), 'w')
@@ -87,15 +99,30 @@ def get_search_recovery_list(input_dir, recovery_file=True):
 def check_search_err_files(search_output_dir):
     """
     Lookup all output subdirectories and check for cases that .err files are
-    not empty
+    not empty. Genome download projects are answered by the project index,
+    which re-stats the indexed .err files instead of listing every directory
 
-    search_output_dir: search output directory as organised by genome_search
+    search_output_dir: search output directory as organised by genome_search,
+    or a project directory as generated by genome_downloader
 
     returns: A dictionary with all erroneous cases
     """
 
     search_err_cases = {}
 
+    if pi.is_project_dir(search_output_dir):
+        index = pi.load_project_index(search_output_dir)
+
+        for upid in index.upids():
+            gen_err_cases = [os.path.basename(x)[0:-4] for x in index.error_files(upid)]
+
+            if len(gen_err_cases) > 0:
+                search_err_cases.setdefault(upid[-3:], {})[upid] = gen_err_cases
+
+        index.close()
+
+        return search_err_cases
+
     output_subdirs = os.listdir(search_output_dir)
 
     for subdir in output_subdirs:
@@ -12,13 +12,13 @@ limitations under the License.
 """
 
 import os
-import sys
 import json
 import copy
-import subprocess
-
-from config import rfam_config as rc
+import argparse
+import multiprocessing
 
+from utils import fasta_validator as fv
+from utils import project_index as pi
 
 # -----------------------------------------------------------------------------------------------------------
 
@@ -99,50 +99,27 @@ def check_wgs_file_exists(wgs_accession, dest_dir):
 
 def check_file_format(seq_file):
     """
-    Performs some sanity checks on the sequence file. Checks if file is
-    compressed and if not validates the format using esl-seqstat. It will also
-    check if the sequence file provided is empty or not
+    Performs some sanity checks on the sequence file. Plain and gzipped
+    fasta files are streamed and validated natively, which also catches
+    empty files and truncated archives. Other compressed files are checked
+    for their magic bytes and any other file for being non-empty
 
     seq_file: The path to a valid sequence file
     returns: True if file passed validation checks, False otherwise
     """
 
-    status = True
-
-    # compressed file
-    if seq_file.endswith(".gz"):
+    if not fv.is_sequence_file(seq_file):
         if not os.path.exists(seq_file):
             return False
-        else:
-            return check_compressed_file(seq_file)
 
-    # uncompressed fasta format
-    elif seq_file.endswith(".fa"):
-
-        # check that file exists
-        if not os.path.exists(seq_file):
-            return False
-
-        # check content
-        else:
-            cmd_args = [rc.ESL_SEQSTAT, '--informat', "fasta", "--dna", seq_file]
-            channel = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
-
-            # fetch esl-seqstat result
-            proc_output = channel.communicate()
+        # other compressed formats can only be checked for their magic bytes
+        elif seq_file.endswith(".gz"):
+            return check_compressed_file(seq_file)
 
-            # process the response
-            esl_seqstat_out = proc_output[0].split('\n')
-            # check only first line of response
-            if esl_seqstat_out[0].find("Parse failed") != -1 \
-                or esl_seqstat_out[0].find("Format") == -1:
-                return False
+        # files in any other format are only checked for content
+        return os.path.getsize(seq_file) > 0
 
-    # check the size of the file
-    if os.path.getsize(seq_file) == 0:
-        return False
-
-    return status
+    return fv.validate_sequence_file(seq_file)["status"]
 
 # -----------------------------------------------------------------------------------------------------------
 
@@ -193,9 +170,7 @@ def validate_genome_download_project(project_dir):
     # validate all genomes in project directory
     for upid in upids:
         # 1. get updir loc
-        upid_idx = upid[-3:]
-        subdir_loc = os.path.join(project_dir, upid_idx)
-        updir_loc = os.path.join(subdir_loc, upid)
+        updir_loc = pi.get_genome_dir(project_dir, upid)
 
         # check if genome directory does not exist, print message and move to the next one
         if not os.path.exists(updir_loc):
@@ -399,10 +374,257 @@ def validate_genome_download_project(project_dir):
 
 # -----------------------------------------------------------------------------------------------------------
 
+
+def load_gca_report_accessions(gca_report_file):
+    """
+    Loads the sequence accessions listed in a GCA sequence report file
+
+    gca_report_file: The path to a GCA sequence report file
+
+    return: A set of sequence accessions without versions
+    """
+
+    fp = open(gca_report_file, 'r')
+    lines = [x.strip() for x in fp if x.strip() != '']
+    fp.close()
+
+    # skip the header
+    return set([x.split('\t')[0].partition('.')[0] for x in lines[1:]])
+
+# -----------------------------------------------------------------------------------------------------------
+
+
+def validate_genome(genome_task):
+    """
+    Validates the directory structure and all sequence files of a genome.
+    Files that have not changed since their stored validation are not read
+    again. The accessions expected are those retrieved from Uniprot plus any
+    listed in the GCA sequence report, and a restore.json with the WGS set
+    and the missing or invalid accessions is written for the genome. Runs in
+    a worker process of validate_project
+
+    genome_task: A tuple (upid, updir_loc, gca_acc, seq_files, cached) where
+    gca_acc is the GCA accession of the genome or -1, seq_files the sequence
+    files of the genome as listed in the project index and cached a
+    dictionary of the stored results of the genome's files
+
+    return: A tuple (upid, genome report, list of new file results)
+    """
+
+    upid, updir_loc, gca_acc, seq_files, cached = genome_task
+
+    report = {"status": "Success", "errors": [], "invalid_files": {},
+              "missing_accessions": [], "files": 0, "sequences": 0, "residues": 0}
+
+    if not os.path.exists(updir_loc):
+        report["status"] = "Failure"
+        report["errors"].append("Output directory is missing")
+        return upid, report, []
+
+    # only LSF downloads write download.out, local ones keep their state in
+    # the project's download_state.db
+    download_out = os.path.join(updir_loc, "download.out")
+    if os.path.exists(download_out) and not check_genome_download_status(download_out):
+        report["errors"].append("Unsuccessful download")
+
+    seq_dir_loc = os.path.join(updir_loc, "sequences")
+
+    if not os.path.exists(seq_dir_loc):
+        report["status"] = "Failure"
+        report["errors"].append("Sequences directory is missing")
+        return upid, report, []
+
+    new_results = []
+    accessions = set()
+    invalid_accessions = set()
+    multi_dir = 0
+
+    for seq_file in seq_files:
+        result = cached.get(seq_file)
+
+        if not fv.is_unchanged(seq_file, result):
+            result = fv.validate_sequence_file(seq_file)
+            new_results.append(result)
+
+        report["files"] += 1
+        report["sequences"] += result["sequences"]
+        report["residues"] += result["residues"]
+        accessions.add(os.path.basename(seq_file).partition('.')[0])
+
+        if os.path.dirname(seq_file) != seq_dir_loc:
+            multi_dir = 1
+
+        if result["status"] is False:
+            report["invalid_files"][os.path.relpath(seq_file, updir_loc)] = result["error"]
+            invalid_accessions.add(os.path.basename(seq_file).partition('.')[0])
+
+    if report["files"] == 0:
+        report["errors"].append("Empty sequence directory")
+
+    # compare sequence files against the accessions retrieved from Uniprot
+    uniprot_acc_file = os.path.join(updir_loc, upid + '_accessions.json')
+
+    if not os.path.exists(uniprot_acc_file):
+        report["errors"].append("Missing proteome_accessions file")
+
+    else:
+        fp = open(uniprot_acc_file, 'r')
+        proteome_accs = json.load(fp)
+        fp.close()
+
+        if proteome_accs["WGS"] != -1 and \
+                not check_wgs_file_exists(proteome_accs["WGS"], seq_dir_loc):
+            report["errors"].append("WGS file has not been copied")
+
+        genome_unique_accs = set(proteome_accs["OTHER"].values())
+
+        if gca_acc != -1:
+            gca_report_file = os.path.join(updir_loc, gca_acc + "_sequence_report.txt")
+
+            if os.path.exists(gca_report_file):
+                genome_unique_accs.update(load_gca_report_accessions(gca_report_file))
+
+        for accession in sorted(genome_unique_accs):
+            if accession not in accessions:
+                report["missing_accessions"].append(accession)
+
+        # accessions to download again, in the format of the legacy validation
+        accessions_to_restore = {"WGS": proteome_accs["WGS"], "MULTI": multi_dir,
+                                 "OTHER": sorted(invalid_accessions.union(
+                                     report["missing_accessions"]))}
+
+        fp = open(os.path.join(updir_loc, "restore.json"), 'w')
+        json.dump(accessions_to_restore, fp)
+        fp.close()
+
+    if len(report["errors"]) > 0 or len(report["invalid_files"]) > 0 or \
+            len(report["missing_accessions"]) > 0:
+        report["status"] = "Failure"
+
+    return upid, report, new_results
+
+# -----------------------------------------------------------------------------------------------------------
+
+
+def validate_project(project_dir, workers=None, index_file=None, report_file=None):
+    """
+    Validates all genomes of a genome download project with a pool of
+    worker processes and writes a single json report. Validation results
+    are kept in an index, so reruns only read the files that have changed
+
+    project_dir: A valid path to a genome download project directory as
+    generated by the genome_downloader pipeline
+    workers: Number of worker processes. Defaults to the number of cpus
+    index_file: The path to the validation index. Defaults to
+    validation_index.db in project_dir
+    report_file: The path to the json report. Defaults to
+    validation_report.json in project_dir
+
+    return: The report dictionary
+    """
+
+    if index_file is None:
+        index_file = os.path.join(project_dir, "validation_index.db")
+
+    if report_file is None:
+        report_file = os.path.join(project_dir, "validation_report.json")
+
+    fp = open(os.path.join(project_dir, "upid_gca_dict.json"))
+    upid_gca_dict = json.load(fp)
+    fp.close()
+
+    index = fv.ValidationIndex(index_file)
+
+    # only genomes whose directories have changed are listed again
+    project_index = pi.load_project_index(project_dir, upids=sorted(upid_gca_dict.keys()))
+
+    seq_files = {}
+    for upid in upid_gca_dict.keys():
+        seq_files[upid] = [x[0] for x in project_index.files(upid, kind="sequence")
+                           if fv.is_sequence_file(x[0])]
+
+    project_index.close()
+
+    def genome_tasks():
+        for upid in sorted(upid_gca_dict.keys()):
+            yield (upid, pi.get_genome_dir(project_dir, upid), upid_gca_dict[upid]["GCA"],
+                   seq_files[upid], index.fetch_genome(upid))
+
+    report = {"project_dir": project_dir, "genomes": {},
+              "summary": {"genomes": 0, "failed_genomes": 0, "files": 0,
+                          "invalid_files": 0, "missing_accessions": 0,
+                          "sequences": 0, "residues": 0}}
+
+    pool = multiprocessing.Pool(processes=workers)
+
+    for upid, genome_report, new_results in pool.imap_unordered(validate_genome,
+                                                                 genome_tasks()):
+        if len(new_results) > 0:
+            index.store(upid, new_results)
+
+        report["genomes"][upid] = genome_report
+
+        summary = report["summary"]
+        summary["genomes"] += 1
+        summary["files"] += genome_report["files"]
+        summary["invalid_files"] += len(genome_report["invalid_files"])
+        summary["missing_accessions"] += len(genome_report["missing_accessions"])
+        summary["sequences"] += genome_report["sequences"]
+        summary["residues"] += genome_report["residues"]
+
+        if genome_report["status"] != "Success":
+            summary["failed_genomes"] += 1
+
+    pool.close()
+    pool.join()
+
+    index.close()
+
+    fp_out = open(report_file, 'w')
+    json.dump(report, fp_out, indent=2, sort_keys=True)
+    fp_out.close()
+
+    return report
+
+# -----------------------------------------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Validate a genome download project")
+
+    parser.add_argument("project_dir", help="path to a genome download project", type=str)
+    parser.add_argument("--legacy", help="run the serial per genome validation",
+                        action="store_true")
+    parser.add_argument("--workers", help="number of worker processes",
+                        type=int, default=None)
+    parser.add_argument("--index", help="validation index file", type=str, default=None)
+    parser.add_argument("--report", help="json report file", type=str, default=None)
+
+    return parser
+
+# -----------------------------------------------------------------------------------------------------------
+
 if __name__ == '__main__':
     """
-    Usage python validate_genomes.py /path/to/project/dir > genome_validation_report.txt
+    Usage python validate_genomes.py /path/to/project/dir
+    python validate_genomes.py --legacy /path/to/project/dir > genome_validation_report.txt
     """
-    project_dir = sys.argv[1]
-    validate_genome_download_project(project_dir)
+
+    parser = usage()
+    args = parser.parse_args()
+
+    if args.legacy is True:
+        validate_genome_download_project(args.project_dir)
+
+    else:
+        report = validate_project(args.project_dir, workers=args.workers,
+                                  index_file=args.index, report_file=args.report)
+
+        print "%(genomes)d genomes, %(failed_genomes)d failed, %(invalid_files)d invalid files, " \
+              "%(missing_accessions)d missing accessions" % report["summary"]
+
 
@@ -9,26 +9,53 @@ To be used for updating all fields prior to indexing
 
 # -----------------------------------------------------------------
 
-if __name__ == '__main__':
-
+def usage():
     """
-    parser = argparse.ArgumentParser(description='Update table fields for a new release')
-    parser.add_argument('--all', action='store_const',
-                        const=sum
-                        help='Update fields for all accessions)
+    Parses arguments and displays usage information on screen
     """
 
-    # FAMILIES
-    RfamDB.set_num_full_sig_seqs()
-    RfamDB.set_number_of_species()
+    parser = argparse.ArgumentParser(
+        description='Update table fields for a new release', epilog='')
+
+    parser.add_argument(
+        "--changes", help="json change file generated by clan competition or "
+                          "rethreshold_family (-c). Only the recorded families "
+                          "and genomes are updated",
+        type=str, default=None)
+
+    parser.add_argument(
+        "--dry-run", help="print the counter deltas without updating the database",
+        action="store_true")
+
+    return parser
+
+# -----------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = usage()
+    args = parser.parse_args()
+
+    # incremental update of the touched families and genomes
+    if args.changes is not None:
+        RfamDB.refresh_changed_statistics(args.changes, dry_run=args.dry_run)
+        sys.exit()
+
+    if args.dry_run is True:
+        for delta in RfamDB.fetch_family_statistics_deltas() + \
+                RfamDB.fetch_genome_statistics_deltas():
+            print "%s\t%s\t%s -> %s" % delta
+        sys.exit()
+
+    # FAMILIES - num_full and number_of_species in a single pass
+    RfamDB.update_family_statistics()
     # truncate family_ncbi table before executing this
     RfamDB.update_family_ncbi()
 
     # GENOMES
-    RfamDB.set_number_of_distinct_families_in_genome(upid=None)
     RfamDB.set_genome_size(upid=None)
-    RfamDB.set_number_of_distinct_families_in_genome(upid=None)
-    RfamDB.set_number_of_genomic_significant_hits(upid=None)
+    # num_families and num_rfam_regions in a single pass
+    RfamDB.update_genome_statistics()
 
 
 
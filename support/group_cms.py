@@ -14,56 +14,145 @@ limitations under the License.
 # ---------------------------------IMPORTS-------------------------------------
 
 import os
-import sys
-import subprocess
-from utils import db_utils as db
+import shutil
+import argparse
+
+from utils import search_planner as sp
+
+# ----------------------------------------------------------------------------
+
+WEIGHTS = ["clen", "size"]
+COPY_BUFFER = 1048576  # bytes
+
+# ----------------------------------------------------------------------------
+
+
+def get_cm_clen(cm_file):
+    """
+    Reads the consensus length (CLEN) of a single covariance model from its
+    header, without reading the rest of the file
+
+    cm_file: The path to a single CM file
+
+    return: The CLEN of the model, or 0 if the file has no CLEN line
+    """
+
+    clen = 0
+
+    fp = open(cm_file, 'r')
+    for line in fp:
+        if line.startswith("CLEN"):
+            clen = int(line.split()[1])
+            break
+        # end of the header
+        elif line.startswith("CM"):
+            break
+    fp.close()
+
+    return clen
+
+# ----------------------------------------------------------------------------
+
+
+def get_cm_weights(cm_dir, weight="clen"):
+    """
+    Weighs every covariance model in cm_dir by its expected search cost
+
+    cm_dir: A directory with all Rfam single covariance model files
+    weight: clen to weigh models by consensus length, or size by file size
+
+    return: A list of (cm filename, CLEN, weight) tuples
+    """
+
+    cm_weights = []
+
+    for cm_file in sorted([x for x in os.listdir(cm_dir) if x.endswith('.cm')]):
+        cm_file_loc = os.path.join(cm_dir, cm_file)
+        clen = get_cm_clen(cm_file_loc)
+
+        if weight == "size":
+            cm_weights.append((cm_file, clen, os.path.getsize(cm_file_loc)))
+        else:
+            cm_weights.append((cm_file, clen, clen))
+
+    return cm_weights
 
 # ----------------------------------------------------------------------------
 
 
-def group_cms(cm_dir, no_of_cms=6, dest_dir=None):
+def group_cms(cm_dir, no_of_cms=6, dest_dir=None, weight="clen"):
     """
-    Fetch all family accessions from the database and sort in DESC order according to
-    seed size. Split the cms into multiple files defined by no_of_cms making sure that
-    we split the large families across the multiple cms
+    Split the cms into multiple files defined by no_of_cms, so that every file
+    takes about the same time to search. Models are weighed by CLEN or file
+    size and packed heaviest first into the lightest file so far, and a
+    manifest of the groups is written to dest_dir for multi_cm_sequence_scan
 
     cm_dir: A directory with all Rfam single covariance model files
     no_of_cms: The number of sub covariance model files to produce
     dest_dir: The path to the destination directory. Will use cm_dir if this parameter
     is None
-    """
+    weight: clen to weigh models by consensus length, or size by file size
 
-    rfam_accs = db.fetch_rfam_accs_sorted(order='DESC')
-
-    rfam_cms = [x for x in os.listdir(cm_dir) if x.endswith('.cm')]
+    return: A list of group dictionaries with the cm_file, models,
+    total_clen and weight of every group
+    """
 
     if dest_dir is None:
         dest_dir = cm_dir
 
-    idx = 1
-    for cm_file in rfam_cms:
-        cm_file_loc = os.path.join(cm_dir, cm_file)
+    cm_weights = get_cm_weights(cm_dir, weight=weight)
+    clens = dict([(x[0], x[1]) for x in cm_weights])
 
-        cmd = "cat %s >> %s" % (cm_file_loc, os.path.join(dest_dir, 'CM'+str(idx)))
-        subprocess.call(cmd, shell=True)
+    groups = sp.plan_cm_groups([(x[0], x[2]) for x in cm_weights], no_of_cms)
 
-        idx += 1
+    for idx, group in enumerate(groups):
+        group["cm_file"] = 'CM' + str(idx + 1)
+        group["total_clen"] = sum([clens[x] for x in group["models"]])
 
-        if idx > no_of_cms:
-            idx = 1
+        # write every group file in one pass, replacing any previous one
+        group_file = os.path.join(dest_dir, group["cm_file"])
+        out_fp = open(group_file + ".tmp", 'wb')
+        for cm_file in group["models"]:
+            cm_fp = open(os.path.join(cm_dir, cm_file), 'rb')
+            shutil.copyfileobj(cm_fp, out_fp, COPY_BUFFER)
+            cm_fp.close()
+        out_fp.close()
 
-# ----------------------------------------------------------------------------
+        os.rename(group_file + ".tmp", group_file)
 
-if __name__ == '__main__':
+    sp.save_cm_groups(os.path.join(dest_dir, sp.CM_GROUP_MANIFEST), groups)
+
+    return groups
+
+# ----------------------------------------------------------------------------
 
-    cm_dir = sys.argv[1]
 
-    group_cms(cm_dir, no_of_cms=6, dest_dir=None)
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
 
+    parser = argparse.ArgumentParser(description="Split Rfam CMs into files of even search cost")
 
+    parser.add_argument("cm_dir", help="directory with all Rfam single CM files", type=str)
+    parser.add_argument("--groups", help="number of CM files to produce", type=int, default=6)
+    parser.add_argument("--dest-dir", help="destination directory. Defaults to cm_dir",
+                        type=str, default=None)
+    parser.add_argument("--weight", help="weigh models by CLEN or file size",
+                        choices=WEIGHTS, default="clen")
 
+    return parser
 
+# ----------------------------------------------------------------------------
 
+if __name__ == '__main__':
 
+    parser = usage()
+    args = parser.parse_args()
 
+    groups = group_cms(args.cm_dir, no_of_cms=args.groups, dest_dir=args.dest_dir,
+                       weight=args.weight)
 
+    for group in groups:
+        print "%s: %d models, CLEN %d" % (group["cm_file"], len(group["models"]),
+                                          group["total_clen"])
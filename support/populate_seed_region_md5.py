@@ -1,80 +1,235 @@
-import sys
+import os
 import hashlib
-import subprocess
+import itertools
+import argparse
+import multiprocessing
 
-from config import rfam_config
 from utils import seed_region as sr
+from utils.fasta_index import FastaIndex
 
-ESL_PATH = rfam_config.ESL_PATH
+BATCH_SIZE = 5000  # seed regions hashed per worker task
+CHUNK_SIZE = 20000  # rows updated per commit checkpoint
+WINDOW_FACTOR = 2  # batches in flight per worker
+
+# per worker process sequence reader, opened by init_worker
+SEQ_INDEX = None
 
 
 # -------------------------------------------------------------------------
 
-def fetch_sequence(seq_file, seq_acc, seq_start, seq_end):
+def calculate_sequence_md5(sequence):
     """
-    Extracts a sequence from sequence file seq_file using rfamseq_acc
-    and sequence start-end positions (seq_start, seq_end)
-    seq_file: A sequence file in fasta format to extract a sequence from
-    seq_acc: The accession of the sequence to extract
-    seq_start: The starting position of the sequence/subsequence
-    seq_end: The end position of the sequence/subsequence
-
-    return: A string which corresponds to the extracted sequence
+    Calculates the md5 of a sequence after replacing Us with Ts as done
+    by RNAcentral
+
+    sequence: A sequence string
+
+    return: The md5 hex digest or None if the sequence is too short
     """
-    cmd = "%s %s %s/%s-%s" % (ESL_PATH,
-                                 seq_file, str(seq_acc),
-				 str(seq_start), str(seq_end))
 
-    proc = subprocess.Popen(
-        cmd, shell=True, stdout=subprocess.PIPE)
+    # Replace Us with Ts as done by RNAcentral
+    sequence = sequence.replace('U', 'T')
 
-    seq = proc.communicate()[0]
+    if sequence != '' and len(sequence) > 2:
+        return hashlib.md5(sequence).hexdigest()
 
-    # get sequence
-    sequence = ''
-    seq_bits = seq.split('\n')[1:]
-    sequence = sequence.join(seq_bits)
+    return None
+
+# -------------------------------------------------------------------------
+
+def init_worker(seq_file):
+    """
+    Opens the indexed sequence file once per worker process
+
+    seq_file: A sequence file in fasta format
+    """
 
-    return sequence
+    global SEQ_INDEX
+    SEQ_INDEX = FastaIndex(seq_file)
 
 # -------------------------------------------------------------------------
 
-if __name__ == '__main__':
+def hash_seed_regions(seed_regions):
+    """
+    Extracts and hashes a batch of seed regions using the worker's
+    sequence index
+
+    seed_regions: A list of (rfam_acc, rfamseq_acc, seq_start, seq_end)
+    tuples
+
+    return: A tuple (md5_rows, missing), where md5_rows is a list of
+    (md5, rfam_acc, rfamseq_acc, seq_start, seq_end) tuples ready for
+    update_seed_region_md5s and missing the list of regions that could
+    not be extracted
+    """
+
+    md5_rows = []
+    missing = []
+
+    for seed_region in seed_regions:
+        rfam_acc, seq_acc, seq_start, seq_end = seed_region
+
+        seq_md5 = calculate_sequence_md5(SEQ_INDEX.fetch(seq_acc, seq_start, seq_end))
 
-    seq_file = sys.argv[1]
+        if seq_md5 is not None:
+            md5_rows.append((seq_md5, rfam_acc, seq_acc, seq_start, seq_end))
+        else:
+            missing.append(seed_region)
 
-    seed_region_rows = sr.fetch_seed_regions()
+    return md5_rows, missing
+
+# -------------------------------------------------------------------------
+
+def load_resume_file(resume_file):
+    """
+    Loads the seed regions already updated by a previous run
+
+    resume_file: A tab separated file of rfam_acc, rfamseq_acc, seq_start,
+    seq_end as written by populate_seed_region_md5s
+
+    return: A set of (rfam_acc, rfamseq_acc, seq_start, seq_end) tuples
+    """
+
+    done = set()
+
+    if resume_file is None or not os.path.exists(resume_file):
+        return done
+
+    fp = open(resume_file, 'r')
+    for line in fp:
+        fields = line.strip().split('\t')
+        if len(fields) == 4:
+            done.add((fields[0], fields[1], int(fields[2]), int(fields[3])))
+    fp.close()
+
+    return done
+
+# -------------------------------------------------------------------------
+
+def populate_seed_region_md5s(seq_file, workers=None, resume_file=None,
+                              missing_md5=False):
+    """
+    Populates the md5 field of every seed_region entry. Regions are
+    streamed from the database in batches, hashed by a pool of worker
+    processes each reading sequences from an indexed fasta file, and
+    written back with chunked updates committed at checkpoints. Updated
+    regions are appended to resume_file after every commit so that an
+    interrupted run can be resumed
+
+    seq_file: A sequence file in fasta format containing all seed sequences
+    workers: Number of worker processes. Defaults to the number of cpus
+    resume_file: A file to record updated regions in and skip on rerun
+    missing_md5: If True, only process regions with no md5 set
+
+    return: A list of the seed regions that could not be extracted
+    """
 
-    sql_data_list = []
+    # build the index once in the parent, rather than in every worker
+    FastaIndex(seq_file).close()
 
-    for seq_region in seed_region_rows:
-        seq_acc = seq_region[1]
-        seq_start = seq_region[2]
-        seq_end = seq_region[3]
+    done = load_resume_file(resume_file)
+    resume_fp = None
+    if resume_file is not None:
+        resume_fp = open(resume_file, 'a')
 
-        # extract sequence from sequence file
-        sequence = fetch_sequence(seq_file, seq_acc, seq_start, seq_end)
+    def pending_batches():
+        for batch in sr.fetch_seed_regions_batched(BATCH_SIZE, missing_md5):
+            if len(done) > 0:
+                batch = [x for x in batch if x not in done]
+            if len(batch) > 0:
+                yield batch
 
-        # Replace Us with Ts as done by RNAcentral
-        sequence = sequence.replace('U', 'T')
-        
-	if sequence != '' and len(sequence) > 2:
-		# convert sequence to md5
-        	m = hashlib.md5()
-        	m.update(sequence)
-        	seq_md5 = m.hexdigest()
-		# update tuple
-        	rfam_acc = seq_region[0]
-        	extended_tuple = (seq_md5, rfam_acc, seq_acc, seq_start, seq_end)
-        	# add to new list
-        	sql_data_list.append(extended_tuple)
-        	extended_tuple = None
+    if workers is None:
+        workers = multiprocessing.cpu_count()
 
-	else:
-		print seq_region
-    # update seed_region md5s
-    #sr.update_seed_region_md5s(sql_data_list)
+    pool = multiprocessing.Pool(processes=workers, initializer=init_worker,
+                                initargs=(seq_file,))
 
+    all_missing = []
+    pending_rows = []
+
+    # the pool drains any iterable it is given into its task queue, so
+    # batches are submitted a bounded window at a time
+    batches = pending_batches()
+
+    while True:
+        window = list(itertools.islice(batches, workers * WINDOW_FACTOR))
+        if len(window) == 0:
+            break
+
+        for md5_rows, missing in pool.imap_unordered(hash_seed_regions, window):
+            pending_rows.extend(md5_rows)
+            all_missing.extend(missing)
+
+            if len(pending_rows) >= CHUNK_SIZE:
+                checkpoint(pending_rows, resume_fp)
+                pending_rows = []
+
+    if len(pending_rows) > 0:
+        checkpoint(pending_rows, resume_fp)
+
+    pool.close()
+    pool.join()
+
+    if resume_fp is not None:
+        resume_fp.close()
+
+    return all_missing
+
+# -------------------------------------------------------------------------
+
+def checkpoint(md5_rows, resume_fp):
+    """
+    Commits a chunk of md5 updates and records the updated regions
+
+    md5_rows: A list of (md5, rfam_acc, rfamseq_acc, seq_start, seq_end)
+    tuples
+    resume_fp: An open resume file or None
+    """
+
+    sr.update_seed_region_md5s(md5_rows, chunk_size=CHUNK_SIZE)
+
+    if resume_fp is not None:
+        for row in md5_rows:
+            resume_fp.write("%s\t%s\t%d\t%d\n" % row[1:])
+        resume_fp.flush()
+
+    print "%d seed regions updated" % len(md5_rows)
+
+# -------------------------------------------------------------------------
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Populate seed_region md5s", epilog='')
+
+    parser.add_argument("seq_file", help="seed sequence file in fasta format",
+                        type=str)
+
+    parser.add_argument("--workers", help="number of worker processes",
+                        type=int, default=None)
+
+    parser.add_argument("--resume", help="file to record progress in and resume from",
+                        type=str, default=None)
+
+    parser.add_argument("--missing", help="only process regions with no md5 set",
+                        action="store_true")
+
+    return parser
+
+# -------------------------------------------------------------------------
+
+if __name__ == '__main__':
 
+    parser = usage()
+    args = parser.parse_args()
 
+    missing_regions = populate_seed_region_md5s(args.seq_file, workers=args.workers,
+                                                resume_file=args.resume,
+                                                missing_md5=args.missing)
 
+    for seq_region in missing_regions:
+        print seq_region
@@ -16,6 +16,8 @@ limitations under the License.
 import os
 import sys
 
+from utils import project_index as pi
+
 # -----------------------------------------------------------------------------
 
 
@@ -63,29 +65,27 @@ def generate_genseq_files_from_project_directory(project_dir, upid_input):
 
     if os.path.isfile(upid_input):
         fp = open(upid_input, 'r')
-        upids = [x.strip() for x in fp]
+        upids = [x.strip() for x in fp if x.strip() != '']
         fp.close()
 
-        # loop over all upids and generate
-        for upid in upids:
-            suffix = upid[-3:]
-            subdir = os.path.join(project_dir, suffix)
-            updir = os.path.join(subdir, upid)
-            uprfamseq = os.path.join(updir, upid+'.rfamseq')
+    else:
+        upids = [upid_input]
 
-            if os.path.exists(uprfamseq):
-                # dest_dir set to None so that genseq file is created
-                # in the same directory as rfamseq
-                convert_rfamseq_to_genseq(uprfamseq, dest_dir=None)
+    # rfamseq files are looked up in the project index
+    index = pi.load_project_index(project_dir, upids=upids)
 
-    else:
-        # get rfamseq file
-        suffix = upid_input[-3:]
-        subdir = os.path.join(project_dir, suffix)
-        updir = os.path.join(subdir, upid_input)
-        uprfamseq = os.path.join(updir, upid_input + '.rfamseq')
+    # loop over all upids and generate
+    for upid in upids:
+        uprfamseq = index.find_file(upid, upid + '.rfamseq', kind="genome")
+
+        if uprfamseq is not None:
+            # dest_dir set to None so that genseq file is created
+            # in the same directory as rfamseq
+            convert_rfamseq_to_genseq(uprfamseq, dest_dir=None)
+        else:
+            print "%s\tMissing rfamseq file" % upid
 
-        convert_rfamseq_to_genseq(uprfamseq, dest_dir=None)
+    index.close()
 
 # -----------------------------------------------------------------------------
 
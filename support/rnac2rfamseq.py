@@ -3,6 +3,7 @@ import sys
 import subprocess
 
 from config import rfam_config as rc
+from utils import rnacentral_index as rni
 
 # ----------------------------------------------------------------------------------
 
@@ -118,24 +119,30 @@ def generate_rfamseq_tsv_dump(fasta_file, rnac_metadata_file, to_file = False):
 
     fasta_file: The path to the input fasta file as generated from RNAcentral
     rnac_metadata_file: The path to the RNAcentral metadata file in tabular
-    format
+    format, or to an RNAcentral index built from it (utils/rnacentral_index.py)
 
     return: void
     """
 
-    rnac_metadata = load_rnacentral_metadata_to_dict(rnac_metadata_file)
+    # an RNAcentral index holds the metadata on disk
+    if rni.is_rnacentral_index(rnac_metadata_file):
+        rnac_index = rni.RNAcentralIndex(rnac_metadata_file)
+        rnac_metadata_items = rnac_index.iterate_metadata()
+    else:
+        rnac_metadata_items = load_rnacentral_metadata_to_dict(rnac_metadata_file).iteritems()
+
     sequence_stats = generate_sequence_stats(fasta_file)
 
-    for urs_id in rnac_metadata.keys():
+    for urs_id, urs_metadata in rnac_metadata_items:
         rfamseq_acc = urs_id
         accession = urs_id
         version = '0'
-        taxid = rnac_metadata[urs_id]["tax_id"]
-        mol_type = rnac_metadata[urs_id]["mol_type"]
+        taxid = urs_metadata["tax_id"]
+        mol_type = urs_metadata["mol_type"]
         length = sequence_stats[urs_id]["length"]
         description = sequence_stats[urs_id]["desc"]
-        previous_acc = rnac_metadata[urs_id]["previous_acc"]
-        source = rnac_metadata[urs_id]["source"]
+        previous_acc = urs_metadata["previous_acc"]
+        source = urs_metadata["source"]
 
 
         rfamseq_entry = "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s" % (rfamseq_acc, accession,
@@ -6,19 +6,22 @@ import subprocess
 from config import rfam_local as conf
 from config import gen_config as gc
 from utils import genome_search_utils as gsu
+from utils import project_index as pi
 
 # ------------------------------------------------------------------------
 
 
-def split_genome_to_chunks(updir, upid):
+def split_genome_to_chunks(index, upid):
     """
+    Splits a genome's fasta file into search chunks and indexes them
 
-    updir:
-    upid:
+    index: A project_index.ProjectIndex object of the genome's project
+    upid: A valid Uniprot proteome accession
 
     return:
     """
     # get updir location
+    updir = index.genome_dir(upid)
     upid_fasta = os.path.join(updir, upid + '.fa')
     seq_chunks_dir = os.path.join(updir, "search_chunks")
 
@@ -31,10 +34,9 @@ def split_genome_to_chunks(updir, upid):
             # split sequence file into smalled chunks
             gsu.split_seq_file(upid_fasta, gc.SPLIT_SIZE, dest_dir=seq_chunks_dir)
 
-            # now index the fasta files
-            seq_files = os.listdir(seq_chunks_dir)
-            for seq_file in seq_files:
-                seq_file_loc = os.path.join(seq_chunks_dir, seq_file)
+            # now index the fasta files, as listed by the project index
+            index.refresh(upids=[upid])
+            for seq_file_loc in index.chunks(upid):
                 cmd = "%s --index %s" % (conf.ESL_SFETCH, seq_file_loc)
                 subprocess.call(cmd, shell=True)
 
@@ -57,24 +59,19 @@ if __name__ == '__main__':
     # this can be a file of upids or a upid string UPXXXXXXXX
     upid_input = sys.argv[2]
 
+    index = pi.ProjectIndex(project_dir)
+
     if os.path.isfile(upid_input):
         fp = open(upid_input, 'r')
         upids = [x.strip() for x in fp]
         fp.close()
 
         for upid in upids:
-            suffix = upid[-3:]
-            subdir_loc = os.path.join(project_dir, suffix)
-            updir_loc = os.path.join(subdir_loc, upid)
-
-            split_genome_to_chunks(updir_loc, upid)
+            split_genome_to_chunks(index, upid)
     else:
-        # get updir location and subdir
-        suffix = upid_input[-3:]
-        subdir_loc = os.path.join(project_dir, suffix)
-        updir_loc = os.path.join(subdir_loc, upid_input)
+        split_genome_to_chunks(index, upid_input)
 
-        split_genome_to_chunks(updir_loc, upid_input)
+    index.close()
 
 
 
@@ -0,0 +1,94 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import random
+
+from scripts.processing import clan_competition as cc
+from utils import clan_regions as cr
+
+
+# --------------------------------------------------------------------------------------------------
+
+class Log(object):
+    def debug(self, message):
+        pass
+
+
+def compete_clan_file_rows(rows):
+    """
+    Competes (rfam_acc, rfamseq_acc, seq_start, seq_end, evalue, bit_score)
+    rows the way complete_clan_seqs competes the lines of a clan file
+    """
+
+    regions = {}
+    for rfam_acc, rfamseq_acc, seq_start, seq_end, evalue, bit_score in rows:
+        line = [rfam_acc, rfamseq_acc, str(seq_start), str(seq_end), str(bit_score), str(evalue)]
+        regions.setdefault(rfamseq_acc, []).append(line)
+
+    non_sig_regs = []
+    for rfamseq_acc in sorted(regions.keys()):
+        non_sig_regs.extend([(x[0], x[1], int(x[2]))
+                             for x in cc.compete_seq_regions(regions[rfamseq_acc], Log())])
+
+    return non_sig_regs
+
+
+def compete_clan_rows(rows):
+    return cc.compete_clan_regions(cr.build_clan_regions(rows), Log())
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_compete_ties():
+    # RF00002 and RF00003 tie on both E-value and bit score, the later row loses
+    rows = [("RF00003", "CM000001.1", 150, 250, 1e-10, 50.0),
+            ("RF00002", "CM000001.1", 100, 200, 1e-10, 50.0),
+            ("RF00001", "CM000001.1", 120, 210, 1e-10, 40.0),
+            ("RF00001", "CM000002.1", 300, 200, 1e-05, 30.0),
+            ("RF00002", "CM000002.1", 290, 210, 1e-08, 35.0),
+            ("RF00003", "CM000002.1", 200, 300, 1e-20, 90.0)]
+
+    expected = [("RF00002", "CM000001.1", 100), ("RF00001", "CM000001.1", 120),
+                ("RF00001", "CM000002.1", 300)]
+
+    assert sorted(compete_clan_file_rows(rows)) == sorted(expected)
+    assert sorted(compete_clan_rows(rows)) == sorted(expected)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_compete_clan_regions_matches_clan_files():
+    rng = random.Random(46)
+
+    for clan in range(50):
+        rows = []
+        used = set()
+
+        for idx in range(rng.randint(2, 60)):
+            rfam_acc = "RF%05d" % rng.randint(1, 4)
+            rfamseq_acc = "CM%06d.1" % rng.randint(1, 3)
+            seq_start = rng.randint(1, 400)
+
+            # regions are identified by rfam_acc, rfamseq_acc and seq_start
+            if (rfam_acc, rfamseq_acc, seq_start) in used:
+                continue
+            used.add((rfam_acc, rfamseq_acc, seq_start))
+
+            seq_end = seq_start + rng.choice([-1, 1]) * rng.randint(20, 120)
+            rows.append((rfam_acc, rfamseq_acc, seq_start, max(seq_end, 1),
+                         rng.choice([1e-20, 1e-10, 1e-05]), rng.choice([30.0, 50.0, 70.0])))
+
+        # clan files are sorted on rfamseq_acc and then on the rest of the line
+        rows.sort(key=lambda x: (x[1], str(x[2])))
+
+        assert sorted(compete_clan_rows(rows)) == sorted(compete_clan_file_rows(rows))
@@ -0,0 +1,61 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from utils import clan_regions as cr
+
+
+# --------------------------------------------------------------------------------------------------
+
+ROWS = [("RF00001", "CM000002.1", "500", "420", "1e-10", "50.1"),
+        ("RF00002", "CM000001.1", "300", "380", "1e-05", "30.0"),
+        ("RF00001", "CM000001.1", "100", "171", "1e-20", "70.5"),
+        ("RF00002", "CM000002.1", "10", "90", "0.001", None),
+        ("RF00001", "CM000001.1", "50", "20", "2e-08", "40.0")]
+
+
+def test_build_clan_regions():
+    regions = cr.build_clan_regions(ROWS)
+
+    assert len(regions) == 5
+    assert regions.families == ["RF00001", "RF00002"]
+    assert regions.sequences == ["CM000001.1", "CM000002.1"]
+    assert list(regions.seq_offsets) == [0, 3, 5]
+
+    # regions of a sequence ordered by lowest coordinate
+    assert [regions.starts[x] for x in range(5)] == [50, 100, 300, 10, 500]
+    assert list(regions.row_ids) == [4, 2, 1, 3, 0]
+    assert regions.region(0) == ("RF00001", 50, 20, 2e-08, 40.0)
+    assert regions.region(3) == ("RF00002", 10, 90, 0.001, 0.0)
+
+    assert list(regions.iterate_sequences()) == [("CM000001.1", 0, 3), ("CM000002.1", 3, 5)]
+    assert regions.nbytes() > 0
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_to_dict():
+    fam_seqs = cr.build_clan_regions(ROWS).to_dict()
+
+    assert fam_seqs == {"RF00001": {"CM000001.1": [(50, 20, 2e-08), (100, 171, 1e-20)],
+                                    "CM000002.1": [(500, 420, 1e-10)]},
+                        "RF00002": {"CM000001.1": [(300, 380, 1e-05)],
+                                    "CM000002.1": [(10, 90, 0.001)]}}
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_build_empty():
+    regions = cr.build_clan_regions([])
+
+    assert len(regions) == 0
+    assert list(regions.iterate_sequences()) == []
@@ -0,0 +1,78 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import mysql.connector
+
+from utils import db_utils
+
+
+# --------------------------------------------------------------------------------------------------
+
+class Cursor(object):
+    def __init__(self, error):
+        self.error = error
+        self.rowcount = 0
+        self.closed = False
+
+    def execute(self, query):
+        if self.error is not None:
+            raise self.error
+        self.rowcount = 3
+
+    def close(self):
+        self.closed = True
+
+
+class Connection(object):
+    def __init__(self, error=None):
+        self.cur = Cursor(error)
+        self.calls = []
+
+    def cursor(self, buffered=False):
+        return self.cur
+
+    def commit(self):
+        self.calls.append("commit")
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_execute_stats_update():
+    connect = db_utils.RfamDB.connect
+    disconnect = db_utils.RfamDB.disconnect
+
+    try:
+        cnx = Connection()
+        db_utils.RfamDB.connect = lambda: cnx
+        db_utils.RfamDB.disconnect = lambda x: None
+
+        assert db_utils.execute_stats_update("UPDATE genome") == 3
+        assert cnx.calls == ["commit"]
+
+        # failed updates are rolled back and raised
+        cnx = Connection(mysql.connector.Error("lock wait timeout"))
+        try:
+            db_utils.execute_stats_update("UPDATE genome")
+            assert False
+        except mysql.connector.Error:
+            pass
+
+        assert cnx.calls == ["rollback"]
+        assert cnx.cur.closed is True
+
+    finally:
+        db_utils.RfamDB.connect = connect
+        db_utils.RfamDB.disconnect = disconnect
@@ -0,0 +1,52 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils import download_queue as dq
+from test_http_client import StubHandler, start_stub_server
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_run_downloads_resumes():
+    server, base_url = start_stub_server()
+    dest_dir = tempfile.mkdtemp()
+    store = dq.DownloadStateStore(os.path.join(dest_dir, "state.db"))
+
+    entries = [("UP1", "q%d" % x, base_url + "/ok/q%d" % x,
+                os.path.join(dest_dir, "q%d.fa" % x)) for x in range(10)]
+    entries.append(("UP1", "gone", base_url + "/missing", os.path.join(dest_dir, "gone.fa")))
+    store.add_many(entries)
+
+    counts = dq.run_downloads(store, workers=4)
+
+    assert counts == {dq.DONE: 10, dq.FAILED: 1}
+    assert open(os.path.join(dest_dir, "q3.fa")).read() == "/ok/q3"
+    assert store.failed_accessions("UP1") == ["gone"]
+    assert not os.path.exists(os.path.join(dest_dir, "gone.fa.part"))
+
+    # only the deleted file is fetched again on rerun
+    os.remove(os.path.join(dest_dir, "q3.fa"))
+    store.add_many(entries)
+    dq.run_downloads(store, workers=4)
+
+    assert StubHandler.hits["/ok/q3"] == 2
+    assert StubHandler.hits["/ok/q4"] == 1
+    assert os.path.exists(os.path.join(dest_dir, "q3.fa"))
+
+    store.close()
+    shutil.rmtree(dest_dir)
+    server.shutdown()
@@ -0,0 +1,87 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils import fasta_index as fi
+
+# seq1 wraps at 4 residues, seq2 at 3 with CRLF line endings, and
+# seq1/3-6 is named the way seed sequence files name regions
+FASTA = (">seq1 first sequence\nACGU\nACGU\nAC\n"
+         ">seq2\r\nAAC\r\nCGG\r\nT\r\n"
+         ">seq1/3-6\nGUAC\n")
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_fasta(tmp_dir):
+    fasta_file = os.path.join(tmp_dir, "seed.fa")
+    fp = open(fasta_file, 'wb')
+    fp.write(FASTA)
+    fp.close()
+
+    return fasta_file
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_build_fasta_index():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        index_file = fi.build_fasta_index(write_fasta(tmp_dir))
+
+        fp = open(index_file)
+        lines = [x.split('\t') for x in fp.read().splitlines()]
+        fp.close()
+
+        # name, length, offset, line bases, line width
+        assert lines == [["seq1", "10", "21", "4", "5"],
+                         ["seq2", "7", "41", "3", "5"],
+                         ["seq1/3-6", "4", "64", "4", "5"]]
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_fetch_regions():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        index = fi.FastaIndex(write_fasta(tmp_dir))
+
+        assert index.fetch("seq1") == "ACGUACGUAC"
+        assert index.fetch("seq2") == "AACCGGT"
+
+        # regions spanning line breaks
+        assert index.fetch("seq1", 4, 9) == "UACGUA"
+        assert index.fetch("seq2", 3, 7) == "CCGGT"
+        assert index.fetch("seq1", 9, 20) == "AC"
+
+        # an exact region name is preferred over extracting from seq1
+        assert index.fetch("seq1", 3, 6) == "GUAC"
+
+        # reverse strand
+        assert index.fetch("seq2", 7, 3) == "ACCGG"
+        assert fi.reverse_complement("ACGUn") == "nACGT"
+
+        assert index.fetch("missing", 1, 2) == ''
+        assert "seq2" in index
+        index.close()
+
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,119 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+
+from scripts.export import full_region_xml as frx
+
+
+# --------------------------------------------------------------------------------------------------
+
+class Taxonomy(object):
+    tax_string = "Eukaryota; Metazoa; Chordata."
+
+
+class Genome(object):
+    upid = "UP000005640"
+    ncbi_id = "9606"
+    common_name = "Human"
+    scientific_name = "Homo sapiens"
+    ncbi = Taxonomy()
+
+
+def make_region(rfamseq_acc="CM000663.2", seq_start=100, seq_end=171):
+    return {"rfamseq_acc": rfamseq_acc, "seq_start": seq_start, "seq_end": seq_end,
+            "cm_start": 1, "cm_end": 71, "evalue_score": "2.3e-14", "bit_score": 61.2,
+            "alignment_type": "full", "truncated": "0", "rfam_acc": "RF00005",
+            "rfam_id": "tRNA", "rna_type": "Gene; tRNA;",
+            "rfamseq_acc_description": "chromosome 1 & <unplaced>",
+            "ncbi_id": 9606, "scientific_name": "Homo sapiens sapiens",
+            "tax_string": "Eukaryota."}
+
+
+def get_fields(entry):
+    return [(x.get("name"), x.text) for x in entry.find("additional_fields")]
+
+
+def get_refs(entry):
+    return sorted([(x.get("dbname"), x.get("dbkey")) for x in entry.find("cross_references")])
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_format_genome_region():
+    formatter = frx.FullRegionFormatter(Genome(), {"CM000663.2": ("1", "chromosome")},
+                                        {"CM000663.2/100:171": "URS00000AAAAA"},
+                                        timestamp="19 Oct 2026")
+
+    entry = ET.fromstring(formatter.format(make_region()))
+
+    assert entry.get("id") == "CM000663.2_100_171"
+    assert entry.find("name").text == "CM000663.2/100:171"
+    assert entry.find("description").text == "Homo sapiens tRNA"
+    assert [x.get("value") for x in entry.find("dates")] == ["19 Oct 2026", "19 Oct 2026"]
+
+    fields = get_fields(entry)
+    assert ("rfamseq_acc_description", "chromosome 1 & <unplaced>") in fields
+    assert ("chromosome_name", "1") in fields
+    assert ("popular_species", "9606") in fields
+    assert ("common_name", "Human") in fields
+    assert ("tax_string", "Eukaryota; Metazoa; Chordata.") in fields
+    assert [x[1] for x in fields if x[0] == "rna_type"] == ["Gene", "tRNA"]
+
+    assert get_refs(entry) == [("ENA", "CM000663"), ("RFAM", "RF00005"),
+                               ("RNACENTRAL", "URS00000AAAAA_9606"),
+                               ("Uniprot", "UP000005640"), ("ncbi_taxonomy_id", "9606")]
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_format_region_without_genome():
+    formatter = frx.FullRegionFormatter(None, {}, {})
+
+    entry = ET.fromstring(formatter.format(make_region(rfamseq_acc="URS000000AAAA")))
+
+    assert entry.find("description").text == "Homo sapiens sapiens tRNA"
+    assert ("tax_string", "Eukaryota.") in get_fields(entry)
+    assert "common_name" not in [x[0] for x in get_fields(entry)]
+    assert get_refs(entry) == [("RFAM", "RF00005"), ("RNACENTRAL", "URS000000AAAA"),
+                               ("ncbi_taxonomy_id", "9606")]
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_write_full_region_file():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        formatter = frx.FullRegionFormatter(Genome(), {}, {})
+        filename = os.path.join(tmp_dir, "UP000005640.xml")
+
+        regions = [make_region(seq_start=x, seq_end=x + 70) for x in (1, 500)]
+        assert frx.write_full_region_file(filename, regions, formatter) == 2
+
+        database = ET.parse(filename).getroot()
+        assert len(database.find("entries")) == 2
+        assert database.find("entry_count").text == "2"
+        assert not os.path.exists(filename + ".tmp")
+
+        # no file for genomes without entries
+        empty_file = os.path.join(tmp_dir, "UP000000001.xml")
+        assert frx.write_full_region_file(empty_file, [], formatter) == 0
+        assert not os.path.exists(empty_file)
+        assert not os.path.exists(empty_file + ".tmp")
+
+    finally:
+        shutil.rmtree(tmp_dir)
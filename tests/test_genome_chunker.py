@@ -0,0 +1,70 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils import genome_chunker as gch
+
+
+# --------------------------------------------------------------------------------------------------
+
+def read_fasta(fasta_file):
+    seqs = {}
+    for entry in open(fasta_file).read().split('>')[1:]:
+        lines = entry.split('\n')
+        seqs[lines[0]] = ''.join(lines[1:])
+    return seqs
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_split_genome_windows():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        chrom = ''.join(["ACGT"[(x * 7) % 4] for x in range(2500)])
+        fasta_file = os.path.join(tmp_dir, "genome.fa")
+        fp = open(fasta_file, 'w')
+        fp.write(">chr1 description\n")
+        for idx in range(0, len(chrom), 70):
+            fp.write(chrom[idx:idx + 70] + '\n')
+        fp.write(">ctg1\nAAAA\n>ctg2\nCCCC\n")
+        fp.close()
+
+        chunks_dir = os.path.join(tmp_dir, "chunks")
+        os.mkdir(chunks_dir)
+        manifest = gch.split_genome_windows(fasta_file, chunks_dir, "UP1", 1000, overlap=200)
+
+        assert [x[:4] for x in manifest] == [("UP1.1", "chr1/1-1000", "chr1", 0),
+                                             ("UP1.2", "chr1/801-1800", "chr1", 800),
+                                             ("UP1.3", "chr1/1601-2500", "chr1", 1600),
+                                             ("UP1.3", "ctg1", "ctg1", 0),
+                                             ("UP1.3", "ctg2", "ctg2", 0)]
+
+        # every window holds the sequence at its offset
+        for chunk, piece, seq_name, offset, length in manifest[:3]:
+            seq = read_fasta(os.path.join(chunks_dir, chunk))[piece]
+            assert seq == chrom[offset:offset + length]
+
+        manifest_file = os.path.join(tmp_dir, "UP1.chunks")
+        gch.write_chunk_manifest(manifest, manifest_file)
+        chunks, offsets = gch.read_chunk_manifest(manifest_file)
+
+        assert chunks == ["UP1.1", "UP1.2", "UP1.3"]
+        assert offsets["chr1/801-1800"] == ("chr1", 800)
+        assert "ctg1" not in offsets
+
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,90 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from scripts.export.genomes import download_genome as dg
+from scripts.release import genome_download_engine as gde
+from utils import download_queue as dq
+from test_http_client import start_stub_server
+
+# UP000000001 has a WGS set that is missing from the cluster and from ENA,
+# UP000000002 a single sequence and UP000000003 cannot be resolved at all
+GENOME_ACCESSIONS = {"UP000000001": {"GCA": -1, "WGS": "AAAA01000000", "OTHER": ["ACC0"],
+                                     "GCA_NA": 0},
+                     "UP000000002": {"GCA": -1, "WGS": -1, "OTHER": ["ACC1"], "GCA_NA": 0}}
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_download_genomes_locally_records_failures():
+    server, base_url = start_stub_server()
+    project_dir = tempfile.mkdtemp()
+
+    def get_genome_unique_accessions(upid, to_file=False, output_dir=None):
+        if upid not in GENOME_ACCESSIONS:
+            raise ValueError("no accessions for %s" % upid)
+        return GENOME_ACCESSIONS[upid]
+
+    def get_ena_file_location(acc, file_format, dest_dir, compressed=True):
+        return base_url + "/ok/" + acc, os.path.join(dest_dir, acc + ".fa")
+
+    gflib_funcs = dict([(x, getattr(dg.gflib, x)) for x in
+                        ["get_genome_unique_accessions", "get_wgs_range", "get_ena_file_location"]])
+    ftp_dirs = (dg.gflib.gc.ENA_FTP_WGS_PUB, dg.gflib.gc.ENA_FTP_WGS_SUP)
+
+    try:
+        dg.gflib.get_genome_unique_accessions = get_genome_unique_accessions
+        dg.gflib.get_wgs_range = lambda wgs_acc: None
+        dg.gflib.get_ena_file_location = get_ena_file_location
+        dg.gflib.gc.ENA_FTP_WGS_PUB = os.path.join(project_dir, "wgs_public")
+        dg.gflib.gc.ENA_FTP_WGS_SUP = os.path.join(project_dir, "wgs_suppressed")
+
+        upid_list = os.path.join(project_dir, "upids.txt")
+        fp = open(upid_list, 'w')
+        fp.write("UP000000001\nUP000000002\nUP000000003\n")
+        fp.close()
+
+        # used to hang when the missing WGS set called sys.exit in a worker
+        missing = gde.download_genomes_locally(project_dir, upid_list, workers=2,
+                                               genome_workers=3)
+
+        assert missing == {"UP000000001": ["AAAA01000000"], "UP000000002": [],
+                           "UP000000003": ["UP000000003"]}
+
+        # the other sequences of a genome with a missing WGS set are still fetched
+        for upid, acc in [("UP000000001", "ACC0"), ("UP000000002", "ACC1")]:
+            seq_file = os.path.join(project_dir, upid[8:], upid, "sequences", acc + ".fa")
+            assert open(seq_file).read() == "/ok/" + acc
+
+        store = dq.DownloadStateStore(os.path.join(project_dir, "download_state.db"))
+        errors = store.genome_errors()
+        store.close()
+
+        assert [x[:2] for x in errors] == [("UP000000001", "AAAA01000000"),
+                                           ("UP000000003", "UP000000003")]
+        assert "does not exist" in errors[0][2]
+
+        fp = open(os.path.join(project_dir, "001", "UP000000001", "unavailable_accessions.txt"))
+        assert fp.read() == "AAAA01000000\n"
+        fp.close()
+
+    finally:
+        for name, func in gflib_funcs.items():
+            setattr(dg.gflib, name, func)
+        dg.gflib.gc.ENA_FTP_WGS_PUB, dg.gflib.gc.ENA_FTP_WGS_SUP = ftp_dirs
+
+        shutil.rmtree(project_dir)
+        server.shutdown()
@@ -13,8 +13,10 @@ limitations under the License.
 
 import os
 import shutil
+import tempfile
 
 from scripts.export.genomes import genome_fetch as gf
+from test_http_client import start_stub_server
 from config.rfam_local import TEST_DIR
 
 
@@ -187,6 +189,47 @@ def test_fetch_wgs_range_accs():
     assert wgs_accs is not None or len(wgs_accs) != 0
 
 
+# --------------------------------------------------------------------------------------------------
+def test_get_wgs_range_batches():
+    batches = gf.get_wgs_range_batches("AYNF01000001-AYNF01000106", batch_size=50)
+
+    assert batches == [("AYNF01000001", "AYNF01000036", 36),
+                       ("AYNF01000037", "AYNF01000071", 35),
+                       ("AYNF01000072", "AYNF01000106", 35)]
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_download_wgs_range_batch():
+    server, base_url = start_stub_server()
+    tmp_dir = tempfile.mkdtemp()
+    data_url = gf.ENA_DATA_URL_GZIP
+
+    try:
+        # the stub serves 3 contigs whatever the range
+        gf.ENA_DATA_URL_GZIP = base_url + "/gzip/3/%s/%s"
+
+        assert gf.download_wgs_range_batch(("AYNF01000001", "AYNF01000003", 3), tmp_dir) is True
+        fp = open(os.path.join(tmp_dir, "AYNF01000001-AYNF01000003.fa"))
+        assert fp.read().count('>') == 3
+        fp.close()
+
+        # incomplete ranges are discarded
+        assert gf.download_wgs_range_batch(("AYNF01000004", "AYNF01000007", 4), tmp_dir) is False
+        assert os.listdir(tmp_dir) == ["AYNF01000001-AYNF01000003.fa"]
+
+        # a corrupt stream fails its own range only, with no .part file left
+        gf.ENA_DATA_URL_GZIP = base_url + "/badgzip/%s/%s"
+        failed = gf.split_and_download("AYNF01000001-AYNF01000006", tmp_dir, batch_size=3)
+        assert failed == ["AYNF01000004-AYNF01000006"]
+        assert os.listdir(tmp_dir) == ["AYNF01000001-AYNF01000003.fa"]
+
+    finally:
+        gf.ENA_DATA_URL_GZIP = data_url
+        shutil.rmtree(tmp_dir)
+        server.shutdown()
+
+
 # --------------------------------------------------------------------------------------------------
 
 def test_download_genomes():
@@ -281,6 +324,7 @@ if __name__ == '__main__':
     # test_fetch_genome_acc()
     # test_extract_assembly_accs()
     # test_fetch_wgs_range_accs()
+    # test_get_wgs_range_batches()
     # test_fetch_genome_accessions()
     # test_load_upid_gca_pairs()
     # test_load_upid_gca_file()
@@ -0,0 +1,111 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from scripts.processing import genome_scanner as gs
+from utils import lsf_stats
+from utils import project_index as pi
+from test_lsf_stats import write_job
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_file(file_path, content):
+    fp = open(file_path, 'w')
+    fp.write(content)
+    fp.close()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_fit_search_cost_model_with_performance_db():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        project_dir = os.path.join(tmp_dir, "project")
+        upid = "UP000000001"
+        updir = pi.get_genome_dir(project_dir, upid)
+        chunk_name = upid + ".fa.1"
+
+        os.makedirs(os.path.join(updir, "search_chunks"))
+        os.makedirs(os.path.join(updir, "search_output"))
+        write_file(os.path.join(updir, "search_chunks", chunk_name), ">s1\n" + "A" * 1000 + "\n")
+        write_file(os.path.join(updir, "search_output", chunk_name + ".err"), "")
+        write_file(os.path.join(updir, "search_output", chunk_name + ".tbl"), "")
+        write_job(os.path.join(updir, "search_output"), chunk_name, "36.00", "100")
+
+        cm_file = os.path.join(tmp_dir, "Rfam.cm")
+        write_file(cm_file, "INFERNAL1/a [1.1]\nNAME RF00001\nCLEN 150\n")
+
+        # jobs of an earlier run along with the project's own job
+        old_run = os.path.join(tmp_dir, "old_run")
+        os.makedirs(old_run)
+        write_job(old_run, "chunk1", "1800.00", "400")
+        write_job(old_run, "chunk2", "1800.00", "600")
+
+        db_file = os.path.join(tmp_dir, "perf.db")
+        assert lsf_stats.harvest_job_stats([old_run, project_dir], db_file, workers=1) == 3
+
+        model_file = os.path.join(tmp_dir, "model.json")
+        model = gs.fit_search_cost_model(project_dir, model_file, cm_file=cm_file)
+        assert model["samples"] == 1
+
+        # the project's job is not counted twice
+        model = gs.fit_search_cost_model(project_dir, model_file, cm_file=cm_file,
+                                         perf_db_file=db_file)
+        assert model["samples"] == 3
+        assert os.path.exists(model_file)
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+class RecordingExecutor(object):
+    def __init__(self):
+        self.existing_dirs = None
+
+    def run(self, jobs):
+        self.existing_dirs = sorted(set([os.path.basename(x["dest_dir"]) for x in jobs
+                                         if os.path.isdir(x["dest_dir"])]))
+        return [None] * len(jobs)
+
+
+def test_multi_cm_sequence_scan_creates_family_dirs():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        for dir_name in ("cms", "sequences"):
+            os.mkdir(os.path.join(tmp_dir, dir_name))
+
+        for cm_file in ("RF00001.cm", "RF00002.cm"):
+            write_file(os.path.join(tmp_dir, "cms", cm_file), "CLEN 10\n")
+
+        for seq_file in ("chunk1.fa", "chunk2.fa"):
+            write_file(os.path.join(tmp_dir, "sequences", seq_file), ">seq\nACGU\n")
+
+        executor = RecordingExecutor()
+        results = gs.multi_cm_sequence_scan(os.path.join(tmp_dir, "cms"),
+                                            os.path.join(tmp_dir, "sequences"),
+                                            dest_dir=os.path.join(tmp_dir, "output"),
+                                            executor=executor)
+
+        assert len(results) == 4
+        assert executor.existing_dirs == ["RF00001", "RF00002"]
+
+    finally:
+        shutil.rmtree(tmp_dir)
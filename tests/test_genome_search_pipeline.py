@@ -0,0 +1,137 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+import luigi
+
+from pipelines import genome_scanner as gs
+from pipelines import genome_search_utils as gsu
+from utils import project_index as pi
+
+# stub cmsearch reporting one hit per sequence of its chunk and logging
+# every chunk it searches
+STUB_SEARCH = """#!%(python)s
+import os
+import sys
+args = sys.argv[1:]
+seq_file = args[-1]
+open(%(log)r, 'a').write(os.path.basename(seq_file) + '\\n')
+names = [x.split()[0] for x in open(seq_file).read().split('>')[1:]]
+tbl_fp = open(args[args.index("--tblout") + 1], 'w')
+tbl_fp.write("# target name\\n")
+for name in names:
+    tbl_fp.write("%%s - 5S_rRNA RF00001 cm 1 100 10 40 + no 1 0.5 0.0 80.0 1e-10 ! -\\n" %% name)
+tbl_fp.close()
+open(args[args.index("-o") + 1], 'w').write("# cmsearch :: search CM(s) against a sequence database\\n")
+"""
+
+STUB_SFETCH = "#!/bin/sh\ntouch \"$2.ssi\"\n"
+
+# three short sequences packed into two chunks of 100 residues
+SEQUENCES = {"seq1.fa": ">seq1\n" + "ACGU" * 15 + "\n",
+             "seq2.fa": ">seq2\n" + "GGCC" * 10 + "\n",
+             "seq3.fa": ">seq3\n" + "AAUU" * 20 + "\n"}
+
+CONFIG = {"SearchConfig": {"executor": "local", "cpus": "1", "memory": "10"},
+          "SplitConfig": {"mode": "window", "window_size": "100", "overlap": "10"}}
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_file(file_path, content, mode=0644):
+    fp = open(file_path, 'w')
+    fp.write(content)
+    fp.close()
+    os.chmod(file_path, mode)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def read_search_log(log_file):
+    fp = open(log_file)
+    chunks = sorted(fp.read().split())
+    fp.close()
+
+    return chunks
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_genome_search_pipeline_local():
+    tmp_dir = tempfile.mkdtemp()
+    upid = "UP000000001"
+
+    conf_values = dict([(x, getattr(gsu.conf, x)) for x in ("CMSEARCH", "ESL_SFETCH", "CMFILE")])
+    luigi_config = luigi.configuration.get_config()
+
+    try:
+        log_file = os.path.join(tmp_dir, "searches.log")
+        gsu.conf.CMSEARCH = os.path.join(tmp_dir, "cmsearch")
+        gsu.conf.ESL_SFETCH = os.path.join(tmp_dir, "esl-sfetch")
+        gsu.conf.CMFILE = os.path.join(tmp_dir, "Rfam.cm")
+        write_file(gsu.conf.CMSEARCH, STUB_SEARCH % {"python": sys.executable, "log": log_file},
+                   mode=0755)
+        write_file(gsu.conf.ESL_SFETCH, STUB_SFETCH, mode=0755)
+
+        for section, options in CONFIG.items():
+            for option, value in options.items():
+                luigi_config.set(section, option, value)
+
+        project_dir = os.path.join(tmp_dir, "project")
+        updir = pi.get_genome_dir(project_dir, upid)
+        os.makedirs(os.path.join(updir, "sequences"))
+        for filename, sequence in SEQUENCES.items():
+            write_file(os.path.join(updir, "sequences", filename), sequence)
+
+        # the genome list defaults to every genome of the project
+        write_file(os.path.join(project_dir, "upid_gca_dict.json"),
+                   json.dumps({upid: {"GCA": -1, "DOM": "bacteria"}}))
+
+        assert luigi.build([gs.GenomeSearchEngine(project_dir=project_dir)],
+                           local_scheduler=True, workers=2) is True
+
+        fp = open(os.path.join(updir, upid + ".chunks"))
+        chunks = [x.split('\t')[0] for x in fp]
+        fp.close()
+        assert sorted(set(chunks)) == [upid + ".1", upid + ".2"]
+        assert read_search_log(log_file) == [upid + ".1", upid + ".2"]
+
+        fp = open(os.path.join(updir, upid + ".txt"))
+        full_regions = [x.split('\t') for x in fp.read().splitlines()]
+        fp.close()
+        assert sorted([x[1] for x in full_regions]) == ["seq1", "seq2", "seq3"]
+
+        # only the chunk whose search output is missing is searched again
+        os.remove(os.path.join(updir, "search_output", upid + ".2.tbl"))
+        os.remove(os.path.join(updir, upid + ".tbl"))
+        os.remove(os.path.join(updir, upid + ".txt"))
+
+        assert luigi.build([gs.GenomeSearchEngine(project_dir=project_dir)],
+                           local_scheduler=True, workers=2) is True
+
+        assert read_search_log(log_file) == [upid + ".1", upid + ".2", upid + ".2"]
+        assert os.path.exists(os.path.join(updir, upid + ".txt"))
+
+    finally:
+        for name, value in conf_values.items():
+            setattr(gsu.conf, name, value)
+
+        for section in CONFIG.keys():
+            luigi_config.remove_section(section)
+
+        shutil.rmtree(tmp_dir)
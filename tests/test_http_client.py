@@ -0,0 +1,238 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import gzip
+import time
+import shutil
+import tempfile
+import threading
+import SocketServer
+import BaseHTTPServer
+import StringIO
+
+from utils import http_client
+
+
+# --------------------------------------------------------------------------------------------------
+
+def gzip_fasta(seq_no):
+    buf = StringIO.StringIO()
+    gz_fp = gzip.GzipFile(fileobj=buf, mode='wb')
+    for idx in range(seq_no):
+        gz_fp.write(">contig%d\nACGTACGTAC\n" % idx)
+    gz_fp.close()
+
+    return buf.getvalue()
+
+
+# --------------------------------------------------------------------------------------------------
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves /ok/<name> as 200, /flaky/<name> as 503 on the first request
+    and 200 afterwards, /etag/<name> as 200 with an ETag or 304 when
+    revalidated, /gzip/<n>/<name> as a gzipped fasta file of n sequences,
+    /badgzip/<name> as a corrupt gzip stream and anything else as 404
+    """
+
+    protocol_version = "HTTP/1.1"
+    hits = {}
+
+    def do_GET(self):
+        StubHandler.hits[self.path] = StubHandler.hits.get(self.path, 0) + 1
+
+        status = 404
+        body = self.path
+        etag = None
+        if self.path.startswith("/ok/"):
+            status = 200
+        elif self.path.startswith("/flaky/"):
+            status = 503 if StubHandler.hits[self.path] == 1 else 200
+        elif self.path.startswith("/etag/"):
+            etag = '"%s"' % self.path
+            status = 200
+            if self.headers.get("If-None-Match") == etag:
+                status = 304
+                body = ''
+        elif self.path.startswith("/gzip/"):
+            status = 200
+            body = gzip_fasta(int(self.path.split('/')[2]))
+        elif self.path.startswith("/badgzip/"):
+            status = 200
+            body = gzip_fasta(100)[:20] + "not a gzip stream"
+
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --------------------------------------------------------------------------------------------------
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    # one thread per keep-alive connection
+    daemon_threads = True
+
+
+# --------------------------------------------------------------------------------------------------
+
+def start_stub_server():
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server, "http://127.0.0.1:%d" % server.server_address[1]
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_get_retries_server_errors():
+    server, base_url = start_stub_server()
+
+    response = http_client.get(base_url + "/flaky/a", backoff=0.01)
+
+    assert response.status_code == 200
+    assert StubHandler.hits["/flaky/a"] == 2
+
+    server.shutdown()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_get_content_returns_none_when_not_found():
+    server, base_url = start_stub_server()
+
+    assert http_client.get_content(base_url + "/missing") is None
+    assert http_client.get_content(base_url + "/ok/a") == "/ok/a"
+
+    server.shutdown()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_fetch_all_preserves_order():
+    server, base_url = start_stub_server()
+
+    urls = [base_url + "/ok/%d" % x for x in range(20)]
+    responses = http_client.fetch_all(urls, workers=4)
+
+    assert [x.content for x in responses] == ["/ok/%d" % x for x in range(20)]
+
+    server.shutdown()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_map_concurrent_reraises_worker_exit():
+    def exit_on_three(x):
+        if x == 3:
+            raise SystemExit("exit on %d" % x)
+        return x
+
+    assert http_client.map_concurrent(lambda x: x * 2, range(5), workers=3) == [0, 2, 4, 6, 8]
+
+    # a worker calling sys.exit used to leave pool.map waiting forever
+    try:
+        http_client.map_concurrent(exit_on_three, range(5), workers=3)
+        assert False
+    except SystemExit as e:
+        assert str(e) == "exit on 3"
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_rate_limit_per_host():
+    server, base_url = start_stub_server()
+    host = base_url.replace("http://", "")
+
+    http_client.set_rate_limit(host, 20.0)
+
+    t_start = time.time()
+    http_client.fetch_all([base_url + "/ok/r%d" % x for x in range(10)], workers=5)
+    elapsed = time.time() - t_start
+
+    http_client.set_rate_limit(host, None)
+
+    # 10 requests at 20 per second take at least 0.45 seconds
+    assert elapsed >= 0.4
+
+    server.shutdown()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_download():
+    server, base_url = start_stub_server()
+    dest_dir = tempfile.mkdtemp()
+
+    assert http_client.download(base_url + "/ok/file", os.path.join(dest_dir, "file")) is True
+    assert open(os.path.join(dest_dir, "file")).read() == "/ok/file"
+    assert http_client.download(base_url + "/missing", os.path.join(dest_dir, "missing")) is False
+    assert not os.path.exists(os.path.join(dest_dir, "missing"))
+
+    shutil.rmtree(dest_dir)
+    server.shutdown()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_cached_get_revalidates_stale_entries():
+    server, base_url = start_stub_server()
+    cache_dir = tempfile.mkdtemp()
+    cache = http_client.ResponseCache(os.path.join(cache_dir, "cache.db"), ttl=60)
+
+    assert cache.get(base_url + "/etag/a").content == "/etag/a"
+    assert cache.get(base_url + "/etag/a").from_cache is True
+    assert StubHandler.hits["/etag/a"] == 1
+
+    # an expired entry is revalidated and served from the cache on 304
+    cache.ttl = 0
+    response = cache.get(base_url + "/etag/a")
+    assert response.from_cache is True
+    assert response.content == "/etag/a"
+    assert StubHandler.hits["/etag/a"] == 2
+
+    cache.close()
+    shutil.rmtree(cache_dir)
+    server.shutdown()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_cached_get_offline_and_eviction():
+    server, base_url = start_stub_server()
+    cache_dir = tempfile.mkdtemp()
+    cache_file = os.path.join(cache_dir, "cache.db")
+
+    cache = http_client.ResponseCache(cache_file, max_size=len("/ok/c1") * 2)
+    for name in ("c1", "c2", "c3"):
+        cache.get(base_url + "/ok/" + name)
+    cache.close()
+
+    cache = http_client.ResponseCache(cache_file, ttl=0, offline=True)
+
+    # least recently used entry was evicted, no request reaches the server
+    assert cache.get(base_url + "/ok/c1").status_code == 504
+    assert cache.get(base_url + "/ok/c3").content == "/ok/c3"
+    assert StubHandler.hits["/ok/c3"] == 1
+
+    cache.close()
+    shutil.rmtree(cache_dir)
+    server.shutdown()
@@ -0,0 +1,93 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils import infernal_utils as iu
+
+TBL_HEADER = "#target name accession query name accession mdl ...\n#------- ---\n"
+TBL_FOOTER = "#\n# Program:         cmsearch\n# [ok]\n"
+TBL_HIT = "%s - 5S_rRNA RF00001 cm 1 119 %d %d %s no 1 0.52 0.0 %s 1e-20 ! -\n"
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_tbl(tbl_file, hits):
+    fp = open(tbl_file, 'w')
+    fp.write(TBL_HEADER)
+    for hit in hits:
+        fp.write(TBL_HIT % hit)
+    fp.write(TBL_FOOTER)
+    fp.close()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_merge_tblout_files():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        chunk1 = os.path.join(tmp_dir, "chunk1.tbl")
+        chunk2 = os.path.join(tmp_dir, "chunk2.tbl")
+        write_tbl(chunk1, [("chr2", 500, 400, '-', "80.0"), ("chr1", 900, 1000, '+', "70.0"),
+                           ("chr1", 10, 110, '+', "90.0")])
+        # the chr1 hit at 900-1000 again, found in the overlap of the next window
+        write_tbl(chunk2, [("chr1/801", 100, 200, '+', "75.0"), ("chr1/801", 300, 400, '+', "60.0")])
+
+        dest_file = os.path.join(tmp_dir, "genome.tbl")
+        hits = iu.merge_tblout_files([chunk1, chunk2], dest_file,
+                                     offsets={"chr1/801": ("chr1", 800)})
+
+        lines = open(dest_file).readlines()
+        comments = [x for x in lines if x[0] == '#']
+        hits_cont = [x.split() for x in lines if x[0] != '#']
+
+        assert hits == 4
+        assert comments == TBL_HEADER.splitlines(True)
+        assert [(x[0], x[7], x[14]) for x in hits_cont] == [("chr1", "10", "90.0"),
+                                                             ("chr1", "900", "75.0"),
+                                                             ("chr1", "1100", "60.0"),
+                                                             ("chr2", "500", "80.0")]
+        assert sorted(os.listdir(tmp_dir)) == ["chunk1.tbl", "chunk2.tbl", "genome.tbl"]
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_merge_tblout_files_resolves_window_overlaps():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        # a hit cut short at the end of the first window, found whole in the next one
+        chunk1 = os.path.join(tmp_dir, "chunk1.tbl")
+        chunk2 = os.path.join(tmp_dir, "chunk2.tbl")
+        write_tbl(chunk1, [("chr1/1-1000", 950, 1000, '+', "20.0")])
+        write_tbl(chunk2, [("chr1/801-1800", 150, 260, '+', "85.0")])
+
+        dest_file = os.path.join(tmp_dir, "genome.tbl")
+        hits = iu.merge_tblout_files([chunk1, chunk2], dest_file,
+                                     offsets={"chr1/1-1000": ("chr1", 0),
+                                              "chr1/801-1800": ("chr1", 800)},
+                                     resolve_overlaps=True)
+
+        hits_cont = [x.split() for x in open(dest_file) if x[0] != '#']
+
+        assert hits == 1
+        assert (hits_cont[0][0], hits_cont[0][7], hits_cont[0][8]) == ("chr1", "950", "1060")
+
+    finally:
+        shutil.rmtree(tmp_dir)
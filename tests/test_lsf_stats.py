@@ -0,0 +1,118 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils import lsf_stats
+
+LSF_REPORT = """Sender: LSF System
+Job <cmsearch -o %(name)s.inf -Z 1000 Rfam.cm %(name)s.fa> was submitted
+
+# LSBATCH: User input
+cmsearch -o %(name)s.inf -Z 1000 Rfam.cm %(name)s.fa
+------------------------------------------------------------
+
+Successfully completed.
+
+Started at Mon Jan  8 10:00:00 2018
+Results reported at Mon Jan  8 10:30:00 2018
+
+Resource usage summary:
+
+    CPU time :                                   %(cpu)s sec.
+    Max Memory :                                 %(mem)s MB
+    Average Memory :                             -
+    Max Processes :                              3
+"""
+
+INF_OUTPUT = """# cmsearch :: search CM(s) against a sequence database
+Internal pipeline statistics summary:
+Query model(s):                                1  (100 consensus positions)
+Target sequences:                              2  (2000000 residues searched)
+//
+Internal pipeline statistics summary:
+Query model(s):                                1  (50 consensus positions)
+Target sequences:                              2  (2000000 residues searched)
+//
+"""
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_job(job_dir, name, cpu, mem):
+    fp = open(os.path.join(job_dir, name + ".out"), 'w')
+    fp.write(LSF_REPORT % {"name": name, "cpu": cpu, "mem": mem})
+    fp.close()
+
+    fp = open(os.path.join(job_dir, name + ".inf"), 'w')
+    fp.write(INF_OUTPUT)
+    fp.close()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_harvest_job_stats():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        search_dir = os.path.join(tmp_dir, "UP000000001", "search_output")
+        os.makedirs(search_dir)
+        write_job(search_dir, "chunk1", "1800.00", "400")
+        write_job(tmp_dir, "chunk2", "1800.00", "600")
+
+        db_file = os.path.join(tmp_dir, "perf.db")
+        assert lsf_stats.harvest_job_stats([tmp_dir], db_file, workers=2) == 2
+
+        # unchanged reports are not harvested again
+        assert lsf_stats.harvest_job_stats([tmp_dir], db_file, workers=2) == 0
+
+        perf_db = lsf_stats.PerformanceDB(db_file)
+        summary = perf_db.throughput()
+        assert perf_db.max_memory("cmsearch") == 600
+        perf_db.close()
+
+        assert len(summary) == 1
+        assert summary[0]["tool"] == "cmsearch"
+        assert summary[0]["jobs"] == 2
+        # Infernal counts both strands, the planner a single one
+        assert abs(summary[0]["mb_per_cpu_hour"] - 2.0) < 1e-6
+
+        job = lsf_stats.harvest_job(os.path.join(tmp_dir, "chunk2.out"))
+        assert job["cm_count"] == 2
+        assert job["total_clen"] == 150
+        assert job["residues"] == 1000000
+
+        perf_db = lsf_stats.PerformanceDB(db_file)
+        samples = sorted(perf_db.samples(tool="cmsearch"), key=lambda x: x["mem"])
+        perf_db.close()
+
+        assert [(x["residues"], x["total_clen"], x["cpu_time"], x["mem"]) for x in samples] == \
+            [(1000000, 150, 1800.0, 400.0), (1000000, 150, 1800.0, 600.0)]
+
+        stats = lsf_stats.parse_lsf_report(os.path.join(tmp_dir, "chunk2.out"))
+        assert stats["status"] == "done"
+        assert stats["start_date"] == "Mon Jan  8 10:00:00 2018"
+        assert stats["end_date"] == "Mon Jan  8 10:30:00 2018"
+        assert "avg_mem" not in stats
+
+        # single strand searches are not halved
+        fp = open(os.path.join(tmp_dir, "chunk2.inf"), 'w')
+        fp.write("# search top-strand only:                on\n" + INF_OUTPUT)
+        fp.close()
+        assert lsf_stats.parse_infernal_output(os.path.join(tmp_dir, "chunk2.inf"))["residues"] == \
+            2000000
+
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,67 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+
+from support import populate_seed_region_md5 as psm
+
+FASTA = ">seq1\nACGU\nACGU\nAC\n>seq2\nAACCGGT\n"
+
+SEED_REGIONS = [("RF00001", "seq1", 1, 4), ("RF00001", "seq2", 7, 3),
+                ("RF00002", "seq1", 4, 9), ("RF00002", "seq3", 1, 10)]
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_populate_and_resume():
+    tmp_dir = tempfile.mkdtemp()
+
+    fetch_batched = psm.sr.fetch_seed_regions_batched
+    update_md5s = psm.sr.update_seed_region_md5s
+    updates = []
+
+    try:
+        seq_file = os.path.join(tmp_dir, "seed.fa")
+        fp = open(seq_file, 'w')
+        fp.write(FASTA)
+        fp.close()
+
+        psm.sr.fetch_seed_regions_batched = lambda batch_size, missing_md5: \
+            iter([SEED_REGIONS[x:x + 2] for x in range(0, len(SEED_REGIONS), 2)])
+        psm.sr.update_seed_region_md5s = lambda rows, chunk_size: updates.extend(rows)
+
+        resume_file = os.path.join(tmp_dir, "resume.tsv")
+        missing = psm.populate_seed_region_md5s(seq_file, workers=2, resume_file=resume_file)
+
+        assert missing == [("RF00002", "seq3", 1, 10)]
+        assert sorted(updates) == sorted([
+            (hashlib.md5("ACGT").hexdigest(), "RF00001", "seq1", 1, 4),
+            (hashlib.md5("ACCGG").hexdigest(), "RF00001", "seq2", 7, 3),
+            (hashlib.md5("TACGTA").hexdigest(), "RF00002", "seq1", 4, 9)])
+
+        # every committed region is recorded and skipped on rerun
+        assert psm.load_resume_file(resume_file) == set([x[1:] for x in updates])
+
+        del updates[:]
+        missing = psm.populate_seed_region_md5s(seq_file, workers=2, resume_file=resume_file)
+
+        assert updates == []
+        assert missing == [("RF00002", "seq3", 1, 10)]
+
+    finally:
+        psm.sr.fetch_seed_regions_batched = fetch_batched
+        psm.sr.update_seed_region_md5s = update_md5s
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,125 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from scripts.validation import genome_search_validator as gsv
+from utils import project_index as pi
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_file(file_path, content):
+    fp = open(file_path, 'w')
+    fp.write(content)
+    fp.close()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_project_index_refresh():
+    project_dir = tempfile.mkdtemp()
+    upid = "UP000000123"
+
+    updir = pi.get_genome_dir(project_dir, upid)
+    os.makedirs(os.path.join(updir, "search_chunks"))
+    os.makedirs(os.path.join(updir, "search_output"))
+    write_file(os.path.join(updir, upid + ".fa"), ">s1\nACGT\nAC\n>s2\nAAA\n")
+    write_file(os.path.join(updir, "search_chunks", upid + ".fa.1"), ">s1\nACGT\n")
+    write_file(os.path.join(updir, "search_chunks", upid + ".fa.2"), ">s2\nAAA\n")
+    write_file(os.path.join(updir, "search_output", upid + ".fa.1.err"), "")
+    write_file(os.path.join(updir, "search_output", upid + ".fa.1.tbl"), "")
+    write_file(os.path.join(updir, "search_output", upid + ".fa.2.err"), "")
+
+    index = pi.ProjectIndex(project_dir)
+
+    assert index.refresh() == 1
+    assert index.upids() == [upid]
+    assert index.genome(upid)["residues"] == 9
+    assert index.genome(upid)["chunks"] == 2
+    assert index.search_status(upid) == pi.PENDING
+
+    # unchanged genomes are not listed again, but pending searches are
+    # checked for content written to their error files
+    write_file(os.path.join(updir, "search_output", upid + ".fa.2.err"), "Segmentation fault")
+
+    assert index.refresh() == 0
+    assert index.search_status(upid) == pi.FAILED
+    assert index.failed_chunks() == {upid: [upid + ".fa.2"]}
+
+    index.close()
+    shutil.rmtree(project_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_project_index_nested_sequence_dirs():
+    project_dir = tempfile.mkdtemp()
+    upid = "UP000000456"
+
+    updir = pi.get_genome_dir(project_dir, upid)
+    os.makedirs(os.path.join(updir, "sequences", "1"))
+    write_file(os.path.join(updir, "sequences", "1", "CP0001.fa"), ">CP0001\nACGT\n")
+    write_file(os.path.join(updir, upid + ".tbl"), "")
+
+    index = pi.ProjectIndex(project_dir)
+
+    assert index.refresh() == 1
+    assert index.find_file(upid, upid + ".tbl", kind="genome") == \
+        os.path.join(updir, upid + ".tbl")
+    assert index.find_file(upid, upid + ".rfamseq") is None
+
+    # a file added to a nested sequence directory leaves the mtime of the
+    # sequences directory unchanged
+    mtime = os.path.getmtime(os.path.join(updir, "sequences", "1"))
+    write_file(os.path.join(updir, "sequences", "1", "CP0002.fa"), ">CP0002\nACGT\n")
+    os.utime(os.path.join(updir, "sequences", "1"), (mtime + 10, mtime + 10))
+
+    assert index.refresh() == 1
+    assert [os.path.basename(x[0]) for x in index.files(upid, kind="sequence")] == \
+        ["CP0001.fa", "CP0002.fa"]
+    assert index.refresh() == 0
+
+    index.close()
+    shutil.rmtree(project_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_search_validator_project_dir():
+    project_dir = tempfile.mkdtemp()
+    upid = "UP000000789"
+
+    updir = pi.get_genome_dir(project_dir, upid)
+    os.makedirs(os.path.join(updir, "search_chunks"))
+    os.makedirs(os.path.join(updir, "search_output"))
+    write_file(os.path.join(project_dir, pi.UPID_GCA_FILENAME), "{}")
+    write_file(os.path.join(updir, "search_chunks", upid + ".fa.1"), ">s1\nACGT\n")
+    write_file(os.path.join(updir, "search_output", upid + ".fa.1.err"), "")
+
+    assert gsv.get_search_recovery_list(project_dir) == []
+    assert gsv.check_search_err_files(project_dir) == {}
+
+    # error files grow without changing their directory
+    write_file(os.path.join(updir, "search_output", upid + ".fa.1.err"), "Segmentation fault")
+
+    assert gsv.get_search_recovery_list(project_dir) == [upid]
+    assert gsv.check_search_err_files(project_dir) == {"789": {upid: [upid + ".fa.1"]}}
+
+    fp = open(os.path.join(project_dir, "recovery_list.txt"))
+    assert fp.read() == upid + "\n"
+    fp.close()
+
+    shutil.rmtree(project_dir)
@@ -0,0 +1,148 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from scripts.export import rfam_svn_file_export as sfe
+
+SVN_URL = "https://svn.example.org/Families"
+
+# svn list --verbose output of the Families directory
+SVN_LISTING = """  25650 rfamprod              Oct 19 10:00 ./
+  25641 rfamprod              Oct 01  2016 RF00001/
+  25648 jdoe                  Oct 18 09:12 RF00002/
+   1204 rfamprod            112 Mar 03  2012 README
+"""
+
+# stub svn printing the listing on svn list and the url on svn cat, failing
+# on the files of RF00002, and logging every file it reads
+STUB_SVN = """#!%(python)s
+import sys
+if sys.argv[1] == "list":
+    sys.stdout.write(open(%(listing)r).read())
+    sys.exit(0)
+url = sys.argv[-1]
+open(%(log)r, 'a').write(url + '\\n')
+if "/RF00002/" in url and %(fail)r:
+    sys.exit(1)
+sys.stdout.write(url + '\\n')
+"""
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_stub_svn(tmp_dir, fail=False):
+    listing = os.path.join(tmp_dir, "listing.txt")
+    fp = open(listing, 'w')
+    fp.write(SVN_LISTING)
+    fp.close()
+
+    svn = os.path.join(tmp_dir, "svn")
+    fp = open(svn, 'w')
+    fp.write(STUB_SVN % {"python": sys.executable, "listing": listing,
+                         "log": os.path.join(tmp_dir, "svn.log"), "fail": fail})
+    fp.close()
+    os.chmod(svn, 0755)
+
+    return svn
+
+
+def read_svn_log(tmp_dir):
+    log_file = os.path.join(tmp_dir, "svn.log")
+    if not os.path.exists(log_file):
+        return []
+
+    fp = open(log_file)
+    urls = fp.read().splitlines()
+    fp.close()
+    os.remove(log_file)
+
+    return sorted(urls)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_get_family_revisions():
+    tmp_dir = tempfile.mkdtemp()
+
+    svn_list = sfe.SVN_LIST
+
+    try:
+        sfe.SVN_LIST = [write_stub_svn(tmp_dir), "list", "--verbose"]
+
+        assert sfe.get_family_revisions(SVN_URL) == {"RF00001": 25641, "RF00002": 25648}
+
+    finally:
+        sfe.SVN_LIST = svn_list
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_export_unchanged_families():
+    tmp_dir = tempfile.mkdtemp()
+    out_dir = os.path.join(tmp_dir, "export")
+
+    svn_list = sfe.SVN_LIST
+    svn_cat = sfe.SVN_CAT
+
+    try:
+        svn = write_stub_svn(tmp_dir, fail=True)
+        sfe.SVN_LIST = [svn, "list", "--verbose"]
+        sfe.SVN_CAT = [svn, "cat"]
+
+        rfam_accs = ["RF00001", "RF00002", "RF00003"]
+
+        failed = sfe.export_rfam_family_files(sfe.FILE_TYPES, out_dir, svn_url=SVN_URL,
+                                              workers=2, rfam_accs=rfam_accs)
+
+        assert sorted(failed.keys()) == ["RF00002", "RF00003"]
+        assert failed["RF00003"] == "RF00003 not found in %s" % SVN_URL
+        assert sfe.load_export_manifest(out_dir) == {"RF00001": 25641}
+
+        # files are read at the family's last changed revision
+        fp = open(sfe.get_export_path(out_dir, "SEED", "RF00001"))
+        assert fp.read() == "%s/RF00001/SEED@25641\n" % SVN_URL
+        fp.close()
+
+        assert os.listdir(os.path.join(out_dir, "CM")) == ["RF00001.cm"]
+        assert sorted(os.listdir(out_dir)) == ["CM", "SEED", sfe.EXPORT_MANIFEST]
+        read_svn_log(tmp_dir)
+
+        # only the family that failed is exported again
+        write_stub_svn(tmp_dir)
+        failed = sfe.export_rfam_family_files(sfe.FILE_TYPES, out_dir, svn_url=SVN_URL,
+                                              workers=2, rfam_accs=rfam_accs[0:2])
+
+        assert failed == {}
+        assert read_svn_log(tmp_dir) == ["%s/RF00002/CM@25648" % SVN_URL,
+                                         "%s/RF00002/SEED@25648" % SVN_URL]
+        assert sfe.load_export_manifest(out_dir) == {"RF00001": 25641, "RF00002": 25648}
+
+        # families with missing files are exported again
+        os.remove(sfe.get_export_path(out_dir, "CM", "RF00002"))
+        sfe.export_rfam_family_files(sfe.FILE_TYPES, out_dir, svn_url=SVN_URL, workers=2,
+                                     rfam_accs=rfam_accs[0:2])
+        assert len(read_svn_log(tmp_dir)) == 2
+
+        sfe.export_rfam_family_files(sfe.FILE_TYPES, out_dir, svn_url=SVN_URL, workers=2,
+                                     rfam_accs=rfam_accs[0:2], force=True)
+        assert len(read_svn_log(tmp_dir)) == 4
+
+    finally:
+        sfe.SVN_LIST = svn_list
+        sfe.SVN_CAT = svn_cat
+        shutil.rmtree(tmp_dir)
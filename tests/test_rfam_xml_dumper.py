@@ -0,0 +1,91 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rfam_schemas.rfam_schemas.settings")
+
+from scripts.export import rfam_xml_dumper as rxd
+
+GENOME_FIELDS = {"id": "UP000005640", "updated": "2026-10-01 10:00:00"}
+
+
+# --------------------------------------------------------------------------------------------------
+
+class Index(object):
+    def __init__(self, index_file):
+        self.index_file = index_file
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_full_region_delta_export():
+    tmp_dir = tempfile.mkdtemp()
+
+    fetch_entry_fields = rxd.fetch_entry_fields
+    fetch_full_region_checksum = rxd.fetch_full_region_checksum
+    get_rnacentral_mapping = rxd.get_rnacentral_mapping
+
+    regions = {"UP000005640": (2, "aaaa"), "UP000000625": (1, "bbbb")}
+    mappings = {"CM000663.2/100:171": "URS00000AAAAA"}
+    exported = []
+
+    def export_entry(upid):
+        exported.append(upid)
+        fp = open(os.path.join(tmp_dir, upid + ".xml"), 'w')
+        fp.write(upid)
+        fp.close()
+
+    def export(rnac_index=None):
+        del exported[:]
+        return rxd.export_entries(rxd.rs.MATCH, sorted(regions.keys()), tmp_dir, export_entry,
+                                  delta=True, rnac_index=rnac_index)
+
+    try:
+        rxd.fetch_entry_fields = lambda entry_acc, entry_type: dict(GENOME_FIELDS, id=entry_acc)
+        rxd.fetch_full_region_checksum = lambda upid: regions[upid]
+        rxd.get_rnacentral_mapping = lambda upid: dict(mappings)
+
+        assert export() == (2, 0)
+        assert export() == (0, 2)
+        assert exported == []
+
+        # the genome row is unchanged, but its regions are not
+        regions["UP000000625"] = (2, "cccc")
+        assert export() == (1, 1)
+        assert exported == ["UP000000625"]
+
+        mappings["CM000663.2/100:171"] = "URS00000BBBBB"
+        assert export() == (2, 0)
+
+        # exports with an index are signed with the index file
+        index_file = os.path.join(tmp_dir, "rnacentral_index.db")
+        fp = open(index_file, 'w')
+        fp.write("regions")
+        fp.close()
+
+        assert export(rnac_index=Index(index_file)) == (2, 0)
+        assert export(rnac_index=Index(index_file)) == (0, 2)
+
+        fp = open(index_file, 'a')
+        fp.write(" and metadata")
+        fp.close()
+        assert export(rnac_index=Index(index_file)) == (2, 0)
+
+    finally:
+        rxd.fetch_entry_fields = fetch_entry_fields
+        rxd.fetch_full_region_checksum = fetch_full_region_checksum
+        rxd.get_rnacentral_mapping = get_rnacentral_mapping
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,64 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+
+from utils import rnacentral_index as rni
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_build_and_lookup():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        metadata_file = os.path.join(tmp_dir, "rnacentral.tsv")
+        fp = open(metadata_file, 'w')
+        fp.write("URS0000000001\tENA\tAB000001.1/1-70\t9606\trRNA\n")
+        fp.write("URS0000000001\tRefSeq\tNR_000001.1\t9606\trRNA\n")
+        fp.write("URS0000000002\tENA\tAB000002.1\t10090\ttRNA\n")
+        fp.close()
+
+        rows = [("CM000663.2", 100, 171, "URS0000000001"),
+                ("CM000663.2", 500, 420, "URS0000000002"),
+                ("CM000663.2", 100, 171, "URS0000000003"),
+                ("CM000664.2", 1, 80, None)]
+
+        index_file = os.path.join(tmp_dir, rni.INDEX_FILENAME)
+        assert rni.build_rnacentral_index(index_file, rows,
+                                          rnac_metadata_file=metadata_file) == (2, 2)
+        assert rni.is_rnacentral_index(index_file) is True
+        assert rni.is_rnacentral_index(metadata_file) is False
+
+        index = rni.RNAcentralIndex(index_file)
+
+        # the first mapping of a region is kept
+        assert index.lookup("CM000663.2", 100, 171) == "URS0000000001"
+        assert index.lookup("CM000664.2", 1, 80) is None
+        assert index.get("CM000663.2/500:420") == "URS0000000002"
+        assert index.get("CM000663.2/1:2") is None
+        assert index.get("CM000663.2") is None
+        assert index.sequence_regions("CM000663.2") == {(100, 171): "URS0000000001",
+                                                        (500, 420): "URS0000000002"}
+
+        assert index.metadata("URS0000000001_9606") == {"source": "ENA",
+                                                        "previous_acc": "AB000001.1",
+                                                        "tax_id": "9606", "mol_type": "rRNA"}
+        assert [x[0] for x in index.iterate_metadata()] == ["URS0000000001_9606",
+                                                            "URS0000000002_10090"]
+        index.close()
+
+    finally:
+        shutil.rmtree(tmp_dir)
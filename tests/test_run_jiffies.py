@@ -0,0 +1,134 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+from scripts.export import run_jiffies
+
+# writes ACC.cm in the working directory, fails on RF00002 every time and
+# on RF00003 the first time only
+JIFFY = """#!/bin/sh
+if [ "$1" = "RF00002" ]; then echo "no family" >&2; exit 1; fi
+if [ "$1" = "RF00003" ] && [ ! -e %(marker)s ]; then touch %(marker)s; exit 2; fi
+echo "CM of $1" > $1.cm
+"""
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_call_jiffy():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        jiffy = os.path.join(tmp_dir, "writeAnnotatedCM.sh")
+        fp = open(jiffy, 'w')
+        fp.write(JIFFY % {"marker": os.path.join(tmp_dir, "marker")})
+        fp.close()
+        os.chmod(jiffy, 0755)
+
+        fam_file = os.path.join(tmp_dir, "families.txt")
+        fp = open(fam_file, 'w')
+        fp.write("RF00001\nRF00002\n\nRF00003\n")
+        fp.close()
+
+        outdir = os.path.join(tmp_dir, "out")
+        failed = run_jiffies.call_jiffy(jiffy, fam_file, outdir, workers=2, retries=1)
+
+        assert failed == ["RF00002"]
+        assert sorted(os.listdir(outdir)) == ["RF00001.cm", "RF00003.cm", "jiffy_summary.tsv",
+                                              "logs"]
+        assert os.listdir(os.path.join(outdir, "logs")) == ["RF00002.log"]
+
+        fp = open(os.path.join(outdir, "logs", "RF00002.log"))
+        assert fp.read() == "no family\n"
+        fp.close()
+
+        fp = open(os.path.join(outdir, "jiffy_summary.tsv"))
+        summary = [x.split('\t') for x in fp.read().splitlines()[1:]]
+        fp.close()
+
+        assert [(x[0], x[1], x[3]) for x in summary] == [("RF00001", "0", "1"),
+                                                         ("RF00002", "1", "2"),
+                                                         ("RF00003", "0", "2")]
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_run_jiffy_error():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        os.mkdir(os.path.join(tmp_dir, "logs"))
+
+        # the directory the jiffy writes cannot replace this file
+        fp = open(os.path.join(tmp_dir, "RF00004.dir"), 'w')
+        fp.close()
+
+        rfam_acc, status, elapsed = run_jiffies.run_jiffy("echo done; mkdir", "RF00004.dir",
+                                                          tmp_dir)
+
+        assert status == -1
+        assert sorted(os.listdir(tmp_dir)) == ["RF00004.dir", "logs"]
+
+        fp = open(os.path.join(tmp_dir, "logs", "RF00004.dir.log"))
+        log = fp.read()
+        fp.close()
+
+        assert log.startswith("done\nTraceback")
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_positional_arguments():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        jiffy = os.path.join(tmp_dir, "writeAnnotatedCM.sh")
+        fp = open(jiffy, 'w')
+        fp.write("#!/bin/sh\necho \"CM of $1\" > $1.cm\n")
+        fp.close()
+        os.chmod(jiffy, 0755)
+
+        fam_file = os.path.join(tmp_dir, "families.txt")
+        fp = open(fam_file, 'w')
+        fp.write("RF00001\n")
+        fp.close()
+
+        script = os.path.splitext(run_jiffies.__file__)[0] + ".py"
+
+        # run_jiffies.py <jiffy> <fam_file> <outdir>
+        outdir = os.path.join(tmp_dir, "out")
+        subprocess.check_call([sys.executable, script, jiffy, fam_file, outdir])
+        assert os.path.exists(os.path.join(outdir, "RF00001.cm"))
+
+        # options win over the positionals
+        option_outdir = os.path.join(tmp_dir, "option_out")
+        subprocess.check_call([sys.executable, script, jiffy, fam_file, outdir,
+                               "--outdir", option_outdir])
+        assert os.path.exists(os.path.join(option_outdir, "RF00001.cm"))
+
+        args = run_jiffies.usage().parse_args(["writeAnnotatedCM.pl", "--outdir", "out"])
+        assert (args.jiffy, args.fam_file, args.outdir) == ("writeAnnotatedCM.pl", None, "out")
+
+    finally:
+        shutil.rmtree(tmp_dir)
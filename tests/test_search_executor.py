@@ -0,0 +1,113 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from utils import search_executor as se
+from utils import lsf_stats
+from utils import project_index as pi
+
+# stub cmsearch writing its -o and --tblout files, failing on chunks named bad*
+STUB_SEARCH = """#!%s
+import sys
+args = sys.argv[1:]
+seq_file = args[-1]
+if seq_file.endswith("bad.fa"):
+    sys.stderr.write("Error: stub failure\\n")
+    sys.exit(1)
+open(args[args.index("-o") + 1], 'w').write("# cmsearch :: search CM(s) against a sequence database\\n")
+open(args[args.index("--tblout") + 1], 'w').write("#\\n")
+"""
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_local_executor():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        stub = os.path.join(tmp_dir, "cmsearch")
+        fp = open(stub, 'w')
+        fp.write(STUB_SEARCH % sys.executable)
+        fp.close()
+        os.chmod(stub, 0755)
+
+        dest_dir = os.path.join(tmp_dir, "search_output")
+        jobs = [{"name": name, "binary": stub, "cm_file": "Rfam.cm",
+                 "seq_file": os.path.join(tmp_dir, name), "dest_dir": dest_dir,
+                 "dbsize": 1000, "cpus": 2, "memory": 100}
+                for name in ("chunk1.fa", "chunk2.fa", "bad.fa")]
+
+        executor = se.LocalExecutor(cpus=2, memory=150, scratch_dir=tmp_dir)
+        results = executor.run(jobs)
+
+        assert [x["exit_code"] for x in results] == [0, 0, 1]
+        assert executor.cpus_used == 0 and executor.memory_used == 0
+
+        files = dict([(x, os.path.getsize(os.path.join(dest_dir, x)))
+                      for x in os.listdir(dest_dir)])
+
+        # same layout and status as LSF searches
+        assert pi.get_chunk_search_status("chunk1.fa", files) == pi.DONE
+        assert pi.get_chunk_search_status("bad.fa", files) == pi.FAILED
+
+        stats = lsf_stats.parse_lsf_report(os.path.join(dest_dir, "chunk1.fa.out"))
+        assert stats["status"] == "done"
+        assert "cpu_time" in stats and "max_mem" in stats
+
+        # scratch directories are cleaned up
+        assert sorted(os.listdir(tmp_dir)) == ["cmsearch", "search_output"]
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_task_file_and_arrays():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        stub = os.path.join(tmp_dir, "cmsearch")
+        fp = open(stub, 'w')
+        fp.write(STUB_SEARCH % sys.executable)
+        fp.close()
+        os.chmod(stub, 0755)
+
+        dest_dir = os.path.join(tmp_dir, "search_output")
+        jobs = [{"name": name, "binary": stub, "cm_file": cm_file,
+                 "seq_file": os.path.join(tmp_dir, name), "dest_dir": dest_dir,
+                 "dbsize": 1000, "cpus": 2, "memory": 100}
+                for cm_file in ("/cms/CM1", "/cms/CM2") for name in ("chunk1.fa", "chunk2.fa",
+                                                                     "chunk3.fa")]
+
+        # one array per CM file, split at max_array_size
+        executor = se.LSFArrayExecutor(os.path.join(tmp_dir, "tasks"), max_array_size=2)
+        arrays = executor.group_jobs(jobs)
+        assert [(x[0], len(x[1])) for x in arrays] == [("CM1_2c_100m_1", 2), ("CM1_2c_100m_2", 1),
+                                                        ("CM2_2c_100m_1", 2), ("CM2_2c_100m_2", 1)]
+
+        task_file = os.path.join(tmp_dir, "CM1.tasks")
+        se.write_task_file(task_file, jobs[:3])
+        assert se.read_task(task_file, 2) == jobs[1]
+
+        result = se.run_task(task_file, 2, scratch_dir=tmp_dir)
+        assert result["exit_code"] == 0
+        assert sorted(os.listdir(dest_dir)) == ["chunk2.fa." + x for x in ("err", "inf", "out",
+                                                                           "tbl")]
+
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,57 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from utils import search_planner as sp
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_fit_cost_model():
+    # 2 seconds per Mb per 1000 CLEN, 1000 MB + 100 MB per Mb
+    samples = [{"residues": x * 1000000, "total_clen": 5000, "cpu_time": x * 10.0,
+                "mem": 1000 + x * 100.0} for x in (1, 2, 4)]
+
+    model = sp.fit_cost_model(samples)
+
+    assert abs(model["cpu_rate"] - 2.0) < 1e-6
+    assert abs(model["mem_base"] - 1000.0) < 1e-6
+    assert abs(model["mem_per_mb"] - 100.0) < 1e-6
+    assert model["samples"] == 3
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_plan_search_jobs_balances_chunks():
+    model = dict(sp.DEFAULT_MODEL)
+    chunks = [("c%d" % x, size) for x, size in enumerate([8, 1, 1, 2, 3, 4, 5])]
+
+    jobs = sp.plan_search_jobs(chunks, model, 1000)
+
+    # every job is bounded by the most expensive chunk
+    assert len(jobs) == 3
+    assert sorted([x["residues"] for x in jobs]) == [8, 8, 8]
+    assert sorted(sum([x["chunks"] for x in jobs], [])) == sorted([x[0] for x in chunks])
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_plan_cm_groups():
+    models = [("RF%05d.cm" % x, clen) for x, clen in enumerate([100, 900, 300, 400, 500, 200])]
+
+    groups = sp.plan_cm_groups(models, 3)
+
+    assert [x["weight"] for x in groups] == [900, 800, 700]
+    assert groups[2]["models"] == ["RF00003.cm", "RF00002.cm"]
+    assert sorted(sum([x["models"] for x in groups], [])) == sorted([x[0] for x in models])
+
+    assert len(sp.plan_cm_groups(models[:2], 6)) == 2
@@ -0,0 +1,142 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import gzip
+import shutil
+import tempfile
+
+from utils import fasta_validator as fv
+from scripts.validation import validate_genomes as vg
+
+
+# --------------------------------------------------------------------------------------------------
+
+def write_file(file_path, content):
+    fp = open(file_path, 'w')
+    fp.write(content)
+    fp.close()
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_validate_sequence_file():
+    test_dir = tempfile.mkdtemp()
+
+    write_file(os.path.join(test_dir, "ok.fa"), ">s1 desc\nACGT\nAC\n>s2\nNNNN\n")
+    write_file(os.path.join(test_dir, "bad.fa"), ">s1\nACGT\n<html>\n")
+    write_file(os.path.join(test_dir, "empty.fa"), "")
+    write_file(os.path.join(test_dir, "truncated.fa.gz"), "\x1f\x8b\x08\x00")
+
+    fp = gzip.open(os.path.join(test_dir, "ok.fasta.gz"), 'wb')
+    fp.write(">s1\nACGU\n")
+    fp.close()
+
+    result = fv.validate_sequence_file(os.path.join(test_dir, "ok.fa"))
+    assert result["status"] is True
+    assert (result["sequences"], result["residues"]) == (2, 10)
+
+    assert fv.validate_sequence_file(os.path.join(test_dir, "ok.fasta.gz"))["status"] is True
+    assert fv.validate_sequence_file(os.path.join(test_dir, "bad.fa"))["status"] is False
+    assert fv.validate_sequence_file(os.path.join(test_dir, "empty.fa"))["error"] == "Empty file"
+    assert fv.validate_sequence_file(os.path.join(test_dir, "truncated.fa.gz"))["status"] is False
+    assert fv.validate_sequence_file(os.path.join(test_dir, "none.fa"))["error"] == "Missing file"
+
+    shutil.rmtree(test_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_validate_project():
+    project_dir = tempfile.mkdtemp()
+    upid = "UP000000001"
+
+    write_file(os.path.join(project_dir, "upid_gca_dict.json"),
+               json.dumps({upid: {"GCA": -1, "DOM": "bacteria"}}))
+
+    seq_dir = os.path.join(project_dir, "001", upid, "sequences")
+    os.makedirs(seq_dir)
+    write_file(os.path.join(project_dir, "001", upid, upid + "_accessions.json"),
+               json.dumps({"WGS": -1, "OTHER": {"Chr1": "CP0001", "Chr2": "CP0002"}}))
+    write_file(os.path.join(seq_dir, "CP0001.fa"), ">CP0001\nACGT\n")
+
+    report = vg.validate_project(project_dir, workers=2)
+
+    assert report["genomes"][upid]["status"] == "Failure"
+    assert report["genomes"][upid]["missing_accessions"] == ["CP0002"]
+    assert report["summary"]["files"] == 1
+    assert os.path.exists(os.path.join(project_dir, "validation_report.json"))
+
+    # unchanged files are served from the index
+    index = fv.ValidationIndex(os.path.join(project_dir, "validation_index.db"))
+    assert index.fetch_genome(upid).keys() == [os.path.join(seq_dir, "CP0001.fa")]
+    index.close()
+
+    write_file(os.path.join(seq_dir, "CP0002.fa"), ">CP0002\nACGT\n")
+    report = vg.validate_project(project_dir, workers=2)
+
+    assert report["genomes"][upid]["status"] == "Success"
+    assert report["summary"]["sequences"] == 2
+
+    shutil.rmtree(project_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_check_file_format():
+    test_dir = tempfile.mkdtemp()
+
+    # files that are neither fasta nor gzipped are only checked for content
+    write_file(os.path.join(test_dir, "CP0001.embl"), "ID   CP0001\n")
+    write_file(os.path.join(test_dir, "CP0002.embl"), "")
+    write_file(os.path.join(test_dir, "CP0003.tar.gz"), "\x1f\x8b\x08\x00")
+
+    assert vg.check_file_format(os.path.join(test_dir, "CP0001.embl")) is True
+    assert vg.check_file_format(os.path.join(test_dir, "CP0002.embl")) is False
+    assert vg.check_file_format(os.path.join(test_dir, "CP0003.tar.gz")) is True
+    assert vg.check_file_format(os.path.join(test_dir, "CP0004.embl")) is False
+
+    shutil.rmtree(test_dir)
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_validate_genome_legacy_checks():
+    project_dir = tempfile.mkdtemp()
+    upid = "UP000000002"
+    updir = os.path.join(project_dir, "002", upid)
+    seq_dir = os.path.join(updir, "sequences")
+    os.makedirs(seq_dir)
+
+    write_file(os.path.join(updir, upid + "_accessions.json"),
+               json.dumps({"WGS": -1, "OTHER": {"Chr1": "CP0001"}}))
+    write_file(os.path.join(updir, "GCA_000000001.1_sequence_report.txt"),
+               "accession\tchromosome\nCP0001.1\tChr1\nCP0002.2\tChr2\n")
+    write_file(os.path.join(updir, "download.out"), "Exited with exit code 1.\n")
+    write_file(os.path.join(seq_dir, "CP0001.fa"), ">CP0001\n<html>\n")
+
+    upid, report, new_results = vg.validate_genome((upid, updir, "GCA_000000001.1",
+                                                    [os.path.join(seq_dir, "CP0001.fa")], {}))
+
+    # accessions of the GCA report are expected as well as those from Uniprot
+    assert report["missing_accessions"] == ["CP0002"]
+    assert report["invalid_files"].keys() == [os.path.join("sequences", "CP0001.fa")]
+    assert report["errors"] == ["Unsuccessful download"]
+    assert report["status"] == "Failure"
+
+    fp = open(os.path.join(updir, "restore.json"))
+    assert json.load(fp) == {"WGS": -1, "MULTI": 0, "OTHER": ["CP0001", "CP0002"]}
+    fp.close()
+
+    shutil.rmtree(project_dir)
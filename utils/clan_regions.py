@@ -0,0 +1,215 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Columnar store of the full_region hits of a clan for clan competition.
+Regions are kept in typed arrays, one per column, sorted by sequence
+accession and lowest coordinate, with the regions of every sequence in a
+contiguous range given by seq_offsets:
+
+    family_ids: Index of the family in families (uint16)
+    starts, ends: seq_start and seq_end (uint32)
+    evalues, bit_scores: E-value and bit score (float64)
+    row_ids: Position of the region in the input rows (uint32), which
+             breaks exact ties in clan competition
+
+Accessions are stored once, in the families and sequences lists
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+from array import array
+
+# -----------------------------------------------------------------------------
+
+
+class ClanRegions(object):
+    """
+    The full_region hits of a clan in columnar form, as built by
+    build_clan_regions
+    """
+
+    def __init__(self, families, sequences, seq_offsets, family_ids, starts, ends,
+                 evalues, bit_scores, row_ids):
+        """
+        families: A list of family accessions
+        sequences: A list of sequence accessions in sorted order
+        seq_offsets: An array of len(sequences) + 1 offsets. The regions of
+        sequences[i] are in range(seq_offsets[i], seq_offsets[i + 1])
+        family_ids, starts, ends, evalues, bit_scores, row_ids: Region
+        columns
+        """
+
+        self.families = families
+        self.sequences = sequences
+        self.seq_offsets = seq_offsets
+        self.family_ids = family_ids
+        self.starts = starts
+        self.ends = ends
+        self.evalues = evalues
+        self.bit_scores = bit_scores
+        self.row_ids = row_ids
+
+    def __len__(self):
+        """
+        Returns the number of regions
+        """
+
+        return len(self.starts)
+
+    def iterate_sequences(self):
+        """
+        Iterates over the sequences and the ranges of their regions
+
+        return: A generator of (rfamseq_acc, first region, last region + 1)
+        tuples
+        """
+
+        for idx, rfamseq_acc in enumerate(self.sequences):
+            yield rfamseq_acc, self.seq_offsets[idx], self.seq_offsets[idx + 1]
+
+    def region(self, idx):
+        """
+        Returns a region as a tuple (rfam_acc, seq_start, seq_end, evalue,
+        bit_score)
+        """
+
+        return (self.families[self.family_ids[idx]], self.starts[idx], self.ends[idx],
+                self.evalues[idx], self.bit_scores[idx])
+
+    def to_dict(self):
+        """
+        Converts the regions to the {rfam_acc: {rfamseq_acc: [(start, end,
+        evalue), ...]}} dictionary of db_utils.load_clan_seqs_from_db
+        """
+
+        fam_seqs = {}
+
+        for rfamseq_acc, first, last in self.iterate_sequences():
+            for idx in xrange(first, last):
+                rfam_acc = self.families[self.family_ids[idx]]
+                fam_seqs.setdefault(rfam_acc, {}).setdefault(rfamseq_acc, []).append(
+                    (self.starts[idx], self.ends[idx], self.evalues[idx]))
+
+        return fam_seqs
+
+    def nbytes(self):
+        """
+        Returns the memory used by the region columns in bytes
+        """
+
+        return sum([x.itemsize * len(x) for x in (self.seq_offsets, self.family_ids,
+                                                  self.starts, self.ends, self.evalues,
+                                                  self.bit_scores, self.row_ids)])
+
+# -----------------------------------------------------------------------------
+
+
+def build_clan_regions(rows):
+    """
+    Streams full_region rows into a ClanRegions store. Rows are grouped by
+    sequence with a counting sort over the arrays, so the rows do not need
+    to come sorted
+
+    rows: An iterable of (rfam_acc, rfamseq_acc, seq_start, seq_end, evalue,
+    bit_score) rows. A missing bit score (5 column rows) is stored as 0
+
+    return: A ClanRegions object
+    """
+
+    family_index = {}
+    sequence_index = {}
+    families = []
+    sequences = []
+
+    row_family_ids = array('H')
+    row_seq_ids = array('I')
+    starts = array('I')
+    ends = array('I')
+    evalues = array('d')
+    bit_scores = array('d')
+
+    for row in rows:
+        rfam_acc = str(row[0])
+        family_id = family_index.get(rfam_acc)
+        if family_id is None:
+            family_id = len(families)
+            family_index[rfam_acc] = family_id
+            families.append(intern(rfam_acc))
+
+        rfamseq_acc = str(row[1])
+        seq_id = sequence_index.get(rfamseq_acc)
+        if seq_id is None:
+            seq_id = len(sequences)
+            sequence_index[rfamseq_acc] = seq_id
+            sequences.append(intern(rfamseq_acc))
+
+        row_family_ids.append(family_id)
+        row_seq_ids.append(seq_id)
+        starts.append(int(row[2]))
+        ends.append(int(row[3]))
+        evalues.append(float(row[4]))
+        bit_scores.append(float(row[5]) if len(row) > 5 and row[5] is not None else 0.0)
+
+    family_index = None
+    sequence_index = None
+
+    # rank of every sequence in accession order
+    seq_order = sorted(xrange(len(sequences)), key=sequences.__getitem__)
+    seq_ranks = array('I', [0]) * len(sequences)
+    for rank, seq_id in enumerate(seq_order):
+        seq_ranks[seq_id] = rank
+
+    # counting sort of the rows by sequence rank
+    seq_offsets = array('L', [0]) * (len(sequences) + 1)
+    for seq_id in row_seq_ids:
+        seq_offsets[seq_ranks[seq_id] + 1] += 1
+
+    for rank in xrange(len(sequences)):
+        seq_offsets[rank + 1] += seq_offsets[rank]
+
+    next_slot = array('L', seq_offsets[:-1])
+    order = array('L', [0]) * len(row_seq_ids)
+    for row_idx, seq_id in enumerate(row_seq_ids):
+        rank = seq_ranks[seq_id]
+        order[next_slot[rank]] = row_idx
+        next_slot[rank] += 1
+
+    # regions of a sequence by lowest coordinate
+    for rank in xrange(len(sequences)):
+        first = seq_offsets[rank]
+        last = seq_offsets[rank + 1]
+        if last - first > 1:
+            order[first:last] = array('L', sorted(order[first:last],
+                                                  key=lambda x: (min(starts[x], ends[x]), starts[x])))
+
+    row_seq_ids = None
+    seq_ranks = None
+    next_slot = None
+
+    # reorder one column at a time, so that only one is held twice
+    columns = [row_family_ids, starts, ends, evalues, bit_scores]
+    row_family_ids = starts = ends = evalues = bit_scores = None
+
+    for idx in xrange(len(columns)):
+        columns[idx] = array(columns[idx].typecode, (columns[idx][x] for x in order))
+
+    columns.append(array('I', order))
+
+    return ClanRegions(families, [sequences[x] for x in seq_order], seq_offsets, *columns)
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
@@ -23,8 +23,6 @@ Description: A set of database functions to ease processing and data
        - set_num_sig_seqs() we need a new field in the family table to hold the
          number of significant sequences per family. This can be performed after
          clan competition
-       - merge functions set_num_sig_seqs and set_number_of_species to one and
-         pass query and fields as parameters
 
        *Perhaps include this module within an RfamLive class as all of the
         functions are database specific.
@@ -38,7 +36,10 @@ import sys
 import string
 import json
 
+import mysql.connector
+
 from utils import RfamDB
+from utils import clan_regions as clan_regions_lib
 from scripts.export.genomes import fetch_gen_metadata as fgm
 
 # -------------------------------------------------------------------------
@@ -148,19 +149,17 @@ def load_clan_seqs_from_db(clan_acc):  # tested
 
     # build family dictionary of sequences
     for row in cursor:
+        rfam_acc = str(row[RFAM_ACC])
+        rfamseq_acc = str(row[SEQ_ACC])
 
-        if str(row[RFAM_ACC]) in fam_seqs.keys():
+        if rfam_acc not in fam_seqs:
+            fam_seqs[rfam_acc] = {}
 
-            if str(row[SEQ_ACC]) in fam_seqs[str(row[RFAM_ACC])].keys():
+        if rfamseq_acc not in fam_seqs[rfam_acc]:
+            fam_seqs[rfam_acc][rfamseq_acc] = []
 
-                fam_seqs[str(row[RFAM_ACC])][str(row[SEQ_ACC])].append(
-                    (int(row[START]), int(row[END]), float(row[EVAL])))
-            else:
-                fam_seqs[str(row[RFAM_ACC])][str(row[SEQ_ACC])] = [(int(row[START]),
-                                                                    int(row[END]), float(row[EVAL]))]
-        else:
-            fam_seqs[str(row[RFAM_ACC])] = {
-                str(row[SEQ_ACC]): [(int(row[START]), int(row[END]), float(row[EVAL]))]}
+        fam_seqs[rfam_acc][rfamseq_acc].append(
+            (int(row[START]), int(row[END]), float(row[EVAL])))
 
     # close cursor and DB connection
     cursor.close()
@@ -171,6 +170,42 @@ def load_clan_seqs_from_db(clan_acc):  # tested
 # -------------------------------------------------------------------------
 
 
+def load_clan_regions_from_db(clan_acc):
+    """
+    Streams the full_region hits of the families of a clan into a columnar
+    ClanRegions store (see utils/clan_regions.py), which uses a fraction of
+    the memory of the dictionary returned by load_clan_seqs_from_db
+
+    clan_acc: Clan accession as in Rfam
+
+    return: A ClanRegions object
+    """
+
+    cnx = RfamDB.connect()
+
+    # unbuffered, rows are read as they arrive
+    cursor = cnx.cursor(raw=True, buffered=False)
+
+    query = ("SELECT full_region.rfam_acc, full_region.rfamseq_acc, "
+             "full_region.seq_start, full_region.seq_end, full_region.evalue_score, "
+             "full_region.bit_score\n"
+             "FROM full_region\n"
+             "JOIN (SELECT rfam_acc FROM clan_membership WHERE clan_acc=\'%s\') as CLAN_FAMS\n"
+             "ON CLAN_FAMS.rfam_acc=full_region.rfam_acc") % (clan_acc)
+
+    cursor.execute(query)
+
+    try:
+        clan_regions = clan_regions_lib.build_clan_regions(cursor)
+    finally:
+        cursor.close()
+        RfamDB.disconnect(cnx)
+
+    return clan_regions
+
+# -------------------------------------------------------------------------
+
+
 def load_clan_members_from_db(clan_acc):
     """
     Retrieves all clan family members from DB and returns a list of the family
@@ -386,107 +421,460 @@ def update_post_process(jobs_file):
 
 def set_number_of_species():
     """
-    Updates number_of_species in family table
+    Updates number_of_species in family table using a single set-based
+    UPDATE...JOIN over the per-family aggregate
     """
 
-    cnx = RfamDB.connect()
+    update_query = ("UPDATE family f\n"
+                    "LEFT JOIN (SELECT fr.rfam_acc, COUNT(DISTINCT rs.ncbi_id) AS cnt\n"
+                    "           FROM full_region fr, rfamseq rs\n"
+                    "           WHERE rs.rfamseq_acc=fr.rfamseq_acc\n"
+                    "           AND fr.is_significant=1\n"
+                    "           GROUP BY fr.rfam_acc) AS stats\n"
+                    "ON stats.rfam_acc=f.rfam_acc\n"
+                    "SET f.number_of_species=COALESCE(stats.cnt, 0)")
 
-    cursor = cnx.cursor(buffered=True)
-    c_cursor = cnx.cursor(buffered=True)
+    execute_stats_update(update_query)
 
-    cursor.execute("Select rfam_acc from family")
+    print "Done"
 
-    rfam_accs = cursor.fetchall()
+# ----------------------------------------------------------------------------
 
-    cursor.close()
 
-    count_query = ("select count(distinct ncbi_id)\n"
-                   "from full_region f, rfamseq r\n"
-                   "where r.rfamseq_acc=f.rfamseq_acc\n"
-                   "and is_significant=1 and rfam_acc=\'%s\'")
+def set_num_full_sig_seqs():
+    """
+    Updates num_full in family table to hold the number of significant
+    sequences rather than the number of sequences in the full alignment
+    """
 
-    # counts list
-    counts = []
-    for acc in rfam_accs:
-        c_cursor.execute(count_query % str(acc[0]))
-        count = c_cursor.fetchall()
+    update_query = ("UPDATE family f\n"
+                    "LEFT JOIN (SELECT rfam_acc, COUNT(*) AS cnt\n"
+                    "           FROM full_region\n"
+                    "           WHERE is_significant=1\n"
+                    "           AND type=\'full\'\n"
+                    "           GROUP BY rfam_acc) AS stats\n"
+                    "ON stats.rfam_acc=f.rfam_acc\n"
+                    "SET f.num_full=COALESCE(stats.cnt, 0)")
 
-        counts.append((count[0][0], str(acc[0])))
+    execute_stats_update(update_query)
 
-        count = 0
+    print "Done"
 
-    c_cursor.close()
-    c_cursor = cnx.cursor(buffered=True)
+# ----------------------------------------------------------------------------
 
-    # query to update number_of_species in the family table
-    update_query = (
-        "update family set number_of_species=%s where rfam_acc=%s")
+
+def execute_stats_update(update_query):
+    """
+    Executes a single set-based statistics UPDATE statement and commits the
+    changes. On failure the changes are rolled back and the error is raised,
+    so that callers do not go on with stale counters
+
+    update_query: A complete UPDATE...JOIN statement
+
+    return: The number of rows affected
+    """
+
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=True)
 
     try:
-        c_cursor.executemany(update_query, counts)
+        cursor.execute(update_query)
+        row_count = cursor.rowcount
         cnx.commit()
-    except:
+
+    except mysql.connector.Error:
+        print "MySQL Update Error. Rolling back..."
         cnx.rollback()
+        raise
 
-    c_cursor.close()
-    RfamDB.disconnect(cnx)
+    finally:
+        cursor.close()
+        RfamDB.disconnect(cnx)
 
-    print "Done"
+    return row_count
 
 # ----------------------------------------------------------------------------
 
 
-def set_num_full_sig_seqs():
+def build_in_clause(values):
     """
-    Updates num_full in family table to hold the number of significant
-    sequences rather than the number of sequences in the full alignment
+    Formats a list of accessions as the body of an SQL IN (...) clause
+
+    values: A list of accessions (rfam_acc, upid, rfamseq_acc)
+
+    return: A string in the form of 'acc1','acc2',...
+    """
+
+    return ','.join(["\'%s\'" % str(x) for x in values])
+
+# ----------------------------------------------------------------------------
+
+
+def build_family_statistics_query(rfam_accs=None):
+    """
+    Builds the grouped aggregate query computing num_full and
+    number_of_species per family from full_region LEFT JOIN rfamseq
+
+    rfam_accs: A list of family accessions to restrict the aggregate to.
+    If None, all families are aggregated
+
+    return: An SQL SELECT statement returning (rfam_acc, num_full, num_species)
+    """
+
+    acc_filter = ""
+    if rfam_accs is not None:
+        acc_filter = "AND fr.rfam_acc IN (%s)\n" % build_in_clause(rfam_accs)
+
+    query = ("SELECT fr.rfam_acc,\n"
+             "SUM(fr.type=\'full\') AS num_full,\n"
+             "COUNT(DISTINCT rs.ncbi_id) AS num_species\n"
+             "FROM full_region fr\n"
+             "LEFT JOIN rfamseq rs ON rs.rfamseq_acc=fr.rfamseq_acc\n"
+             "WHERE fr.is_significant=1\n"
+             "%s"
+             "GROUP BY fr.rfam_acc") % acc_filter
+
+    return query
+
+# ----------------------------------------------------------------------------
+
+
+def build_genome_statistics_query(upids=None):
+    """
+    Builds the grouped aggregate query computing num_families and
+    num_rfam_regions per genome from full_region JOIN genseq
+
+    upids: A list of genome accessions to restrict the aggregate to.
+    If None, all genomes are aggregated
+
+    return: An SQL SELECT statement returning (upid, num_families, num_regions)
+    """
+
+    upid_filter = ""
+    if upids is not None:
+        upid_filter = "AND gs.upid IN (%s)\n" % build_in_clause(upids)
+
+    query = ("SELECT gs.upid,\n"
+             "COUNT(DISTINCT fr.rfam_acc) AS num_families,\n"
+             "SUM(fr.is_significant=1) AS num_regions\n"
+             "FROM full_region fr\n"
+             "JOIN genseq gs ON gs.rfamseq_acc=fr.rfamseq_acc\n"
+             "WHERE gs.version=\'%s\'\n"
+             "%s"
+             "GROUP BY gs.upid") % (version, upid_filter)
+
+    return query
+
+# ----------------------------------------------------------------------------
+
+
+def update_family_statistics(rfam_accs=None):
+    """
+    Refreshes family counters (num_full, number_of_species) with one
+    grouped aggregate over full_region LEFT JOIN rfamseq, written back with a
+    single UPDATE...JOIN. Families without significant hits are set to 0.
+
+    rfam_accs: A list of family accessions to refresh. If None, all families
+    are refreshed
+
+    return: The number of family rows affected
+    """
+
+    if rfam_accs is not None and len(rfam_accs) == 0:
+        return 0
+
+    update_query = ("UPDATE family f\n"
+                    "LEFT JOIN (%s) AS stats\n"
+                    "ON stats.rfam_acc=f.rfam_acc\n"
+                    "SET f.num_full=COALESCE(stats.num_full, 0),\n"
+                    "    f.number_of_species=COALESCE(stats.num_species, 0)") % \
+        build_family_statistics_query(rfam_accs)
+
+    if rfam_accs is not None:
+        update_query += "\nWHERE f.rfam_acc IN (%s)" % build_in_clause(rfam_accs)
+
+    return execute_stats_update(update_query)
+
+# ----------------------------------------------------------------------------
+
+
+def update_genome_statistics(upids=None):
+    """
+    Refreshes genome counters (num_families, num_rfam_regions) with one
+    grouped aggregate over full_region JOIN genseq for the current version,
+    written back with a single UPDATE...JOIN. Genomes without hits are set
+    to 0.
+
+    upids: A list of genome accessions to refresh. If None, all genomes are
+    refreshed
+
+    return: The number of genome rows affected
+    """
+
+    if upids is not None and len(upids) == 0:
+        return 0
+
+    update_query = ("UPDATE genome g\n"
+                    "LEFT JOIN (%s) AS stats\n"
+                    "ON stats.upid=g.upid\n"
+                    "SET g.num_families=COALESCE(stats.num_families, 0),\n"
+                    "    g.num_rfam_regions=COALESCE(stats.num_regions, 0)") % \
+        build_genome_statistics_query(upids)
+
+    if upids is not None:
+        update_query += "\nWHERE g.upid IN (%s)" % build_in_clause(upids)
+
+    return execute_stats_update(update_query)
+
+# ----------------------------------------------------------------------------
+
+
+def fetch_statistics_deltas(select_query):
+    """
+    Executes a statistics comparison query and returns the counters that
+    would change upon refresh
+
+    select_query: A query returning rows in the form of
+    (acc, field, current_value, new_value)
+
+    return: A list of (acc, field, current_value, new_value) tuples for
+    which current_value differs from new_value
     """
 
     cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=True)
+
+    cursor.execute(select_query)
+
+    deltas = [(str(x[0]), str(x[1]), x[2], int(x[3])) for x in cursor.fetchall()
+              if x[2] is None or int(x[2]) != int(x[3])]
+
+    cursor.close()
+    RfamDB.disconnect(cnx)
+
+    return deltas
+
+# ----------------------------------------------------------------------------
+
+
+def fetch_family_statistics_deltas(rfam_accs=None):
+    """
+    Computes the family counters without writing them back and reports the
+    ones that differ from the values currently stored in the family table
+
+    rfam_accs: A list of family accessions to check. If None, all families
+    are checked
 
+    return: A list of (rfam_acc, field, current_value, new_value) tuples
+    """
+
+    if rfam_accs is not None and len(rfam_accs) == 0:
+        return []
+
+    acc_filter = ""
+    if rfam_accs is not None:
+        acc_filter = "WHERE f.rfam_acc IN (%s)\n" % build_in_clause(rfam_accs)
+
+    stats_query = build_family_statistics_query(rfam_accs)
+
+    select_query = ("SELECT f.rfam_acc, \'num_full\', f.num_full, COALESCE(stats.num_full, 0)\n"
+                    "FROM family f LEFT JOIN (%s) AS stats ON stats.rfam_acc=f.rfam_acc\n"
+                    "%s"
+                    "UNION ALL\n"
+                    "SELECT f.rfam_acc, \'number_of_species\', f.number_of_species, "
+                    "COALESCE(stats.num_species, 0)\n"
+                    "FROM family f LEFT JOIN (%s) AS stats ON stats.rfam_acc=f.rfam_acc\n"
+                    "%s") % (stats_query, acc_filter, stats_query, acc_filter)
+
+    return fetch_statistics_deltas(select_query)
+
+# ----------------------------------------------------------------------------
+
+
+def fetch_genome_statistics_deltas(upids=None):
+    """
+    Computes the genome counters without writing them back and reports the
+    ones that differ from the values currently stored in the genome table
+
+    upids: A list of genome accessions to check. If None, all genomes are
+    checked
+
+    return: A list of (upid, field, current_value, new_value) tuples
+    """
+
+    if upids is not None and len(upids) == 0:
+        return []
+
+    upid_filter = ""
+    if upids is not None:
+        upid_filter = "WHERE g.upid IN (%s)\n" % build_in_clause(upids)
+
+    stats_query = build_genome_statistics_query(upids)
+
+    select_query = ("SELECT g.upid, \'num_families\', g.num_families, "
+                    "COALESCE(stats.num_families, 0)\n"
+                    "FROM genome g LEFT JOIN (%s) AS stats ON stats.upid=g.upid\n"
+                    "%s"
+                    "UNION ALL\n"
+                    "SELECT g.upid, \'num_rfam_regions\', g.num_rfam_regions, "
+                    "COALESCE(stats.num_regions, 0)\n"
+                    "FROM genome g LEFT JOIN (%s) AS stats ON stats.upid=g.upid\n"
+                    "%s") % (stats_query, upid_filter, stats_query, upid_filter)
+
+    return fetch_statistics_deltas(select_query)
+
+# ----------------------------------------------------------------------------
+
+
+def fetch_upids_by_rfamseq_accs(rfamseq_accs, batch_size=1000):
+    """
+    Fetches the genomes (current genseq version) the given sequences belong to
+
+    rfamseq_accs: A list of sequence accessions
+    batch_size: Number of accessions per IN (...) lookup
+
+    return: A list of distinct upids
+    """
+
+    upids = set()
+    rfamseq_accs = list(rfamseq_accs)
+
+    cnx = RfamDB.connect()
     cursor = cnx.cursor(buffered=True)
-    c_cursor = cnx.cursor(buffered=True)
 
-    cursor.execute("Select rfam_acc from family")
+    query = ("SELECT DISTINCT upid FROM genseq\n"
+             "WHERE version=\'%s\'\n"
+             "AND rfamseq_acc IN (%s)")
 
-    rfam_accs = cursor.fetchall()
+    for index in range(0, len(rfamseq_accs), batch_size):
+        batch = rfamseq_accs[index:index + batch_size]
+        cursor.execute(query % (version, build_in_clause(batch)))
+        upids.update([str(x[0]) for x in cursor.fetchall()])
 
     cursor.close()
+    RfamDB.disconnect(cnx)
 
-    # query to count all significant sequences of a family
+    return list(upids)
 
-    count_query = ("select count(*)\n"
-                   "from full_region f\n"
-                   "where is_significant=1\n"
-                   "and type=\'full\'\n"
-                   "and rfam_acc=\'%s\'")
+# ----------------------------------------------------------------------------
 
-    # counts list
-    counts = []
-    for acc in rfam_accs:
-        c_cursor.execute(count_query % str(acc[0]))
-        count = c_cursor.fetchall()[0][0]
 
-        counts.append((count, str(acc[0])))
+def fetch_upids_by_rfam_accs(rfam_accs):
+    """
+    Fetches all genomes (current genseq version) with full_region hits of
+    the given families
 
-        count = 0
+    rfam_accs: A list of family accessions
 
-    c_cursor.close()
-    c_cursor = cnx.cursor(buffered=True)
+    return: A list of distinct upids
+    """
 
-    update_query = (
-        "update family set num_full=%s where rfam_acc=%s")
+    if len(rfam_accs) == 0:
+        return []
 
-    try:
-        c_cursor.executemany(update_query, counts)
-        cnx.commit()
-    except:
-        cnx.rollback()
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=True)
 
-    c_cursor.close()
+    query = ("SELECT DISTINCT gs.upid\n"
+             "FROM full_region fr\n"
+             "JOIN genseq gs ON gs.rfamseq_acc=fr.rfamseq_acc\n"
+             "WHERE gs.version=\'%s\'\n"
+             "AND fr.rfam_acc IN (%s)") % (version, build_in_clause(rfam_accs))
+
+    cursor.execute(query)
+    upids = [str(x[0]) for x in cursor.fetchall()]
+
+    cursor.close()
     RfamDB.disconnect(cnx)
 
-    print "Done"
+    return upids
+
+# ----------------------------------------------------------------------------
+
+
+def record_statistics_changes(changes_file, rfam_accs=None, upids=None):
+    """
+    Merges the family and genome accessions touched by a load, a rethreshold
+    or a clan competition run into a json change file, so that only their
+    statistics need refreshing afterwards
+
+    changes_file: Path to a json file in the form of
+    {"rfam_acc": [...], "upid": [...]}. Created if it does not exist
+    rfam_accs: A list of touched family accessions
+    upids: A list of touched genome accessions
+
+    return: void
+    """
+
+    changes = load_statistics_changes(changes_file)
+
+    if rfam_accs is not None:
+        changes["rfam_acc"] = sorted(set(changes["rfam_acc"]).union(rfam_accs))
+
+    if upids is not None:
+        changes["upid"] = sorted(set(changes["upid"]).union(upids))
+
+    fp = open(changes_file, 'w')
+    json.dump(changes, fp, indent=2)
+    fp.close()
+
+# ----------------------------------------------------------------------------
+
+
+def load_statistics_changes(changes_file):
+    """
+    Loads a json change file generated by record_statistics_changes
+
+    changes_file: Path to a json change file
+
+    return: A dictionary in the form of {"rfam_acc": [...], "upid": [...]}
+    """
+
+    changes = {"rfam_acc": [], "upid": []}
+
+    if os.path.isfile(changes_file):
+        fp = open(changes_file, 'r')
+        changes.update(json.load(fp))
+        fp.close()
+
+    return changes
+
+# ----------------------------------------------------------------------------
+
+
+def refresh_changed_statistics(changes_file, dry_run=False):
+    """
+    Refreshes family and genome counters only for the accessions recorded
+    in a change file. Genomes with hits of any touched family are refreshed
+    as well.
+
+    changes_file: Path to a json change file generated by
+    record_statistics_changes
+    dry_run: If True, print the deltas without updating the database
+
+    return: A list of (acc, field, current_value, new_value) deltas
+    """
+
+    changes = load_statistics_changes(changes_file)
+
+    rfam_accs = changes["rfam_acc"]
+    upids = sorted(set(changes["upid"]).union(fetch_upids_by_rfam_accs(rfam_accs)))
+
+    deltas = fetch_family_statistics_deltas(rfam_accs)
+    deltas.extend(fetch_genome_statistics_deltas(upids))
+
+    if dry_run is True:
+        for delta in deltas:
+            print "%s\t%s\t%s -> %s" % delta
+        print "%d families, %d genomes, %d counters to update" % (len(rfam_accs),
+                                                                   len(upids),
+                                                                   len(deltas))
+
+    else:
+        update_family_statistics(rfam_accs)
+        update_genome_statistics(upids)
+
+    return deltas
 
 # ----------------------------------------------------------------------------
 
@@ -817,56 +1205,30 @@ def set_number_of_distinct_families_in_genome(upid):
     Sets the number distinct families with hits in a specific genome defined
     by its corresponding upid
 
-    upid: A specific genome upid to update the number of distinct families
+    upid: A specific genome upid to update the number of distinct families.
+    If None, all genomes are updated in a single statement
 
     return: void
     """
 
-    upids = []
-    # connect to db
-    cnx = RfamDB.connect()
-
-    # get a new buffered cursor
-    cursor = cnx.cursor(buffered=True)
-
-    if upid is None:
-        upids = fetch_all_upids()
-
-        for upid in upids:
-            select_query = ("select count(distinct rfam_acc) from full_region fr, genseq gs\n"
-                            "where fr.rfamseq_acc=gs.rfamseq_acc\n"
-                            "and gs.upid=\'%s\'\n"
-                            "and gs.version=\'%s\'")
-
-            cursor.execute(select_query % (upid, version))
-            count = cursor.fetchone()[0]
+    upid_filter = ""
+    if upid is not None:
+        upid_filter = "           AND gs.upid=\'%s\'\n" % upid
 
-            # update is_significant field to 0
-            update_query = "update genome set num_families=%d where upid=\'%s\'"
+    update_query = ("UPDATE genome g\n"
+                    "LEFT JOIN (SELECT gs.upid, COUNT(DISTINCT fr.rfam_acc) AS cnt\n"
+                    "           FROM full_region fr, genseq gs\n"
+                    "           WHERE fr.rfamseq_acc=gs.rfamseq_acc\n"
+                    "           AND gs.version=\'%s\'\n"
+                    "%s"
+                    "           GROUP BY gs.upid) AS stats\n"
+                    "ON stats.upid=g.upid\n"
+                    "SET g.num_families=COALESCE(stats.cnt, 0)") % (version, upid_filter)
 
-            # execute query
-            cursor.execute(update_query % (count, upid))
+    if upid is not None:
+        update_query += "\nWHERE g.upid=\'%s\'" % upid
 
-
-    else:
-        select_query = ("select count(distinct rfam_acc) from full_region fr, genseq gs\n"
-                        "where fr.rfamseq_acc=gs.rfamseq_acc\n"
-                        "and gs.upid=\'%s\'\n"
-                        "and gs.version=\'%s\'")
-
-        cursor.execute(select_query % (upid, version))
-        count = cursor.fetchone()[0]
-
-        # update is_significant field to 0
-        update_query = "update genome set num_families=%d where upid=\'%s\'"
-
-        # execute query
-        cursor.execute(update_query % (count, upid))
-
-    # commit changes and disconnect
-    cnx.commit()
-    cursor.close()
-    RfamDB.disconnect(cnx)
+    execute_stats_update(update_query)
 
 # ----------------------------------------------------------------------------
 
@@ -876,62 +1238,31 @@ def set_number_of_genomic_significant_hits(upid):
     Sets the number of significant hits for a specific genome according to
     its corresponding upid id
 
-    upid: A specific genome upid to update the number of significant hits
+    upid: A specific genome upid to update the number of significant hits.
+    If None, all genomes are updated in a single statement
 
     return: void
     """
 
-    # connect to db
-    cnx = RfamDB.connect()
-
-    # get a new buffered cursor
-    cursor = cnx.cursor(buffered=True)
-
-    if upid is None:
-
-        upids = fetch_all_upids()
-
-        for upid in upids:
-
-
-            count_query = ("select count(fr.rfamseq_acc)\n"
-                           "from full_region fr, genseq gs\n"
-                           "where fr.rfamseq_acc=gs.rfamseq_acc\n"
-                           "and fr.is_significant=1\n"
-                           "and gs.upid=\'%s\'\n"
-                           "and gs.version=\'%s\'")
-
-            cursor.execute(count_query % (upid, version))
-            count = cursor.fetchone()[0]
-
-            # update is_significant field to 0
-            update_query = "update genome set num_rfam_regions=%d where upid=\'%s\'"
-
-            # execute query
-            cursor.execute(update_query % (count, upid))
-    else:
-
-        count_query = ("select count(fr.rfamseq_acc)\n"
-                       "from full_region fr, genseq gs\n"
-                       "where fr.rfamseq_acc=gs.rfamseq_acc\n"
-                       "and fr.is_significant=1\n"
-                       "and gs.upid=\'%s\'\n"
-                       "and gs.version=\'%s\'")
-
-
-        cursor.execute(count_query % (upid, version))
-        count = cursor.fetchone()[0]
-
-        # update is_significant field to 0
-        update_query = "update genome set num_rfam_regions=%d where upid=\'%s\'"
-
-        # execute query
-        cursor.execute(update_query % (count, upid))
-
-    # commit changes and disconnect
-    cnx.commit()
-    cursor.close()
-    RfamDB.disconnect(cnx)
+    upid_filter = ""
+    if upid is not None:
+        upid_filter = "           AND gs.upid=\'%s\'\n" % upid
+
+    update_query = ("UPDATE genome g\n"
+                    "LEFT JOIN (SELECT gs.upid, COUNT(fr.rfamseq_acc) AS cnt\n"
+                    "           FROM full_region fr, genseq gs\n"
+                    "           WHERE fr.rfamseq_acc=gs.rfamseq_acc\n"
+                    "           AND fr.is_significant=1\n"
+                    "           AND gs.version=\'%s\'\n"
+                    "%s"
+                    "           GROUP BY gs.upid) AS stats\n"
+                    "ON stats.upid=g.upid\n"
+                    "SET g.num_rfam_regions=COALESCE(stats.cnt, 0)") % (version, upid_filter)
+
+    if upid is not None:
+        update_query += "\nWHERE g.upid=\'%s\'" % upid
+
+    execute_stats_update(update_query)
 
 # ----------------------------------------------------------------------------
 
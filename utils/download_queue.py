@@ -0,0 +1,398 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Resumable download queue. Every file to download is recorded in an SQLite
+state store (pending/done/failed, with size and md5 of finished files) and
+a pool of threads works through the pending entries, with a cap on the
+number of simultaneous downloads per host. Files are written to a .part
+file and renamed once complete, so an interrupted run never leaves a
+truncated file that looks finished
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import time
+import sqlite3
+import hashlib
+import urlparse
+import threading
+import contextlib
+
+from utils import http_client
+
+# -----------------------------------------------------------------------------
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+MAX_ATTEMPTS = 3  # runs a failed download is retried in
+
+# maximum number of simultaneous downloads per host
+HOST_CONCURRENCY_LIMITS = {"www.ebi.ac.uk": 8,
+                           "eutils.ncbi.nlm.nih.gov": 3}
+DEFAULT_HOST_CONCURRENCY = 4
+
+HOST_SLOTS = {}
+HOST_SLOTS_LOCK = threading.Lock()
+
+# -----------------------------------------------------------------------------
+
+
+@contextlib.contextmanager
+def host_slot(url):
+    """
+    Holds one of the download slots of the host a url points to, blocking
+    while the host is at its concurrency limit
+
+    url: A valid http(s) url
+    """
+
+    host = urlparse.urlparse(url).netloc
+
+    with HOST_SLOTS_LOCK:
+        if host not in HOST_SLOTS:
+            limit = HOST_CONCURRENCY_LIMITS.get(host, DEFAULT_HOST_CONCURRENCY)
+            HOST_SLOTS[host] = threading.BoundedSemaphore(limit)
+        slot = HOST_SLOTS[host]
+
+    slot.acquire()
+    try:
+        yield
+    finally:
+        slot.release()
+
+# -----------------------------------------------------------------------------
+
+
+def file_md5(file_path, chunk_size=1024 * 1024):
+    """
+    Computes the md5 checksum of a file
+
+    file_path: The path to a file
+
+    return: The md5 hex digest
+    """
+
+    md5 = hashlib.md5()
+
+    fp = open(file_path, 'rb')
+    for chunk in iter(lambda: fp.read(chunk_size), ''):
+        md5.update(chunk)
+    fp.close()
+
+    return md5.hexdigest()
+
+# -----------------------------------------------------------------------------
+
+
+class DownloadStateStore(object):
+    """
+    Persistent per file download state stored in an SQLite database. Safe
+    to share between the threads of run_downloads
+    """
+
+    def __init__(self, state_file):
+        """
+        state_file: The path to the SQLite state file. Created if missing
+        """
+
+        self.state_file = state_file
+        self.lock = threading.Lock()
+
+        self.cnx = sqlite3.connect(state_file, timeout=60, check_same_thread=False)
+        self.cnx.text_factory = str
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS downloads ("
+                         "file_path TEXT PRIMARY KEY, upid TEXT, accession TEXT, "
+                         "url TEXT, status TEXT, size INTEGER, md5 TEXT, "
+                         "attempts INTEGER DEFAULT 0, error TEXT, updated REAL)")
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS downloads_status "
+                         "ON downloads (status, upid)")
+        # genome level failures, e.g. a WGS set that could not be copied
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS genome_errors ("
+                         "upid TEXT, accession TEXT, error TEXT, updated REAL, "
+                         "PRIMARY KEY (upid, accession))")
+        self.cnx.commit()
+
+    def add(self, upid, accession, url, file_path):
+        """
+        Queues a file for download. Files already known to the store keep
+        their state, so re-queueing a genome after a crash is a no-op for
+        finished files
+
+        upid: The genome the file belongs to
+        accession: The accession of the sequence being downloaded
+        url: The url to download the file from
+        file_path: The destination path of the file
+        """
+
+        with self.lock:
+            self.cnx.execute("INSERT OR IGNORE INTO downloads "
+                             "(file_path, upid, accession, url, status, updated) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (file_path, upid, accession, url, PENDING, time.time()))
+            self.cnx.commit()
+
+    def add_many(self, entries):
+        """
+        Queues a list of (upid, accession, url, file_path) tuples
+        """
+
+        now = time.time()
+        rows = [(x[3], x[0], x[1], x[2], PENDING, now) for x in entries]
+
+        with self.lock:
+            self.cnx.executemany("INSERT OR IGNORE INTO downloads "
+                                 "(file_path, upid, accession, url, status, updated) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.cnx.commit()
+
+    def verify(self, upid=None, checksum=False):
+        """
+        Resets finished downloads whose file has gone missing, has changed
+        size or, if checksum is True, no longer matches its md5
+
+        upid: Restrict the check to a single genome
+        checksum: Also recompute the md5 of every finished file
+
+        return: The number of entries reset to pending
+        """
+
+        query = "SELECT file_path, size, md5 FROM downloads WHERE status=?"
+        params = [DONE]
+        if upid is not None:
+            query += " AND upid=?"
+            params.append(upid)
+
+        with self.lock:
+            rows = self.cnx.execute(query, params).fetchall()
+
+        reset = []
+        for file_path, size, md5 in rows:
+            if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+                reset.append(file_path)
+            elif checksum is True and file_md5(file_path) != md5:
+                reset.append(file_path)
+
+        with self.lock:
+            self.cnx.executemany("UPDATE downloads SET status=?, size=NULL, md5=NULL "
+                                 "WHERE file_path=?", [(PENDING, x) for x in reset])
+            self.cnx.commit()
+
+        return len(reset)
+
+    def pending(self, upid=None, max_attempts=MAX_ATTEMPTS):
+        """
+        Lists the files left to download, including failed files that have
+        not exhausted their attempts
+
+        upid: Restrict the list to a single genome
+
+        return: A list of (file_path, url) tuples
+        """
+
+        query = ("SELECT file_path, url FROM downloads WHERE "
+                 "(status=? OR (status=? AND attempts<?))")
+        params = [PENDING, FAILED, max_attempts]
+        if upid is not None:
+            query += " AND upid=?"
+            params.append(upid)
+
+        with self.lock:
+            return self.cnx.execute(query, params).fetchall()
+
+    def mark_done(self, file_path, size, md5):
+        """
+        Records a finished download along with its size and md5
+        """
+
+        with self.lock:
+            self.cnx.execute("UPDATE downloads SET status=?, size=?, md5=?, error=NULL, "
+                             "attempts=attempts+1, updated=? WHERE file_path=?",
+                             (DONE, size, md5, time.time(), file_path))
+            self.cnx.commit()
+
+    def mark_failed(self, file_path, error):
+        """
+        Records a failed download attempt
+        """
+
+        with self.lock:
+            self.cnx.execute("UPDATE downloads SET status=?, error=?, "
+                             "attempts=attempts+1, updated=? WHERE file_path=?",
+                             (FAILED, error, time.time(), file_path))
+            self.cnx.commit()
+
+    def failed_accessions(self, upid=None):
+        """
+        Lists the accessions whose download failed
+
+        upid: Restrict the list to a single genome
+
+        return: A list of accessions
+        """
+
+        query = "SELECT accession FROM downloads WHERE status=?"
+        params = [FAILED]
+        if upid is not None:
+            query += " AND upid=?"
+            params.append(upid)
+
+        with self.lock:
+            return [x[0] for x in self.cnx.execute(query, params).fetchall()]
+
+    def mark_genome_failed(self, upid, accession, error):
+        """
+        Records a failure that is not tied to a single queued file, such as
+        a WGS set that could not be copied or a genome that could not be
+        queued at all
+
+        upid: The genome that failed
+        accession: The accession that could not be fetched, or the upid
+        itself if the whole genome failed
+        error: A description of the error
+        """
+
+        with self.lock:
+            self.cnx.execute("INSERT OR REPLACE INTO genome_errors "
+                             "(upid, accession, error, updated) VALUES (?, ?, ?, ?)",
+                             (upid, accession, error, time.time()))
+            self.cnx.commit()
+
+    def clear_genome_errors(self, upid):
+        """
+        Drops the genome level failures of a genome before it is queued again
+        """
+
+        with self.lock:
+            self.cnx.execute("DELETE FROM genome_errors WHERE upid=?", (upid,))
+            self.cnx.commit()
+
+    def genome_errors(self, upid=None):
+        """
+        Lists the genome level failures
+
+        upid: Restrict the list to a single genome
+
+        return: A list of (upid, accession, error) tuples
+        """
+
+        query = "SELECT upid, accession, error FROM genome_errors"
+        params = []
+        if upid is not None:
+            query += " WHERE upid=?"
+            params.append(upid)
+        query += " ORDER BY upid, accession"
+
+        with self.lock:
+            return self.cnx.execute(query, params).fetchall()
+
+    def counts(self, upid=None):
+        """
+        Counts the files in every state
+
+        upid: Restrict the counts to a single genome
+
+        return: A dictionary of status to number of files
+        """
+
+        query = "SELECT status, COUNT(*) FROM downloads"
+        params = []
+        if upid is not None:
+            query += " WHERE upid=?"
+            params.append(upid)
+        query += " GROUP BY status"
+
+        with self.lock:
+            return dict(self.cnx.execute(query, params).fetchall())
+
+    def close(self):
+        """
+        Closes the state database
+        """
+
+        with self.lock:
+            self.cnx.close()
+
+# -----------------------------------------------------------------------------
+
+
+def download_file(store, file_path, url):
+    """
+    Downloads a single queued file and records the outcome in the store
+
+    store: A DownloadStateStore object
+    file_path: The destination path of the file
+    url: The url to download the file from
+
+    return: True if the file was downloaded, False otherwise
+    """
+
+    part_file = file_path + ".part"
+
+    try:
+        with host_slot(url):
+            status = http_client.download(url, part_file)
+
+    except Exception as e:
+        status = False
+        error = str(e)
+
+    else:
+        error = "not available"
+
+    if status is False or not os.path.exists(part_file):
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        store.mark_failed(file_path, error)
+        return False
+
+    os.rename(part_file, file_path)
+    store.mark_done(file_path, os.path.getsize(file_path), file_md5(file_path))
+
+    return True
+
+# -----------------------------------------------------------------------------
+
+
+def run_downloads(store, upid=None, workers=http_client.WORKERS, checksum=False):
+    """
+    Works through the pending downloads of a state store concurrently.
+    Finished files are verified first, so that a rerun after a crash only
+    fetches what is missing
+
+    store: A DownloadStateStore object
+    upid: Only download the files of this genome
+    workers: Number of concurrent downloads
+    checksum: Verify finished files against their md5 rather than their size
+
+    return: A dictionary of status to number of files after the run
+    """
+
+    store.verify(upid=upid, checksum=checksum)
+
+    pending = store.pending(upid=upid)
+
+    http_client.map_concurrent(lambda x: download_file(store, x[0], x[1]),
+                               pending, workers=workers)
+
+    return store.counts(upid=upid)
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
@@ -0,0 +1,211 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+In-process indexed fasta reader. Replaces one esl-sfetch call per sequence
+with a seek into the fasta file using a samtools compatible .fai index
+(name, length, offset, line bases, line width), which is built on first use
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import string
+
+# -----------------------------------------------------------------------------
+
+COMPLEMENT = string.maketrans("ACGTUNRYKMSWBDHVacgtunrykmswbdhv",
+                              "TGCAANYRMKSWVHDBtgcaanyrmkswvhdb")
+
+# -----------------------------------------------------------------------------
+
+
+def build_fasta_index(fasta_file, index_file=None):
+    """
+    Scans a fasta file once and writes a .fai index with one line per
+    sequence (name, length, offset, line bases, line width)
+
+    fasta_file: The path to an uncompressed fasta file
+    index_file: The path to the index file. Defaults to fasta_file.fai
+
+    return: The path to the index file
+    """
+
+    if index_file is None:
+        index_file = fasta_file + ".fai"
+
+    fasta_fp = open(fasta_file, 'rb')
+    index_fp = open(index_file, 'w')
+
+    name = None
+    seq_len = 0
+    offset = 0
+    line_bases = 0
+    line_width = 0
+    position = 0
+
+    for line in fasta_fp:
+        if line[0] == '>':
+            if name is not None:
+                index_fp.write("%s\t%d\t%d\t%d\t%d\n" % (name, seq_len, offset,
+                                                         line_bases, line_width))
+            name = line[1:].strip().split(' ')[0].split('\t')[0]
+            seq_len = 0
+            line_bases = 0
+            line_width = 0
+            offset = position + len(line)
+
+        else:
+            bases = len(line.rstrip('\r\n'))
+            # line geometry is set by the first sequence line
+            if line_width == 0:
+                line_bases = bases
+                line_width = len(line)
+            seq_len += bases
+
+        position += len(line)
+
+    if name is not None:
+        index_fp.write("%s\t%d\t%d\t%d\t%d\n" % (name, seq_len, offset,
+                                                 line_bases, line_width))
+
+    index_fp.close()
+    fasta_fp.close()
+
+    return index_file
+
+# -----------------------------------------------------------------------------
+
+
+def reverse_complement(sequence):
+    """
+    Returns the reverse complement of a nucleotide sequence
+
+    sequence: A DNA/RNA sequence string
+
+    return: The reverse complemented sequence
+    """
+
+    return sequence.translate(COMPLEMENT)[::-1]
+
+# -----------------------------------------------------------------------------
+
+
+class FastaIndex(object):
+    """
+    Random access reader over a fasta file backed by a .fai index
+    """
+
+    def __init__(self, fasta_file, index_file=None):
+        """
+        Loads the index of fasta_file, building it if it does not exist or
+        is older than the fasta file
+
+        fasta_file: The path to an uncompressed fasta file
+        index_file: The path to the index file. Defaults to fasta_file.fai
+        """
+
+        if index_file is None:
+            index_file = fasta_file + ".fai"
+
+        if not os.path.exists(index_file) or \
+                os.path.getmtime(index_file) < os.path.getmtime(fasta_file):
+            build_fasta_index(fasta_file, index_file)
+
+        self.fasta_file = fasta_file
+        self.index = {}
+
+        index_fp = open(index_file, 'r')
+        for line in index_fp:
+            fields = line.rstrip('\n').split('\t')
+            self.index[fields[0]] = (int(fields[1]), int(fields[2]),
+                                     int(fields[3]), int(fields[4]))
+        index_fp.close()
+
+        self.fasta_fp = open(fasta_file, 'rb')
+
+    def __contains__(self, seq_acc):
+        return seq_acc in self.index
+
+    def close(self):
+        """
+        Closes the underlying fasta file
+        """
+
+        self.fasta_fp.close()
+
+    def read_region(self, seq_acc, start, end):
+        """
+        Reads residues start..end (1-based, inclusive, start <= end) of
+        sequence seq_acc
+
+        return: The subsequence as a string
+        """
+
+        seq_len, offset, line_bases, line_width = self.index[seq_acc]
+
+        start = max(start, 1)
+        end = min(end, seq_len)
+        if start > end:
+            return ''
+
+        # translate residue positions to byte offsets accounting for newlines
+        first = offset + ((start - 1) / line_bases) * line_width + (start - 1) % line_bases
+        last = offset + ((end - 1) / line_bases) * line_width + (end - 1) % line_bases
+
+        self.fasta_fp.seek(first)
+        data = self.fasta_fp.read(last - first + 1)
+
+        return data.replace('\n', '').replace('\r', '')
+
+    def fetch(self, seq_acc, start=None, end=None):
+        """
+        Fetches a sequence or a subsequence in the same way esl-sfetch does.
+        Tries the exact name seq_acc/start-end first, as used in seed
+        sequence files, and falls back to extracting the region from the
+        full length sequence. Regions with start > end are reverse
+        complemented
+
+        seq_acc: A sequence accession
+        start: The start coordinate of the region or None for the full sequence
+        end: The end coordinate of the region or None for the full sequence
+
+        return: The sequence string, or '' if the sequence is not indexed
+        """
+
+        if start is None or end is None:
+            if seq_acc not in self.index:
+                return ''
+            return self.read_region(seq_acc, 1, self.index[seq_acc][0])
+
+        region_name = "%s/%s-%s" % (seq_acc, str(start), str(end))
+
+        if region_name in self.index:
+            return self.read_region(region_name, 1, self.index[region_name][0])
+
+        if seq_acc not in self.index:
+            return ''
+
+        start = int(start)
+        end = int(end)
+
+        if start > end:
+            return reverse_complement(self.read_region(seq_acc, end, start))
+
+        return self.read_region(seq_acc, start, end)
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
@@ -0,0 +1,252 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Native streaming validation of (gzipped) fasta files, replacing one
+esl-seqstat process per file, and a persistent index of validation results
+keyed by file size and modification time so that files are only checked
+again once they change
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import zlib
+import gzip
+import struct
+import sqlite3
+import threading
+
+# -----------------------------------------------------------------------------
+
+# IUPAC nucleotide codes, gaps and stop characters accepted by esl-seqstat --dna
+SEQ_CHARS = "ACGTUNRYKMSWBDHVXacgtunrykmswbdhvx-.*"
+
+FASTA_EXTENSIONS = (".fa", ".fasta", ".fna")
+GZIP_EXTENSIONS = tuple([x + ".gz" for x in FASTA_EXTENSIONS])
+
+# -----------------------------------------------------------------------------
+
+
+def check_fasta_stream(fp):
+    """
+    Validates the format of a fasta stream line by line
+
+    fp: A file-like object open for reading
+
+    return: A tuple (error, number of sequences, number of residues) where
+    error is None if the stream is a valid, non-empty fasta file
+    """
+
+    seq_count = 0
+    residues = 0
+    seq_len = None
+    line_no = 0
+
+    for line in fp:
+        line_no += 1
+        line = line.rstrip("\r\n")
+
+        if line == '':
+            continue
+
+        if line[0] == '>':
+            if seq_len == 0:
+                return "Empty sequence before line %d" % line_no, seq_count, residues
+
+            if line[1:].strip() == '':
+                return "Missing sequence name at line %d" % line_no, seq_count, residues
+
+            seq_count += 1
+            seq_len = 0
+
+        elif seq_len is None:
+            return "Sequence data before the first header", seq_count, residues
+
+        else:
+            # any character left after deleting valid ones is an error
+            if line.translate(None, SEQ_CHARS) != '':
+                return "Invalid sequence characters at line %d" % line_no, seq_count, residues
+
+            seq_len += len(line)
+            residues += len(line)
+
+    if seq_count == 0:
+        return "No sequences found", seq_count, residues
+
+    if seq_len == 0:
+        return "Empty sequence at end of file", seq_count, residues
+
+    return None, seq_count, residues
+
+# -----------------------------------------------------------------------------
+
+
+def validate_sequence_file(seq_file):
+    """
+    Validates a plain or gzipped fasta file. Gzipped files are decompressed
+    on the fly, which also checks the integrity of the archive
+
+    seq_file: The path to a sequence file
+
+    return: A dictionary with the size, mtime, status (True/False), error,
+    sequences and residues of the file
+    """
+
+    result = {"file": seq_file, "size": None, "mtime": None, "status": False,
+              "error": None, "sequences": 0, "residues": 0}
+
+    if not os.path.exists(seq_file):
+        result["error"] = "Missing file"
+        return result
+
+    result["size"] = os.path.getsize(seq_file)
+    result["mtime"] = os.path.getmtime(seq_file)
+
+    if result["size"] == 0:
+        result["error"] = "Empty file"
+        return result
+
+    if seq_file.endswith(".gz"):
+        fp = gzip.open(seq_file, 'rb')
+    else:
+        fp = open(seq_file, 'rb')
+
+    try:
+        error, seq_count, residues = check_fasta_stream(fp)
+
+    # truncated or corrupt archives
+    except (IOError, EOFError, zlib.error, struct.error) as e:
+        error, seq_count, residues = "Corrupt file: %s" % str(e), 0, 0
+
+    finally:
+        fp.close()
+
+    result["error"] = error
+    result["status"] = error is None
+    result["sequences"] = seq_count
+    result["residues"] = residues
+
+    return result
+
+# -----------------------------------------------------------------------------
+
+
+def is_sequence_file(filename):
+    """
+    Checks whether a filename has a plain or gzipped fasta extension
+    """
+
+    return filename.endswith(FASTA_EXTENSIONS) or filename.endswith(GZIP_EXTENSIONS)
+
+# -----------------------------------------------------------------------------
+
+
+class ValidationIndex(object):
+    """
+    Persistent index of validation results stored in an SQLite database,
+    keyed by file path and invalidated by a change of size or mtime
+    """
+
+    COLUMNS = ("file", "size", "mtime", "status", "error", "sequences", "residues")
+
+    def __init__(self, index_file):
+        """
+        index_file: The path to the SQLite index file. Created if missing
+        """
+
+        self.index_file = index_file
+        self.lock = threading.Lock()
+
+        self.cnx = sqlite3.connect(index_file, timeout=60, check_same_thread=False)
+        self.cnx.text_factory = str
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS validation ("
+                         "file TEXT PRIMARY KEY, upid TEXT, size INTEGER, "
+                         "mtime REAL, status INTEGER, error TEXT, "
+                         "sequences INTEGER, residues INTEGER)")
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS validation_upid "
+                         "ON validation (upid)")
+        self.cnx.commit()
+
+    def fetch_genome(self, upid):
+        """
+        Loads the stored results of all files of a genome
+
+        upid: A valid Uniprot proteome accession
+
+        return: A dictionary of file paths to result dictionaries
+        """
+
+        with self.lock:
+            rows = self.cnx.execute("SELECT %s FROM validation WHERE upid=?" %
+                                    ', '.join(self.COLUMNS), (upid,)).fetchall()
+
+        results = {}
+        for row in rows:
+            result = dict(zip(self.COLUMNS, row))
+            result["status"] = result["status"] == 1
+            results[result["file"]] = result
+
+        return results
+
+    def store(self, upid, results):
+        """
+        Stores the results of a list of validated files
+
+        upid: A valid Uniprot proteome accession
+        results: A list of dictionaries as returned by validate_sequence_file
+        """
+
+        rows = [(x["file"], upid, x["size"], x["mtime"], 1 if x["status"] else 0,
+                 x["error"], x["sequences"], x["residues"]) for x in results]
+
+        with self.lock:
+            self.cnx.executemany("INSERT OR REPLACE INTO validation "
+                                 "(file, upid, size, mtime, status, error, "
+                                 "sequences, residues) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 rows)
+            self.cnx.commit()
+
+    def close(self):
+        """
+        Closes the index database
+        """
+
+        with self.lock:
+            self.cnx.close()
+
+# -----------------------------------------------------------------------------
+
+
+def is_unchanged(seq_file, cached):
+    """
+    Checks whether a file still matches a stored validation result
+
+    seq_file: The path to a sequence file
+    cached: A stored result dictionary or None
+
+    return: True if the file has the same size and mtime, False otherwise
+    """
+
+    if cached is None or cached["size"] is None or not os.path.exists(seq_file):
+        return False
+
+    return os.path.getsize(seq_file) == cached["size"] and \
+        os.path.getmtime(seq_file) == cached["mtime"]
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
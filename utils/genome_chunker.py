@@ -0,0 +1,252 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Splits a genome fasta file into search chunks of even size. Sequences
+longer than the window size are cut into overlapping windows, one per
+chunk, so that a hit spanning a window boundary is found whole in the next
+window, while shorter sequences are packed together into chunks of up to
+the window size.
+
+Every piece of a sequence written to a chunk is recorded in a chunk
+manifest, a tab separated file with the columns:
+
+    chunk  piece name  sequence name  offset  length
+
+where offset is the 0-based start of the piece on the sequence. Windows are
+named <sequence>/<start>-<end> with 1-based coordinates
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+
+# -----------------------------------------------------------------------------
+
+DEFAULT_OVERLAP = 10000  # longer than the longest Rfam hit
+LINE_WIDTH = 60
+
+# -----------------------------------------------------------------------------
+
+
+class ChunkWriter(object):
+    """
+    Writes the chunk files of a genome and keeps the manifest entries
+    """
+
+    def __init__(self, dest_dir, prefix):
+        """
+        dest_dir: The directory chunk files are written to
+        prefix: The chunk filename prefix. Chunks are named <prefix>.<N>
+        """
+
+        self.dest_dir = dest_dir
+        self.prefix = prefix
+        self.chunk_no = 0
+        self.chunk_fp = None
+        self.chunk = None
+        self.chunk_size = 0
+        self.manifest = []
+
+    def open_chunk(self):
+        """
+        Closes the current chunk and starts a new one
+        """
+
+        self.close()
+
+        self.chunk_no += 1
+        self.chunk = "%s.%d" % (self.prefix, self.chunk_no)
+        self.chunk_fp = open(os.path.join(self.dest_dir, self.chunk), 'w')
+        self.chunk_size = 0
+
+    def write_piece(self, piece_name, seq_name, offset, sequence):
+        """
+        Writes a sequence piece to the current chunk and records it
+        """
+
+        self.chunk_fp.write('>' + piece_name + '\n')
+        for idx in range(0, len(sequence), LINE_WIDTH):
+            self.chunk_fp.write(sequence[idx:idx + LINE_WIDTH] + '\n')
+
+        self.chunk_size += len(sequence)
+        self.manifest.append((self.chunk, piece_name, seq_name, offset, len(sequence)))
+
+    def close(self):
+        """
+        Closes the current chunk file
+        """
+
+        if self.chunk_fp is not None:
+            self.chunk_fp.close()
+            self.chunk_fp = None
+
+# -----------------------------------------------------------------------------
+
+
+def iterate_fasta_lines(fasta_file):
+    """
+    Yields (sequence name, sequence line) tuples of a fasta file, with a
+    None line marking the end of every sequence
+    """
+
+    seq_name = None
+
+    fp = open(fasta_file, 'r')
+    for line in fp:
+        line = line.strip()
+        if line == '':
+            continue
+
+        if line[0] == '>':
+            if seq_name is not None:
+                yield seq_name, None
+            seq_name = line[1:].split()[0]
+
+        elif seq_name is not None:
+            yield seq_name, line
+    fp.close()
+
+    if seq_name is not None:
+        yield seq_name, None
+
+# -----------------------------------------------------------------------------
+
+
+def split_genome_windows(fasta_file, dest_dir, prefix, window_size, overlap=DEFAULT_OVERLAP):
+    """
+    Splits a genome fasta file into chunks in a single pass, holding at
+    most one window of sequence in memory. Sequences up to window_size are
+    packed into chunks in file order, while longer sequences are cut into
+    windows of window_size overlapping by overlap residues, one per chunk
+
+    fasta_file: The path to a genome fasta file
+    dest_dir: The directory to write the chunk files to
+    prefix: The chunk filename prefix. Chunks are named <prefix>.<N>
+    window_size: The size of windows and packed chunks in residues
+    overlap: The overlap of consecutive windows in residues
+
+    return: A list of manifest entries (chunk, piece name, sequence name,
+    offset, length)
+    """
+
+    if overlap >= window_size:
+        raise ValueError("Window overlap must be smaller than the window size")
+
+    writer = ChunkWriter(dest_dir, prefix)
+    step = window_size - overlap
+
+    parts = []
+    buf_len = 0
+    offset = 0
+    windowed = False
+
+    for seq_name, line in iterate_fasta_lines(fasta_file):
+        if line is not None:
+            parts.append(line)
+            buf_len += len(line)
+
+            # cut every full window, keeping the overlap for the next one
+            while buf_len > window_size:
+                windowed = True
+                buf = ''.join(parts)
+
+                writer.open_chunk()
+                writer.write_piece("%s/%d-%d" % (seq_name, offset + 1, offset + window_size),
+                                   seq_name, offset, buf[:window_size])
+
+                parts = [buf[step:]]
+                buf_len = len(parts[0])
+                offset += step
+
+            continue
+
+        # end of sequence
+        buf = ''.join(parts)
+
+        if windowed is True:
+            # the last window, unless the previous one already covered it
+            if len(buf) > overlap:
+                writer.open_chunk()
+                writer.write_piece("%s/%d-%d" % (seq_name, offset + 1, offset + len(buf)),
+                                   seq_name, offset, buf)
+
+        elif len(buf) > 0:
+            if writer.chunk_fp is None or writer.chunk_size + len(buf) > window_size:
+                writer.open_chunk()
+            writer.write_piece(seq_name, seq_name, 0, buf)
+
+        parts = []
+        buf_len = 0
+        offset = 0
+        windowed = False
+
+    writer.close()
+
+    return writer.manifest
+
+# -----------------------------------------------------------------------------
+
+
+def write_chunk_manifest(manifest, manifest_file):
+    """
+    Writes the entries of a chunk manifest to a file
+
+    manifest: A list of manifest entries as returned by split_genome_windows
+    manifest_file: The path to the manifest file
+    """
+
+    fp = open(manifest_file, 'w')
+    for entry in manifest:
+        fp.write('\t'.join([str(x) for x in entry]) + '\n')
+    fp.close()
+
+# -----------------------------------------------------------------------------
+
+
+def read_chunk_manifest(manifest_file):
+    """
+    Reads a chunk manifest. Lines with a chunk name only, as written for
+    chunks of whole sequences, are accepted
+
+    manifest_file: The path to a chunk manifest file
+
+    return: A tuple (list of chunk names, offsets) where offsets is a
+    dictionary of window names to (sequence name, offset) tuples
+    """
+
+    chunks = []
+    seen = set()
+    offsets = {}
+
+    fp = open(manifest_file, 'r')
+    for line in fp:
+        fields = line.strip().split('\t')
+        if fields[0] == '':
+            continue
+
+        if fields[0] not in seen:
+            chunks.append(fields[0])
+            seen.add(fields[0])
+
+        if len(fields) >= 4 and fields[1] != fields[2]:
+            offsets[fields[1]] = (fields[2], int(fields[3]))
+    fp.close()
+
+    return chunks, offsets
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
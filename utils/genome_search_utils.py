@@ -28,6 +28,7 @@ import shutil
 import re
 
 from config import rfam_local as rfl
+from utils import lsf_stats
 
 # ---------------------------------GLOBALS-------------------------------------
 
@@ -82,59 +83,35 @@ def split_seq_file(seq_file, size, dest_dir=None):
 
 def extract_job_stats(lsf_output_file):
     """
-    Loops over the out_dir which contains all .out LSF job files, parses the files and returns job
-    details such as, start and end dates, max required memory etc.
-
-    out_dir: A directory where job .out files have been stored
-    """
-
-    gen_exec_stats = {}
-
-    # open lsf output file and read contents
-    fp = open(os.path.join(input, file), 'r')
-    content = fp.readlines()
-    fp.close()
-
-    # get reference proteome id
-    upid = file.partition('.')[0]
-    stats = {}
-
-    for line in content:
-        if line.find("Started") != -1:
-            line = line.strip().split(' ')
-            stats["start_date"] = ' '.join(line[2:])
-
-        elif line.find("Results") != -1:
-            line = line.strip().split(' ')
-            stats["end_date"] = ' '.join(line[3:])
+    Parses an LSF job .out file and returns job details such as, start and
+    end dates, CPU time and max required memory
 
-        elif line.find("CPU time") != -1:
-            line = line.strip().split(' ')
-            stats["cpu_time"] = float(line[17])  # /60.0
+    lsf_output_file: The path to an LSF job .out file
 
-        elif line.find("Max Memory") != -1:
-            line = line.strip().split(' ')
-            stats["mem"] = line[15]
-
-        elif line.find("Max Processes") != -1:
-            line = line.strip().split(' ')
-            stats["max_proc"] = line[len(line) - 1]
+    return: A dictionary with the stats of the job keyed by the job name
+    (the filename without the .out extension), as parsed by
+    lsf_stats.parse_lsf_report with the max memory also stored as mem
+    """
 
-        elif line.find("Max Threads") != -1:
-            line = line.strip().split(' ')
-            stats["max_threads"] = line[len(line) - 1]
+    # get reference proteome id or chunk name
+    upid = os.path.basename(lsf_output_file).rpartition('.')[0]
+    stats = lsf_stats.parse_lsf_report(lsf_output_file)
 
-    gen_exec_stats[upid] = stats
+    if "max_mem" in stats:
+        stats["mem"] = stats["max_mem"]
 
-    return gen_exec_stats
+    return {upid: stats}
 
 # -----------------------------------------------------------------------------
 
 
 def get_max_required_memory(lsf_output_dir):
     """
+    Finds the maximum memory used by any of the LSF jobs in a directory
+
+    lsf_output_dir: A directory where job .out files have been stored
 
-    lsf_output_dir:
+    return: The maximum memory in MB, or 0 if no job reported its memory
     """
 
     max_mem = 0
@@ -143,8 +120,12 @@ def get_max_required_memory(lsf_output_dir):
 
     for lsf_out_file in lsf_out_files:
         output_file_loc = os.path.join(lsf_output_dir, lsf_out_file)
-        all_stats = extract_job_stats(output_file_loc)
+        job_stats = extract_job_stats(output_file_loc).values()[0]
 
+        if job_stats.get("mem", 0) > max_mem:
+            max_mem = job_stats["mem"]
+
+    return max_mem
 
 # -----------------------------------------------------------------------------
 
@@ -155,22 +136,31 @@ def extract_project_stats(lsf_output_dir):
     details such as, start and end dates, max required memory etc.
 
     lsf_output_dir: A directory where job .out files have been stored
+
+    return: A tuple (stats of every job keyed by job name, total CPU time,
+    average CPU time) with CPU times in seconds
     """
 
     all_stats = {}
 
-    # move all files in a single dir and get from there
-    output_files = os.listdir(lsf_output_dir)
+    output_files = [x for x in os.listdir(lsf_output_dir) if x.endswith(".out")]
 
     total_exec_time = 0.0
 
     for output_file in output_files:
-        job_stats = extract_job_stats(output_file)
-        upid = job_stats.keys()
-        total_exec_time = total_exec_time + float(job_stats[upid]["cpu_time"])
+        job_stats = extract_job_stats(os.path.join(lsf_output_dir, output_file))
+        upid = job_stats.keys()[0]
+
+        # jobs killed before LSF sampled them have no CPU time
+        if "cpu_time" not in job_stats[upid]:
+            continue
+
+        total_exec_time = total_exec_time + job_stats[upid]["cpu_time"]
         all_stats[upid] = copy.deepcopy(job_stats[upid])
 
-    avg_exec_time = total_exec_time / len(all_stats.keys())
+    avg_exec_time = 0.0
+    if len(all_stats.keys()) > 0:
+        avg_exec_time = total_exec_time / len(all_stats.keys())
 
     return all_stats, total_exec_time, avg_exec_time
 
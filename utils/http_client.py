@@ -0,0 +1,562 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Shared HTTP fetch layer used for Uniprot, ENA and NCBI metadata retrieval.
+Provides keep-alive sessions (one per thread), retries with exponential
+backoff, per host rate limiting and a bounded thread pool for fetching
+many resources concurrently. Responses fetched via cached_get can be kept
+in a persistent on-disk cache (see configure_cache)
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import httplib
+import urlparse
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------------------------GLOBALS-------------------------------------
+
+# maximum number of requests per second allowed per host
+HOST_RATE_LIMITS = {"www.uniprot.org": 10.0,
+                    "www.ebi.ac.uk": 20.0,
+                    "eutils.ncbi.nlm.nih.gov": 3.0}
+
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5  # seconds, doubled on every retry
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+TIMEOUT = 120  # seconds
+
+POOL_SIZE = 10  # keep-alive connections per host and thread
+WORKERS = 8  # default number of concurrent fetches
+
+THREAD_DATA = threading.local()
+RATE_LIMITERS = {}
+RATE_LIMITERS_LOCK = threading.Lock()
+
+CACHE_TTL = 7 * 24 * 3600  # seconds before a cached response is revalidated
+CACHE_MAX_SIZE = 2 * 1024 ** 3  # bytes of response bodies kept on disk
+
+# persistent response cache used by cached_get, set by configure_cache
+RESPONSE_CACHE = None
+
+# -----------------------------------------------------------------------------
+
+
+class RateLimiter(object):
+    """
+    Spaces out requests to a host so that no more than rate requests per
+    second are issued, across all threads
+    """
+
+    def __init__(self, rate):
+        """
+        rate: Maximum number of requests per second
+        """
+
+        self.interval = 1.0 / float(rate)
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the calling thread is allowed to issue a request
+        """
+
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+# -----------------------------------------------------------------------------
+
+
+def set_rate_limit(host, rate):
+    """
+    Sets or replaces the rate limit of a host
+
+    host: A host name (e.g. www.ebi.ac.uk, localhost:8000)
+    rate: Maximum number of requests per second, None to disable the limit
+
+    return: void
+    """
+
+    with RATE_LIMITERS_LOCK:
+        HOST_RATE_LIMITS[host] = rate
+        RATE_LIMITERS.pop(host, None)
+
+# -----------------------------------------------------------------------------
+
+
+def get_rate_limiter(url):
+    """
+    Returns the rate limiter of the host a url points to
+
+    url: A valid http(s) url
+
+    return: A RateLimiter object or None if the host is not rate limited
+    """
+
+    host = urlparse.urlparse(url).netloc
+
+    with RATE_LIMITERS_LOCK:
+        if host not in RATE_LIMITERS:
+            rate = HOST_RATE_LIMITS.get(host)
+            RATE_LIMITERS[host] = RateLimiter(rate) if rate else None
+
+        return RATE_LIMITERS[host]
+
+# -----------------------------------------------------------------------------
+
+
+def get_session():
+    """
+    Returns the calling thread's keep-alive session, creating it on first use.
+    requests.Session objects are not thread safe, so each thread gets its own
+    connection pool
+
+    return: A requests.Session object
+    """
+
+    session = getattr(THREAD_DATA, "session", None)
+
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        THREAD_DATA.session = session
+
+    return session
+
+# -----------------------------------------------------------------------------
+
+
+def get(url, retries=MAX_RETRIES, backoff=BACKOFF_FACTOR, timeout=TIMEOUT, **kwargs):
+    """
+    Issues a rate limited GET request over the thread's keep-alive session.
+    Connection errors, timeouts and 429/5xx responses are retried with
+    exponential backoff, honouring any Retry-After header
+
+    url: A valid http(s) url
+    retries: Maximum number of retries
+    backoff: Initial backoff in seconds, doubled after every retry
+    timeout: Connection and read timeout in seconds
+    kwargs: Any other arguments accepted by requests.get (e.g. stream)
+
+    return: A requests.Response object. The response of the last attempt is
+    returned if all retries are exhausted
+    """
+
+    limiter = get_rate_limiter(url)
+    session = get_session()
+
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.wait()
+
+        delay = backoff * (2 ** attempt)
+
+        try:
+            response = session.get(url, timeout=timeout, **kwargs)
+
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= retries:
+                raise
+
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                return response
+
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+
+            response.close()
+
+        time.sleep(delay)
+        attempt += 1
+
+# -----------------------------------------------------------------------------
+
+
+def get_content(url, **kwargs):
+    """
+    Fetches a url and returns its contents if the request was successful
+
+    url: A valid http(s) url
+
+    return: The response body as a string or None if the status is not OK
+    """
+
+    response = get(url, **kwargs)
+
+    if response.status_code == httplib.OK:
+        return response.content
+
+    return None
+
+# -----------------------------------------------------------------------------
+
+
+def download(url, file_path, chunk_size=1024 * 1024, **kwargs):
+    """
+    Streams a url directly to a file in a single request
+
+    url: A valid http(s) url
+    file_path: The path to the destination file
+    chunk_size: Number of bytes written per chunk
+
+    return: True if the file was downloaded, False otherwise
+    """
+
+    response = get(url, stream=True, **kwargs)
+
+    if response.status_code != httplib.OK:
+        response.close()
+        return False
+
+    fp_out = open(file_path, 'wb')
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            fp_out.write(chunk)
+    fp_out.close()
+
+    response.close()
+
+    return True
+
+# -----------------------------------------------------------------------------
+
+
+def map_concurrent(func, items, workers=WORKERS):
+    """
+    Applies func to every item using a bounded pool of threads. Meant for
+    functions that spend most of their time waiting on http requests
+    issued through this module, so that throughput is bounded by the host
+    rate limits rather than by request latency
+
+    func: A function accepting a single argument
+    items: A list of arguments
+    workers: Maximum number of concurrent calls
+
+    return: A list with the results of func in the same order as items.
+    An exception raised by func, including SystemExit and
+    KeyboardInterrupt, is raised again in the caller
+    """
+
+    items = list(items)
+
+    if len(items) == 0:
+        return []
+
+    if workers <= 1 or len(items) == 1:
+        return [func(x) for x in items]
+
+    # pool threads only survive Exception subclasses, and a worker killed
+    # by anything else leaves pool.map waiting forever
+    def call(item):
+        try:
+            return True, func(item)
+        except BaseException:
+            return False, sys.exc_info()
+
+    pool = ThreadPool(processes=min(workers, len(items)))
+
+    try:
+        results = pool.map(call, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    for success, result in results:
+        if success is False:
+            raise result[0], result[1], result[2]
+
+    return [x[1] for x in results]
+
+# -----------------------------------------------------------------------------
+
+
+def fetch_all(urls, workers=WORKERS, **kwargs):
+    """
+    Fetches a list of urls concurrently
+
+    urls: A list of valid http(s) urls
+    workers: Maximum number of concurrent requests
+
+    return: A list of requests.Response objects in the same order as urls
+    """
+
+    return map_concurrent(lambda x: get(x, **kwargs), urls, workers=workers)
+
+# -----------------------------------------------------------------------------
+
+
+class CachedResponse(object):
+    """
+    A minimal stand-in for requests.Response served from the response cache
+    """
+
+    def __init__(self, url, status_code, content, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+        self.from_cache = True
+
+    def close(self):
+        pass
+
+# -----------------------------------------------------------------------------
+
+
+class ResponseCache(object):
+    """
+    Persistent response cache stored in an SQLite database. Entries are keyed
+    by url and point to content addressed bodies (md5), so identical
+    responses are stored once. Stale entries are revalidated with the ETag
+    and Last-Modified headers of the original response, and the least
+    recently used entries are evicted once the bodies exceed max_size bytes
+    """
+
+    def __init__(self, cache_file, ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE, offline=False):
+        """
+        cache_file: The path to the SQLite cache file. Created if missing
+        ttl: Number of seconds a response is served without revalidation
+        max_size: Maximum number of bytes of response bodies to keep
+        offline: If True, never access the network and serve any cached
+        response regardless of its age
+        """
+
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.lock = threading.Lock()
+
+        cache_dir = os.path.dirname(os.path.abspath(cache_file))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self.cnx = sqlite3.connect(cache_file, timeout=60, check_same_thread=False)
+        self.cnx.text_factory = str
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "url TEXT PRIMARY KEY, md5 TEXT, etag TEXT, "
+                         "last_modified TEXT, fetched REAL, accessed REAL)")
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS bodies ("
+                         "md5 TEXT PRIMARY KEY, content BLOB, size INTEGER)")
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS responses_accessed "
+                         "ON responses (accessed)")
+        self.cnx.commit()
+
+    def lookup(self, url):
+        """
+        Returns the cached entry of a url
+
+        return: A tuple (content, etag, last_modified, fetched) or None
+        """
+
+        with self.lock:
+            row = self.cnx.execute("SELECT b.content, r.etag, r.last_modified, r.fetched "
+                                   "FROM responses r JOIN bodies b ON b.md5=r.md5 "
+                                   "WHERE r.url=?", (url,)).fetchone()
+
+            if row is not None:
+                self.cnx.execute("UPDATE responses SET accessed=? WHERE url=?",
+                                 (time.time(), url))
+                self.cnx.commit()
+                # BLOBs are returned as buffers
+                row = (str(row[0]),) + tuple(row[1:])
+
+        return row
+
+    def store(self, url, content, etag=None, last_modified=None):
+        """
+        Stores a successful response and evicts old entries if needed
+        """
+
+        md5 = hashlib.md5(content).hexdigest()
+        now = time.time()
+
+        with self.lock:
+            self.cnx.execute("INSERT OR IGNORE INTO bodies (md5, content, size) "
+                             "VALUES (?, ?, ?)", (md5, sqlite3.Binary(content), len(content)))
+            self.cnx.execute("INSERT OR REPLACE INTO responses "
+                             "(url, md5, etag, last_modified, fetched, accessed) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (url, md5, etag, last_modified, now, now))
+            self.evict()
+            self.cnx.commit()
+
+    def touch(self, url):
+        """
+        Marks a cached response as fresh after a successful revalidation
+        """
+
+        now = time.time()
+
+        with self.lock:
+            self.cnx.execute("UPDATE responses SET fetched=?, accessed=? WHERE url=?",
+                             (now, now, url))
+            self.cnx.commit()
+
+    def evict(self):
+        """
+        Deletes the least recently used responses until the bodies fit in
+        max_size. Must be called with the lock held
+        """
+
+        total_size = self.cnx.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+
+        if total_size <= self.max_size:
+            return
+
+        rows = self.cnx.execute("SELECT r.url, b.size FROM responses r "
+                                "JOIN bodies b ON b.md5=r.md5 "
+                                "ORDER BY r.accessed").fetchall()
+
+        for url, size in rows:
+            if total_size <= self.max_size:
+                break
+            self.cnx.execute("DELETE FROM responses WHERE url=?", (url,))
+            total_size -= size
+
+        self.cnx.execute("DELETE FROM bodies WHERE md5 NOT IN "
+                         "(SELECT DISTINCT md5 FROM responses)")
+
+    def get(self, url, **kwargs):
+        """
+        Serves a url from the cache, revalidating or fetching it if needed
+
+        url: A valid http(s) url
+
+        return: A CachedResponse if served from the cache, otherwise the
+        requests.Response of the network request
+        """
+
+        cached = self.lookup(url)
+
+        if cached is not None:
+            content, etag, last_modified, fetched = cached
+
+            if self.offline is True or time.time() - fetched < self.ttl:
+                return CachedResponse(url, httplib.OK, content)
+
+        # 504 is what HTTP caches answer to only-if-cached requests
+        elif self.offline is True:
+            return CachedResponse(url, httplib.GATEWAY_TIMEOUT, '')
+
+        headers = {}
+        if cached is not None:
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            response = get(url, headers=headers, **kwargs)
+
+        except (requests.ConnectionError, requests.Timeout):
+            # serve stale content rather than failing
+            if cached is not None:
+                return CachedResponse(url, httplib.OK, cached[0])
+            raise
+
+        if response.status_code == httplib.NOT_MODIFIED and cached is not None:
+            self.touch(url)
+            return CachedResponse(url, httplib.OK, cached[0])
+
+        if response.status_code == httplib.OK:
+            self.store(url, response.content, response.headers.get("ETag"),
+                       response.headers.get("Last-Modified"))
+
+        elif response.status_code in RETRY_STATUS_CODES and cached is not None:
+            return CachedResponse(url, httplib.OK, cached[0])
+
+        return response
+
+    def close(self):
+        """
+        Closes the cache database
+        """
+
+        with self.lock:
+            self.cnx.close()
+
+# -----------------------------------------------------------------------------
+
+
+def configure_cache(cache_file, ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE, offline=False):
+    """
+    Enables the persistent response cache used by cached_get. Replaces any
+    previously configured cache
+
+    cache_file: The path to the SQLite cache file, None to disable caching
+    ttl: Number of seconds a response is served without revalidation
+    max_size: Maximum number of bytes of response bodies to keep
+    offline: If True, only serve responses from the cache
+
+    return: The ResponseCache object or None
+    """
+
+    global RESPONSE_CACHE
+
+    if RESPONSE_CACHE is not None:
+        RESPONSE_CACHE.close()
+        RESPONSE_CACHE = None
+
+    if cache_file:
+        RESPONSE_CACHE = ResponseCache(cache_file, ttl=ttl, max_size=max_size,
+                                       offline=offline)
+
+    return RESPONSE_CACHE
+
+# -----------------------------------------------------------------------------
+
+
+def cached_get(url, **kwargs):
+    """
+    Same as get, but served through the persistent response cache if one
+    has been configured. Meant for metadata lookups (xml files) that are
+    requested repeatedly across a release
+
+    url: A valid http(s) url
+
+    return: A requests.Response or CachedResponse object
+    """
+
+    if RESPONSE_CACHE is None:
+        return get(url, **kwargs)
+
+    return RESPONSE_CACHE.get(url, **kwargs)
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
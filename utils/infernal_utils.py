@@ -16,6 +16,10 @@ limitations under the License.
 import os
 import sys
 import re
+import heapq
+import itertools
+import shutil
+import tempfile
 
 START = 9
 END = 10
@@ -24,6 +28,13 @@ EVAL = 2
 BSCORE = 3
 DBN_REGEX = {r"\(|\[|<|\{": '(', r"\)|\]|>|\}": ')', r"_|-|\.|,|~|:": '.'}
 
+# tblout columns of the sequence name and the model accession per program
+TBLOUT_COLUMNS = {"cmsearch": (0, 3), "cmscan": (2, 1)}
+TBLOUT_SEQ_FROM = 7
+TBLOUT_SEQ_TO = 8
+TBLOUT_STRAND = 9
+TBLOUT_SCORE = 14
+
 # --------------------------------------------------------------------------------------------------
 
 
@@ -362,6 +373,245 @@ def convert_short_wuss_to_dbn(ss_string):
     return ss_string
 
 
+# --------------------------------------------------------------------------------------------------
+
+def get_tblout_seq_acc(seq_name):
+    """
+    Extracts the sequence accession from a tblout sequence name, keeping
+    the last field of names like ENA|XXXX|XXXX.1
+
+    seq_name: The sequence name column of a tblout line
+    """
+
+    return seq_name.split('|')[-1]
+
+
+# --------------------------------------------------------------------------------------------------
+
+
+def get_tblout_hit_key(line_cont, tool="cmsearch"):
+    """
+    Builds the sort key of a tblout hit, ordering hits by sequence and
+    position. Identical hits have the same key up to the score, which sorts
+    the best scoring copy first
+
+    line_cont: The columns of a tblout line
+    tool: The Infernal program that generated the file (cmsearch, cmscan)
+
+    return: A tuple (seq_acc, start, end, strand, rfam_acc, -bit_score)
+    """
+
+    seq_col, model_col = TBLOUT_COLUMNS[tool]
+
+    seq_from = int(line_cont[TBLOUT_SEQ_FROM])
+    seq_to = int(line_cont[TBLOUT_SEQ_TO])
+
+    return (get_tblout_seq_acc(line_cont[seq_col]), min(seq_from, seq_to),
+            max(seq_from, seq_to), line_cont[TBLOUT_STRAND], line_cont[model_col],
+            -float(line_cont[TBLOUT_SCORE]))
+
+
+# --------------------------------------------------------------------------------------------------
+
+
+def lift_tblout_line(line_cont, offsets, tool="cmsearch"):
+    """
+    Maps the coordinates of a hit on a sequence chunk back to the sequence
+    the chunk was cut from
+
+    line_cont: The columns of a tblout line, split as line.split(None, 17)
+    offsets: A dictionary of chunk sequence names to (sequence name, offset)
+    tuples, offset being the 0-based start of the chunk on the sequence
+    tool: The Infernal program that generated the file (cmsearch, cmscan)
+
+    return: The columns of the line on the original sequence
+    """
+
+    seq_col = TBLOUT_COLUMNS[tool][0]
+
+    if line_cont[seq_col] not in offsets:
+        return line_cont
+
+    seq_name, offset = offsets[line_cont[seq_col]]
+
+    line_cont = list(line_cont)
+    line_cont[seq_col] = seq_name
+    line_cont[TBLOUT_SEQ_FROM] = str(int(line_cont[TBLOUT_SEQ_FROM]) + offset)
+    line_cont[TBLOUT_SEQ_TO] = str(int(line_cont[TBLOUT_SEQ_TO]) + offset)
+
+    return line_cont
+
+
+# --------------------------------------------------------------------------------------------------
+
+
+def read_tblout_hits(tbl_file, tool="cmsearch", offsets=None):
+    """
+    Reads the hits of a tblout file, skipping comment lines
+
+    tbl_file: A valid Infernal's output file in .tblout format
+    tool: The Infernal program that generated the file (cmsearch, cmscan)
+    offsets: Chunk offsets as described in lift_tblout_line, or None
+
+    return: A tuple (header lines, list of (key, line) tuples)
+    """
+
+    header = []
+    hits = []
+
+    fp = open(tbl_file, 'r')
+    for line in fp:
+        if line[0] == '#':
+            # column names precede the first hit, the rest is the footer
+            if len(hits) == 0:
+                header.append(line)
+            continue
+
+        line_cont = line.split(None, 17)
+        if len(line_cont) <= TBLOUT_SCORE:
+            continue
+
+        if offsets is not None:
+            lifted = lift_tblout_line(line_cont, offsets, tool=tool)
+            if lifted is not line_cont:
+                line_cont = lifted
+                line = ' '.join([x.rstrip('\n') for x in line_cont]) + '\n'
+
+        hits.append((get_tblout_hit_key(line_cont, tool=tool), line))
+    fp.close()
+
+    return header, hits
+
+
+# --------------------------------------------------------------------------------------------------
+
+
+def iterate_tblout_run(run_file, tool="cmsearch"):
+    """
+    Yields the (key, line) tuples of a sorted tblout run file
+    """
+
+    fp = open(run_file, 'r')
+    for line in fp:
+        yield (get_tblout_hit_key(line.split(None, 17), tool=tool), line)
+    fp.close()
+
+
+# --------------------------------------------------------------------------------------------------
+
+
+def resolve_overlapping_hits(hits):
+    """
+    Reconciles the hits of a sequence found on overlapping windows. Infernal
+    does not report overlapping hits of the same model on the same strand,
+    so any such hits come from different windows, one of them usually cut
+    short by a window boundary. Only the best scoring of them is kept
+
+    hits: A list of (key, line) tuples of a single sequence, sorted by
+    position, with keys as built by get_tblout_hit_key
+
+    return: The list of hits kept, sorted by position
+    """
+
+    kept = []
+    last_hit = {}  # index in kept of the last hit per strand and model
+
+    for key, line in hits:
+        group = (key[3], key[4])
+        idx = last_hit.get(group)
+
+        if idx is not None and key[1] <= kept[idx][0][2]:
+            # the lower -score is the better hit
+            if key[5] >= kept[idx][0][5]:
+                continue
+            kept[idx] = None
+
+        last_hit[group] = len(kept)
+        kept.append((key, line))
+
+    return [x for x in kept if x is not None]
+
+
+# --------------------------------------------------------------------------------------------------
+
+
+def merge_tblout_files(tbl_files, dest_file, tool="cmsearch", offsets=None,
+                       resolve_overlaps=False):
+    """
+    Merges the tblout files of the chunks of a genome into a single file
+    sorted by sequence accession and position. Every chunk is sorted into a
+    run file on disk and the runs are k-way merged, so that only one chunk
+    is held in memory at a time. Comment lines are written once, and hits
+    found twice, e.g. on overlapping chunks, are kept once with their best
+    score
+
+    tbl_files: A list of tblout files
+    dest_file: The path to the merged tblout file
+    tool: The Infernal program that generated the files (cmsearch, cmscan)
+    offsets: Chunk offsets as described in lift_tblout_line, or None if the
+    chunks are whole sequences
+    resolve_overlaps: If True, also reconcile overlapping hits of the same
+    model found on overlapping windows (see resolve_overlapping_hits)
+
+    return: The number of hits written
+    """
+
+    dest_dir = os.path.dirname(os.path.abspath(dest_file))
+    run_dir = tempfile.mkdtemp(prefix="tbl_merge.", dir=dest_dir)
+
+    header = None
+    run_files = []
+
+    try:
+        for tbl_file in tbl_files:
+            tbl_header, hits = read_tblout_hits(tbl_file, tool=tool, offsets=offsets)
+            if header is None:
+                header = tbl_header
+
+            hits.sort()
+
+            run_file = os.path.join(run_dir, str(len(run_files)))
+            run_fp = open(run_file, 'w')
+            for hit in hits:
+                run_fp.write(hit[1])
+            run_fp.close()
+
+            run_files.append(run_file)
+
+        hit_count = 0
+        last_key = None
+
+        tmp_file = dest_file + ".tmp"
+        out_fp = open(tmp_file, 'w')
+        out_fp.writelines(header or [])
+
+        merged_hits = heapq.merge(*[iterate_tblout_run(x, tool=tool) for x in run_files])
+
+        for seq_acc, seq_hits in itertools.groupby(merged_hits, key=lambda x: x[0][0]):
+            unique_hits = []
+            for key, line in seq_hits:
+                # the same hit on the same strand with the same model
+                if last_key is not None and key[:5] == last_key[:5]:
+                    continue
+                unique_hits.append((key, line))
+                last_key = key
+
+            if resolve_overlaps is True:
+                unique_hits = resolve_overlapping_hits(unique_hits)
+
+            for key, line in unique_hits:
+                out_fp.write(line)
+                hit_count += 1
+
+        out_fp.close()
+        os.rename(tmp_file, dest_file)
+
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    return hit_count
+
+
 # --------------------------------------------------------------------------------------------------
 
 if __name__ == '__main__':
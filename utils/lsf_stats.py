@@ -0,0 +1,411 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Harvests the statistics of search jobs from LSF job reports (.out files)
+and the Infernal output of each job (.inf), and keeps them in a local
+performance database (SQLite) to size future runs
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import re
+import sqlite3
+import argparse
+import multiprocessing
+
+# -----------------------------------------------------------------------------
+
+MB = 1000000.0
+
+TOOLS = ("cmsearch", "cmscan")
+
+LSF_VALUE_LINES = {"CPU time": "cpu_time",
+                   "Run time": "run_time",
+                   "Max Memory": "max_mem",
+                   "Average Memory": "avg_mem",
+                   "Max Processes": "max_proc",
+                   "Max Threads": "max_threads"}
+
+RESIDUES_REGEX = re.compile(r"Target sequences:\s+(\d+)\s+\((\d+) residues searched\)")
+QUERY_MODELS_REGEX = re.compile(r"Query model\(s\):\s+(\d+)\s+\((\d+) consensus positions\)")
+
+JOB_COLUMNS = ("path", "job_name", "tool", "status", "cpu_time", "run_time", "max_mem",
+               "residues", "cm_count", "total_clen", "mtime")
+
+# -----------------------------------------------------------------------------
+
+
+def parse_lsf_report(lsf_output_file):
+    """
+    Parses an LSF job report. This is the only LSF report parser, also used
+    by genome_search_utils.extract_job_stats
+
+    lsf_output_file: The path to an LSF job .out file
+
+    return: A dictionary with the status (done/exit/unknown), start_date and
+    end_date, cpu_time and run_time (seconds), max_mem and avg_mem (MB),
+    max_proc, max_threads and the command of the job. Values LSF did not
+    report are left out
+    """
+
+    stats = {"status": "unknown", "command": None}
+    command_next = False
+
+    fp = open(lsf_output_file, 'r')
+    for line in fp:
+        if command_next is True:
+            stats["command"] = line.strip()
+            command_next = False
+            continue
+
+        if line.startswith("# LSBATCH: User input"):
+            command_next = True
+
+        elif line.startswith("Successfully completed"):
+            stats["status"] = "done"
+
+        elif line.startswith("Exited with"):
+            stats["status"] = "exit"
+
+        elif line.startswith("Started at"):
+            stats["start_date"] = line.strip()[len("Started at "):]
+
+        elif line.startswith("Results reported at"):
+            stats["end_date"] = line.strip()[len("Results reported at "):]
+
+        else:
+            label, sep, value = line.partition(':')
+            label = label.strip()
+
+            if sep != '' and label in LSF_VALUE_LINES:
+                value = value.split()
+                # LSF reports - for values it could not sample
+                if len(value) > 0 and value[0] != '-':
+                    try:
+                        stats[LSF_VALUE_LINES[label]] = float(value[0])
+                    except ValueError:
+                        pass
+    fp.close()
+
+    return stats
+
+# -----------------------------------------------------------------------------
+
+
+def parse_infernal_output(inf_file):
+    """
+    Extracts the tool, residues searched and models searched from the
+    pipeline statistics of a cmsearch/cmscan output file
+
+    inf_file: The path to a cmsearch/cmscan output file (-o)
+
+    return: A dictionary with the tool, residues, cm_count and total_clen.
+    Infernal counts the residues of both strands, which are halved here to
+    match the single strand counts (project_index.count_residues) the search
+    planner works with
+    """
+
+    stats = {"tool": None, "residues": None, "cm_count": 0, "total_clen": 0}
+
+    fp = open(inf_file, 'r')
+    for line in fp:
+        # searches of a single strand report single strand residues
+        if line.startswith("# search top-strand only") or \
+                line.startswith("# search bottom-strand only"):
+            stats["strands"] = 1
+
+        elif stats["tool"] is None and line.startswith('#'):
+            for tool in TOOLS:
+                if line.startswith("# %s ::" % tool):
+                    stats["tool"] = tool
+
+        elif line.startswith("Query model(s):"):
+            match = QUERY_MODELS_REGEX.search(line)
+            if match is not None:
+                stats["cm_count"] += int(match.group(1))
+                stats["total_clen"] += int(match.group(2))
+
+        # every model reports the same database, so keep the first
+        elif stats["residues"] is None and line.startswith("Target sequences:"):
+            match = RESIDUES_REGEX.search(line)
+            if match is not None:
+                stats["residues"] = int(match.group(2))
+
+    fp.close()
+
+    strands = stats.pop("strands", 2)
+    if stats["residues"] is not None:
+        stats["residues"] /= strands
+
+    return stats
+
+# -----------------------------------------------------------------------------
+
+
+def harvest_job(lsf_output_file):
+    """
+    Collects the statistics of a single search job from its LSF report and
+    the Infernal output next to it (<job>.inf)
+
+    lsf_output_file: The path to an LSF job .out file
+
+    return: A dictionary with the keys in JOB_COLUMNS
+    """
+
+    job_name = os.path.basename(lsf_output_file).rpartition('.')[0]
+    stats = parse_lsf_report(lsf_output_file)
+
+    job = dict([(x, None) for x in JOB_COLUMNS])
+    job.update({"path": lsf_output_file, "job_name": job_name, "status": stats["status"],
+                "cpu_time": stats.get("cpu_time"), "run_time": stats.get("run_time"),
+                "max_mem": stats.get("max_mem"),
+                "mtime": os.path.getmtime(lsf_output_file)})
+
+    inf_file = os.path.join(os.path.dirname(lsf_output_file), job_name + ".inf")
+    if os.path.exists(inf_file):
+        job.update(parse_infernal_output(inf_file))
+
+    if job["tool"] is None and stats["command"] is not None:
+        for tool in TOOLS:
+            if stats["command"].find(tool) != -1:
+                job["tool"] = tool
+
+    return job
+
+# -----------------------------------------------------------------------------
+
+
+def harvest_directory(task):
+    """
+    Walks a directory and harvests every LSF job report that is not already
+    in the database with the same mtime. Runs in a worker process of
+    harvest_job_stats
+
+    task: A tuple (directory, known, recursive) where known is a dictionary
+    of report paths to the mtimes stored in the database, and recursive is
+    False to only harvest the top level of the directory
+
+    return: A list of job dictionaries
+    """
+
+    search_dir, known, recursive = task
+    jobs = []
+
+    for dir_path, dir_names, filenames in os.walk(search_dir):
+        if recursive is False:
+            del dir_names[:]
+
+        for filename in filenames:
+            if not filename.endswith(".out"):
+                continue
+
+            lsf_output_file = os.path.join(dir_path, filename)
+            if known.get(lsf_output_file) == os.path.getmtime(lsf_output_file):
+                continue
+
+            # skip files that are not LSF reports
+            job = harvest_job(lsf_output_file)
+            if job["cpu_time"] is not None or job["status"] != "unknown":
+                jobs.append(job)
+
+    return jobs
+
+# -----------------------------------------------------------------------------
+
+
+class PerformanceDB(object):
+    """
+    Local SQLite database of search job statistics
+    """
+
+    def __init__(self, db_file):
+        """
+        db_file: The path to the database file. Created if missing
+        """
+
+        self.db_file = db_file
+
+        self.cnx = sqlite3.connect(db_file, timeout=60)
+        self.cnx.text_factory = str
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                         "path TEXT PRIMARY KEY, job_name TEXT, tool TEXT, status TEXT, "
+                         "cpu_time REAL, run_time REAL, max_mem REAL, residues INTEGER, "
+                         "cm_count INTEGER, total_clen INTEGER, mtime REAL)")
+        self.cnx.commit()
+
+    def known_reports(self, search_dir):
+        """
+        Returns the reports of a directory already in the database
+
+        return: A dictionary of report paths to mtimes
+        """
+
+        prefix = os.path.join(os.path.abspath(search_dir), '')
+
+        return dict(self.cnx.execute("SELECT path, mtime FROM jobs WHERE substr(path, 1, ?)=?",
+                                     (len(prefix), prefix)).fetchall())
+
+    def store(self, jobs):
+        """
+        Adds or updates a list of job dictionaries
+        """
+
+        rows = [tuple([x[c] for c in JOB_COLUMNS]) for x in jobs]
+
+        self.cnx.executemany("INSERT OR REPLACE INTO jobs (%s) VALUES (%s)" %
+                             (', '.join(JOB_COLUMNS), ', '.join(['?'] * len(JOB_COLUMNS))),
+                             rows)
+        self.cnx.commit()
+
+    def throughput(self):
+        """
+        Summarises successful jobs per tool
+
+        return: A list of dictionaries with the tool, number of jobs, CPU
+        hours, Mb searched, throughput (Mb per CPU hour) and the average
+        and maximum memory (MB) of the jobs
+        """
+
+        rows = self.cnx.execute("SELECT tool, COUNT(*), SUM(cpu_time), SUM(residues), "
+                                "AVG(max_mem), MAX(max_mem) FROM jobs "
+                                "WHERE status='done' AND cpu_time > 0 AND residues IS NOT NULL "
+                                "GROUP BY tool ORDER BY tool").fetchall()
+
+        summary = []
+        for tool, job_no, cpu_time, residues, avg_mem, max_mem in rows:
+            cpu_hours = cpu_time / 3600.0
+            summary.append({"tool": tool, "jobs": job_no, "cpu_hours": cpu_hours,
+                            "mb_searched": residues / MB,
+                            "mb_per_cpu_hour": (residues / MB) / cpu_hours,
+                            "avg_mem": avg_mem, "max_mem": max_mem})
+
+        return summary
+
+    def samples(self, tool="cmsearch"):
+        """
+        Lists the successful jobs of a tool in the form fit_cost_model
+        expects. Residues are single strand counts, as used by the planner
+
+        return: A list of dictionaries with the path of the LSF report and
+        the residues, total_clen, cpu_time (seconds) and mem (MB) of every job
+        """
+
+        rows = self.cnx.execute("SELECT path, residues, total_clen, cpu_time, max_mem FROM jobs "
+                                "WHERE status='done' AND tool=? AND cpu_time > 0 AND "
+                                "residues IS NOT NULL AND total_clen > 0",
+                                (tool,)).fetchall()
+
+        return [{"path": x[0], "residues": x[1], "total_clen": x[2], "cpu_time": x[3],
+                 "mem": x[4]} for x in rows]
+
+    def max_memory(self, tool=None):
+        """
+        Returns the maximum memory (MB) used by any job, optionally of a
+        single tool
+        """
+
+        if tool is None:
+            return self.cnx.execute("SELECT MAX(max_mem) FROM jobs").fetchone()[0]
+
+        return self.cnx.execute("SELECT MAX(max_mem) FROM jobs WHERE tool=?",
+                                (tool,)).fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database
+        """
+
+        self.cnx.close()
+
+# -----------------------------------------------------------------------------
+
+
+def harvest_job_stats(search_dirs, db_file, workers=None):
+    """
+    Harvests the LSF job reports found under a list of search output
+    directories into the performance database. The immediate
+    subdirectories of every input directory are walked in parallel, and
+    reports already harvested are skipped unless they have changed
+
+    search_dirs: A list of directories containing LSF .out files
+    db_file: The path to the performance database
+    workers: Number of worker processes. Defaults to the number of cpus
+
+    return: The number of job reports harvested
+    """
+
+    perf_db = PerformanceDB(db_file)
+
+    tasks = []
+    for search_dir in search_dirs:
+        search_dir = os.path.abspath(search_dir)
+
+        for subdir in os.listdir(search_dir):
+            subdir_loc = os.path.join(search_dir, subdir)
+            if os.path.isdir(subdir_loc):
+                tasks.append((subdir_loc, perf_db.known_reports(subdir_loc), True))
+
+        # reports at the top level of the directory
+        tasks.append((search_dir, perf_db.known_reports(search_dir), False))
+
+    pool = multiprocessing.Pool(processes=workers)
+
+    harvested = 0
+    for jobs in pool.imap_unordered(harvest_directory, tasks):
+        perf_db.store(jobs)
+        harvested += len(jobs)
+
+    pool.close()
+    pool.join()
+
+    perf_db.close()
+
+    return harvested
+
+# -----------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Harvest LSF search job statistics")
+
+    parser.add_argument("db_file", help="performance database file", type=str)
+    parser.add_argument("search_dirs", help="directories with LSF .out files", nargs='*')
+    parser.add_argument("--workers", help="number of worker processes", type=int, default=None)
+    parser.add_argument("--summary", help="print throughput per tool", action="store_true")
+
+    return parser
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = usage()
+    args = parser.parse_args()
+
+    if len(args.search_dirs) > 0:
+        print "%d job reports harvested" % harvest_job_stats(args.search_dirs, args.db_file,
+                                                             workers=args.workers)
+
+    if args.summary is True:
+        perf_db = PerformanceDB(args.db_file)
+        for row in perf_db.throughput():
+            print "%(tool)s\t%(jobs)d jobs\t%(cpu_hours).1f CPU hours\t%(mb_searched).1f Mb\t" \
+                  "%(mb_per_cpu_hour).2f Mb/CPU hour\tmax memory %(max_mem)s MB" % row
+        perf_db.close()
@@ -0,0 +1,565 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Persistent index of a genome download project directory, organised as
+project_dir/<upid[-3:]>/<upid>. The index is an SQLite manifest (by default
+project_dir/project_index.db) recording every genome's files, sizes, residue
+count, search chunks and search status. Genomes are only listed again when
+the modification time of one of their directories, including the nested
+directories sequence files are split across, has changed, so tools can
+query the project without walking the whole tree
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import time
+import sqlite3
+import argparse
+
+# -----------------------------------------------------------------------------
+
+INDEX_FILENAME = "project_index.db"
+UPID_GCA_FILENAME = "upid_gca_dict.json"
+
+# genome subdirectories tracked by the index and the kind of their files
+GENOME_SUBDIRS = {"sequences": "sequence",
+                  "search_chunks": "chunk",
+                  "search_output": "search"}
+
+# search status of genomes and chunks
+NOT_STARTED = "not_started"
+PENDING = "pending"
+FAILED = "failed"
+DONE = "done"
+
+# -----------------------------------------------------------------------------
+
+
+def get_genome_dir(project_dir, upid):
+    """
+    Builds the path of a genome directory in a project directory
+
+    project_dir: The path to a project directory as generated by genome_downloader
+    upid: A valid Uniprot proteome accession
+
+    return: The path to the genome directory
+    """
+
+    return os.path.join(os.path.join(project_dir, upid[-3:]), upid)
+
+# -----------------------------------------------------------------------------
+
+
+def is_project_dir(project_dir):
+    """
+    Checks whether a directory is a genome download project directory, as
+    opposed to the flat search output directories of genome_scanner
+
+    project_dir: The path to a directory
+
+    return: True if the directory has a project index or upid_gca_dict.json
+    """
+
+    return os.path.exists(os.path.join(project_dir, INDEX_FILENAME)) or \
+        os.path.exists(os.path.join(project_dir, UPID_GCA_FILENAME))
+
+# -----------------------------------------------------------------------------
+
+
+def count_residues(fasta_file):
+    """
+    Counts the residues of all sequences in a fasta file
+
+    fasta_file: The path to a fasta file
+
+    return: The number of residues
+    """
+
+    residues = 0
+
+    fp = open(fasta_file, 'r')
+    for line in fp:
+        if line[0] != '>':
+            residues += len(line.strip())
+    fp.close()
+
+    return residues
+
+# -----------------------------------------------------------------------------
+
+
+def get_chunk_search_status(chunk_name, search_files):
+    """
+    Works out the search status of a sequence chunk from the sizes of its
+    search output files
+
+    chunk_name: The filename of the sequence chunk
+    search_files: A dictionary of search output filenames to file sizes
+
+    return: One of DONE, FAILED or PENDING
+    """
+
+    err_size = search_files.get(chunk_name + ".err")
+    if err_size is None:
+        return PENDING
+
+    # anything written to the LSF error file means the search crashed
+    if err_size > 0:
+        return FAILED
+
+    if chunk_name + ".tbl" in search_files:
+        return DONE
+
+    return PENDING
+
+# -----------------------------------------------------------------------------
+
+
+class ProjectIndex(object):
+    """
+    SQLite manifest of a genome download project directory
+    """
+
+    def __init__(self, project_dir, index_file=None):
+        """
+        project_dir: The path to a project directory as generated by genome_downloader
+        index_file: The path to the index file. Defaults to
+        project_dir/project_index.db
+        """
+
+        if index_file is None:
+            index_file = os.path.join(project_dir, INDEX_FILENAME)
+
+        self.project_dir = project_dir
+        self.index_file = index_file
+
+        self.cnx = sqlite3.connect(index_file, timeout=60)
+        self.cnx.text_factory = str
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS genomes ("
+                         "upid TEXT PRIMARY KEY, genome_dir TEXT, dir_mtimes TEXT, "
+                         "fasta_size INTEGER, fasta_mtime REAL, residues INTEGER, "
+                         "chunks INTEGER, search_status TEXT, updated REAL)")
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS files ("
+                         "path TEXT PRIMARY KEY, upid TEXT, kind TEXT, name TEXT, "
+                         "size INTEGER, mtime REAL, search_status TEXT)")
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS files_upid ON files (upid, kind)")
+        # directories nested in the genome subdirectories, whose mtimes are
+        # part of the genome's signature
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, upid TEXT)")
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS dirs_upid ON dirs (upid)")
+        self.cnx.commit()
+
+    def close(self):
+        """
+        Closes the index database
+        """
+
+        self.cnx.close()
+
+    def genome_dir(self, upid):
+        """
+        Returns the path to a genome directory of the project
+        """
+
+        return get_genome_dir(self.project_dir, upid)
+
+    def discover_upids(self):
+        """
+        Lists the genome directories of the project. This is the only full
+        walk of the project tree and is only needed to pick up new genomes
+
+        return: A sorted list of upids
+        """
+
+        upids = []
+
+        for subdir in os.listdir(self.project_dir):
+            subdir_loc = os.path.join(self.project_dir, subdir)
+            if len(subdir) != 3 or not os.path.isdir(subdir_loc):
+                continue
+
+            upids.extend([x for x in os.listdir(subdir_loc)
+                          if x.startswith("UP") and os.path.isdir(os.path.join(subdir_loc, x))])
+
+        return sorted(upids)
+
+    def get_dir_mtimes(self, upid):
+        """
+        Builds a signature of the modification times of a genome's directories.
+        Nested directories found by the last scan are included, so files
+        added to e.g. sequences/1 are picked up although the sequences
+        directory itself has not changed. New nested directories change the
+        mtime of their parent
+
+        return: A string, or None if the genome directory does not exist
+        """
+
+        genome_dir = self.genome_dir(upid)
+        if not os.path.exists(genome_dir):
+            return None
+
+        mtimes = [repr(os.path.getmtime(genome_dir))]
+        for subdir in sorted(GENOME_SUBDIRS.keys()):
+            subdir_loc = os.path.join(genome_dir, subdir)
+            mtimes.append(repr(os.path.getmtime(subdir_loc))
+                          if os.path.exists(subdir_loc) else '-')
+
+        for (dir_loc,) in self.cnx.execute("SELECT path FROM dirs WHERE upid=? ORDER BY path",
+                                           (upid,)).fetchall():
+            mtimes.append(repr(os.path.getmtime(dir_loc)) if os.path.exists(dir_loc) else '-')
+
+        return ' '.join(mtimes)
+
+    def scan_genome(self, upid):
+        """
+        Lists all files of a genome and stores them in the index along with
+        the genome's directory signature, counting the residues of the
+        genome's fasta file if it has changed
+        """
+
+        genome_dir = self.genome_dir(upid)
+        files = []
+        nested_dirs = []
+
+        for filename in os.listdir(genome_dir):
+            file_loc = os.path.join(genome_dir, filename)
+            if os.path.isfile(file_loc):
+                files.append((file_loc, "genome", filename))
+
+        for subdir, kind in GENOME_SUBDIRS.items():
+            subdir_loc = os.path.join(genome_dir, subdir)
+            if not os.path.exists(subdir_loc):
+                continue
+
+            # sequence files may be split across subdirectories
+            for dir_path, dir_names, filenames in os.walk(subdir_loc):
+                nested_dirs.extend([os.path.join(dir_path, x) for x in dir_names])
+
+                for filename in filenames:
+                    # sequence indices are not chunks
+                    if kind == "chunk" and filename.endswith(".ssi"):
+                        continue
+                    files.append((os.path.join(dir_path, filename), kind, filename))
+
+        rows = []
+        for file_loc, kind, filename in files:
+            rows.append((file_loc, upid, kind, filename, os.path.getsize(file_loc),
+                         os.path.getmtime(file_loc)))
+
+        self.cnx.execute("DELETE FROM files WHERE upid=?", (upid,))
+        self.cnx.executemany("INSERT INTO files (path, upid, kind, name, size, mtime) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        # the signature is rebuilt once the nested directories are known
+        self.cnx.execute("DELETE FROM dirs WHERE upid=?", (upid,))
+        self.cnx.executemany("INSERT INTO dirs (path, upid) VALUES (?, ?)",
+                             [(x, upid) for x in nested_dirs])
+        dir_mtimes = self.get_dir_mtimes(upid)
+
+        fasta_size, fasta_mtime, residues = None, None, None
+
+        row = self.cnx.execute("SELECT fasta_size, fasta_mtime, residues FROM genomes "
+                               "WHERE upid=?", (upid,)).fetchone()
+
+        fasta_file = os.path.join(genome_dir, upid + ".fa")
+        if os.path.exists(fasta_file):
+            fasta_size = os.path.getsize(fasta_file)
+            fasta_mtime = os.path.getmtime(fasta_file)
+
+            if row is not None and row[0] == fasta_size and row[1] == fasta_mtime:
+                residues = row[2]
+            else:
+                residues = count_residues(fasta_file)
+
+        self.cnx.execute("INSERT OR REPLACE INTO genomes (upid, genome_dir, dir_mtimes, "
+                         "fasta_size, fasta_mtime, residues, chunks, search_status, updated) "
+                         "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                         (upid, genome_dir, dir_mtimes, fasta_size, fasta_mtime,
+                          residues, NOT_STARTED, time.time()))
+
+    def update_search_status(self, upid, restat=False):
+        """
+        Works out the search status of every chunk of a genome and of the
+        genome as a whole
+
+        upid: A valid Uniprot proteome accession
+        restat: If True, refresh the sizes of the search output files
+        already in the index, as LSF error files grow without changing
+        their directory
+        """
+
+        if restat is True:
+            rows = self.cnx.execute("SELECT path FROM files WHERE upid=? AND kind='search'",
+                                    (upid,)).fetchall()
+            updates = []
+            for (file_loc,) in rows:
+                if os.path.exists(file_loc):
+                    updates.append((os.path.getsize(file_loc), os.path.getmtime(file_loc),
+                                    file_loc))
+            self.cnx.executemany("UPDATE files SET size=?, mtime=? WHERE path=?", updates)
+
+        search_files = dict(self.cnx.execute("SELECT name, size FROM files "
+                                             "WHERE upid=? AND kind='search'",
+                                             (upid,)).fetchall())
+        chunks = [x[0] for x in self.cnx.execute("SELECT name FROM files WHERE "
+                                                 "upid=? AND kind='chunk'",
+                                                 (upid,)).fetchall()]
+
+        statuses = []
+        for chunk_name in chunks:
+            status = get_chunk_search_status(chunk_name, search_files)
+            statuses.append((status, upid, chunk_name))
+
+        self.cnx.executemany("UPDATE files SET search_status=? WHERE upid=? AND "
+                             "kind='chunk' AND name=?", statuses)
+
+        if len(statuses) == 0 or len(search_files) == 0:
+            genome_status = NOT_STARTED
+        elif FAILED in [x[0] for x in statuses]:
+            genome_status = FAILED
+        elif PENDING in [x[0] for x in statuses]:
+            genome_status = PENDING
+        else:
+            genome_status = DONE
+
+        self.cnx.execute("UPDATE genomes SET chunks=?, search_status=? WHERE upid=?",
+                         (len(chunks), genome_status, upid))
+
+    def refresh(self, upids=None, force=False):
+        """
+        Brings the index up to date. Genomes whose directories have not
+        changed are not listed again, and only the search output files of
+        genomes with an unfinished search are checked for new content
+
+        upids: A list of upids to refresh. If None, the project directory is
+        walked once to pick up new genomes
+        force: If True, rescan every genome regardless of modification times
+
+        return: The number of genomes rescanned
+        """
+
+        if upids is None:
+            upids = self.discover_upids()
+
+        known = dict(self.cnx.execute("SELECT upid, dir_mtimes FROM genomes").fetchall())
+        rescanned = 0
+
+        for upid in upids:
+            dir_mtimes = self.get_dir_mtimes(upid)
+
+            if dir_mtimes is None:
+                self.cnx.execute("DELETE FROM genomes WHERE upid=?", (upid,))
+                self.cnx.execute("DELETE FROM files WHERE upid=?", (upid,))
+                self.cnx.execute("DELETE FROM dirs WHERE upid=?", (upid,))
+                continue
+
+            if force is True or known.get(upid) != dir_mtimes:
+                self.scan_genome(upid)
+                self.update_search_status(upid)
+                rescanned += 1
+
+            elif self.search_status(upid) in (PENDING, FAILED):
+                self.update_search_status(upid, restat=True)
+
+        self.cnx.commit()
+
+        return rescanned
+
+    def upids(self, search_status=None):
+        """
+        Lists the genomes in the index
+
+        search_status: Only list genomes with this search status
+
+        return: A sorted list of upids
+        """
+
+        if search_status is None:
+            rows = self.cnx.execute("SELECT upid FROM genomes ORDER BY upid").fetchall()
+        else:
+            rows = self.cnx.execute("SELECT upid FROM genomes WHERE search_status=? "
+                                    "ORDER BY upid", (search_status,)).fetchall()
+
+        return [x[0] for x in rows]
+
+    def genome(self, upid):
+        """
+        Returns the indexed summary of a genome
+
+        return: A dictionary or None if the genome is not indexed
+        """
+
+        columns = ("upid", "genome_dir", "fasta_size", "residues", "chunks", "search_status")
+        row = self.cnx.execute("SELECT %s FROM genomes WHERE upid=?" % ', '.join(columns),
+                               (upid,)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(columns, row))
+
+    def files(self, upid, kind=None):
+        """
+        Lists the indexed files of a genome
+
+        upid: A valid Uniprot proteome accession
+        kind: One of genome, sequence, chunk or search. All files if None
+
+        return: A sorted list of (path, size) tuples
+        """
+
+        query = "SELECT path, size FROM files WHERE upid=?"
+        params = [upid]
+        if kind is not None:
+            query += " AND kind=?"
+            params.append(kind)
+
+        return self.cnx.execute(query + " ORDER BY path", params).fetchall()
+
+    def find_file(self, upid, name, kind=None):
+        """
+        Looks up a file of a genome by name
+
+        upid: A valid Uniprot proteome accession
+        name: The filename to look for
+        kind: One of genome, sequence, chunk or search. Any kind if None
+
+        return: The path to the file, or None if it is not indexed
+        """
+
+        query = "SELECT path FROM files WHERE upid=? AND name=?"
+        params = [upid, name]
+        if kind is not None:
+            query += " AND kind=?"
+            params.append(kind)
+
+        row = self.cnx.execute(query + " ORDER BY path", params).fetchone()
+
+        return row[0] if row is not None else None
+
+    def error_files(self, upid):
+        """
+        Lists the LSF error files of a genome that are not empty. The files
+        are stat'ed again, as they grow without changing their directory
+
+        upid: A valid Uniprot proteome accession
+
+        return: A sorted list of error file paths
+        """
+
+        rows = self.cnx.execute("SELECT path FROM files WHERE upid=? AND name LIKE '%.err' "
+                                "ORDER BY path", (upid,)).fetchall()
+
+        return [x[0] for x in rows if os.path.exists(x[0]) and os.path.getsize(x[0]) > 0]
+
+    def chunks(self, upid, search_status=None):
+        """
+        Lists the search chunks of a genome
+
+        upid: A valid Uniprot proteome accession
+        search_status: Only list chunks with this search status
+
+        return: A sorted list of chunk file paths
+        """
+
+        query = "SELECT path FROM files WHERE upid=? AND kind='chunk'"
+        params = [upid]
+        if search_status is not None:
+            query += " AND search_status=?"
+            params.append(search_status)
+
+        return [x[0] for x in self.cnx.execute(query + " ORDER BY path", params).fetchall()]
+
+    def search_status(self, upid):
+        """
+        Returns the search status of a genome, or None if it is not indexed
+        """
+
+        row = self.cnx.execute("SELECT search_status FROM genomes WHERE upid=?",
+                               (upid,)).fetchone()
+
+        return row[0] if row is not None else None
+
+    def failed_chunks(self):
+        """
+        Lists the chunks whose searches failed across the project
+
+        return: A dictionary of upids to lists of chunk names
+        """
+
+        failed = {}
+        for upid, name in self.cnx.execute("SELECT upid, name FROM files WHERE "
+                                           "kind='chunk' AND search_status=? "
+                                           "ORDER BY upid, name", (FAILED,)):
+            failed.setdefault(upid, []).append(name)
+
+        return failed
+
+# -----------------------------------------------------------------------------
+
+
+def load_project_index(project_dir, upids=None, refresh=True):
+    """
+    Opens the index of a project directory, bringing it up to date
+
+    project_dir: The path to a project directory as generated by genome_downloader
+    upids: Only refresh these genomes. If None, all genomes are refreshed
+    refresh: If False, use the index as is
+
+    return: A ProjectIndex object
+    """
+
+    index = ProjectIndex(project_dir)
+
+    if refresh is True:
+        index.refresh(upids=upids)
+
+    return index
+
+# -----------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Build or refresh a project directory index")
+
+    parser.add_argument("project_dir", help="path to a genome download project", type=str)
+    parser.add_argument("--force", help="rescan all genomes", action="store_true")
+    parser.add_argument("--status", help="list genomes with this search status",
+                        choices=[NOT_STARTED, PENDING, FAILED, DONE], default=None)
+
+    return parser
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = usage()
+    args = parser.parse_args()
+
+    index = ProjectIndex(args.project_dir)
+    rescanned = index.refresh(force=args.force)
+
+    if args.status is not None:
+        for upid in index.upids(search_status=args.status):
+            print upid
+    else:
+        print "%d genomes indexed, %d rescanned" % (len(index.upids()), rescanned)
+
+    index.close()
@@ -0,0 +1,350 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+RNAcentral mapping index of a release. An SQLite file built once from the
+rnacentral_matches table and the RNAcentral metadata TSV, with:
+
+    regions: (rfamseq_acc, seq_start, seq_end) -> URS, clustered on the key
+    metadata: URS_taxid -> source, previous_acc, tax_id, mol_type
+
+Exporters look regions up on disk instead of joining rnacentral_matches or
+loading the mappings into dictionaries
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import sqlite3
+import argparse
+
+# -----------------------------------------------------------------------------
+
+INDEX_FILENAME = "rnacentral_index.db"
+
+SQLITE_HEADER = "SQLite format 3\x00"
+
+BATCH_SIZE = 100000
+
+# -----------------------------------------------------------------------------
+
+
+def parse_region_name(name):
+    """
+    Splits a region name into its key
+
+    name: A region name in the form rfamseq_acc/seq_start:seq_end
+
+    return: A tuple (rfamseq_acc, seq_start, seq_end), or None if name is
+    not a region name
+    """
+
+    rfamseq_acc, sep, coords = name.rpartition('/')
+    seq_start, sep2, seq_end = coords.partition(':')
+
+    if sep == '' or sep2 == '' or not seq_start.isdigit() or not seq_end.isdigit():
+        return None
+
+    return rfamseq_acc, int(seq_start), int(seq_end)
+
+# -----------------------------------------------------------------------------
+
+
+def is_rnacentral_index(path):
+    """
+    Checks if a file is an index rather than an RNAcentral metadata TSV
+
+    path: The path to a file
+
+    return: True if the file is an SQLite database, False otherwise
+    """
+
+    fp = open(path, 'rb')
+    header = fp.read(len(SQLITE_HEADER))
+    fp.close()
+
+    return header == SQLITE_HEADER
+
+# -----------------------------------------------------------------------------
+
+
+def iterate_metadata_file(rnac_metadata_file):
+    """
+    Reads the RNAcentral metadata TSV. The expected format is:
+    URS_acc\tsource\tpre_acc/start-end\tncbi_id\tmol_type
+
+    rnac_metadata_file: A tab delimited file with Rfam compatible metadata
+    extracted from RNAcentral
+
+    return: A generator of (URS_taxid, source, previous_acc, tax_id,
+    mol_type) tuples
+    """
+
+    fp = open(rnac_metadata_file, 'r')
+    for rnac_line in fp:
+        rnac_line_contents = rnac_line.strip().split('\t')
+        if len(rnac_line_contents) < 5:
+            continue
+
+        tax_id = rnac_line_contents[3]
+        yield (rnac_line_contents[0] + '_' + tax_id, rnac_line_contents[1],
+               rnac_line_contents[2].partition('/')[0], tax_id, rnac_line_contents[4])
+    fp.close()
+
+# -----------------------------------------------------------------------------
+
+
+class RNAcentralIndex(object):
+    """
+    Read access to an RNAcentral mapping index
+    """
+
+    def __init__(self, index_file):
+        """
+        index_file: The path to an index built by build_rnacentral_index
+        """
+
+        if not os.path.exists(index_file):
+            raise IOError("RNAcentral index %s does not exist" % index_file)
+
+        self.index_file = index_file
+        self.cnx = sqlite3.connect(index_file)
+        self.cnx.text_factory = str
+
+    def close(self):
+        """
+        Closes the index
+        """
+
+        self.cnx.close()
+
+    def lookup(self, rfamseq_acc, seq_start, seq_end):
+        """
+        Returns the URS of a region, or None if the region is not mapped
+        """
+
+        row = self.cnx.execute("SELECT urs FROM regions WHERE rfamseq_acc=? AND seq_start=? "
+                               "AND seq_end=?", (rfamseq_acc, seq_start, seq_end)).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def get(self, name, default=None):
+        """
+        Returns the URS of a region by name (rfamseq_acc/seq_start:seq_end),
+        so that the index can stand in for a dictionary of region names to
+        URS ids
+        """
+
+        key = parse_region_name(name)
+        if key is None:
+            return default
+
+        urs = self.lookup(*key)
+        if urs is None:
+            return default
+
+        return urs
+
+    def sequence_regions(self, rfamseq_acc):
+        """
+        Returns the mapped regions of a sequence
+
+        return: A dictionary of (seq_start, seq_end) tuples to URS ids
+        """
+
+        return dict([((x[0], x[1]), x[2]) for x in
+                     self.cnx.execute("SELECT seq_start, seq_end, urs FROM regions "
+                                      "WHERE rfamseq_acc=?", (rfamseq_acc,))])
+
+    def metadata(self, rnac_acc):
+        """
+        Returns the RNAcentral metadata of a URS_taxid accession
+
+        return: A dictionary with the source, previous_acc, tax_id and
+        mol_type, or None if the accession is not in the index
+        """
+
+        row = self.cnx.execute("SELECT source, previous_acc, tax_id, mol_type FROM metadata "
+                               "WHERE rnac_acc=?", (rnac_acc,)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(("source", "previous_acc", "tax_id", "mol_type"), row))
+
+    def iterate_metadata(self):
+        """
+        Iterates over the RNAcentral metadata in accession order
+
+        return: A generator of (URS_taxid, metadata dictionary) tuples
+        """
+
+        for row in self.cnx.execute("SELECT rnac_acc, source, previous_acc, tax_id, mol_type "
+                                    "FROM metadata ORDER BY rnac_acc"):
+            yield row[0], dict(zip(("source", "previous_acc", "tax_id", "mol_type"), row[1:]))
+
+    def counts(self):
+        """
+        Returns a tuple (number of regions, number of metadata entries)
+        """
+
+        return (self.cnx.execute("SELECT COUNT(*) FROM regions").fetchone()[0],
+                self.cnx.execute("SELECT COUNT(*) FROM metadata").fetchone()[0])
+
+# -----------------------------------------------------------------------------
+
+
+def insert_batches(cnx, query, rows):
+    """
+    Inserts rows from an iterable in batches of BATCH_SIZE
+
+    return: The number of rows inserted
+    """
+
+    count = 0
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            cnx.executemany(query, batch)
+            count += len(batch)
+            batch = []
+
+    if len(batch) > 0:
+        cnx.executemany(query, batch)
+        count += len(batch)
+
+    return count
+
+# -----------------------------------------------------------------------------
+
+
+def build_rnacentral_index(index_file, region_rows, rnac_metadata_file=None):
+    """
+    Builds an RNAcentral mapping index. The index is written to
+    index_file.tmp and only replaces index_file once complete
+
+    index_file: The path to the index file
+    region_rows: An iterable of (rfamseq_acc, seq_start, seq_end, URS) rows,
+    as selected from rnacentral_matches
+    rnac_metadata_file: The path to the RNAcentral metadata TSV (optional)
+
+    return: A tuple (number of regions, number of metadata entries)
+    """
+
+    tmp_file = index_file + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    cnx = sqlite3.connect(tmp_file)
+    cnx.text_factory = str
+
+    # the index is written once, so skip the journal
+    cnx.execute("PRAGMA journal_mode=OFF")
+    cnx.execute("PRAGMA synchronous=OFF")
+
+    cnx.execute("CREATE TABLE regions (rfamseq_acc TEXT, seq_start INTEGER, seq_end INTEGER, "
+                "urs TEXT, PRIMARY KEY (rfamseq_acc, seq_start, seq_end)) WITHOUT ROWID")
+    cnx.execute("CREATE TABLE metadata (rnac_acc TEXT PRIMARY KEY, source TEXT, "
+                "previous_acc TEXT, tax_id TEXT, mol_type TEXT) WITHOUT ROWID")
+
+    # a region mapped more than once keeps its first URS
+    region_count = insert_batches(cnx, "INSERT OR IGNORE INTO regions VALUES (?, ?, ?, ?)",
+                                  ((str(x[0]), int(x[1]), int(x[2]), str(x[3]))
+                                   for x in region_rows if x[3] is not None))
+
+    metadata_count = 0
+    if rnac_metadata_file is not None:
+        # all URS entries must be unique, the first one is kept
+        metadata_count = insert_batches(cnx, "INSERT OR IGNORE INTO metadata "
+                                             "VALUES (?, ?, ?, ?, ?)",
+                                        iterate_metadata_file(rnac_metadata_file))
+
+    cnx.commit()
+    cnx.close()
+
+    os.rename(tmp_file, index_file)
+
+    index = RNAcentralIndex(index_file)
+    counts = index.counts()
+    index.close()
+
+    return counts
+
+# -----------------------------------------------------------------------------
+
+
+def build_rnacentral_index_from_db(index_file, rnac_metadata_file=None):
+    """
+    Builds an RNAcentral mapping index from the rnacentral_matches table of
+    the live database
+
+    index_file: The path to the index file
+    rnac_metadata_file: The path to the RNAcentral metadata TSV (optional)
+
+    return: A tuple (number of regions, number of metadata entries)
+    """
+
+    # only needed when building from the database
+    from config import rfam_search as rs
+    from utils import RfamDB
+
+    cnx = RfamDB.connect()
+    cursor = cnx.cursor(buffered=False)
+    cursor.execute(rs.RNACENTRAL_MATCHES_ALL)
+
+    def iterate_rows():
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+    try:
+        counts = build_rnacentral_index(index_file, iterate_rows(),
+                                        rnac_metadata_file=rnac_metadata_file)
+    finally:
+        cursor.close()
+        cnx.disconnect()
+
+    return counts
+
+# -----------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Build the RNAcentral mapping index of a release")
+
+    parser.add_argument("index_file", help="path to the index file", type=str)
+    parser.add_argument("--metadata", help="RNAcentral metadata TSV", type=str, default=None)
+
+    return parser
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = usage()
+    args = parser.parse_args()
+
+    print "%d regions, %d metadata entries" % build_rnacentral_index_from_db(
+        args.index_file, rnac_metadata_file=args.metadata)
@@ -0,0 +1,581 @@
+"""
+Copyright [2009-2018] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Executors for cmsearch/cmscan chunk jobs. A search job is a dictionary
+describing a single search of a sequence chunk:
+
+    name: The chunk name, used to name the output files
+    binary: The path to the cmsearch/cmscan executable
+    cm_file: The path to the CM file
+    seq_file: The path to the sequence chunk
+    dest_dir: The directory the .out, .err, .inf and .tbl files are written to
+    dbsize: The database size in Mb (-Z)
+    cpus: Number of CPUs of the job
+    memory: Memory of the job in MB
+
+Every executor writes the same output layout: <name>.inf and <name>.tbl
+with the Infernal output, <name>.err with the standard error of the search
+and <name>.out with an LSF style job report
+
+The LSF array executor writes jobs to task files, one json job per line,
+and submits a job array per task file. Every array element runs this
+module on its line of the task file:
+
+    python search_executor.py task_file [--index N]
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import os
+import sys
+import json
+import errno
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import subprocess
+import argparse
+import multiprocessing
+
+# -----------------------------------------------------------------------------
+
+MB = 1000000.0
+
+LSF_SEARCH_GROUP = "/rfam_search"
+
+SEARCH_MPI = ("bsub -q mpi-rh7 -M %s -R \"rusage[mem=%s,tmp=2000]\" -o %s -e %s -n %s -g %s -R \"span[hosts=1]\" "
+              "-f \"%s < %s\" "
+              "-f \"%s < %s\" "
+              "-f \"%s < %s\" "
+              "-f \"%s < %s\" "
+              "-Ep \"rm /tmp/%s.*\" "
+              "-a openmpi mpiexec -mca btl ^openib -np %s "
+              "%s -o %s --tblout %s --acc --cut_ga --rfam --notextw --nohmmonly -Z %s --mpi %s %s")
+
+# one array element per line of a task file, run by this module
+SEARCH_ARRAY = ("bsub -J \"%s[1-%d]%s\" -M %s -R \"rusage[mem=%s]\" -n %s -R \"span[hosts=1]\" "
+                "-o %s -e %s -g %s \"%s %s %s\"")
+
+MAX_ARRAY_SIZE = 1000  # LSF MAX_JOB_ARRAY_SIZE default
+
+SEARCH_OPTIONS = ["--acc", "--cut_ga", "--rfam", "--notextw", "--nohmmonly"]
+
+# LSF style report written by the local executor, so that the job statistics
+# tools parse local and LSF runs alike
+LOCAL_JOB_REPORT = """Sender: local executor <%(host)s>
+Subject: Job %(name)s: <%(command)s> in cluster <local> %(result)s
+
+Job <%(command)s> was submitted from host <%(host)s>.
+Job was executed on host(s) <%(host)s>.
+Started at %(start)s
+Results reported at %(end)s
+
+Your job looked like:
+
+------------------------------------------------------------
+# LSBATCH: User input
+%(command)s
+------------------------------------------------------------
+
+%(status)s
+
+Resource usage summary:
+
+    CPU time :                                   %(cpu_time).2f sec.
+    Max Memory :                                 %(max_mem)d MB
+    Max Processes :                              1
+    Run time :                                   %(run_time)d sec.
+
+The output (if any) is above this job summary.
+"""
+
+# -----------------------------------------------------------------------------
+
+
+def get_output_files(job, output_dir=None):
+    """
+    Builds the paths of the output files of a search job
+
+    job: A search job dictionary
+    output_dir: The directory of the files. Defaults to job["dest_dir"]
+
+    return: A dictionary of extensions (out, err, inf, tbl) to file paths
+    """
+
+    if output_dir is None:
+        output_dir = job["dest_dir"]
+
+    return dict([(x, os.path.join(output_dir, job["name"] + '.' + x))
+                 for x in ("out", "err", "inf", "tbl")])
+
+# -----------------------------------------------------------------------------
+
+
+def build_search_args(job, inf_file, tbl_file):
+    """
+    Builds the argument list of a threaded (non MPI) search
+
+    job: A search job dictionary
+    inf_file: The path to the Infernal output file (-o)
+    tbl_file: The path to the tabular output file (--tblout)
+
+    return: A list of arguments
+    """
+
+    return [job["binary"], "--cpu", str(job["cpus"]), "-o", inf_file, "--tblout", tbl_file] + \
+        SEARCH_OPTIONS + ["-Z", str(job["dbsize"]), job["cm_file"], job["seq_file"]]
+
+# -----------------------------------------------------------------------------
+
+
+def get_total_memory():
+    """
+    Returns the physical memory of the machine in MB
+    """
+
+    return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 * 1024))
+
+# -----------------------------------------------------------------------------
+
+
+class LSFExecutor(object):
+    """
+    Submits every search job to LSF as an MPI job, staging the outputs in
+    the /tmp directory of the execution host
+    """
+
+    def __init__(self, group=LSF_SEARCH_GROUP, wait=False):
+        """
+        group: The LSF job group jobs are submitted to
+        wait: If True, submit jobs with bsub -K and return once they finish
+        """
+
+        self.group = group
+        self.wait = wait
+
+    def run(self, jobs):
+        """
+        Submits a list of search jobs to LSF. Returns as soon as all jobs
+        have been submitted, or have finished if wait is True
+
+        jobs: A list of search job dictionaries
+
+        return: A list of (job name, bsub exit code) tuples. With wait set,
+        the exit code is that of the job
+        """
+
+        results = []
+
+        for job in jobs:
+            output_files = get_output_files(job)
+            tmp_files = get_output_files(job, output_dir="/tmp")
+
+            cmd = SEARCH_MPI % (job["memory"], job["memory"], tmp_files["out"],
+                                tmp_files["err"], job["cpus"], self.group,
+                                output_files["out"], tmp_files["out"],
+                                output_files["err"], tmp_files["err"],
+                                output_files["tbl"], tmp_files["tbl"],
+                                output_files["inf"], tmp_files["inf"], job["name"],
+                                job["cpus"], job["binary"], tmp_files["inf"],
+                                tmp_files["tbl"], job["dbsize"],
+                                job["cm_file"], job["seq_file"])
+
+            if self.wait is True:
+                cmd = cmd.replace("bsub ", "bsub -K ", 1)
+
+            results.append((job["name"], subprocess.call(cmd, shell=True)))
+
+        return results
+
+# -----------------------------------------------------------------------------
+
+
+class LocalExecutor(object):
+    """
+    Runs search jobs on the local machine, at most as many at a time as the
+    CPUs and memory available allow, each in its own scratch directory
+    """
+
+    def __init__(self, cpus=None, memory=None, scratch_dir=None):
+        """
+        cpus: Number of CPUs available to the jobs. Defaults to all CPUs
+        memory: Memory available to the jobs in MB. Defaults to all the
+        physical memory
+        scratch_dir: A directory on local disk to stage the outputs in.
+        Defaults to the system temporary directory
+        """
+
+        self.cpus = cpus if cpus is not None else multiprocessing.cpu_count()
+        self.memory = memory if memory is not None else get_total_memory()
+        self.scratch_dir = scratch_dir
+
+        self.condition = threading.Condition()
+        self.cpus_used = 0
+        self.memory_used = 0
+
+    def reserve(self, job):
+        """
+        Blocks until the CPUs and memory of a job are available and reserves
+        them. A job larger than the machine runs once no other job is running
+
+        return: A tuple (cpus, memory) reserved
+        """
+
+        cpus = min(job["cpus"], self.cpus)
+        memory = min(job["memory"], self.memory)
+
+        with self.condition:
+            while self.cpus_used + cpus > self.cpus or \
+                    self.memory_used + memory > self.memory:
+                self.condition.wait()
+
+            self.cpus_used += cpus
+            self.memory_used += memory
+
+        return cpus, memory
+
+    def release(self, cpus, memory):
+        """
+        Releases the CPUs and memory of a finished job
+        """
+
+        with self.condition:
+            self.cpus_used -= cpus
+            self.memory_used -= memory
+            self.condition.notify_all()
+
+    def run_job(self, job):
+        """
+        Runs a single search job, staging its outputs in a scratch directory
+        and moving them to the destination directory once the job is done
+
+        job: A search job dictionary
+
+        return: A dictionary with the name, exit code, cpu_time (seconds),
+        max_mem (MB) and run_time (seconds) of the job
+        """
+
+        cpus, memory = self.reserve(job)
+
+        try:
+            scratch = tempfile.mkdtemp(prefix=job["name"] + '.', dir=self.scratch_dir)
+            tmp_files = get_output_files(job, output_dir=scratch)
+
+            args = build_search_args(dict(job, cpus=cpus), tmp_files["inf"], tmp_files["tbl"])
+            command = ' '.join(args)
+
+            start = time.time()
+            err_fp = open(tmp_files["err"], 'w')
+            process = subprocess.Popen(args, stdout=err_fp, stderr=err_fp, cwd=scratch)
+
+            # wait4 reports the resources used by this search only
+            pid, status, rusage = os.wait4(process.pid, 0)
+            err_fp.close()
+            end = time.time()
+
+            exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status)
+            result = {"name": job["name"], "exit_code": exit_code,
+                      "cpu_time": rusage.ru_utime + rusage.ru_stime,
+                      "max_mem": rusage.ru_maxrss / 1024.0,  # KB on Linux
+                      "run_time": end - start}
+
+            if exit_code != 0:
+                status_line = "Exited with exit code %d." % exit_code
+                # anything in the .err file marks the search as failed
+                if os.path.getsize(tmp_files["err"]) == 0:
+                    err_fp = open(tmp_files["err"], 'w')
+                    err_fp.write(status_line + '\n')
+                    err_fp.close()
+            else:
+                status_line = "Successfully completed."
+
+            report_fp = open(tmp_files["out"], 'w')
+            report_fp.write(LOCAL_JOB_REPORT % {"host": socket.gethostname(),
+                                                "name": job["name"], "command": command,
+                                                "result": "Done" if exit_code == 0 else "Exited",
+                                                "start": time.ctime(start), "end": time.ctime(end),
+                                                "status": status_line,
+                                                "cpu_time": result["cpu_time"],
+                                                "max_mem": int(round(result["max_mem"])),
+                                                "run_time": int(round(result["run_time"]))})
+            report_fp.close()
+
+            # jobs sharing a destination directory finish concurrently
+            if not os.path.exists(job["dest_dir"]):
+                try:
+                    os.makedirs(job["dest_dir"])
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+
+            # the .err file goes last, as the search status is read from it
+            output_files = get_output_files(job)
+            for extension in ("inf", "tbl", "out", "err"):
+                if os.path.exists(tmp_files[extension]):
+                    shutil.move(tmp_files[extension], output_files[extension])
+
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        finally:
+            self.release(cpus, memory)
+
+        return result
+
+    def run(self, jobs):
+        """
+        Runs a list of search jobs and waits for all of them to finish
+
+        jobs: A list of search job dictionaries
+
+        return: A list of result dictionaries as returned by run_job, in the
+        order of the jobs
+        """
+
+        results = [None] * len(jobs)
+        queue = list(enumerate(jobs))
+        queue_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with queue_lock:
+                    if len(queue) == 0:
+                        return
+                    idx, job = queue.pop(0)
+
+                try:
+                    results[idx] = self.run_job(job)
+                except Exception as e:
+                    results[idx] = {"name": job["name"], "exit_code": None, "error": str(e)}
+
+        threads = [threading.Thread(target=worker) for x in range(min(self.cpus, len(jobs)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return results
+
+# -----------------------------------------------------------------------------
+
+
+def write_task_file(task_file, jobs):
+    """
+    Writes search jobs to a task file, one json job per line. Line N is
+    run by element N of a job array
+
+    task_file: The path to the task file
+    jobs: A list of search job dictionaries
+    """
+
+    fp = open(task_file, 'w')
+    for job in jobs:
+        fp.write(json.dumps(job, sort_keys=True) + '\n')
+    fp.close()
+
+# -----------------------------------------------------------------------------
+
+
+def read_task(task_file, index):
+    """
+    Reads a single search job from a task file
+
+    task_file: The path to a task file written by write_task_file
+    index: The 1-based index of the task (the LSF job array index)
+
+    return: A search job dictionary
+    """
+
+    fp = open(task_file, 'r')
+    for line_no, line in enumerate(fp, 1):
+        if line_no == index:
+            fp.close()
+            return dict([(str(x), y) for x, y in json.loads(line).iteritems()])
+    fp.close()
+
+    raise IndexError("Task %d not found in %s" % (index, task_file))
+
+# -----------------------------------------------------------------------------
+
+
+class LSFArrayExecutor(object):
+    """
+    Submits search jobs to LSF as job arrays, one array per CM file and
+    resource request, instead of one bsub per job. Every element runs its
+    search with the local executor in a scratch directory of its own, so
+    that elements on the same host never share staging paths
+    """
+
+    def __init__(self, tasks_dir, group=LSF_SEARCH_GROUP, max_running=None,
+                 max_array_size=MAX_ARRAY_SIZE):
+        """
+        tasks_dir: The directory task files and array LSF reports are written to
+        group: The LSF job group arrays are submitted to
+        max_running: Maximum number of elements of an array running at a time
+        max_array_size: Maximum number of elements of an array. Larger
+        arrays are split
+        """
+
+        self.tasks_dir = tasks_dir
+        self.group = group
+        self.max_running = max_running
+        self.max_array_size = max_array_size
+
+    def group_jobs(self, jobs):
+        """
+        Splits jobs into arrays by CM file, CPUs and memory, in the order
+        of the jobs
+
+        return: A list of (array name, list of jobs) tuples
+        """
+
+        groups = {}
+        keys = []
+
+        for job in jobs:
+            key = (job["cm_file"], job["cpus"], job["memory"])
+            if key not in groups:
+                groups[key] = []
+                keys.append(key)
+            groups[key].append(job)
+
+        arrays = []
+        for key in keys:
+            cm_name = os.path.basename(key[0]).partition('.')[0]
+            name = "%s_%dc_%dm" % (cm_name, key[1], key[2])
+
+            group_jobs = groups[key]
+            for idx in range(0, len(group_jobs), self.max_array_size):
+                arrays.append(("%s_%d" % (name, idx / self.max_array_size + 1),
+                               group_jobs[idx:idx + self.max_array_size]))
+
+        return arrays
+
+    def run(self, jobs):
+        """
+        Writes a task file per array and submits the arrays to LSF. Returns
+        as soon as all arrays have been submitted
+
+        jobs: A list of search job dictionaries
+
+        return: A list of (array name, bsub exit code) tuples
+        """
+
+        if not os.path.exists(self.tasks_dir):
+            os.makedirs(self.tasks_dir)
+
+        worker = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+        max_running = ''
+        if self.max_running is not None:
+            max_running = "%%%d" % self.max_running
+
+        results = []
+
+        for name, array_jobs in self.group_jobs(jobs):
+            task_file = os.path.join(self.tasks_dir, name + ".tasks")
+            write_task_file(task_file, array_jobs)
+
+            # LSF replaces %I with the array index
+            lsf_prefix = os.path.join(self.tasks_dir, name + ".%I")
+
+            job = array_jobs[0]
+            cmd = SEARCH_ARRAY % (name, len(array_jobs), max_running, job["memory"],
+                                  job["memory"], job["cpus"], lsf_prefix + ".out",
+                                  lsf_prefix + ".err", self.group, sys.executable, worker,
+                                  task_file)
+
+            results.append((name, subprocess.call(cmd, shell=True)))
+
+        return results
+
+# -----------------------------------------------------------------------------
+
+
+def run_task(task_file, index, scratch_dir=None):
+    """
+    Runs a single task of a task file on the local machine, as an element
+    of a job array does
+
+    task_file: The path to a task file written by write_task_file
+    index: The 1-based index of the task
+    scratch_dir: A directory on local disk to stage the outputs in
+
+    return: The result dictionary of the job
+    """
+
+    job = read_task(task_file, index)
+    executor = LocalExecutor(cpus=job["cpus"], memory=job["memory"], scratch_dir=scratch_dir)
+
+    return executor.run_job(job)
+
+# -----------------------------------------------------------------------------
+
+
+def get_executor(name, **kwargs):
+    """
+    Creates a search executor by name
+
+    name: One of lsf, lsf_array or local
+    kwargs: Options passed to the executor
+
+    return: An executor object
+    """
+
+    if name == "lsf":
+        return LSFExecutor(**kwargs)
+
+    elif name == "lsf_array":
+        return LSFArrayExecutor(**kwargs)
+
+    elif name == "local":
+        return LocalExecutor(**kwargs)
+
+    raise ValueError("Unknown executor %s" % name)
+
+# -----------------------------------------------------------------------------
+
+
+def usage():
+    """
+    Parses arguments and displays usage information on screen
+    """
+
+    parser = argparse.ArgumentParser(description="Run a search job of a task file")
+
+    parser.add_argument("task_file", help="a task file written by the LSF array executor",
+                        type=str)
+    parser.add_argument("--index", help="1-based index of the task. Defaults to $LSB_JOBINDEX",
+                        type=int, default=None)
+    parser.add_argument("--scratch-dir", help="directory to stage the outputs in",
+                        type=str, default=None)
+
+    return parser
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = usage()
+    args = parser.parse_args()
+
+    index = args.index
+    if index is None:
+        index = int(os.environ["LSB_JOBINDEX"])
+
+    result = run_task(args.task_file, index, scratch_dir=args.scratch_dir)
+
+    sys.exit(result["exit_code"])
@@ -0,0 +1,298 @@
+"""
+Copyright [2009-2017] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Residue balanced search job planner. Estimates the CPU time and memory of
+searching a sequence chunk with a CM file from a cost model fitted on the
+statistics of past LSF jobs, and packs chunks into jobs of even cost so
+that no single long chunk holds up the end of a run. Models are split
+into CM files of even search cost the same way.
+
+The CPU time of a search is modelled as proportional to the number of
+residues searched times the total consensus length (CLEN) of the models,
+and its memory as a linear function of the residues in the chunk
+"""
+
+# ---------------------------------IMPORTS-------------------------------------
+
+import json
+import math
+
+# -----------------------------------------------------------------------------
+
+MB = 1000000.0
+
+# cost model used until one is fitted on past jobs
+DEFAULT_MODEL = {"cpu_rate": 10.0,  # CPU seconds per Mb per 1000 CLEN
+                 "mem_base": 4000.0,  # MB
+                 "mem_per_mb": 500.0,  # MB per Mb of the chunk
+                 "samples": 0}
+
+MEM_SAFETY_FACTOR = 1.5
+MIN_JOB_MEMORY = 2000  # MB
+
+CM_GROUP_MANIFEST = "cm_groups.json"
+
+# -----------------------------------------------------------------------------
+
+
+def get_cm_stats(cm_file):
+    """
+    Counts the models in a CM file and sums their consensus lengths
+
+    cm_file: The path to a CM file
+
+    return: A tuple (number of models, total CLEN)
+    """
+
+    cm_count = 0
+    total_clen = 0
+
+    fp = open(cm_file, 'r')
+    for line in fp:
+        if line.startswith("INFERNAL1"):
+            cm_count += 1
+        elif line.startswith("CLEN"):
+            total_clen += int(line.split()[1])
+    fp.close()
+
+    return cm_count, total_clen
+
+# -----------------------------------------------------------------------------
+
+
+def get_search_work(residues, total_clen):
+    """
+    Computes the units of work of a search: Mb searched times thousands of
+    consensus positions
+    """
+
+    return (residues / MB) * (total_clen / 1000.0)
+
+# -----------------------------------------------------------------------------
+
+
+def fit_cost_model(samples):
+    """
+    Fits the cost model on the statistics of past search jobs. CPU time is
+    fitted through the origin against the units of work, and memory by
+    least squares against the Mb searched
+
+    samples: A list of dictionaries with the residues, total_clen, cpu_time
+    (seconds) and mem (MB) of past jobs
+
+    return: A cost model dictionary
+    """
+
+    model = dict(DEFAULT_MODEL)
+
+    samples = [x for x in samples if x.get("cpu_time") and x.get("residues")]
+    if len(samples) == 0:
+        return model
+
+    work = [get_search_work(x["residues"], x["total_clen"]) for x in samples]
+    sum_xx = sum([x * x for x in work])
+    if sum_xx > 0:
+        model["cpu_rate"] = sum([w * x["cpu_time"] for w, x in zip(work, samples)]) / sum_xx
+
+    mem_samples = [(x["residues"] / MB, float(x["mem"])) for x in samples if x.get("mem")]
+
+    if len(mem_samples) >= 2:
+        mean_x = sum([x[0] for x in mem_samples]) / len(mem_samples)
+        mean_y = sum([x[1] for x in mem_samples]) / len(mem_samples)
+        var_x = sum([(x[0] - mean_x) ** 2 for x in mem_samples])
+
+        if var_x > 0:
+            slope = sum([(x[0] - mean_x) * (x[1] - mean_y) for x in mem_samples]) / var_x
+            model["mem_per_mb"] = max(slope, 0.0)
+            model["mem_base"] = max(mean_y - model["mem_per_mb"] * mean_x, 0.0)
+        else:
+            model["mem_base"] = mean_y
+            model["mem_per_mb"] = 0.0
+
+    model["samples"] = len(samples)
+
+    return model
+
+# -----------------------------------------------------------------------------
+
+
+def save_cost_model(model, model_file):
+    """
+    Writes a cost model to a json file
+    """
+
+    fp = open(model_file, 'w')
+    json.dump(model, fp, indent=2)
+    fp.close()
+
+# -----------------------------------------------------------------------------
+
+
+def load_cost_model(model_file=None):
+    """
+    Loads a cost model from a json file
+
+    model_file: The path to a model file. If None, the default model is used
+
+    return: A cost model dictionary
+    """
+
+    model = dict(DEFAULT_MODEL)
+
+    if model_file is not None:
+        fp = open(model_file, 'r')
+        model.update(json.load(fp))
+        fp.close()
+
+    return model
+
+# -----------------------------------------------------------------------------
+
+
+def estimate_cpu_time(model, residues, total_clen):
+    """
+    Estimates the CPU seconds needed to search residues with models of
+    total_clen consensus positions
+    """
+
+    return model["cpu_rate"] * get_search_work(residues, total_clen)
+
+# -----------------------------------------------------------------------------
+
+
+def estimate_memory(model, residues):
+    """
+    Estimates the memory in MB needed to search a chunk of residues,
+    including a safety margin
+    """
+
+    mem = (model["mem_base"] + model["mem_per_mb"] * residues / MB) * MEM_SAFETY_FACTOR
+
+    return int(max(math.ceil(mem), MIN_JOB_MEMORY))
+
+# -----------------------------------------------------------------------------
+
+
+def plan_search_jobs(chunks, model, total_clen, cpus=1, job_hours=None):
+    """
+    Packs sequence chunks into search jobs of even estimated wall time,
+    placing the most expensive chunks first, each in the job with the
+    least work so far (LPT scheduling). Chunks within a job are searched
+    one after the other
+
+    chunks: A list of (chunk path, residues) tuples
+    model: A cost model dictionary
+    total_clen: The total consensus length of the CM file searched
+    cpus: Number of CPUs of every job
+    job_hours: Target wall time of a job in hours. Defaults to the time
+    of the most expensive chunk, so that no job runs longer than it
+
+    return: A list of job dictionaries with the chunks, residues,
+    cpu_time (estimated CPU seconds), wall_time (estimated seconds) and
+    memory (MB) of every job
+    """
+
+    if len(chunks) == 0:
+        return []
+
+    costs = [(estimate_cpu_time(model, x[1], total_clen), x[0], x[1]) for x in chunks]
+    costs.sort(reverse=True)
+
+    total_cost = sum([x[0] for x in costs])
+    target = costs[0][0]
+    if job_hours is not None:
+        target = max(target, job_hours * 3600.0 * cpus)
+
+    job_no = max(1, int(math.ceil(total_cost / target))) if target > 0 else len(costs)
+    job_no = min(job_no, len(costs))
+
+    jobs = [{"chunks": [], "residues": 0, "cpu_time": 0.0, "memory": MIN_JOB_MEMORY}
+            for x in range(job_no)]
+
+    for cost, chunk, residues in costs:
+        job = min(jobs, key=lambda x: x["cpu_time"])
+        job["chunks"].append(chunk)
+        job["residues"] += residues
+        job["cpu_time"] += cost
+        job["memory"] = max(job["memory"], estimate_memory(model, residues))
+
+    for job in jobs:
+        job["wall_time"] = job["cpu_time"] / cpus
+
+    return jobs
+
+# -----------------------------------------------------------------------------
+
+
+def plan_cm_groups(models, group_no):
+    """
+    Splits covariance models into groups of even total weight, placing the
+    heaviest models first, each in the group with the least weight so far
+    (LPT scheduling). With the CLEN as weight, every group takes about the
+    same time to search a sequence file
+
+    models: A list of (model name, weight) tuples
+    group_no: The number of groups to produce
+
+    return: A list of at most group_no group dictionaries with the models
+    and the total weight of every group
+    """
+
+    group_no = min(group_no, len(models))
+
+    groups = [{"models": [], "weight": 0} for x in range(group_no)]
+
+    for name, weight in sorted(models, key=lambda x: x[1], reverse=True):
+        group = min(groups, key=lambda x: x["weight"])
+        group["models"].append(name)
+        group["weight"] += weight
+
+    return groups
+
+# -----------------------------------------------------------------------------
+
+
+def save_cm_groups(manifest_file, groups):
+    """
+    Writes the CM groups built by support/group_cms.py to a json manifest
+
+    groups: A list of group dictionaries with the cm_file, models, total_clen
+    and weight of every group
+    """
+
+    fp = open(manifest_file, 'w')
+    json.dump({"groups": groups}, fp, indent=2)
+    fp.close()
+
+# -----------------------------------------------------------------------------
+
+
+def load_cm_groups(manifest_file):
+    """
+    Loads the CM groups of a json manifest written by save_cm_groups
+
+    return: A list of group dictionaries
+    """
+
+    fp = open(manifest_file, 'r')
+    groups = json.load(fp)["groups"]
+    fp.close()
+
+    return groups
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    pass
@@ -3,12 +3,14 @@ import RfamDB
 # -------------------------------------------------------------------------
 
 
-def update_seed_region_md5s(data):
+def update_seed_region_md5s(data, chunk_size=None):
 
     """
     Updates md5 fields of the seed region table
 
     data: A list of tuples specifying the entries to populate
+    chunk_size: Number of rows per executemany call. Changes are committed
+    after every chunk. If None all rows are updated in a single transaction
 
     return: void
     """
@@ -23,9 +25,12 @@ def update_seed_region_md5s(data):
     query = ("UPDATE seed_region SET md5=%s WHERE rfam_acc=%s "
              "AND rfamseq_acc=%s AND seq_start=%s AND seq_end=%s")
 
-    cursor.executemany(query, data)
+    if chunk_size is None:
+        chunk_size = max(len(data), 1)
 
-    cnx.commit()
+    for index in range(0, len(data), chunk_size):
+        cursor.executemany(query, data[index:index + chunk_size])
+        cnx.commit()
 
     cursor.close()
     RfamDB.disconnect(cnx)
@@ -59,4 +64,41 @@ def fetch_seed_regions():
 
     return seed_region_rows
 
+# -------------------------------------------------------------------------
+
+
+def fetch_seed_regions_batched(batch_size=10000, missing_md5=False):
+    """
+    Streams seed_region entries in batches instead of loading the entire
+    table in memory
+
+    batch_size: Number of rows per batch
+    missing_md5: If True, only fetch entries with no md5 set
+
+    return: A generator of lists of (rfam_acc, rfamseq_acc, seq_start, seq_end)
+    tuples
+    """
+
+    # connect to db
+    cnx = RfamDB.connect()
+
+    # unbuffered cursor to stream the rows
+    cursor = cnx.cursor()
+
+    query = ("Select rfam_acc, rfamseq_acc, seq_start, seq_end "
+             "from seed_region")
+
+    if missing_md5 is True:
+        query += " where md5 is NULL"
+
+    cursor.execute(query)
+
+    rows = cursor.fetchmany(batch_size)
+    while len(rows) > 0:
+        yield [(str(x[0]), str(x[1]), int(x[2]), int(x[3])) for x in rows]
+        rows = cursor.fetchmany(batch_size)
+
+    cursor.close()
+    RfamDB.disconnect(cnx)
+
 # -------------------------------------------------------------------------
\ No newline at end of file